@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the rule-based fix engine
+Runs the IEEE 2-column fix sequence (table*, centering, float placement,
+figure*, authors, image positioning and sizes) as the former chain of
+whole-document re.sub/re.findall calls and as the RuleSets in
+utils.fix_rules, checks both produce the same document, and reports scans
+and time per document
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.append('.')
+
+from utils.fix_rules import (
+    AUTHOR_NAME_SPACING_RULES, AUTHOR_SUPERSCRIPT_RULES, FIGURE_STAR_RULES, IEEE_AUTHOR_BLOCK_RULES,
+    IEEE_TABLE_STAR_RULES, IMAGE_POSITION_RULES, IMAGE_SIZE_RULES, TABLE_CENTERING_RULES,
+    table_placement_rules
+)
+from utils.rule_engine import apply_rules
+
+STAGES = (IEEE_TABLE_STAR_RULES, TABLE_CENTERING_RULES, table_placement_rules("IEEE", "2-column"),
+          FIGURE_STAR_RULES, AUTHOR_SUPERSCRIPT_RULES, AUTHOR_NAME_SPACING_RULES, IEEE_AUTHOR_BLOCK_RULES,
+          IMAGE_POSITION_RULES, IMAGE_SIZE_RULES)
+
+_SAMPLE = r"""\documentclass{article}
+\usepackage{caption}
+\author{Jane  Doe ${ }^{1}{ }^{*}$ and John Roe ${ }^{2}$}
+\begin{document}
+\section{Results}
+\begin{table}[h]
+\begin{center}
+\begin{tabular}{|l|l|}
+Model & MAE \\
+\end{tabular}
+\end{center}
+\caption{Results}
+\end{table}
+\begin{figure}[h]
+\includegraphics[width=\columnwidth]{plot.png}
+\end{figure}
+\begin{figure}
+\includegraphics{diagram.png}
+\end{figure}
+\end{document}
+"""
+
+
+def legacy_fixes(content: str) -> tuple:
+    """The re.sub chains the fixer ran before utils.fix_rules; returns (content, passes)"""
+    passes = 0
+
+    def sub(pattern, replacement, text, **kwargs):
+        nonlocal passes
+        passes += 1
+        return re.sub(pattern, replacement, text, **kwargs)
+
+    def findall(pattern, text):
+        nonlocal passes
+        passes += 1
+        return re.findall(pattern, text)
+
+    # _apply_table_fixes: table*, stfloats, centering, float parameters
+    content = sub(r'\\begin\{table\}(\[[^\]]*\])?', r'\\begin{table*}[!tb]', content)
+    content = sub(r'\\end\{table\}', r'\\end{table*}', content)
+    if '\\usepackage{stfloats}' not in content:
+        content = sub(r'(\\usepackage\{caption\})', r'\1\n\\usepackage{stfloats}', content)
+    content = sub(r'\\begin\{center\}', r'\\centering', content)
+    content = sub(r'\\end\{center\}', '', content)
+    if 'setcounter' not in content or 'topfraction' not in content:
+        float_params = ("\n% Adjust float parameters for better table placement\n" +
+                        "\\setcounter{dbltopnumber}{2}\n" +
+                        "\\renewcommand{\\dbltopfraction}{0.9}\n" +
+                        "\\renewcommand{\\dblfloatpagefraction}{0.7}\n")
+        content = sub(r'(\\begin\{document\})', lambda m: m.group(1) + float_params, content)
+
+    # _apply_figure_fixes: figure*
+    content = sub(r'\\begin\{figure\}\[h\]', r'\\begin{figure*}[!t]', content)
+    content = sub(r'\\begin\{figure\}', r'\\begin{figure*}[!t]', content)
+    content = sub(r'\\end\{figure\}', r'\\end{figure*}', content)
+
+    # _apply_author_fix (IEEE)
+    content = sub(r'\$\{\s*\}\s*\^\{([^}]+)\}\s*\{\s*\}\s*\^\{([^}]+)\}\s*\$', r'$^{\1,\2}$', content)
+    content = sub(r'\$\{\s*\}\s*\^\{([^}]+)\}\s*\$', r'$^{\1}$', content)
+    content = sub(r'([A-Za-z]+)\s+\$\s*\{\s*\}\s*\^\{', r'\1$^{', content)
+
+    def clean_author_spacing(match):
+        author_content = re.sub(r'\s+', ' ', match.group(1))
+        author_content = re.sub(r'\s*\$\s*\{\s*\}\s*\^\{([^}]+)\}\s*\$', r'$^{\1}$', author_content)
+        return f'\\author{{{author_content}}}'
+
+    content = sub(r'\\author\{([^}]+)\}', clean_author_spacing, content)
+    content = sub(r'\\author\{([^}]+)\}', lambda m: f'\\author{{\\IEEEauthorblockN{{{m.group(1)}}}}}', content)
+
+    # _force_image_positioning_here
+    for pattern, replacement in [(r'\\begin\{figure\*\}\[[^\]]*\]', r'\\begin{figure*}[!htbp]'),
+                                 (r'\\begin\{figure\}\[[^\]]*\]', r'\\begin{figure}[!htbp]'),
+                                 (r'\\begin\{figure\*\}(?!\[)', r'\\begin{figure*}[!htbp]'),
+                                 (r'\\begin\{figure\}(?!\[)', r'\\begin{figure}[!htbp]')]:
+        findall(pattern, content)
+        content = sub(pattern, replacement, content)
+
+    # _limit_image_sizes
+    for unit in ('textwidth', 'columnwidth'):
+        for width in (r'\\', r'1\\', r'1\.0\\', r'0\.[6-9]\\'):
+            pattern = r'\\includegraphics\[width=' + width + unit + r'\]'
+            if findall(pattern, content):
+                content = sub(pattern, r'\\includegraphics[width=0.5\\' + unit + ']', content)
+    for img in findall(r'\\includegraphics\{[^}]+\}', content):
+        if '[' not in img:
+            content = content.replace(img, img.replace(r'\includegraphics{', r'\includegraphics[width=0.5\textwidth]{'))
+
+    return content, passes
+
+
+def load_document(copies: int) -> str:
+    """The bundled input documents (or a built-in sample), body repeated `copies` times"""
+    sources = [path.read_text(errors='ignore') for path in sorted(Path('input').glob('*.tex'))] or [_SAMPLE]
+    document = '\n'.join(sources)
+    head, _, body = document.partition('\\begin{document}')
+    return head + '\\begin{document}' + body * copies if body else document * copies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the fix rule engine against re.sub chains')
+    parser.add_argument('--copies', type=int, default=20, help='Repeat the document body this many times')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per implementation')
+    args = parser.parse_args()
+
+    document = load_document(args.copies)
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        expected, passes = legacy_fixes(document)
+    legacy_s = (time.perf_counter() - start) / args.repeat
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        fixed, report = apply_rules(document, *STAGES)
+    rules_s = (time.perf_counter() - start) / args.repeat
+
+    assert fixed == expected, "rule engine output differs from the re.sub chain"
+
+    print(f"Document: {len(document):,} chars, {args.repeat} runs each")
+    print(f"{'implementation':<16}{'scans':>7}{'time (ms)':>12}")
+    print(f"{'re.sub chain':<16}{passes:>7}{legacy_s * 1000:>12.2f}")
+    print(f"{'rule engine':<16}{report.scans:>7}{rules_s * 1000:>12.2f}")
+    print(f"Speedup: {legacy_s / rules_s:.1f}x, {sum(report.fired.values())} rewrites, "
+          f"{len(report.conflicts)} conflicts")
+
+
+if __name__ == "__main__":
+    main()
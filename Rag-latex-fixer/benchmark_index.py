@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Recall-vs-latency benchmark for the knowledge base vector index
+Compares every index type from rag.index_factory against exact Flat search
+on the embedded knowledge base corpus
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from config import settings
+from rag.index_factory import INDEX_TYPES, create_index, index_type_of
+
+
+def load_corpus_embeddings() -> np.ndarray:
+    """Embeddings written by KnowledgeBaseManager (built on first use)"""
+    embeddings_file = settings.EMBEDDINGS_DIR / "embeddings.npy"
+    if not embeddings_file.exists():
+        from rag.knowledge_base import KnowledgeBaseManager
+        KnowledgeBaseManager()
+    return np.load(embeddings_file).astype('float32')
+
+
+def augment(embeddings: np.ndarray, size: int, noise: float, seed: int) -> np.ndarray:
+    """Grow the corpus to `size` vectors with jittered copies (simulates a larger KB)"""
+    if size <= len(embeddings):
+        return embeddings
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(embeddings), size - len(embeddings))
+    scale = noise * embeddings.std()
+    extra = embeddings[picks] + rng.normal(0, scale, (len(picks), embeddings.shape[1]))
+    return np.vstack([embeddings, extra.astype('float32')])
+
+
+def benchmark(corpus: np.ndarray, queries: np.ndarray, top_k: int) -> list:
+    """Build every index type and measure recall@k against Flat plus query latency"""
+    results = []
+    truth = None
+
+    for index_type in INDEX_TYPES:
+        start = time.perf_counter()
+        index = create_index(corpus, index_type=index_type)
+        build_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for query in queries:
+            index.search(query.reshape(1, -1), top_k)
+        latency_ms = (time.perf_counter() - start) / len(queries) * 1000
+        _, found = index.search(queries, top_k)
+
+        if truth is None:
+            truth = found  # Flat is exact and comes first
+        recall = np.mean([len(set(f) & set(t)) / top_k for f, t in zip(found, truth)])
+
+        results.append({
+            "requested": index_type,
+            "built": index_type_of(index),
+            "build_s": build_s,
+            "latency_ms": latency_ms,
+            "recall": recall,
+        })
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark FAISS index types against Flat')
+    parser.add_argument('--size', type=int, default=0,
+                        help='Augment the corpus to this many vectors (0 = real corpus only)')
+    parser.add_argument('--queries', type=int, default=200, help='Number of held-out queries')
+    parser.add_argument('--top-k', type=int, default=settings.RETRIEVAL_TOP_K)
+    parser.add_argument('--noise', type=float, default=0.1, help='Jitter for augmented/query vectors')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = augment(load_corpus_embeddings(), args.size, args.noise, args.seed)
+
+    # Queries are jittered corpus vectors, so neighbours are meaningful
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.integers(0, len(corpus), args.queries)
+    queries = corpus[picks] + rng.normal(0, args.noise * corpus.std(), (args.queries, corpus.shape[1]))
+    queries = np.ascontiguousarray(queries, dtype='float32')
+
+    print(f"Corpus: {len(corpus)} vectors x {corpus.shape[1]} dims, "
+          f"{args.queries} queries, recall@{args.top_k} vs flat")
+    print(f"{'index':<8}{'built as':<10}{'build (s)':>10}{'query (ms)':>12}{'recall':>9}")
+    for row in benchmark(corpus, queries, args.top_k):
+        print(f"{row['requested']:<8}{row['built']:<10}{row['build_s']:>10.3f}"
+              f"{row['latency_ms']:>12.3f}{row['recall']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
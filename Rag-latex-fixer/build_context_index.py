@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+Build the static example index used by ContextAwareRAGFixer
+Run after editing knowledge_base/context_examples.json
+"""
+
+import argparse
+
+from enhanced_user_guided_rag import EXAMPLES_FILE, INDEX_FILE, FAISS_FILE, build_context_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the context-aware example index')
+    parser.add_argument('--examples', default=EXAMPLES_FILE, help='Examples JSON file')
+    parser.add_argument('--index', default=INDEX_FILE, help='Output .npz with embeddings and tag bitmasks')
+    parser.add_argument('--faiss', default=FAISS_FILE, help='Output FAISS index file')
+    args = parser.parse_args()
+
+    build_context_index(args.examples, args.index, args.faiss)
+
+
+if __name__ == "__main__":
+    main()
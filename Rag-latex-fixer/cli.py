@@ -11,6 +11,7 @@ from rich.progress import Progress
 from loguru import logger
 
 from pipeline import LatexFixerPipeline
+from utils.latex_project import load_project, write_files
 from config import settings
 
 console = Console()
@@ -37,6 +38,9 @@ Examples:
   
   # Show detailed report
   python cli.py input.tex --report
+  
+  # Long document: detect and fix chunk by chunk in parallel
+  python cli.py thesis.tex --chunked -o fixed/thesis.tex
         """
     )
     
@@ -52,6 +56,9 @@ Examples:
                        help="Show detailed fix report")
     parser.add_argument("-v", "--verbose", action="store_true",
                        help="Verbose output")
+    parser.add_argument("--chunked", action="store_true",
+                       help="Process long documents chunk by chunk in parallel "
+                            "(always on for files that \\input or \\include others)")
     
     args = parser.parse_args()
     
@@ -68,9 +75,11 @@ Examples:
     else:
         output_file = args.input.parent / f"{args.input.stem}_fixed.tex"
     
-    # Read input
+    # Read input, with every file it \\input's or \\include's
     console.print(f"[cyan]Reading input file: {args.input}[/cyan]")
-    latex_content = args.input.read_text(encoding='utf-8')
+    project = load_project(args.input)
+    if len(project.files) > 1:
+        console.print(f"[cyan]Project with {len(project.files)} files[/cyan]")
     
     # Initialize pipeline
     console.print(f"[cyan]Initializing RAG LaTeX Fixer for {args.format} format...[/cyan]")
@@ -80,11 +89,19 @@ Examples:
     with Progress() as progress:
         task = progress.add_task("[green]Processing document...", total=None)
         
-        report = pipeline.process_document(
-            latex_content,
-            document_format=args.format,
-            validate_compilation=not args.no_validate
-        )
+        if len(project.files) > 1:
+            report = pipeline.process_project(
+                args.input,
+                document_format=args.format,
+                validate_compilation=not args.no_validate
+            )
+        else:
+            report = pipeline.process_document(
+                project.files[project.main],
+                document_format=args.format,
+                validate_compilation=not args.no_validate,
+                chunk_chars=settings.CHUNK_CHARS if args.chunked else None
+            )
     
     # Display results
     if report.success:
@@ -97,8 +114,17 @@ Examples:
     if args.report:
         display_report(report)
     
-    # Save output
-    output_file.write_text(report.fixed_latex, encoding='utf-8')
+    # Save output; a project's included files go next to the fixed main
+    # file, unless that would overwrite the originals
+    fixed_latex = report.fixed_latex
+    if report.fixed_files and output_file.parent.resolve() != project.root.resolve():
+        included = dict(report.fixed_files)
+        fixed_latex = included.pop(project.main)
+        for path in write_files(included, output_file.parent):
+            console.print(f"[cyan]Saved fixed include to: {path}[/cyan]")
+    elif report.fixed_files:
+        console.print("[yellow]Output is in the project directory: saving one flattened document[/yellow]")
+    output_file.write_text(fixed_latex, encoding='utf-8')
     console.print(f"[cyan]Saved fixed document to: {output_file}[/cyan]")
     
     sys.exit(0 if report.success else 1)
@@ -139,6 +165,9 @@ def display_report(report):
             """
             console.print(Panel(panel_content, title=f"Fix {i}", border_style="green"))
     
+    if report.fixes_rolled_back:
+        console.print(f"\n[yellow]Rolled back {len(report.fixes_rolled_back)} conflicting or broken fixes[/yellow]")
+    
     # Validation
     if report.validation_result:
         val = report.validation_result
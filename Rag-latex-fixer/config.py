@@ -26,6 +26,16 @@ class Settings(BaseSettings):
     RERANK_TOP_K: int = 3
     SIMILARITY_THRESHOLD: float = 0.7
     
+    # Vector Index Configuration ("flat", "hnsw" or "ivfpq")
+    INDEX_TYPE: str = "flat"
+    HNSW_M: int = 32
+    HNSW_EF_CONSTRUCTION: int = 40
+    HNSW_EF_SEARCH: int = 64
+    IVF_NLIST: int = 0  # 0 = derive from corpus size (4 * sqrt(n))
+    IVF_NPROBE: int = 8
+    PQ_M: int = 8  # sub-quantizers; must divide the embedding dimension
+    PQ_NBITS: int = 8
+    
     # Paths
     BASE_DIR: Path = Path(__file__).parent
     KNOWLEDGE_BASE_DIR: Path = BASE_DIR / "knowledge_base"
@@ -34,9 +44,21 @@ class Settings(BaseSettings):
     PATTERNS_DIR: Path = KNOWLEDGE_BASE_DIR / "patterns"
     EMBEDDINGS_DIR: Path = KNOWLEDGE_BASE_DIR / "embeddings"
     
+    # LLM Fix Cache
+    FIX_CACHE_ENABLED: bool = True
+    FIX_CACHE_PATH: Path = BASE_DIR / ".cache" / "fix_cache.sqlite"
+    FIX_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    FIX_CACHE_MAX_ENTRIES: int = 10000
+    PROMPT_VERSION: str = "1"  # Bump when prompts change to invalidate cached fixes
+    LLM_INPUT_COST_PER_1K_TOKENS: float = 0.0001
+    LLM_OUTPUT_COST_PER_1K_TOKENS: float = 0.0004
+    
     # System Configuration
     MAX_RETRIES: int = 3
     COMPILATION_TIMEOUT: int = 30
+    VALIDATION_WORKERS: int = 0  # parallel compiles when bisecting failed fixes; 0 = CPU count
+    CHUNK_CHARS: int = 40000  # chunked mode: target chunk size of long documents
+    CHUNK_WORKERS: int = 4  # chunks analyzed and fixed in parallel
     LOG_LEVEL: str = "INFO"
     
     # Supported Formats
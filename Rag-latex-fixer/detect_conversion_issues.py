@@ -10,6 +10,7 @@ import os
 import sys
 import re
 from pathlib import Path
+from typing import Optional
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent / 'src'))
@@ -18,6 +19,7 @@ from detectors.style_detector import StyleIssueDetector
 from rag.retriever import RAGRetriever
 from rag.fix_generator import FixGenerator
 from models import LatexIssue, FixSuggestion, Severity, IssueType
+from utils.latex_structure import LatexStructure, get_structure
 from config import Settings
 
 class DocumentFormatDetector:
@@ -43,8 +45,10 @@ class DocumentFormatDetector:
             ]
         }
     
-    def analyze_document_format(self, content: str) -> dict:
+    def analyze_document_format(self, content: str,
+                                structure: Optional[LatexStructure] = None) -> dict:
         """Analyze document to detect original format"""
+        structure = structure or get_structure(content)
         
         analysis = {
             'original_format': 'unknown',
@@ -65,9 +69,9 @@ class DocumentFormatDetector:
                 found_indicators.append(indicator)
         
         # Check document structure
-        has_abstract = '\\begin{abstract}' in content
+        has_abstract = bool(structure.environments_named('abstract'))
         has_index_terms = 'Index Terms' in content or 'Keywords' in content
-        has_sections = len(re.findall(r'\\section\*?\{', content)) > 2
+        has_sections = structure.count('section') + structure.count('section*') > 2
         
         if has_abstract:
             two_column_score += 2
@@ -0,0 +1,330 @@
+"""
+Detector registry: runs independent, read-only detection passes concurrently
+
+Every registered detector is called as `detector(content, structure)` and
+returns a list of issues. Small documents are checked inline; on large
+ones the document-wide detectors run on a thread pool sharing the
+structure. Results are merged in registration order and deduplicated, so
+the output does not depend on which detector finishes first.
+
+Regional detectors check one region at a time (an environment, a section)
+and their issues depend only on the region's text. With a RegionCache
+their issues are kept per region, keyed by the hash of its text, so after
+an edit only the changed regions are checked again; issues of regions
+that merely moved are shifted to their new offsets.
+
+Regional detectors carry the regex-heavy work (regex scanning holds the
+GIL, so threads would not help). On a large, freshly parsed document their
+uncached regions are sent in batches to a shared process pool: each worker
+checks a region on its own text, as if it were a document starting at
+offset 0, and the issues are shifted back to the region's place. The
+document-wide detectors then run inline, next to the structure, instead of
+rebuilding it in a worker.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pickle import PicklingError
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from loguru import logger
+
+from utils.latex_structure import LatexStructure, get_structure
+
+# Below this many characters the pool overhead outweighs the checks
+PARALLEL_MIN_CHARS = 100_000
+
+PROCESS_WORKERS = min(8, os.cpu_count() or 1)
+REGION_BATCHES_PER_WORKER = 4  # batches per worker and detector, to balance uneven regions
+
+MAX_CACHED_REGIONS = 4096
+
+Detector = Callable[[str, LatexStructure], List[Any]]
+
+
+@dataclass
+class Region:
+    """A span of the document checked on its own (absolute offsets)"""
+    start: int
+    end: int
+    context: Hashable = None  # what the issues depend on besides the text (part of the cache key)
+    element: Any = None  # what the span covers, for the detector (not part of the key)
+
+
+Regions = Callable[[str, LatexStructure], List[Region]]
+RegionDetector = Callable[[str, LatexStructure, Region], List[Any]]
+
+
+@dataclass
+class DetectionRun:
+    """Merged result of one registry run"""
+    issues: List[Any] = field(default_factory=list)
+    issues_by_detector: Dict[str, List[Any]] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)  # seconds per detector
+    mode: str = "inline"  # inline, process, thread or chunked
+    duplicates_removed: int = 0
+    regions_checked: int = 0  # regions run through a regional detector
+    regions_reused: int = 0  # regions whose issues came from the cache
+    regions_pooled: int = 0  # regions checked on the process pool
+
+
+class RegionCache:
+    """Issues of regional detectors per region, keyed by the region's text hash"""
+
+    def __init__(self, shift: Callable[[Any, int, int], Any], max_entries: int = MAX_CACHED_REGIONS):
+        """
+        Args:
+            shift: (issue, offset delta, line delta) -> the issue moved by that much
+            max_entries: Least recently used regions are dropped beyond this
+        """
+        self.shift = shift
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple, Tuple[List[Any], int, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple, start: int, line: int) -> Optional[List[Any]]:
+        """Cached issues of the region `key`, moved to `start` (offset) and `line`"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        issues, cached_start, cached_line = entry
+        if (cached_start, cached_line) == (start, line):
+            return list(issues)
+        return [self.shift(issue, start - cached_start, line - cached_line) for issue in issues]
+
+    def put(self, key: Tuple, issues: List[Any], start: int, line: int) -> None:
+        with self._lock:
+            self._entries[key] = (list(issues), start, line)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _timed(detector: Detector, content: str, structure: LatexStructure) -> Tuple[List[Any], float]:
+    start = time.perf_counter()
+    issues = detector(content, structure)
+    return issues, time.perf_counter() - start
+
+
+def _local(region: Region, line: int) -> Region:
+    """`region` as the whole of its own text (offset 0, line 1); elements with `moved` follow it"""
+    element = region.element
+    if hasattr(element, "moved"):
+        element = element.moved(-region.start, 1 - line)
+    return Region(0, region.end - region.start, region.context, element)
+
+
+def _check_regions(detector: RegionDetector, shift: Callable[[Any, int, int], Any],
+                   batch: List[Tuple[str, Region, int]]) -> Tuple[List[List[Any]], float]:
+    """Worker side: issues of each (region text, region, line), found on the text alone and moved into place"""
+    start = time.perf_counter()
+    found = [[shift(issue, region.start, line - 1) for issue in detector(text, get_structure(text), _local(region, line))]
+             for text, region, line in batch]
+    return found, time.perf_counter() - start
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=PROCESS_WORKERS)
+        return _process_pool
+
+
+def _reset_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+class DetectorRegistry:
+    """Named detectors run together over one document"""
+
+    def __init__(self, issue_key: Callable[[Any], Hashable],
+                 processes: bool = PROCESS_WORKERS > 1,
+                 parallel_min_chars: int = PARALLEL_MIN_CHARS,
+                 region_cache: Optional[RegionCache] = None,
+                 shift: Optional[Callable[[Any, int, int], Any]] = None):
+        """
+        Args:
+            issue_key: Identity of an issue; later duplicates are dropped
+            processes: Check the uncached regions of large, freshly parsed
+                documents on the process pool (regional detectors must then
+                be picklable); by default only with more than one CPU
+            parallel_min_chars: Documents shorter than this run inline
+            region_cache: Where regional detectors keep their issues
+                between runs; without one every region is checked
+            shift: (issue, offset delta, line delta) -> the issue moved by
+                that much, to place issues found on a region's own text;
+                defaults to the region cache's. Without one regions are
+                always checked in this process
+        """
+        self.issue_key = issue_key
+        self.processes = processes
+        self.parallel_min_chars = parallel_min_chars
+        self.region_cache = region_cache
+        self.shift = shift or (region_cache.shift if region_cache else None)
+        self._detectors: Dict[str, Detector] = {}
+        self._regional: Dict[str, Tuple[RegionDetector, Regions, Hashable]] = {}
+        self._names: List[str] = []
+
+    def register(self, name: str, detector: Detector) -> None:
+        self._add_name(name)
+        self._detectors[name] = detector
+
+    def register_regional(self, name: str, detector: RegionDetector, regions: Regions,
+                          key: Hashable = None) -> None:
+        """
+        Register a detector called once per region as
+        `detector(content, structure, region)`
+
+        Args:
+            regions: Splits a document into the regions to check, in the
+                order their issues should be reported
+            key: Detector settings the issues depend on (part of the cache key)
+        """
+        self._add_name(name)
+        self._regional[name] = (detector, regions, key)
+
+    def _add_name(self, name: str) -> None:
+        if name in self._names:
+            raise ValueError(f"Detector already registered: {name}")
+        self._names.append(name)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._names)
+
+    def run(self, content: str, structure: Optional[LatexStructure] = None) -> DetectionRun:
+        """Run every detector over `content` and merge their issues"""
+        structure = structure or get_structure(content)
+        run = DetectionRun()
+        large = len(content) >= self.parallel_min_chars
+
+        # A derived structure means an edit: most regions come from the cache
+        pool = None
+        if large and self.processes and self.shift and self._regional and not structure.incremental:
+            pool = _get_process_pool()
+        regional = self._run_regional(content, structure, run, pool)
+
+        # Document-wide detectors share the structure: inline after a pooled
+        # run (a worker would first have to rebuild it), else on threads
+        mode = "process" if run.regions_pooled else "inline"
+        if mode == "inline" and large and len(self._detectors) > 1:
+            mode = "thread"
+            with ThreadPoolExecutor(max_workers=len(self._detectors)) as executor:
+                results = self._run_on(executor, content, structure)
+        else:
+            results = {name: _timed(detector, content, structure)
+                       for name, detector in self._detectors.items()}
+        results.update(regional)
+
+        run.mode = mode
+        seen = set()
+        for name in self._names:
+            issues, elapsed = results[name]
+            run.issues_by_detector[name] = issues
+            run.timings[name] = elapsed
+            for issue in issues:
+                key = self.issue_key(issue)
+                if key in seen:
+                    run.duplicates_removed += 1
+                    continue
+                seen.add(key)
+                run.issues.append(issue)
+
+        logger.debug(f"Detectors ran {mode}: " + ", ".join(
+            f"{name}={elapsed * 1000:.1f}ms" for name, elapsed in run.timings.items()))
+        return run
+
+    def _run_regional(self, content: str, structure: LatexStructure, run: DetectionRun,
+                      pool: Optional[ProcessPoolExecutor]) -> Dict[str, Tuple[List[Any], float]]:
+        """
+        Issues of every regional detector: cached regions are reused, the
+        others are checked here or, with a pool, in worker batches.
+        Timings include the workers' time.
+        """
+        found: Dict[str, List[Optional[List[Any]]]] = {}  # per detector, per region
+        elapsed: Dict[str, float] = {}
+        pending = []  # (name, position in found[name], region, line, cache key)
+        for name, (detector, regions, key) in self._regional.items():
+            start = time.perf_counter()
+            found[name] = []
+            for region in regions(content, structure):
+                run.regions_checked += 1
+                line = structure.line_of(region.start)
+                cache_key = None
+                if self.region_cache is not None:
+                    digest = hashlib.sha1(content[region.start:region.end].encode('utf-8')).hexdigest()
+                    cache_key = (name, key, region.context, digest)
+                    cached = self.region_cache.get(cache_key, region.start, line)
+                    if cached is not None:
+                        run.regions_reused += 1
+                        found[name].append(cached)
+                        continue
+                found[name].append(None)
+                pending.append((name, len(found[name]) - 1, region, line, cache_key))
+            elapsed[name] = time.perf_counter() - start
+
+        if pending and pool is not None:
+            try:
+                self._check_on_pool(pool, content, pending, found, elapsed)
+                run.regions_pooled = len(pending)
+            except (BrokenProcessPool, PicklingError, TypeError, AttributeError) as e:
+                logger.warning(f"Process pool unavailable ({e}); checking regions inline")
+                if isinstance(e, BrokenProcessPool):
+                    _reset_process_pool()
+
+        for name, position, region, line, cache_key in pending:
+            if found[name][position] is None:
+                start = time.perf_counter()
+                found[name][position] = self._checked(cache_key, self._regional[name][0](content, structure, region),
+                                                      region, line)
+                elapsed[name] += time.perf_counter() - start
+
+        return {name: ([issue for issues in found[name] for issue in issues], elapsed[name]) for name in found}
+
+    def _check_on_pool(self, pool: ProcessPoolExecutor, content: str, pending: List[Tuple],
+                       found: Dict[str, List[Optional[List[Any]]]], elapsed: Dict[str, float]) -> None:
+        """Check the pending regions on their own text in worker batches, one detector per batch"""
+        by_name: Dict[str, List[Tuple]] = {}
+        for entry in pending:
+            by_name.setdefault(entry[0], []).append(entry)
+
+        futures = []
+        for name, entries in by_name.items():
+            size = -(-len(entries) // (PROCESS_WORKERS * REGION_BATCHES_PER_WORKER))
+            for i in range(0, len(entries), size):
+                batch = entries[i:i + size]
+                texts = [(content[region.start:region.end], region, line) for _, _, region, line, _ in batch]
+                futures.append((batch, pool.submit(_check_regions, self._regional[name][0], self.shift, texts)))
+
+        for batch, future in futures:
+            issues_per_region, worker_time = future.result()
+            for (name, position, region, line, cache_key), issues in zip(batch, issues_per_region):
+                found[name][position] = self._checked(cache_key, issues, region, line)
+            elapsed[batch[0][0]] += worker_time
+
+    def _checked(self, cache_key: Optional[Tuple], issues: List[Any], region: Region, line: int) -> List[Any]:
+        if cache_key is not None:
+            self.region_cache.put(cache_key, issues, region.start, line)
+        return issues
+
+    def _run_on(self, executor: Executor, content: str,
+                structure: LatexStructure) -> Dict[str, Tuple[List[Any], float]]:
+        futures = {name: executor.submit(_timed, detector, content, structure)
+                   for name, detector in self._detectors.items()}
+        return {name: future.result() for name, future in futures.items()}
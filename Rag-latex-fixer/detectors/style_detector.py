@@ -2,11 +2,70 @@
 Style and layout issue detector for LaTeX documents
 """
 import re
-from typing import List, Dict, Optional
+from functools import partial
+from typing import List, Dict, Optional, Sequence
 from loguru import logger
 
 from models import LatexIssue, IssueType, Severity, DocumentAnalysis
 from utils.latex_parser import LatexParser
+from utils.latex_structure import LatexStructure, get_structure
+from detectors.registry import DetectorRegistry, Region, RegionCache
+
+SUPERSCRIPT_PATTERN = re.compile(r'\$\{\s*\}\s*\^\{\s*\d+\s*\}\s*\{\s*\}\s*\^\{\s*.*?\}', re.MULTILINE)
+
+# Superscript checks are cut into regions at these headings
+REGION_HEADINGS = ("part", "chapter", "section", "subsection")
+
+# Checks that need the whole document (indentation mixed across sections,
+# the preamble's author and title) and checks that look at one table,
+# figure or section at a time; only the latter can run on chunks
+DOCUMENT_CHECKS = ("author", "title", "spacing")
+REGIONAL_CHECKS = ("tables", "figures", "superscript")
+ALL_CHECKS = DOCUMENT_CHECKS + REGIONAL_CHECKS
+
+
+def _location(element: Dict[str, any]) -> Dict[str, int]:
+    """Lines and offsets of an extracted element (its full_match is the issue's code)"""
+    return {key: element[key] for key in ("start_line", "end_line", "start_pos", "end_pos")}
+
+
+def _match_location(structure: LatexStructure, match: re.Match, code: str) -> Dict[str, int]:
+    """Line and offsets of `code`, a (possibly truncated) regex match"""
+    line = structure.line_of(match.start())
+    return {"start_line": line, "end_line": line,
+            "start_pos": match.start(), "end_pos": match.start() + len(code)}
+
+
+def _issue_key(issue: LatexIssue):
+    """Issues reported twice (same kind, element, place and text) are merged"""
+    location = issue.location or {}
+    return (issue.type, issue.element, location.get("start_line"), issue.description)
+
+
+# Shared by every detector, so a re-analysis after an edit reuses the
+# issues of unchanged tables, figures and sections
+_region_cache = RegionCache(LatexIssue.moved)
+
+
+def _float_regions(name: str, offset: int = 0):
+    """Regions of the `name` and `name*` floats, numbered (after `offset` earlier ones) as the checks report them"""
+    def regions(latex: str, structure: LatexStructure) -> List[Region]:
+        floats = structure.environments_named(name, name + "*")
+        return [Region(env.start, env.end, context=number, element=env)
+                for number, env in enumerate(floats, 1 + offset)]
+    return regions
+
+
+def _section_regions(latex: str, structure: LatexStructure) -> List[Region]:
+    """The document cut at lines that start with a heading"""
+    cuts = set()
+    for name in REGION_HEADINGS:
+        for command in structure.commands.get(name, ()):
+            line_start = structure.line_starts[command.line - 1]
+            if not latex[line_start:command.start].strip():
+                cuts.add(line_start)
+    bounds = sorted(cuts | {0}) + [len(latex)]
+    return [Region(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
 
 
 class StyleIssueDetector:
@@ -17,43 +76,71 @@ class StyleIssueDetector:
     
     def __init__(self):
         self.parser = LatexParser()
+        self._structure: Optional[LatexStructure] = None  # of the last analyzed document
+
+    def __getstate__(self):
+        # Regional checks sent to the process pool only need their region;
+        # shipping the previous structure with every bound method would cost more
+        state = self.__dict__.copy()
+        state['_structure'] = None
+        return state
         
     def analyze_document(self, latex_content: str, 
-                        target_format: str = "IEEE_two_column") -> DocumentAnalysis:
+                        target_format: str = "IEEE_two_column",
+                        structure: Optional[LatexStructure] = None,
+                        checks: Sequence[str] = ALL_CHECKS,
+                        float_offsets: Optional[Dict[str, int]] = None) -> DocumentAnalysis:
         """
         Comprehensive document analysis
+        
+        `structure` is the document's shared structure index; built (or
+        taken from the cache) here when not given, derived from the last
+        analyzed document when this one is an edit of it.
+        
+        Tables, figures and sections are checked one region at a time and
+        their issues cached by region text, so re-analyzing an edited
+        document only checks the regions that changed.
+        
+        A chunk of a long document is analyzed with checks=REGIONAL_CHECKS
+        (the DOCUMENT_CHECKS run once on the whole text) and with
+        `float_offsets`, the number of tables and figures before it, so
+        floats keep their document numbers.
         """
         logger.info(f"Analyzing document for {target_format} format compliance")
         
-        issues = []
-        
         # Extract document structure
+        structure = structure or get_structure(latex_content, previous=self._structure)
+        self._structure = structure
         doc_class = self.parser.extract_document_class(latex_content)
         is_two_column = self.parser.is_two_column_document(latex_content)
+        float_offsets = float_offsets or {}
         
+        # Independent read-only checks. On a large, freshly parsed document
+        # the uncached tables, figures and sections are checked on the
+        # process pool; the document-wide checks use the shared structure
+        registry = DetectorRegistry(issue_key=_issue_key, region_cache=_region_cache)
         # 1. Check author block
-        author_issues = self._check_author_block(latex_content, target_format)
-        issues.extend(author_issues)
-        
+        if "author" in checks:
+            registry.register("author", partial(self._check_author_block, target_format=target_format))
         # 2. Check title formatting
-        title_issues = self._check_title_formatting(latex_content)
-        issues.extend(title_issues)
-        
+        if "title" in checks:
+            registry.register("title", self._check_title_formatting)
         # 3. Check tables
-        table_issues = self._check_tables(latex_content, is_two_column)
-        issues.extend(table_issues)
-        
+        if "tables" in checks:
+            registry.register_regional("tables", partial(self._check_table, is_two_column=is_two_column),
+                                       _float_regions("table", float_offsets.get("table", 0)),
+                                       key=is_two_column)
         # 4. Check figures
-        figure_issues = self._check_figures(latex_content, is_two_column)
-        issues.extend(figure_issues)
-        
+        if "figures" in checks:
+            registry.register_regional("figures", partial(self._check_figure, is_two_column=is_two_column),
+                                       _float_regions("figure", float_offsets.get("figure", 0)),
+                                       key=is_two_column)
         # 5. Check superscript spacing issues
-        superscript_issues = self._check_superscript_spacing(latex_content)
-        issues.extend(superscript_issues)
-        
+        if "superscript" in checks:
+            registry.register_regional("superscript", self._check_superscript_spacing, _section_regions)
         # 6. Check indentation and spacing
-        spacing_issues = self._check_spacing_and_indentation(latex_content)
-        issues.extend(spacing_issues)
+        if "spacing" in checks:
+            registry.register("spacing", self._check_spacing_and_indentation)
         
         # 7. Check column layout consistency
         # DISABLED: Formula overflow checking was disturbing the document
@@ -61,24 +148,32 @@ class StyleIssueDetector:
         #     column_issues = self._check_column_consistency(latex_content)
         #     issues.extend(column_issues)
         
-        logger.info(f"Found {len(issues)} issues")
+        run = registry.run(latex_content, structure)
+        logger.info(f"Found {len(run.issues)} issues")
         
         return DocumentAnalysis(
             document_format=target_format,
-            detected_issues=issues,
+            detected_issues=run.issues,
             document_structure={
                 "document_class": doc_class,
                 "is_two_column": is_two_column,
-                "num_tables": len(self.parser.extract_tables(latex_content)),
-                "num_figures": len(self.parser.extract_figures(latex_content))
+                "num_tables": len(structure.environments_named("table", "table*")),
+                "num_figures": len(structure.environments_named("figure", "figure*"))
+            },
+            metadata={
+                "detector_mode": run.mode,
+                "detector_timings": run.timings,
+                "regions_checked": run.regions_checked,
+                "regions_reused": run.regions_reused
             }
         )
     
-    def _check_author_block(self, latex: str, target_format: str) -> List[LatexIssue]:
+    def _check_author_block(self, latex: str, structure: LatexStructure,
+                            target_format: str) -> List[LatexIssue]:
         """Check author block formatting and centering"""
         issues = []
         
-        author_element = self.parser.extract_element(latex, "author")
+        author_element = self.parser.extract_element(latex, "author", structure)
         if not author_element:
             return issues
         
@@ -91,7 +186,8 @@ class StyleIssueDetector:
                 latex, 
                 author_element['start_line'], 
                 author_element['end_line'],
-                context_lines=3
+                context_lines=3,
+                structure=structure
             )
             
             if not self.parser.check_element_centering(context):
@@ -100,10 +196,7 @@ class StyleIssueDetector:
                     severity=Severity.HIGH,
                     description="Author block is not centered",
                     element="author",
-                    location={
-                        "start_line": author_element['start_line'],
-                        "end_line": author_element['end_line']
-                    },
+                    location=_location(author_element),
                     current_code=author_element['full_match'],
                     context=context,
                     expected_format=f"Should use \\centering or {target_format}-specific author formatting"
@@ -117,21 +210,18 @@ class StyleIssueDetector:
                     severity=Severity.MEDIUM,
                     description="Not using IEEE-specific author formatting",
                     element="author",
-                    location={
-                        "start_line": author_element['start_line'],
-                        "end_line": author_element['end_line']
-                    },
+                    location=_location(author_element),
                     current_code=author_element['full_match'],
                     expected_format="Should use \\IEEEauthorblockN and \\IEEEauthorblockA"
                 ))
         
         return issues
     
-    def _check_title_formatting(self, latex: str) -> List[LatexIssue]:
+    def _check_title_formatting(self, latex: str, structure: LatexStructure) -> List[LatexIssue]:
         """Check title centering and formatting"""
         issues = []
         
-        title_element = self.parser.extract_element(latex, "title")
+        title_element = self.parser.extract_element(latex, "title", structure)
         if not title_element:
             return issues
         
@@ -141,7 +231,8 @@ class StyleIssueDetector:
             latex,
             title_element['start_line'],
             title_element['end_line'],
-            context_lines=5
+            context_lines=5,
+            structure=structure
         )
         
         # Check for common issues like manual centering that might interfere
@@ -151,164 +242,139 @@ class StyleIssueDetector:
                 severity=Severity.MEDIUM,
                 description="Title has left-alignment commands that may prevent centering",
                 element="title",
-                location={
-                    "start_line": title_element['start_line'],
-                    "end_line": title_element['end_line']
-                },
+                location=_location(title_element),
                 current_code=title_element['full_match'],
                 context=context
             ))
         
         return issues
     
-    def _check_tables(self, latex: str, is_two_column: bool) -> List[LatexIssue]:
-        """Check table formatting, centering, and placement"""
+    def _check_table(self, latex: str, structure: LatexStructure, region: Region,
+                     is_two_column: bool) -> List[LatexIssue]:
+        """Check formatting, centering, and placement of one table (region.context is its number)"""
         issues = []
         
-        tables = self.parser.extract_tables(latex)
+        table = self.parser.float_details(latex, region.element, structure)
+        table_num = region.context
         
-        for i, table in enumerate(tables):
-            table_num = i + 1
-            
-            # Issue 1: Table not centered
-            if not table['has_centering']:
-                issues.append(LatexIssue(
-                    type=IssueType.TABLE_NOT_CENTERED,
-                    severity=Severity.HIGH,
-                    description=f"Table {table_num} is not centered",
-                    element=f"table_{table_num}",
-                    location={
-                        "start_line": table['start_line'],
-                        "end_line": table['end_line']
-                    },
-                    current_code=table['full_match'],
-                    expected_format="Should include \\centering after \\begin{table}"
-                ))
-            
-            # Issue 2: Missing placement parameters
-            if not table['placement']:
+        # Issue 1: Table not centered
+        if not table['has_centering']:
+            issues.append(LatexIssue(
+                type=IssueType.TABLE_NOT_CENTERED,
+                severity=Severity.HIGH,
+                description=f"Table {table_num} is not centered",
+                element=f"table_{table_num}",
+                location=_location(table),
+                current_code=table['full_match'],
+                expected_format="Should include \\centering after \\begin{table}"
+            ))
+        
+        # Issue 2: Missing placement parameters
+        if not table['placement']:
+            issues.append(LatexIssue(
+                type=IssueType.TABLE_PLACEMENT_MISSING,
+                severity=Severity.MEDIUM,
+                description=f"Table {table_num} missing placement parameters",
+                element=f"table_{table_num}",
+                location=_location(table),
+                current_code=table['full_match'],
+                expected_format="Should include placement like [htbp] or [t]"
+            ))
+        
+        # Issue 3: Column width issues in two-column documents
+        if is_two_column:
+            # Check if using appropriate width
+            if '\\linewidth' in table['full_match'] and not table['is_spanning']:
                 issues.append(LatexIssue(
-                    type=IssueType.TABLE_PLACEMENT_MISSING,
+                    type=IssueType.COLUMN_WIDTH_WRONG,
                     severity=Severity.MEDIUM,
-                    description=f"Table {table_num} missing placement parameters",
+                    description=f"Table {table_num} uses \\linewidth in two-column format",
                     element=f"table_{table_num}",
-                    location={
-                        "start_line": table['start_line'],
-                        "end_line": table['end_line']
-                    },
+                    location=_location(table),
                     current_code=table['full_match'],
-                    expected_format="Should include placement like [htbp] or [t]"
+                    expected_format="Should use \\columnwidth instead of \\linewidth"
                 ))
             
-            # Issue 3: Column width issues in two-column documents
-            if is_two_column:
-                # Check if using appropriate width
-                if '\\linewidth' in table['full_match'] and not table['is_spanning']:
+            # Check if should be spanning
+            if self._table_should_span_columns(table['content']):
+                if not table['is_spanning']:
                     issues.append(LatexIssue(
-                        type=IssueType.COLUMN_WIDTH_WRONG,
-                        severity=Severity.MEDIUM,
-                        description=f"Table {table_num} uses \\linewidth in two-column format",
+                        type=IssueType.LAYOUT_MISMATCH,
+                        severity=Severity.HIGH,
+                        description=f"Table {table_num} appears too wide for single column",
                         element=f"table_{table_num}",
-                        location={
-                            "start_line": table['start_line'],
-                            "end_line": table['end_line']
-                        },
+                        location=_location(table),
                         current_code=table['full_match'],
-                        expected_format="Should use \\columnwidth instead of \\linewidth"
+                        expected_format="Consider using table* to span both columns"
                     ))
-                
-                # Check if should be spanning
-                if self._table_should_span_columns(table['content']):
-                    if not table['is_spanning']:
-                        issues.append(LatexIssue(
-                            type=IssueType.LAYOUT_MISMATCH,
-                            severity=Severity.HIGH,
-                            description=f"Table {table_num} appears too wide for single column",
-                            element=f"table_{table_num}",
-                            location={
-                                "start_line": table['start_line'],
-                                "end_line": table['end_line']
-                            },
-                            current_code=table['full_match'],
-                            expected_format="Consider using table* to span both columns"
-                        ))
         
         return issues
     
-    def _check_figures(self, latex: str, is_two_column: bool) -> List[LatexIssue]:
-        """Check figure formatting, centering, and placement"""
+    def _check_figure(self, latex: str, structure: LatexStructure, region: Region,
+                      is_two_column: bool) -> List[LatexIssue]:
+        """Check formatting, centering, and placement of one figure (region.context is its number)"""
         issues = []
         
-        figures = self.parser.extract_figures(latex)
+        figure = self.parser.float_details(latex, region.element, structure)
+        fig_num = region.context
         
-        for i, figure in enumerate(figures):
-            fig_num = i + 1
-            
-            # Issue 1: Figure not centered
-            if not figure['has_centering']:
-                issues.append(LatexIssue(
-                    type=IssueType.FIGURE_NOT_CENTERED,
-                    severity=Severity.HIGH,
-                    description=f"Figure {fig_num} is not centered",
-                    element=f"figure_{fig_num}",
-                    location={
-                        "start_line": figure['start_line'],
-                        "end_line": figure['end_line']
-                    },
-                    current_code=figure['full_match'],
-                    expected_format="Should include \\centering after \\begin{figure}"
-                ))
-            
-            # Issue 2: Missing placement parameters
-            if not figure['placement']:
-                issues.append(LatexIssue(
-                    type=IssueType.FLOAT_PLACEMENT_WRONG,
-                    severity=Severity.MEDIUM,
-                    description=f"Figure {fig_num} missing placement parameters",
-                    element=f"figure_{fig_num}",
-                    location={
-                        "start_line": figure['start_line'],
-                        "end_line": figure['end_line']
-                    },
-                    current_code=figure['full_match'],
-                    expected_format="Should include placement like [htbp] or [t]"
-                ))
-            
-            # Issue 3: Width issues in two-column documents
-            if is_two_column and not figure['is_spanning']:
-                width_match = re.search(r'width=([0-9.]+)\\(linewidth|textwidth)', figure['full_match'])
-                if width_match:
-                    width_value = float(width_match.group(1))
-                    if width_value > 1.0:
-                        issues.append(LatexIssue(
-                            type=IssueType.COLUMN_WIDTH_WRONG,
-                            severity=Severity.HIGH,
-                            description=f"Figure {fig_num} width exceeds column width",
-                            element=f"figure_{fig_num}",
-                            location={
-                                "start_line": figure['start_line'],
-                                "end_line": figure['end_line']
-                            },
-                            current_code=figure['full_match'],
-                            expected_format="Width should be ≤1.0\\columnwidth or use figure*"
-                        ))
+        # Issue 1: Figure not centered
+        if not figure['has_centering']:
+            issues.append(LatexIssue(
+                type=IssueType.FIGURE_NOT_CENTERED,
+                severity=Severity.HIGH,
+                description=f"Figure {fig_num} is not centered",
+                element=f"figure_{fig_num}",
+                location=_location(figure),
+                current_code=figure['full_match'],
+                expected_format="Should include \\centering after \\begin{figure}"
+            ))
+        
+        # Issue 2: Missing placement parameters
+        if not figure['placement']:
+            issues.append(LatexIssue(
+                type=IssueType.FLOAT_PLACEMENT_WRONG,
+                severity=Severity.MEDIUM,
+                description=f"Figure {fig_num} missing placement parameters",
+                element=f"figure_{fig_num}",
+                location=_location(figure),
+                current_code=figure['full_match'],
+                expected_format="Should include placement like [htbp] or [t]"
+            ))
+        
+        # Issue 3: Width issues in two-column documents
+        if is_two_column and not figure['is_spanning']:
+            width_match = re.search(r'width=([0-9.]+)\\(linewidth|textwidth)', figure['full_match'])
+            if width_match:
+                width_value = float(width_match.group(1))
+                if width_value > 1.0:
+                    issues.append(LatexIssue(
+                        type=IssueType.COLUMN_WIDTH_WRONG,
+                        severity=Severity.HIGH,
+                        description=f"Figure {fig_num} width exceeds column width",
+                        element=f"figure_{fig_num}",
+                        location=_location(figure),
+                        current_code=figure['full_match'],
+                        expected_format="Width should be ≤1.0\\columnwidth or use figure*"
+                    ))
         
         return issues
     
-    def _check_spacing_and_indentation(self, latex: str) -> List[LatexIssue]:
+    def _check_spacing_and_indentation(self, latex: str,
+                                       structure: Optional[LatexStructure] = None) -> List[LatexIssue]:
         """Check for spacing and indentation issues"""
         issues = []
         
-        lines = latex.split('\n')
+        structure = structure or get_structure(latex)
         
-        # Check for inconsistent indentation
+        # Check for inconsistent indentation (first character of each line)
         indentation_chars = set()
-        for line in lines:
-            if line and line[0] in [' ', '\t']:
-                if line[0] == '\t':
-                    indentation_chars.add('tab')
-                else:
-                    indentation_chars.add('space')
+        for line_start in structure.line_starts:
+            first = latex[line_start:line_start + 1]
+            if first == '\t':
+                indentation_chars.add('tab')
+            elif first == ' ':
+                indentation_chars.add('space')
         
         if len(indentation_chars) > 1:
             issues.append(LatexIssue(
@@ -353,10 +419,7 @@ class StyleIssueDetector:
                             severity=Severity.MEDIUM,
                             description=f"Long equation in {env} may exceed column width",
                             element=f"{env}_environment",
-                            location={
-                                "start_line": eq['start_line'],
-                                "end_line": eq['end_line']
-                            },
+                            location=_location(eq),
                             current_code=eq['full_match'],
                             expected_format=f"Consider using {env}* to span columns"
                         ))
@@ -366,18 +429,18 @@ class StyleIssueDetector:
     def _check_broken_math_environments(self, latex: str) -> List[LatexIssue]:
         """Check for broken/malformed math environments from PDF conversion"""
         issues = []
+        structure = get_structure(latex)
         
         # Pattern 1: Inline math ($) mixed with display equation (\begin{equation})
         # e.g., $R\begin{equation}
         pattern1 = r'\$[^$]*\\begin\{(equation|align|multline|gather)'
         for match in re.finditer(pattern1, latex):
-            line_num = latex[:match.start()].count('\n') + 1
             issues.append(LatexIssue(
                 type=IssueType.MATH_ENVIRONMENT_ERROR,
                 severity=Severity.HIGH,
                 description="Inline math ($) mixed with display environment (\\begin{equation})",
                 element="math_environment",
-                location={"start_line": line_num, "end_line": line_num},
+                location=_match_location(structure, match, match.group(0)),
                 current_code=match.group(0),
                 expected_format="Use either inline math ($...$) or display environment (\\begin{equation}...\\end{equation}), not both"
             ))
@@ -386,13 +449,12 @@ class StyleIssueDetector:
         # e.g., \end{equation}\mathcal{D}=
         pattern2 = r'\\end\{(equation|align|multline|gather)\}\\?[a-zA-Z\\]'
         for match in re.finditer(pattern2, latex):
-            line_num = latex[:match.start()].count('\n') + 1
             issues.append(LatexIssue(
                 type=IssueType.MATH_ENVIRONMENT_ERROR,
                 severity=Severity.HIGH,
                 description="Display math environment ends abruptly in middle of sentence",
                 element="math_environment",
-                location={"start_line": line_num, "end_line": line_num},
+                location=_match_location(structure, match, match.group(0)[:50]),
                 current_code=match.group(0)[:50],
                 expected_format="Math environments should be on their own lines, not inline with text"
             ))
@@ -401,13 +463,12 @@ class StyleIssueDetector:
         # multline with manual line breaks (\\&)
         pattern3 = r'\\begin\{multline\}[^}]*?\\\\\s*&'
         for match in re.finditer(pattern3, latex, re.DOTALL):
-            line_num = latex[:match.start()].count('\n') + 1
             issues.append(LatexIssue(
                 type=IssueType.MATH_ENVIRONMENT_ERROR,
                 severity=Severity.MEDIUM,
                 description="Improper use of multline environment with manual line breaks (\\\\&)",
                 element="multline",
-                location={"start_line": line_num, "end_line": line_num},
+                location=_match_location(structure, match, match.group(0)[:80]),
                 current_code=match.group(0)[:80],
                 expected_format="Use align environment for multi-line equations with alignment, or remove line breaks"
             ))
@@ -415,13 +476,12 @@ class StyleIssueDetector:
         # Pattern 4: Empty or nearly empty equation environments
         pattern4 = r'\\begin\{(equation|align|multline|gather)\}\s*\n\s*\\end\{\1\}'
         for match in re.finditer(pattern4, latex):
-            line_num = latex[:match.start()].count('\n') + 1
             issues.append(LatexIssue(
                 type=IssueType.MATH_ENVIRONMENT_ERROR,
                 severity=Severity.LOW,
                 description=f"Empty {match.group(1)} environment",
                 element=match.group(1),
-                location={"start_line": line_num, "end_line": line_num},
+                location=_match_location(structure, match, match.group(0)),
                 current_code=match.group(0),
                 expected_format="Remove empty math environments"
             ))
@@ -430,13 +490,12 @@ class StyleIssueDetector:
         pattern5 = r'\\end\{multline\}[^\\$\n]*?(?=[A-Z]|\$|\\)'
         for match in re.finditer(pattern5, latex):
             if len(match.group(0)) > 15:  # Only flag if there's significant text
-                line_num = latex[:match.start()].count('\n') + 1
                 issues.append(LatexIssue(
                     type=IssueType.MATH_ENVIRONMENT_ERROR,
                     severity=Severity.MEDIUM,
                     description="Text improperly placed after \\end{multline}",
                     element="multline",
-                    location={"start_line": line_num, "end_line": line_num},
+                    location=_match_location(structure, match, match.group(0)[:60]),
                     current_code=match.group(0)[:60],
                     expected_format="Math environments should be separated from surrounding text"
                 ))
@@ -455,24 +514,25 @@ class StyleIssueDetector:
             return num_cols > 4
         return False
     
-    def _check_superscript_spacing(self, latex: str) -> List[LatexIssue]:
-        """Check for superscript spacing issues like ${ }^{"""
+    def _check_superscript_spacing(self, latex: str,
+                                   structure: Optional[LatexStructure] = None,
+                                   region: Optional[Region] = None) -> List[LatexIssue]:
+        """Check for superscript spacing issues like ${ }^{ (in `region`, else everywhere)"""
         issues = []
         
-        # Pattern for problematic superscript spacing
-        superscript_pattern = r'\$\{\s*\}\s*\^\{\s*\d+\s*\}\s*\{\s*\}\s*\^\{\s*.*?\}'
-        matches = re.finditer(superscript_pattern, latex, re.MULTILINE)
+        # Pattern for problematic superscript spacing; a match never spans a
+        # line that starts with a command, so regions cut there see them all
+        region = region or Region(0, len(latex))
+        matches = SUPERSCRIPT_PATTERN.finditer(latex, region.start, region.end)
+        structure = structure or get_structure(latex)
         
         for match in matches:
-            # Find line number
-            line_num = latex[:match.start()].count('\n') + 1
-            
             issues.append(LatexIssue(
                 type=IssueType.FORMATTING_INCONSISTENT,
                 severity=Severity.MEDIUM,
                 description="Superscript has unnecessary spacing: ${ }^{...}{ }^{...}",
                 element="superscript",
-                location={"start_line": line_num, "end_line": line_num},
+                location=_match_location(structure, match, match.group(0)),
                 current_code=match.group(0),
                 expected_format="$^{...}$ or proper superscript formatting"
             ))
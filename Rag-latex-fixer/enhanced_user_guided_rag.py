@@ -7,14 +7,23 @@ Allows users to specify document format and conference type for targeted fixes
 import os
 import sys
 import json
+import hashlib
+import time
 import numpy as np
 from sentence_transformers import SentenceTransformer
 import faiss
-import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 import argparse
 
+from config import settings
+from rag.fix_cache import FixCache
+from rag.index_factory import create_index, configure_search
+
+from doc_edit.llm_client import get_client
+
 @dataclass
 class DocumentContext:
     """User-provided context about the document"""
@@ -33,277 +42,174 @@ class LaTeXExample:
     format_tags: List[str]      # ["1-column", "2-column"]
     issue_type: str            # "formatting", "conversion", "structure"
 
+KNOWLEDGE_BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'knowledge_base')
+EXAMPLES_FILE = os.path.join(KNOWLEDGE_BASE_DIR, 'context_examples.json')
+INDEX_FILE = os.path.join(KNOWLEDGE_BASE_DIR, 'context_examples_index.npz')
+FAISS_FILE = os.path.join(KNOWLEDGE_BASE_DIR, 'context_examples.faiss')
+ENCODER_NAME = 'all-MiniLM-L6-v2'
+
+
+def load_examples_file(path: str = EXAMPLES_FILE) -> List[LaTeXExample]:
+    """Load context-tagged examples from the JSON data file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [LaTeXExample(**item) for item in json.load(f)]
+
+
+def _file_hash(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _tag_bitmask(tag_lists: List[List[str]], vocab: List[str]) -> np.ndarray:
+    """One uint32 per example with bit i set when vocab[i] is in its tags"""
+    bits = {tag: 1 << i for i, tag in enumerate(vocab)}
+    return np.array([sum(bits[t] for t in set(tags)) for tags in tag_lists], dtype=np.uint32)
+
+
+def build_context_index(examples_path: str = EXAMPLES_FILE, index_path: str = INDEX_FILE,
+                        faiss_path: str = FAISS_FILE, encoder=None) -> Dict:
+    """
+    Build step for the static example index.
+    Encodes every example once, L2-normalizes the matrix and persists it
+    together with the conference/format bitmasks and an inner-product FAISS
+    index of the configured INDEX_TYPE.
+    """
+    examples = load_examples_file(examples_path)
+    if encoder is None:
+        encoder = SentenceTransformer(ENCODER_NAME)
+    
+    texts = [f"{ex.problem} {ex.solution} {ex.context}" for ex in examples]
+    embeddings = np.ascontiguousarray(encoder.encode(texts), dtype='float32')
+    faiss.normalize_L2(embeddings)
+    
+    conference_vocab = sorted({t for ex in examples for t in ex.conference_tags})
+    format_vocab = sorted({t for ex in examples for t in ex.format_tags})
+    if len(conference_vocab) > 32 or len(format_vocab) > 32:
+        raise ValueError("Too many distinct tags for a uint32 bitmask")
+    
+    data = {
+        'embeddings': embeddings,
+        'conference_mask': _tag_bitmask([ex.conference_tags for ex in examples], conference_vocab),
+        'format_mask': _tag_bitmask([ex.format_tags for ex in examples], format_vocab),
+        'conversion_mask': np.array([ex.issue_type == "conversion" for ex in examples], dtype=bool),
+        'conference_vocab': np.array(conference_vocab),
+        'format_vocab': np.array(format_vocab),
+        'source_hash': np.array(_file_hash(examples_path)),
+        'encoder': np.array(ENCODER_NAME),
+    }
+    np.savez(index_path, **data)
+    
+    index = create_index(embeddings, metric="ip")
+    faiss.write_index(index, faiss_path)
+    
+    print(f"✅ Built static context index for {len(examples)} examples -> {index_path}")
+    return data
+
+
 class ContextAwareRAGFixer:
     """Enhanced RAG system with user context awareness"""
     
     def __init__(self, api_key: str):
-        """Initialize with API key and load context-aware examples"""
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        self.encoder = SentenceTransformer('all-MiniLM-L6-v2')
+        """Initialize with API key and load the prebuilt context-aware index"""
+        self.model_name = 'gemini-2.0-flash-exp'
+        self.client = get_client([api_key], self.model_name)
+        self.cache = FixCache() if settings.FIX_CACHE_ENABLED else None
+        self._encoder = None
         self.examples = []
         self.index = None
         self.load_context_aware_examples()
         self.build_vector_index()
     
+    @property
+    def encoder(self):
+        """Sentence encoder, loaded on first query rather than at construction"""
+        if self._encoder is None:
+            self._encoder = SentenceTransformer(ENCODER_NAME)
+        return self._encoder
+    
     def load_context_aware_examples(self):
         """Load LaTeX examples with context tags"""
-        self.examples = [
-            # IEEE Conference Examples
-            LaTeXExample(
-                problem="Author names not centered in IEEE format",
-                solution="Use \\author{\\IEEEauthorblockN{Name1}\\and\\IEEEauthorblockN{Name2}} for IEEE",
-                context="IEEE conference papers require specific author formatting",
-                conference_tags=["IEEE"],
-                format_tags=["1-column", "2-column"],
-                issue_type="formatting"
-            ),
-            LaTeXExample(
-                problem="IEEE paper has wrong document class after PDF conversion",
-                solution="Change \\documentclass[10pt]{article} to \\documentclass[conference]{IEEEtran}",
-                context="PDF to LaTeX conversion often uses generic article class instead of IEEEtran",
-                conference_tags=["IEEE"],
-                format_tags=["2-column"],
-                issue_type="conversion"
-            ),
-            LaTeXExample(
-                problem="IEEE paper missing proper column formatting",
-                solution="Add \\usepackage{multicol} and \\begin{multicols}{2}...\\end{multicols} for 2-column IEEE",
-                context="IEEE conference papers are typically 2-column format",
-                conference_tags=["IEEE"],
-                format_tags=["2-column"],
-                issue_type="formatting"
-            ),
-            
-            # ACM Conference Examples  
-            LaTeXExample(
-                problem="ACM paper author formatting incorrect",
-                solution="Use \\author{\\authornote{Author 1}\\affiliation{Institution}} for ACM format",
-                context="ACM has specific author and affiliation formatting requirements",
-                conference_tags=["ACM"],
-                format_tags=["1-column", "2-column"],
-                issue_type="formatting"
-            ),
-            LaTeXExample(
-                problem="ACM document class missing after conversion",
-                solution="Change to \\documentclass[sigconf]{acmart} for ACM conference format",
-                context="ACM papers require acmart document class with sigconf option",
-                conference_tags=["ACM"],
-                format_tags=["2-column"],
-                issue_type="conversion"
-            ),
-            
-            # Springer Examples
-            LaTeXExample(
-                problem="Springer paper margins too wide after PDF conversion",
-                solution="Add \\usepackage[margin=1in]{geometry} for Springer format compliance",
-                context="Springer has specific margin requirements that differ from generic articles",
-                conference_tags=["SPRINGER"],
-                format_tags=["1-column"],
-                issue_type="conversion"
-            ),
-            
-            # Column Format Specific Examples
-            LaTeXExample(
-                problem="Two-column document converted to single column with extra whitespace",
-                solution="Add \\usepackage[twocolumn,margin=0.75in]{geometry} to restore 2-column format",
-                context="PDF to LaTeX conversion often loses original column formatting",
-                conference_tags=["IEEE", "ACM"],
-                format_tags=["2-column"],
-                issue_type="conversion"
-            ),
-            LaTeXExample(
-                problem="Single column document has inappropriate narrow margins",
-                solution="Use \\usepackage[margin=1in]{geometry} for proper 1-column spacing",
-                context="Single column documents need wider margins for readability",
-                conference_tags=["SPRINGER", "ELSEVIER"],
-                format_tags=["1-column"],
-                issue_type="formatting"
-            ),
-            
-            # Generic Conversion Issues
-            LaTeXExample(
-                problem="PDF conversion added extra spacing and paragraph breaks",
-                solution="Remove extra \\vspace commands and consolidate paragraph breaks",
-                context="PDF to LaTeX conversion often introduces unwanted spacing",
-                conference_tags=["GENERIC"],
-                format_tags=["1-column", "2-column"],
-                issue_type="conversion"
-            ),
-            
-            # Add more context-aware examples...
-            LaTeXExample(
-                problem="Table formatting broken in IEEE 2-column layout",
-                solution="Use \\begin{table*}[!t] for tables spanning both columns in IEEE format",
-                context="IEEE 2-column papers need special table handling for wide tables",
-                conference_tags=["IEEE"],
-                format_tags=["2-column"],
-                issue_type="formatting"
-            ),
-            LaTeXExample(
-                problem="Figure placement issues in ACM single column",
-                solution="Use \\begin{figure}[!htb] with proper sizing for ACM 1-column format",
-                context="ACM single column has specific figure placement requirements",
-                conference_tags=["ACM"],
-                format_tags=["1-column"],
-                issue_type="formatting"
-            ),
-            
-            # Table Formatting Examples
-            LaTeXExample(
-                problem="Wide table covering second column text in IEEE 2-column format",
-                solution="Use \\begin{table*}[!t] and \\centering with proper column widths: |c|l|p{4cm}|p{3cm}|",
-                context="IEEE 2-column papers need table* environment for wide tables to span both columns",
-                conference_tags=["IEEE"],
-                format_tags=["2-column"],
-                issue_type="formatting"
-            ),
-            LaTeXExample(
-                problem="Table placement interfering with text flow in IEEE 2-column format",
-                solution="Use \\begin{table*}[!tb] with stfloats package and adjusted float parameters to keep table closer to reference text",
-                context="IEEE 2-column format requires table* with stfloats package, [!tb] positioning, and float parameter adjustments (dbltopnumber=2, dbltopfraction=0.9, dblfloatpagefraction=0.7) to prevent tables from floating to last page",
-                conference_tags=["IEEE"],
-                format_tags=["2-column"],
-                issue_type="formatting"
-            ),
-            LaTeXExample(
-                problem="Table positioning [h] causes layout issues",
-                solution="Change \\begin{table}[h] to \\begin{table}[t] for IEEE standard positioning at page top",
-                context="IEEE format prefers tables at top of page with [t] positioning for professional appearance and consistent layout",
-                conference_tags=["IEEE"],
-                format_tags=["1-column", "2-column"],
-                issue_type="formatting"
-            ),
-            LaTeXExample(
-                problem="Table uses \\begin{center} instead of \\centering",
-                solution="Replace \\begin{center}...\\end{center} with \\centering for IEEE format",
-                context="IEEE style guide recommends \\centering over center environment in tables",
-                conference_tags=["IEEE"],
-                format_tags=["1-column", "2-column"],
-                issue_type="formatting"
-            ),
-            LaTeXExample(
-                problem="Table missing proper label for referencing",
-                solution="Add \\label{tab:descriptive_name} after \\caption for proper referencing",
-                context="All tables should have labels for academic paper referencing",
-                conference_tags=["IEEE", "ACM", "SPRINGER"],
-                format_tags=["1-column", "2-column"],
-                issue_type="formatting"
-            ),
-            LaTeXExample(
-                problem="Table column widths not specified causing overflow",
-                solution="Use p{width} columns: \\begin{tabular}{|c|l|p{4cm}|p{3cm}|} for controlled widths",
-                context="Fixed column widths prevent table overflow in constrained layouts",
-                conference_tags=["IEEE", "ACM"],
-                format_tags=["2-column"],
-                issue_type="formatting"
-            ),
-            
-            # Image Sizing and Placement Examples
-            LaTeXExample(
-                problem="Large image width may cause figure to float to document end. Consider using smaller width (0.8\\textwidth or 0.7\\textwidth) for better placement",
-                solution="Replace width=\\textwidth with width=0.7\\textwidth or width=0.8\\textwidth to prevent figure from floating to end",
-                context="Large images in LaTeX often get pushed to document end due to float placement algorithm. Smaller widths help keep figures closer to referencing text",
-                conference_tags=["IEEE", "ACM", "SPRINGER"],
-                format_tags=["1-column", "2-column"],
-                issue_type="formatting"
-            ),
-            LaTeXExample(
-                problem="Figure missing size specification. Add width parameter to control placement and prevent floating to document end",
-                solution="Add width=0.7\\textwidth to \\includegraphics for better size control: \\includegraphics[width=0.7\\textwidth]{filename}",
-                context="Images without size specifications can cause unpredictable placement. Explicit width helps LaTeX place figures optimally",
-                conference_tags=["IEEE", "ACM", "SPRINGER"],
-                format_tags=["1-column", "2-column"],
-                issue_type="formatting"
-            ),
-            LaTeXExample(
-                problem="Figure* environment should use \\textwidth for proper sizing across both columns",
-                solution="Change width=\\columnwidth to width=0.8\\textwidth in figure* environment for proper two-column spanning",
-                context="Figure* spans both columns so should use textwidth-based sizing, not columnwidth",
-                conference_tags=["IEEE", "ACM"],
-                format_tags=["2-column"],
-                issue_type="formatting"
-            ),
-            LaTeXExample(
-                problem="Single column figure should use \\columnwidth instead of \\textwidth",
-                solution="Change width=\\textwidth to width=0.9\\columnwidth for single column figures",
-                context="Single column figures should be sized relative to column width, not full text width",
-                conference_tags=["IEEE", "ACM"],
-                format_tags=["2-column"],
-                issue_type="formatting"
-            ),
-            LaTeXExample(
-                problem="Image positioning should use [!ht] or [!htbp] to prevent floating to document end. Missing restrictive positioning to keep image close to text",
-                solution="Change \\begin{figure*}[!t] to \\begin{figure*}[!ht] or add [!htbp] positioning to keep images on current or next page only",
-                context="Restrictive positioning [!ht] forces images to stay on current page (here) or next page top, preventing them from floating to document end",
-                conference_tags=["IEEE", "ACM", "SPRINGER"],
-                format_tags=["1-column", "2-column"],
-                issue_type="formatting"
-            ),
-            LaTeXExample(
-                problem="Figure positioning [h] can cause text overlap. Use [!tbp] or [!t] for better placement",
-                solution="Replace [h] with [!ht] for better positioning that keeps figure close without overlap",
-                context="[!ht] positioning allows figure on current page (here) or top of next page, preventing distant floating",
-                conference_tags=["IEEE", "ACM", "SPRINGER"],
-                format_tags=["1-column", "2-column"],
-                issue_type="formatting"
-            )
-        ]
-        
+        self.examples = load_examples_file(EXAMPLES_FILE)
         print(f"✅ Loaded {len(self.examples)} context-aware LaTeX examples")
     
     def build_vector_index(self):
-        """Build FAISS index from examples with error handling"""
+        """Load the persisted FAISS index and tag bitmasks, building them if stale"""
         try:
-            texts = [f"{ex.problem} {ex.solution} {ex.context}" for ex in self.examples]
-            embeddings = self.encoder.encode(texts)
-            
-            dimension = embeddings.shape[1]
-            self.index = faiss.IndexFlatIP(dimension)
+            data = self._load_index_data()
+            if data is None:
+                print("⚠️ Static context index missing or stale, rebuilding...")
+                data = build_context_index(EXAMPLES_FILE, INDEX_FILE, FAISS_FILE, encoder=self.encoder)
+                self.index = configure_search(faiss.read_index(FAISS_FILE))
             
-            # Normalize embeddings for cosine similarity
-            faiss.normalize_L2(embeddings)
-            self.index.add(embeddings.astype('float32'))
+            self.conference_vocab = {t: 1 << i for i, t in enumerate(data['conference_vocab'].tolist())}
+            self.format_vocab = {t: 1 << i for i, t in enumerate(data['format_vocab'].tolist())}
+            self.conference_mask = data['conference_mask']
+            self.format_mask = data['format_mask']
+            self.conversion_mask = data['conversion_mask']
             
-            print(f"✅ Built FAISS index with {len(texts)} examples")
+            print(f"✅ Loaded FAISS index with {self.index.ntotal} examples")
         except Exception as e:
-            print(f"⚠️ FAISS index building failed: {e}")
+            print(f"⚠️ FAISS index loading failed: {e}")
             print("⚠️ Continuing without vector search capabilities")
             self.index = None
+            self._build_tag_masks()
+    
+    def _load_index_data(self) -> Optional[Dict]:
+        """Read the build-step artifacts; None when absent or out of date"""
+        if not (os.path.exists(INDEX_FILE) and os.path.exists(FAISS_FILE)):
+            return None
+        
+        with np.load(INDEX_FILE, allow_pickle=False) as npz:
+            data = {key: npz[key] for key in npz.files}
+        
+        if str(data['source_hash']) != _file_hash(EXAMPLES_FILE) or \
+           str(data['encoder']) != ENCODER_NAME:
+            return None
+        
+        self.index = configure_search(faiss.read_index(FAISS_FILE))
+        if self.index.ntotal != len(self.examples):
+            return None
+        return data
+    
+    def _build_tag_masks(self):
+        """Compute bitmasks in memory (used when the index cannot be loaded)"""
+        conference_vocab = sorted({t for ex in self.examples for t in ex.conference_tags})
+        format_vocab = sorted({t for ex in self.examples for t in ex.format_tags})
+        self.conference_vocab = {t: 1 << i for i, t in enumerate(conference_vocab)}
+        self.format_vocab = {t: 1 << i for i, t in enumerate(format_vocab)}
+        self.conference_mask = _tag_bitmask([ex.conference_tags for ex in self.examples], conference_vocab)
+        self.format_mask = _tag_bitmask([ex.format_tags for ex in self.examples], format_vocab)
+        self.conversion_mask = np.array([ex.issue_type == "conversion" for ex in self.examples], dtype=bool)
+    
+    def context_mask(self, context: DocumentContext) -> np.ndarray:
+        """Vectorized context filter over all examples"""
+        # Conference match (the GENERIC tag matches every conference)
+        conference_bits = (self.conference_vocab.get(context.conference_type, 0) |
+                           self.conference_vocab.get("GENERIC", 0))
+        conference_match = (self.conference_mask & conference_bits) != 0
+        
+        # Format match
+        format_match = (self.format_mask & self.format_vocab.get(context.column_format, 0)) != 0
+        
+        # Conversion issues are prioritized if the document was converted
+        conversion_priority = self.conversion_mask & bool(context.conversion_applied)
+        
+        return (conference_match & format_match) | conversion_priority
     
     def filter_examples_by_context(self, context: DocumentContext) -> List[int]:
         """Filter examples based on user-provided context"""
-        relevant_indices = []
-        
-        for i, example in enumerate(self.examples):
-            # Check conference match
-            conference_match = (context.conference_type in example.conference_tags or 
-                              "GENERIC" in example.conference_tags)
-            
-            # Check format match
-            format_match = context.column_format in example.format_tags
-            
-            # Prioritize conversion issues if document was converted
-            conversion_priority = (context.conversion_applied and 
-                                 example.issue_type == "conversion")
-            
-            # Include if matches context or has high priority
-            if conference_match and format_match:
-                relevant_indices.append(i)
-            elif conversion_priority:
-                relevant_indices.append(i)
-                
-        return relevant_indices
+        return np.flatnonzero(self.context_mask(context)).tolist()
     
     def retrieve_contextual_examples(self, query: str, context: DocumentContext, 
                                    top_k: int = 5) -> List[Tuple[LaTeXExample, float]]:
         """Retrieve examples filtered by context"""
         # First filter by context
-        relevant_indices = self.filter_examples_by_context(context)
+        relevant = self.context_mask(context)
         
-        if not relevant_indices:
+        if not relevant.any():
             print(f"⚠️  No examples found for {context.conference_type} {context.column_format}")
-            relevant_indices = list(range(len(self.examples)))  # Fallback to all
+            relevant = np.ones(len(self.examples), dtype=bool)  # Fallback to all
+        relevant_indices = np.flatnonzero(relevant)
         
         # If FAISS index is not available, return relevant examples by context only
         if self.index is None:
@@ -315,11 +221,11 @@ class ContextAwareRAGFixer:
         
         try:
             # Encode query
-            query_embedding = self.encoder.encode([query])
+            query_embedding = np.ascontiguousarray(self.encoder.encode([query]), dtype='float32')
             faiss.normalize_L2(query_embedding)
             
             # Search in full index
-            scores, indices = self.index.search(query_embedding.astype('float32'), 
+            scores, indices = self.index.search(query_embedding, 
                                               min(top_k * 2, len(self.examples)))
         except Exception as e:
             print(f"⚠️ Vector search failed: {e}")
@@ -332,7 +238,7 @@ class ContextAwareRAGFixer:
         # Filter results to context-relevant examples
         contextual_results = []
         for idx, score in zip(indices[0], scores[0]):
-            if idx in relevant_indices:
+            if idx >= 0 and relevant[idx]:
                 contextual_results.append((self.examples[idx], float(score)))
                 if len(contextual_results) >= top_k:
                     break
@@ -340,7 +246,7 @@ class ContextAwareRAGFixer:
         # If not enough contextual results, add best general matches
         if len(contextual_results) < top_k:
             for idx, score in zip(indices[0], scores[0]):
-                if idx not in relevant_indices and len(contextual_results) < top_k:
+                if idx >= 0 and not relevant[idx] and len(contextual_results) < top_k:
                     contextual_results.append((self.examples[idx], float(score)))
         
         return contextual_results
@@ -349,6 +255,21 @@ class ContextAwareRAGFixer:
                               examples: List[Tuple[LaTeXExample, float]]) -> Dict:
         """Generate fix with context awareness"""
         
+        # Repeated issues across documents are answered from the fix cache
+        cache_key = None
+        if self.cache:
+            cache_key = FixCache.make_key(
+                "contextual_fix", issue,
+                f"{context.conference_type}/{context.column_format}/"
+                f"{context.original_format}/{context.conversion_applied}",
+                [hashlib.sha1(f"{ex.problem}\n{ex.solution}".encode('utf-8')).hexdigest()
+                 for ex, _ in examples],
+                self.model_name
+            )
+            cached = self.cache.get(cache_key)
+            if cached:
+                return cached
+        
         context_prompt = f"""
 You are a LaTeX expert specializing in {context.conference_type} conference papers.
 
@@ -387,8 +308,8 @@ Respond with JSON:
 """
         
         try:
-            response = self.model.generate_content(context_prompt)
-            response_text = response.text.strip()
+            started = time.perf_counter()
+            response_text = self.client.generate_sync(context_prompt).strip()
             
             # Extract JSON
             start_idx = response_text.find('{')
@@ -396,7 +317,11 @@ Respond with JSON:
             
             if start_idx != -1 and end_idx > start_idx:
                 json_str = response_text[start_idx:end_idx]
-                return json.loads(json_str)
+                result = json.loads(json_str)
+                if cache_key:
+                    self.cache.put(cache_key, result, latency=time.perf_counter() - started,
+                                   prompt=context_prompt, response=response_text)
+                return result
             else:
                 return {
                     "fix": "Unable to parse fix",
@@ -412,6 +337,14 @@ Respond with JSON:
                 "confidence": 0.0,
                 "context_relevance": "None"
             }
+    
+    def generate_contextual_fixes(self, requests: List[Tuple[str, DocumentContext, List[Tuple[LaTeXExample, float]]]],
+                                  max_workers: int = 8) -> List[Dict]:
+        """Generate fixes for independent issues concurrently, preserving order"""
+        if len(requests) <= 1:
+            return [self.generate_contextual_fix(*request) for request in requests]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(requests))) as pool:
+            return list(pool.map(lambda request: self.generate_contextual_fix(*request), requests))
 
 def main():
     """Enhanced main function with user context input"""
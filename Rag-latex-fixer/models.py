@@ -38,13 +38,24 @@ class LatexIssue(BaseModel):
     severity: Severity
     description: str
     element: str  # e.g., "author", "table", "figure"
-    location: Optional[Dict[str, int]] = None  # line numbers
+    location: Optional[Dict[str, int]] = None  # start/end_line, and start/end_pos of current_code
     current_code: str
     context: Optional[str] = None  # surrounding code
     expected_format: Optional[str] = None
     
     class Config:
         use_enum_values = True
+    
+    def moved(self, offset: int, lines: int) -> 'LatexIssue':
+        """The same issue with its code moved by `offset` characters and `lines` lines"""
+        if not self.location:
+            return self
+        location = dict(self.location)
+        for key, shift in (("start_pos", offset), ("end_pos", offset),
+                           ("start_line", lines), ("end_line", lines)):
+            if key in location:
+                location[key] += shift
+        return self.model_copy(update={"location": location})
 
 
 class RetrievedExample(BaseModel):
@@ -65,6 +76,7 @@ class FixSuggestion(BaseModel):
     confidence_score: float
     retrieved_examples: List[RetrievedExample] = Field(default_factory=list)
     changes_made: List[str] = Field(default_factory=list)
+    location: Optional[Dict[str, int]] = None  # the issue's location: where original_code is
 
 
 class ValidationResult(BaseModel):
@@ -90,6 +102,8 @@ class FixReport(BaseModel):
     fixed_latex: str
     issues_fixed: List[LatexIssue] = Field(default_factory=list)
     fixes_applied: List[FixSuggestion] = Field(default_factory=list)
+    fixes_rolled_back: List[FixSuggestion] = Field(default_factory=list)
     validation_result: Optional[ValidationResult] = None
     processing_time: float
     success: bool
+    fixed_files: Dict[str, str] = Field(default_factory=dict)  # multi-file projects: path -> content
@@ -3,14 +3,19 @@ Main pipeline for RAG-based LaTeX fixing
 Orchestrates the entire detection -> retrieval -> generation -> validation flow
 """
 import time
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 from loguru import logger
 
 from models import DocumentAnalysis, LatexIssue, FixReport, FixSuggestion, ValidationResult
-from detectors.style_detector import StyleIssueDetector
+from detectors.style_detector import DOCUMENT_CHECKS, REGIONAL_CHECKS, StyleIssueDetector
 from rag.retriever import RAGRetriever
 from rag.fix_generator import FixGenerator
 from utils.latex_validator import LatexValidator
+from utils.fix_spans import AppliedFixes, apply_fixes, describe
+from utils.fix_bisect import FixBisector
+from utils.latex_project import Chunk, Flattened, load_project, split_chunks
+from utils.latex_structure import LatexStructure, get_structure
 from config import settings
 
 
@@ -27,7 +32,9 @@ class LatexFixerPipeline:
         
     def process_document(self, latex_content: str, 
                         document_format: str = "IEEE_two_column",
-                        validate_compilation: bool = True) -> FixReport:
+                        validate_compilation: bool = True,
+                        chunk_chars: Optional[int] = None,
+                        flattened: Optional[Flattened] = None) -> FixReport:
         """
         Process a LaTeX document: detect issues, generate fixes, validate
         
@@ -35,6 +42,11 @@ class LatexFixerPipeline:
             latex_content: The LaTeX document content
             document_format: Target format (IEEE_two_column, ACM_format, etc.)
             validate_compilation: Whether to validate by compilation
+            chunk_chars: Chunked mode for long documents: detect and fix
+                chunks of about this many characters in parallel
+                (utils.latex_project.split_chunks); None = whole document
+            flattened: The project latex_content was flattened from (set
+                by process_project); fixes must stay within one file
         
         Returns:
             FixReport with original, fixed content, and all details
@@ -42,11 +54,14 @@ class LatexFixerPipeline:
         start_time = time.time()
         logger.info(f"Starting LaTeX fixing pipeline for {document_format} format")
         
-        # Step 1: Detect Issues
-        logger.info("Step 1: Detecting style and layout issues...")
-        analysis = self.detector.analyze_document(latex_content, document_format)
+        if chunk_chars:
+            boundaries = flattened.boundaries() if flattened else ()
+            issues, fixes_applied = self._process_chunks(latex_content, document_format,
+                                                         chunk_chars, boundaries)
+        else:
+            issues, fixes_applied = self._detect_and_generate(latex_content, document_format)
         
-        if not analysis.detected_issues:
+        if not issues:
             logger.info("No issues detected!")
             return FixReport(
                 original_latex=latex_content,
@@ -54,45 +69,39 @@ class LatexFixerPipeline:
                 issues_fixed=[],
                 fixes_applied=[],
                 processing_time=time.time() - start_time,
-                success=True
+                success=True,
+                fixed_files=dict(flattened.files) if flattened else {}
             )
         
-        logger.info(f"Detected {len(analysis.detected_issues)} issues")
-        
-        # Step 2: Retrieve fixes for each issue
-        logger.info("Step 2: Retrieving relevant fixes from knowledge base...")
-        issue_fixes = self._retrieve_fixes_for_issues(
-            analysis.detected_issues, 
-            document_format
-        )
-        
-        # Step 3: Generate fixes
-        logger.info("Step 3: Generating fixes with LLM...")
-        fixes_applied = self._generate_fixes(
-            issue_fixes,
-            document_format,
-            latex_content
-        )
+        if self.generator.cache:
+            cache_stats = self.generator.cache.stats()
+            logger.info(f"Fix cache: {cache_stats['hit_rate']:.1%} hit rate, "
+                        f"saved {cache_stats['saved_seconds']:.1f}s / ${cache_stats['saved_usd']:.4f}")
         
         # Step 4: Apply fixes to document
         logger.info("Step 4: Applying fixes to document...")
-        fixed_latex = self._apply_fixes(latex_content, fixes_applied)
+        applied = self._apply_fixes(latex_content, fixes_applied)
+        if flattened:
+            applied = self._roll_back_cross_file_fixes(applied, flattened)
         
         # Step 5: Validate (optional)
         validation_result = None
+        success = True
         if validate_compilation:
             logger.info("Step 5: Validating fixed document...")
-            validation_result = self._validate_fixes(latex_content, fixed_latex)
+            validation_result = self._validate_fixes(latex_content, applied.latex)
             
-            # If validation fails, rollback
-            if not validation_result.compilation_success:
-                logger.warning("Validation failed, rolling back fixes")
-                fixed_latex = latex_content
-                success = False
-            else:
-                success = True
-        else:
-            success = True
+            # If validation fails, roll back only the fixes that break it
+            if not validation_result.compilation_success and applied.applied:
+                logger.warning("Validation failed, bisecting fixes to find the breaking ones")
+                applied = self._roll_back_breaking_fixes(applied)
+                validation_result = self._validate_fixes(latex_content, applied.latex)
+            success = validation_result.compilation_success
+        
+        fixed_latex = applied.latex
+        fixed_files = {}
+        if flattened:
+            fixed_files, _ = flattened.unflatten(applied.edits)
         
         processing_time = time.time() - start_time
         logger.info(f"Pipeline completed in {processing_time:.2f}s")
@@ -100,12 +109,110 @@ class LatexFixerPipeline:
         return FixReport(
             original_latex=latex_content,
             fixed_latex=fixed_latex,
-            issues_fixed=analysis.detected_issues,
-            fixes_applied=fixes_applied if success else [],
+            issues_fixed=issues,
+            fixes_applied=applied.applied,
+            fixes_rolled_back=[fix for fix, _ in applied.rolled_back],
             validation_result=validation_result,
             processing_time=processing_time,
-            success=success
+            success=success,
+            fixed_files=fixed_files
+        )
+    
+    def process_project(self, main_file,
+                        document_format: str = "IEEE_two_column",
+                        validate_compilation: bool = True,
+                        chunk_chars: Optional[int] = None) -> FixReport:
+        """
+        Process a multi-file project: the main file and every file it
+        \\input's or \\include's (utils.latex_project) are fixed as one
+        flattened document, chunked at file and section boundaries
+        
+        Args:
+            main_file: Path of the main .tex file
+            chunk_chars: Chunk size (default settings.CHUNK_CHARS)
+        
+        Returns:
+            FixReport whose fixed_files holds the fixed content of every
+            file, keyed by path relative to the main file's directory
+        """
+        project = load_project(main_file)
+        flattened = project.flatten()
+        logger.info(f"Loaded project {project.main} with {len(project.files)} files "
+                    f"({len(flattened.latex)} characters)")
+        return self.process_document(flattened.latex, document_format, validate_compilation,
+                                     chunk_chars=chunk_chars or settings.CHUNK_CHARS,
+                                     flattened=flattened)
+    
+    def _detect_and_generate(self, latex_content: str,
+                             document_format: str) -> Tuple[List[LatexIssue], List[FixSuggestion]]:
+        """Steps 1-3 on the whole document"""
+        # Step 1: Detect Issues
+        logger.info("Step 1: Detecting style and layout issues...")
+        analysis = self.detector.analyze_document(latex_content, document_format)
+        if not analysis.detected_issues:
+            return [], []
+        
+        logger.info(f"Detected {len(analysis.detected_issues)} issues")
+        
+        # Step 2: Retrieve fixes for each issue
+        logger.info("Step 2: Retrieving relevant fixes from knowledge base...")
+        issue_fixes = self._retrieve_fixes_for_issues(
+            analysis.detected_issues, 
+            document_format
         )
+        
+        # Step 3: Generate fixes
+        logger.info("Step 3: Generating fixes with LLM...")
+        fixes = self._generate_fixes(
+            issue_fixes,
+            document_format,
+            latex_content
+        )
+        return analysis.detected_issues, fixes
+    
+    def _process_chunks(self, latex_content: str, document_format: str, chunk_chars: int,
+                        boundaries=()) -> Tuple[List[LatexIssue], List[FixSuggestion]]:
+        """
+        Steps 1-3 chunk by chunk (utils.latex_project.split_chunks), chunks in parallel
+        
+        The document-wide checks (indentation, author, title) run once on
+        the whole text. The regional ones run per chunk, analyzed as the
+        shared preamble plus the chunk; its issues are moved to document
+        offsets and its floats keep their document numbers, so the fixes
+        are applied to the whole document as usual.
+        """
+        structure = get_structure(latex_content)
+        chunks = split_chunks(latex_content, chunk_chars, boundaries, structure)
+        logger.info(f"Steps 1-3: Processing {len(chunks)} chunks "
+                    f"with {settings.CHUNK_WORKERS} workers...")
+        
+        with ThreadPoolExecutor(max_workers=max(1, settings.CHUNK_WORKERS)) as pool:
+            whole = pool.submit(self.detector.analyze_document, latex_content, document_format,
+                                structure, checks=DOCUMENT_CHECKS)
+            groups = list(pool.map(
+                lambda chunk: self._detect_chunk(latex_content, chunk, document_format, structure), chunks))
+            groups.insert(0, whole.result().detected_issues)
+            issues = [issue for group in groups for issue in group]
+            logger.info(f"Detected {len(issues)} issues")
+            
+            generated = pool.map(
+                lambda group: self._generate_fixes(
+                    self._retrieve_fixes_for_issues(group, document_format),
+                    document_format, latex_content),
+                [group for group in groups if group])
+            fixes = [fix for group in generated for fix in group]
+        return issues, fixes
+    
+    def _detect_chunk(self, latex_content: str, chunk: Chunk, document_format: str,
+                      structure: LatexStructure) -> List[LatexIssue]:
+        """Regional issues in the chunk's own text, at document offsets and lines"""
+        context = chunk.context(latex_content)
+        # Built from scratch: chunks are not edits of one another
+        context_structure = get_structure(context)
+        analysis = self.detector.analyze_document(context, document_format, structure=context_structure,
+                                                  checks=REGIONAL_CHECKS,
+                                                  float_offsets=chunk.float_offsets(structure))
+        return chunk.own_issues(analysis.detected_issues, context_structure)
     
     def _retrieve_fixes_for_issues(self, issues: List[LatexIssue], 
                                   document_format: str) -> List[tuple]:
@@ -151,35 +258,52 @@ class LatexFixerPipeline:
         return fixes
     
     def _apply_fixes(self, original_latex: str, 
-                    fixes: List[FixSuggestion]) -> str:
+                    fixes: List[FixSuggestion]) -> AppliedFixes:
         """
         Apply all fixes to the document
         
-        Note: This is a simplified version. In production, you'd want
-        more sophisticated merging to handle overlapping fixes.
+        Each fix is spliced in at its issue's span (utils.fix_spans) in one
+        rebuild. Overlapping fixes are merged line by line where they touch
+        different lines; otherwise the higher-confidence one wins. Only the
+        losing and malformed fixes are rolled back.
         """
-        fixed_latex = original_latex
+        result = apply_fixes(original_latex, fixes)
         
-        # Sort fixes by position (if available) to apply from end to start
-        # This prevents position shifts from affecting later fixes
+        for fix in result.applied:
+            logger.info(f"Applied fix: {fix.changes_made[0] if fix.changes_made else 'Unknown'}")
+        for fix, reason in result.rolled_back:
+            logger.warning(f"Rolled back fix ({reason}): {describe(fix)}")
         
-        for fix in fixes:
-            try:
-                # Simple replacement
-                if fix.original_code in fixed_latex:
-                    fixed_latex = fixed_latex.replace(
-                        fix.original_code,
-                        fix.fixed_code,
-                        1  # Replace only first occurrence
-                    )
-                    logger.info(f"Applied fix: {fix.changes_made[0] if fix.changes_made else 'Unknown'}")
-                else:
-                    logger.warning(f"Could not find code to replace: {fix.original_code[:50]}...")
-            except Exception as e:
-                logger.error(f"Error applying fix: {e}")
-                continue
+        return result
+    
+    def _roll_back_breaking_fixes(self, applied: AppliedFixes) -> AppliedFixes:
+        """
+        Bisect the applied fixes (utils.fix_bisect) and roll back the smallest
+        set found to break validation; compiles are cached by the validator
+        and run in parallel across bisection branches
+        """
+        def compile_check(latex: str):
+            success, _, errors = self.validator.compile_latex(latex)
+            return success, errors
         
-        return fixed_latex
+        bisector = FixBisector(applied, self.validator.check_syntax, compile_check,
+                               workers=settings.VALIDATION_WORKERS)
+        breaking = bisector.find_breaking()
+        for i in breaking:
+            logger.warning(f"Rolled back fix (breaks validation): {describe(applied.applied[i])}")
+        logger.info(f"Kept {len(applied.applied) - len(breaking)}/{len(applied.applied)} fixes "
+                    f"after {bisector.compile_count} compiles")
+        return applied.roll_back(breaking, "breaks validation")
+    
+    def _roll_back_cross_file_fixes(self, applied: AppliedFixes,
+                                    flattened: Flattened) -> AppliedFixes:
+        """Roll back fixes that edit more than one project file or the glue between them"""
+        crossing = [i for i, edits in enumerate(applied.fix_edits)
+                    if any(flattened.segment_of(start, end) is None for start, end, _ in edits)]
+        for i in crossing:
+            logger.warning(f"Rolled back fix (spans more than one project file): "
+                           f"{describe(applied.applied[i])}")
+        return applied.roll_back(crossing, "spans more than one project file") if crossing else applied
     
     def _validate_fixes(self, original: str, fixed: str) -> ValidationResult:
         """Validate that fixes improved the document"""
@@ -227,7 +351,5 @@ class LatexFixerPipeline:
             document_format
         )
         
-        # Apply fix
-        fixed = latex_content.replace(fix.original_code, fix.fixed_code, 1)
-        
-        return fixed
+        # Apply fix at the issue's location
+        return apply_fixes(latex_content, [fix]).latex
@@ -0,0 +1,172 @@
+"""
+Corpus ingestion for the knowledge base
+Turns every knowledge_base corpus (templates, fixes, patterns, scenarios,
+packages, error patterns, formatting rules) into flat embeddable records
+"""
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+from loguru import logger
+
+
+# (glob relative to the knowledge base dir, record type)
+JSON_CORPORA: List[Tuple[str, str]] = [
+    ("fixes/*.json", "fix"),
+    ("patterns/*.json", "pattern"),
+    ("scenarios/*.json", "scenario"),
+    ("packages/comprehensive_package_database.json", "package"),
+    ("error_patterns.json", "error_pattern"),
+    ("formatting_rules.json", "formatting_rule"),
+]
+
+# Keys whose value is the LaTeX payload of an entry, in order of preference
+CODE_KEYS = ["example", "latex_template", "template", "code", "fix", "replacement", "latex"]
+
+# Path keywords used to tag records with the element the retriever filters on
+ELEMENT_KEYWORDS = [
+    ("author", "author_block"),
+    ("table", "table"),
+    ("figure", "figure"),
+    ("title", "title"),
+]
+
+RECORD_FIELDS = ["type", "format", "element", "category", "name", "description", "code"]
+
+
+class CorpusIngestor:
+    """
+    Walks the knowledge base and yields one record per leaf entry.
+
+    A JSON node becomes a record as soon as it holds scalar data (strings,
+    numbers, lists of strings); nodes that only group other objects are
+    recursed into.  Records are plain dicts with the keys in RECORD_FIELDS.
+    """
+
+    def __init__(self, kb_dir: Path):
+        self.kb_dir = Path(kb_dir)
+
+    def ingest(self) -> List[Dict[str, str]]:
+        """Collect records from every corpus, dropping duplicate payloads"""
+        records = []
+        seen = set()
+
+        for record in self._iter_all():
+            key = hashlib.sha1(
+                f"{record['type']}\0{record['code']}".encode("utf-8")
+            ).hexdigest()
+            if key in seen:
+                continue
+            seen.add(key)
+            records.append(record)
+
+        logger.info(f"Ingested {len(records)} records from knowledge base corpora")
+        return records
+
+    def _iter_all(self) -> Iterator[Dict[str, str]]:
+        yield from self._iter_templates()
+
+        for pattern, record_type in JSON_CORPORA:
+            for json_file in sorted(self.kb_dir.glob(pattern)):
+                yield from self._iter_json_file(json_file, record_type)
+
+    def _iter_templates(self) -> Iterator[Dict[str, str]]:
+        templates_dir = self.kb_dir / "templates"
+        if not templates_dir.exists():
+            return
+
+        for tex_file in sorted(templates_dir.glob("*/*.tex")):
+            format_name = tex_file.parent.name
+            element_name = tex_file.stem
+            yield {
+                "type": "template",
+                "format": format_name,
+                "element": element_name,
+                "category": format_name,
+                "name": element_name,
+                "description": f"{element_name} template for {format_name}",
+                "code": tex_file.read_text(encoding="utf-8"),
+            }
+
+    def _iter_json_file(self, json_file: Path, record_type: str) -> Iterator[Dict[str, str]]:
+        try:
+            with open(json_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping unreadable corpus {json_file.name}: {e}")
+            return
+
+        category = json_file.stem
+        for path, entry in self._walk(data, []):
+            yield self._build_record(entry, path or [category], record_type, category)
+
+    def _walk(self, node: Any, path: List[str]) -> Iterator[Tuple[List[str], Any]]:
+        """Yield (path, entry) for every node that carries scalar data"""
+        if isinstance(node, dict):
+            if any(self._is_leaf_value(v) for v in node.values()):
+                yield path, node
+                return
+            for key, value in node.items():
+                yield from self._walk(value, path + [str(key)])
+        elif isinstance(node, list):
+            if node and all(self._is_leaf_value(v) for v in node):
+                yield path, node
+                return
+            for i, value in enumerate(node):
+                yield from self._walk(value, path + [str(i)])
+        elif node is not None and path:
+            yield path, node
+
+    @staticmethod
+    def _is_leaf_value(value: Any) -> bool:
+        if isinstance(value, (str, int, float, bool)):
+            return True
+        if isinstance(value, list):
+            return all(isinstance(v, (str, int, float, bool)) for v in value)
+        return False
+
+    def _build_record(self, entry: Any, path: List[str],
+                      record_type: str, category: str) -> Dict[str, str]:
+        name = ".".join(path)
+        description = ""
+        code = None
+
+        if isinstance(entry, dict):
+            description = str(entry.get("description", ""))
+            for key in CODE_KEYS:
+                value = entry.get(key)
+                if isinstance(value, str) and value.strip():
+                    code = value
+                    break
+
+        if code is None:
+            code = entry if isinstance(entry, str) else json.dumps(entry, ensure_ascii=False, indent=2)
+
+        if not description:
+            description = f"{path[-1].replace('_', ' ')} ({' / '.join(p.replace('_', ' ') for p in path[:-1]) or category})"
+
+        return {
+            "type": record_type,
+            "format": "generic",
+            "element": self._infer_element(path),
+            "category": category,
+            "name": name,
+            "description": description,
+            "code": code,
+        }
+
+    @staticmethod
+    def _infer_element(path: List[str]) -> str:
+        joined = " ".join(path).lower()
+        for keyword, element in ELEMENT_KEYWORDS:
+            if keyword in joined:
+                return element
+        return path[-1]
+
+
+def embedding_text(record: Dict[str, str]) -> str:
+    """Text that is embedded for a record"""
+    if record["type"] == "template":
+        return record["code"]
+    return f"{record['description']}\n{record['code']}"
@@ -0,0 +1,169 @@
+"""
+Persistent cache for LLM-generated fixes
+Entries are keyed by a normalized issue signature plus the retrieved
+context, so repeated issues across documents skip the network entirely
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from config import settings
+
+
+def normalize_code(code: str) -> str:
+    """
+    Collapse spaces and tabs within each line so indentation-only differences
+    share a cache entry.  Line breaks are kept: a newline ends a ``%`` comment
+    and a blank line ends a paragraph, so they change what the code means.
+    """
+    lines = (code or '').replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(re.sub(r'[ \t]+', ' ', line).strip() for line in lines).strip('\n')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)"""
+    return max(1, len(text or '') // 4)
+
+
+class FixCache:
+    """
+    SQLite-backed fix cache with TTL and size bounds.
+
+    Every hit records the latency and estimated dollar cost of the original
+    generation, so `stats()` reports what the cache has saved.  The database
+    is shared by every process that points at the same path.
+    """
+
+    def __init__(self, path: Optional[Path] = None,
+                 ttl_seconds: Optional[int] = None,
+                 max_entries: Optional[int] = None):
+        self.path = Path(path or settings.FIX_CACHE_PATH)
+        self.ttl_seconds = settings.FIX_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_entries = settings.FIX_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS fixes (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL,
+                latency REAL NOT NULL,
+                cost REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS fixes_accessed ON fixes(accessed);
+            CREATE TABLE IF NOT EXISTS stats (
+                name TEXT PRIMARY KEY,
+                value REAL NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(issue_type: str, original_code: str, document_format: str,
+                 example_ids: List[str], model: str,
+                 prompt_version: Optional[str] = None) -> str:
+        """Hash of the normalized issue signature and retrieval context"""
+        signature = {
+            "issue_type": str(issue_type).strip().lower(),
+            "code": normalize_code(original_code),
+            "format": str(document_format).strip().lower(),
+            "examples": sorted(str(e) for e in example_ids),
+            "model": model,
+            "prompt_version": prompt_version or settings.PROMPT_VERSION,
+        }
+        payload = json.dumps(signature, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached value, or None on a miss or expired entry"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created, latency, cost FROM fixes WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or (self.ttl_seconds and now - row[1] > self.ttl_seconds):
+                if row is not None:
+                    self._conn.execute("DELETE FROM fixes WHERE key = ?", (key,))
+                self._bump("misses", 1)
+                self._conn.commit()
+                return None
+
+            value, _, latency, cost = row
+            self._conn.execute("UPDATE fixes SET accessed = ? WHERE key = ?", (now, key))
+            self._bump("hits", 1)
+            self._bump("saved_seconds", latency)
+            self._bump("saved_usd", cost)
+            self._conn.commit()
+
+        logger.debug(f"Fix cache hit {key[:12]} (saved {latency:.2f}s)")
+        return json.loads(value)
+
+    def put(self, key: str, value: Dict[str, Any], latency: float = 0.0,
+            prompt: str = "", response: str = ""):
+        """Store a generated fix along with what producing it cost"""
+        now = time.time()
+        cost = (estimate_tokens(prompt) / 1000 * settings.LLM_INPUT_COST_PER_1K_TOKENS +
+                estimate_tokens(response) / 1000 * settings.LLM_OUTPUT_COST_PER_1K_TOKENS)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fixes (key, value, created, accessed, latency, cost) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now, latency, cost)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        """Drop expired entries, then least recently used ones beyond max_entries"""
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM fixes WHERE created < ?", (now - self.ttl_seconds,))
+        if self.max_entries:
+            self._conn.execute(
+                "DELETE FROM fixes WHERE key IN ("
+                "SELECT key FROM fixes ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def _bump(self, name: str, amount: float):
+        self._conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    def stats(self) -> Dict[str, float]:
+        """Hit rate and cumulative savings across every process using this cache"""
+        with self._lock:
+            values = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+            entries = self._conn.execute("SELECT COUNT(*) FROM fixes").fetchone()[0]
+
+        hits = int(values.get("hits", 0))
+        misses = int(values.get("misses", 0))
+        lookups = hits + misses
+        return {
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "saved_seconds": values.get("saved_seconds", 0.0),
+            "saved_usd": values.get("saved_usd", 0.0),
+        }
+
+    def clear(self):
+        """Remove every entry and reset the statistics"""
+        with self._lock:
+            self._conn.execute("DELETE FROM fixes")
+            self._conn.execute("DELETE FROM stats")
+            self._conn.commit()
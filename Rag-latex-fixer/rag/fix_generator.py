@@ -2,14 +2,16 @@
 LLM-based fix generator
 Uses retrieved examples to generate context-aware fixes
 """
-import os
 import re
+import time
 from typing import List, Dict, Optional
-import google.generativeai as genai
 from loguru import logger
 
 from models import LatexIssue, FixSuggestion, RetrievedExample
 from config import settings
+from rag.fix_cache import FixCache
+
+from doc_edit.llm_client import get_client
 
 
 def get_enum_value(enum_field):
@@ -23,15 +25,18 @@ class FixGenerator:
     """
     
     def __init__(self):
-        # Configure Gemini
+        # Per-key Gemini client; no global genai.configure
         if settings.GEMINI_API_KEY:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            self.primary_model = genai.GenerativeModel(settings.PRIMARY_MODEL)
-            self.fallback_model = genai.GenerativeModel(settings.FALLBACK_MODEL)
+            self.client = get_client([settings.GEMINI_API_KEY], settings.PRIMARY_MODEL)
+            self.primary_model = settings.PRIMARY_MODEL
+            self.fallback_model = settings.FALLBACK_MODEL
         else:
             logger.warning("GEMINI_API_KEY not set. Fix generation will be limited.")
+            self.client = None
             self.primary_model = None
             self.fallback_model = None
+        
+        self.cache = FixCache() if settings.FIX_CACHE_ENABLED else None
     
     def generate_fix(self, issue: LatexIssue, 
                     retrieved_examples: List[RetrievedExample],
@@ -51,11 +56,31 @@ class FixGenerator:
         """
         logger.info(f"Generating fix for: {issue.type}")
         
-        # Build prompt
-        prompt = self._build_prompt(issue, retrieved_examples, document_format, context)
+        # Check the cross-document cache before calling the LLM
+        cache_key = None
+        cached = None
+        if self.cache and self.primary_model:
+            cache_key = FixCache.make_key(
+                get_enum_value(issue.type), issue.current_code, document_format,
+                [self._example_id(ex) for ex in retrieved_examples[:3]],
+                settings.PRIMARY_MODEL
+            )
+            cached = self.cache.get(cache_key)
         
-        # Generate with LLM
-        fixed_code, confidence = self._generate_with_llm(prompt, issue.current_code)
+        if cached:
+            fixed_code, confidence = cached["fixed_code"], cached["confidence"]
+        else:
+            # Build prompt
+            prompt = self._build_prompt(issue, retrieved_examples, document_format, context)
+            
+            # Generate with LLM
+            started = time.perf_counter()
+            fixed_code, confidence = self._generate_with_llm(prompt, issue.current_code)
+            
+            if cache_key and confidence > 0:
+                self.cache.put(cache_key, {"fixed_code": fixed_code, "confidence": confidence},
+                               latency=time.perf_counter() - started,
+                               prompt=prompt, response=fixed_code)
         
         # Extract changes made
         changes = self._identify_changes(issue.current_code, fixed_code)
@@ -66,9 +91,18 @@ class FixGenerator:
             explanation=self._generate_explanation(issue, changes),
             confidence_score=confidence,
             retrieved_examples=retrieved_examples,
-            changes_made=changes
+            changes_made=changes,
+            location=issue.location
         )
     
+    @staticmethod
+    def _example_id(example: RetrievedExample) -> str:
+        """Stable identifier of a retrieved example for cache keys"""
+        meta = example.metadata or {}
+        if meta.get("name"):
+            return f"{meta.get('type', '')}:{meta.get('category', '')}:{meta['name']}"
+        return example.code
+    
     def _build_prompt(self, issue: LatexIssue,
                      examples: List[RetrievedExample],
                      document_format: str,
@@ -168,15 +202,15 @@ Description: {example.description}
         
         try:
             # Try primary model
-            response = self.primary_model.generate_content(prompt)
-            fixed_code = self._extract_code_from_response(response.text)
+            response_text = self.client.generate_sync(prompt, model=self.primary_model)
+            fixed_code = self._extract_code_from_response(response_text)
             confidence = 0.9
             
         except Exception as e:
             logger.warning(f"Primary model failed: {e}, trying fallback...")
             try:
-                response = self.fallback_model.generate_content(prompt)
-                fixed_code = self._extract_code_from_response(response.text)
+                response_text = self.client.generate_sync(prompt, model=self.fallback_model)
+                fixed_code = self._extract_code_from_response(response_text)
                 confidence = 0.7
             except Exception as e2:
                 logger.error(f"Fallback model also failed: {e2}")
@@ -0,0 +1,109 @@
+"""
+FAISS index factory
+Builds the vector index type selected in config.Settings (flat, hnsw, ivfpq)
+"""
+import math
+from typing import Optional
+
+import faiss
+import numpy as np
+from loguru import logger
+
+from config import settings
+
+
+INDEX_TYPES = ["flat", "hnsw", "ivfpq"]
+
+# FAISS wants roughly this many training points per IVF list
+_MIN_POINTS_PER_LIST = 39
+
+
+def create_index(embeddings: np.ndarray, index_type: Optional[str] = None,
+                 metric: str = "l2") -> faiss.Index:
+    """
+    Build, train and fill an index for the given embedding matrix
+
+    Args:
+        embeddings: float32 matrix (n, dim); normalise it first for metric="ip"
+        index_type: "flat", "hnsw" or "ivfpq" (defaults to settings.INDEX_TYPE)
+        metric: "l2" or "ip" (inner product)
+
+    Returns:
+        A populated FAISS index.  Corpora too small to train IVF-PQ fall
+        back to a flat index.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    n, dimension = embeddings.shape
+    index_type = resolve_index_type(n, dimension, index_type)
+    faiss_metric = faiss.METRIC_INNER_PRODUCT if metric == "ip" else faiss.METRIC_L2
+
+    if index_type == "flat":
+        index = faiss.IndexFlat(dimension, faiss_metric)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, settings.HNSW_M, faiss_metric)
+        index.hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+    else:
+        nlist = _ivf_nlist(n)
+        quantizer = faiss.IndexFlat(dimension, faiss_metric)
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist,
+                                 settings.PQ_M, settings.PQ_NBITS, faiss_metric)
+        logger.info(f"Training IVF-PQ index (nlist={nlist}) on {n} vectors...")
+        index.train(embeddings)
+
+    index.add(embeddings)
+    configure_search(index)
+    return index
+
+
+def resolve_index_type(n: int, dimension: int, index_type: Optional[str] = None) -> str:
+    """Index type that create_index will actually build for a corpus of this size"""
+    index_type = (index_type or settings.INDEX_TYPE).lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+
+    if index_type == "ivfpq":
+        pq_training_points = _MIN_POINTS_PER_LIST * 2 ** settings.PQ_NBITS
+        if _ivf_nlist(n) < 1 or n < pq_training_points or dimension % settings.PQ_M != 0:
+            logger.warning(f"Corpus of {n} vectors (dim {dimension}) is too small for IVF-PQ, "
+                           "using a flat index")
+            return "flat"
+    return index_type
+
+
+def _ivf_nlist(n: int) -> int:
+    nlist = settings.IVF_NLIST or max(1, int(4 * math.sqrt(n)))
+    return min(nlist, n // _MIN_POINTS_PER_LIST)
+
+
+def configure_search(index: faiss.Index) -> faiss.Index:
+    """Apply search-time parameters; call again after faiss.read_index"""
+    # downcast_index returns a non-owning view, so hand back the original object
+    typed = faiss.downcast_index(index)
+    if isinstance(typed, faiss.IndexHNSW):
+        typed.hnsw.efSearch = settings.HNSW_EF_SEARCH
+    elif isinstance(typed, faiss.IndexIVF):
+        typed.nprobe = min(settings.IVF_NPROBE, typed.nlist)
+    return index
+
+
+def search_parameters(index: faiss.Index,
+                      selector: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+    """Per-query search parameters matching the index type, optionally restricted to an ID selector"""
+    if selector is None:
+        return None
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    return faiss.SearchParameters(sel=selector)
+
+
+def index_type_of(index: faiss.Index) -> str:
+    """Name of the factory type a (loaded) index was built as"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    return "flat"
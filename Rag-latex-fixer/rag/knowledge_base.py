@@ -3,7 +3,6 @@ Knowledge Base Manager for RAG system
 Handles loading, indexing, and retrieval of LaTeX patterns and fixes
 """
 import json
-import pickle
 from pathlib import Path
 from typing import List, Dict, Optional, Any
 import numpy as np
@@ -13,6 +12,10 @@ from loguru import logger
 
 from config import settings
 from models import RetrievedExample
+from rag.corpus_ingestion import CorpusIngestor, embedding_text
+from rag.record_store import RecordStore, STORE_FILE
+from rag.index_factory import (create_index, configure_search, index_type_of,
+                               resolve_index_type, search_parameters)
 
 
 class KnowledgeBaseManager:
@@ -24,7 +27,7 @@ class KnowledgeBaseManager:
         self.kb_dir = settings.KNOWLEDGE_BASE_DIR
         self.embedding_model = None
         self.faiss_index = None
-        self.metadata = []
+        self.records: Optional[RecordStore] = None
         
         # Load data
         self._load_knowledge_base()
@@ -45,7 +48,7 @@ class KnowledgeBaseManager:
         # Load or create embeddings
         self._load_or_create_embeddings()
         
-        logger.info(f"Knowledge base loaded. {len(self.metadata)} examples indexed.")
+        logger.info(f"Knowledge base loaded. {len(self.records or [])} examples indexed.")
     
     def _load_json(self, filename: str) -> Dict:
         """Load a JSON file from knowledge base"""
@@ -77,17 +80,23 @@ class KnowledgeBaseManager:
     
     def _load_or_create_embeddings(self):
         """Load existing embeddings or create new ones"""
-        embeddings_file = self.kb_dir / "embeddings_cache.pkl"
+        store_file = self.kb_dir / STORE_FILE
         index_file = self.kb_dir / "faiss_index.bin"
         
-        if embeddings_file.exists() and index_file.exists():
-            logger.info("Loading existing embeddings and FAISS index...")
+        if store_file.exists() and index_file.exists():
+            logger.info("Loading existing record store and FAISS index...")
             try:
-                with open(embeddings_file, 'rb') as f:
-                    data = pickle.load(f)
-                    self.metadata = data['metadata']
+                self.records = RecordStore.load(self.kb_dir)
+                self.faiss_index = configure_search(faiss.read_index(str(index_file)))
+                if self.faiss_index.ntotal != len(self.records):
+                    raise ValueError("index and record store are out of sync")
+                
+                # Rebuild the index (without re-encoding) if INDEX_TYPE changed
+                expected = resolve_index_type(self.faiss_index.ntotal, self.faiss_index.d)
+                if index_type_of(self.faiss_index) != expected:
+                    logger.info(f"Index type changed to '{expected}', rebuilding index...")
+                    self._build_index(np.load(self.embeddings_file))
                 
-                self.faiss_index = faiss.read_index(str(index_file))
                 logger.info("Embeddings loaded successfully")
                 return
             except Exception as e:
@@ -97,76 +106,47 @@ class KnowledgeBaseManager:
         self._create_embeddings()
     
     def _create_embeddings(self):
-        """Create embeddings for all examples in knowledge base"""
+        """Create embeddings for every record produced by the corpus ingestor"""
         logger.info("Creating embeddings for knowledge base...")
         
         # Initialize embedding model
         if self.embedding_model is None:
             self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
         
-        # Collect all examples
-        examples = []
-        metadata = []
-        
-        # Add templates
-        for format_name, elements in self.templates.items():
-            for element_name, code in elements.items():
-                examples.append(code)
-                metadata.append({
-                    "type": "template",
-                    "format": format_name,
-                    "element": element_name,
-                    "code": code,
-                    "description": f"{element_name} template for {format_name}"
-                })
+        # Collect records from all corpora
+        records = CorpusIngestor(self.kb_dir).ingest()
         
-        # Add fix patterns
-        fixes_dir = self.kb_dir / "fixes"
-        if fixes_dir.exists():
-            for fix_file in fixes_dir.glob("*.json"):
-                fix_data = self._load_json(f"fixes/{fix_file.name}")
-                for fix_name, fix_info in fix_data.items():
-                    if isinstance(fix_info, dict) and "example" in fix_info:
-                        examples.append(fix_info["example"])
-                        metadata.append({
-                            "type": "fix",
-                            "fix_name": fix_name,
-                            "code": fix_info["example"],
-                            "description": fix_info.get("description", ""),
-                            "category": fix_file.stem
-                        })
-        
-        if not examples:
+        if not records:
             logger.warning("No examples found to embed!")
-            self.metadata = []
+            self.records = None
             return
         
         # Generate embeddings
+        examples = [embedding_text(record) for record in records]
         logger.info(f"Generating embeddings for {len(examples)} examples...")
         embeddings = self.embedding_model.encode(examples, show_progress_bar=True)
         
-        # Create FAISS index
-        dimension = embeddings.shape[1]
-        self.faiss_index = faiss.IndexFlatL2(dimension)
-        self.faiss_index.add(embeddings.astype('float32'))
+        embeddings = embeddings.astype('float32')
+        np.save(self.embeddings_file, embeddings)
         
-        self.metadata = metadata
+        self.records = RecordStore.from_records(records)
         
-        # Save embeddings and index
-        self._save_embeddings()
+        # Create, train and save the FAISS index
+        self._build_index(embeddings)
+        self.records.save(self.kb_dir)
         
         logger.info(f"Created embeddings for {len(examples)} examples")
     
-    def _save_embeddings(self):
-        """Save embeddings and FAISS index to disk"""
-        embeddings_file = self.kb_dir / "embeddings_cache.pkl"
-        index_file = self.kb_dir / "faiss_index.bin"
-        
-        with open(embeddings_file, 'wb') as f:
-            pickle.dump({'metadata': self.metadata}, f)
-        
-        faiss.write_index(self.faiss_index, str(index_file))
-        logger.info("Embeddings saved to disk")
+    @property
+    def embeddings_file(self) -> Path:
+        """Raw embedding matrix, kept so the index can be rebuilt or benchmarked"""
+        return settings.EMBEDDINGS_DIR / "embeddings.npy"
+    
+    def _build_index(self, embeddings: np.ndarray):
+        """Build the configured index type and save it to disk"""
+        self.faiss_index = create_index(embeddings, metric="l2")
+        faiss.write_index(self.faiss_index, str(self.kb_dir / "faiss_index.bin"))
+        logger.info(f"Saved {index_type_of(self.faiss_index)} index with {self.faiss_index.ntotal} vectors")
     
     def retrieve_similar_examples(self, query: str, 
                                   filters: Optional[Dict[str, Any]] = None,
@@ -182,10 +162,19 @@ class KnowledgeBaseManager:
         Returns:
             List of retrieved examples with similarity scores
         """
-        if self.faiss_index is None or not self.metadata:
-            logger.warning("Knowledge base not initialized or empty")
+        if self.faiss_index is None or not self.records:
+            logger.warning("No embeddings available. Knowledge base may be empty")
             return []
         
+        # Restrict the search to records matching the filters
+        params = None
+        if filters:
+            allowed = np.flatnonzero(self.records.mask(filters))
+            if len(allowed) == 0:
+                return []
+            selector = faiss.IDSelectorBatch(allowed.astype('int64'))
+            params = search_parameters(self.faiss_index, selector)
+        
         # Initialize embedding model if needed
         if self.embedding_model is None:
             self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
@@ -194,48 +183,32 @@ class KnowledgeBaseManager:
         query_embedding = self.embedding_model.encode([query])[0]
         
         # Search in FAISS
-        # Retrieve more results to allow for filtering
-        search_k = top_k * 3 if filters else top_k
         distances, indices = self.faiss_index.search(
             query_embedding.reshape(1, -1).astype('float32'), 
-            search_k
+            min(top_k, len(self.records)),
+            params=params
         )
         
-        # Convert to similarity scores (FAISS returns L2 distances)
+        # Convert to similarity scores (FAISS returns squared L2 distances)
         similarities = 1 / (1 + distances[0])
         
-        # Collect results
+        # Collect results; code payloads are only read for returned records
         results = []
         for idx, similarity in zip(indices[0], similarities):
-            if idx < len(self.metadata):
-                meta = self.metadata[idx]
-                
-                # Apply filters if provided
-                if filters:
-                    if not self._matches_filters(meta, filters):
-                        continue
+            if 0 <= idx < len(self.records):
+                meta = self.records.metadata(int(idx))
                 
                 results.append(RetrievedExample(
-                    code=meta.get("code", ""),
-                    description=meta.get("description", ""),
-                    document_format=meta.get("format", "generic"),
-                    element_type=meta.get("element", meta.get("fix_name", "unknown")),
+                    code=self.records.code(int(idx)),
+                    description=meta["description"],
+                    document_format=meta["format"],
+                    element_type=meta["element"] or meta["name"],
                     similarity_score=float(similarity),
                     metadata=meta
                 ))
-                
-                if len(results) >= top_k:
-                    break
         
         return results
     
-    def _matches_filters(self, metadata: Dict, filters: Dict) -> bool:
-        """Check if metadata matches all filters"""
-        for key, value in filters.items():
-            if metadata.get(key) != value:
-                return False
-        return True
-    
     def get_template(self, format_name: str, element_name: str) -> Optional[str]:
         """Get a specific template"""
         return self.templates.get(format_name, {}).get(element_name)
@@ -0,0 +1,150 @@
+"""
+Columnar metadata store for knowledge base records
+Keeps record metadata in compact NumPy columns and the full code payloads
+in a separate file that is only read when a record is returned
+"""
+import json
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+# Low-cardinality columns are dictionary encoded (vocabulary + int32 codes)
+CATEGORICAL_COLUMNS = ["type", "format", "element", "category"]
+# High-cardinality columns are stored as utf-8 bytes + int64 offsets
+STRING_COLUMNS = ["name", "description"]
+
+STORE_FILE = "records.npz"
+PAYLOAD_FILE = "records_payload.bin"
+
+
+class RecordStore:
+    """
+    Arrow-style record store.
+
+    Categorical columns are filtered with vectorised comparisons on their
+    integer codes; `code` payloads live in PAYLOAD_FILE and are fetched by
+    offset on demand, so resident memory does not grow with the corpus.
+    """
+
+    def __init__(self, vocab: Dict[str, List[str]], codes: Dict[str, np.ndarray],
+                 strings: Dict[str, np.ndarray], string_offsets: Dict[str, np.ndarray],
+                 payload_offsets: np.ndarray, payload_path: Optional[Path] = None,
+                 payload: Optional[bytes] = None):
+        self.vocab = vocab
+        self.codes = codes
+        self.strings = strings
+        self.string_offsets = string_offsets
+        self.payload_offsets = payload_offsets
+        self.payload_path = payload_path
+        self._payload = payload
+        self._vocab_index = {
+            col: {value: i for i, value in enumerate(values)}
+            for col, values in vocab.items()
+        }
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, str]]) -> "RecordStore":
+        """Build an in-memory store from ingestion records"""
+        vocab = {}
+        codes = {}
+        for col in CATEGORICAL_COLUMNS:
+            values = [str(r.get(col, "")) for r in records]
+            vocab[col] = sorted(set(values))
+            index = {value: i for i, value in enumerate(vocab[col])}
+            codes[col] = np.array([index[v] for v in values], dtype=np.int32)
+
+        strings = {}
+        string_offsets = {}
+        for col in STRING_COLUMNS:
+            strings[col], string_offsets[col] = _pack_strings(
+                [str(r.get(col, "")) for r in records]
+            )
+
+        payload, payload_offsets = _pack_strings([r.get("code", "") for r in records])
+        return cls(vocab, codes, strings, string_offsets, payload_offsets,
+                   payload=payload.tobytes())
+
+    @classmethod
+    def load(cls, directory: Path) -> "RecordStore":
+        """Load columns from disk; the payload file is left unread"""
+        directory = Path(directory)
+        with np.load(directory / STORE_FILE, allow_pickle=False) as data:
+            vocab = json.loads(str(data["vocab"]))
+            codes = {col: data[f"codes_{col}"] for col in CATEGORICAL_COLUMNS}
+            strings = {col: data[f"strings_{col}"] for col in STRING_COLUMNS}
+            string_offsets = {col: data[f"offsets_{col}"] for col in STRING_COLUMNS}
+            payload_offsets = data["payload_offsets"]
+        return cls(vocab, codes, strings, string_offsets, payload_offsets,
+                   payload_path=directory / PAYLOAD_FILE)
+
+    def save(self, directory: Path):
+        """Write columns to STORE_FILE and payloads to PAYLOAD_FILE"""
+        directory = Path(directory)
+        arrays = {"vocab": np.array(json.dumps(self.vocab)),
+                  "payload_offsets": self.payload_offsets}
+        for col in CATEGORICAL_COLUMNS:
+            arrays[f"codes_{col}"] = self.codes[col]
+        for col in STRING_COLUMNS:
+            arrays[f"strings_{col}"] = self.strings[col]
+            arrays[f"offsets_{col}"] = self.string_offsets[col]
+        np.savez(directory / STORE_FILE, **arrays)
+
+        (directory / PAYLOAD_FILE).write_bytes(self._read_payload_range(0, len(self)))
+        self.payload_path = directory / PAYLOAD_FILE
+
+    def __len__(self) -> int:
+        return len(self.payload_offsets) - 1
+
+    def value(self, idx: int, column: str) -> str:
+        """Value of a metadata column for one record"""
+        if column in self.codes:
+            return self.vocab[column][self.codes[column][idx]]
+        if column in self.strings:
+            start, end = self.string_offsets[column][idx:idx + 2]
+            return self.strings[column][start:end].tobytes().decode("utf-8")
+        if column == "code":
+            return self.code(idx)
+        raise KeyError(column)
+
+    def metadata(self, idx: int) -> Dict[str, str]:
+        """Metadata dict for one record (without the code payload)"""
+        return {col: self.value(idx, col) for col in CATEGORICAL_COLUMNS + STRING_COLUMNS}
+
+    def code(self, idx: int) -> str:
+        """Lazily load the code payload of one record"""
+        return self._read_payload_range(idx, idx + 1).decode("utf-8")
+
+    def mask(self, filters: Optional[Dict[str, str]] = None) -> np.ndarray:
+        """Boolean mask of records whose columns equal every filter value"""
+        result = np.ones(len(self), dtype=bool)
+        for key, value in (filters or {}).items():
+            if key in self.codes:
+                code = self._vocab_index[key].get(value)
+                if code is None:
+                    return np.zeros(len(self), dtype=bool)
+                result &= self.codes[key] == code
+            else:
+                result &= np.array([self.value(i, key) == value for i in range(len(self))],
+                                   dtype=bool)
+        return result
+
+    def _read_payload_range(self, first: int, last: int) -> bytes:
+        start = int(self.payload_offsets[first])
+        end = int(self.payload_offsets[last])
+        if self._payload is not None:
+            return self._payload[start:end]
+        with open(self.payload_path, "rb") as f:
+            f.seek(start)
+            return f.read(end - start)
+
+
+def _pack_strings(values: List[str]):
+    """Concatenate strings into a uint8 buffer with int64 offsets"""
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(e) for e in encoded])
+    buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return buffer, offsets
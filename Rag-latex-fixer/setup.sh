@@ -28,6 +28,7 @@ read -p "Press Enter to continue with installation..."
 # Install dependencies
 echo "Installing dependencies..."
 pip install -r requirements.txt || { echo "Error: Installation failed"; exit 1; }
+pip install --no-deps -e .. || { echo "Error: Installing the shared doc_edit package failed"; exit 1; }
 echo "✓ Dependencies installed"
 echo ""
 
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test the concurrent detector registry
+"""
+
+import sys
+import time
+sys.path.append('.')
+
+from detectors.registry import DetectorRegistry, Region
+
+
+def slow_sections(content, structure):
+    time.sleep(0.05)
+    return [("section", env.start_line) for env in structure.environments_named("table")] + [("dup", 1)]
+
+
+def fast_lines(content, structure):
+    return [("dup", 1), ("lines", len(structure.line_starts))]
+
+
+def tables(content, structure):
+    return [Region(env.start, env.end, context=number, element=env)
+            for number, env in enumerate(structure.environments_named("table"), 1)]
+
+
+def table_ends(content, structure, region):
+    """Where each table ends, found from the region's element"""
+    return [("table", region.context, region.element.end_line, content[region.element.start:region.element.end])]
+
+
+def shift(issue, offset, lines):
+    return issue[:2] + (issue[2] + lines,) + issue[3:]
+
+
+def _registry(**kwargs):
+    registry = DetectorRegistry(issue_key=lambda issue: issue, shift=shift, **kwargs)
+    registry.register("slow", slow_sections)
+    registry.register("fast", fast_lines)
+    registry.register_regional("tables", table_ends, tables)
+    return registry
+
+
+def test_merge_is_deterministic_across_modes():
+    """Inline, thread and process runs merge to the same ordered issues"""
+    content = "\\begin{table}\nx\n\\end{table}\n" * 4
+
+    inline = _registry().run(content)
+    threaded = _registry(processes=False, parallel_min_chars=0).run(content)
+    pooled = _registry(processes=True, parallel_min_chars=0).run(content)
+
+    assert inline.mode == "inline"
+    assert threaded.mode == "thread"
+    assert pooled.mode in ("process", "thread")  # threads if the sandbox forbids processes
+    assert pooled.regions_pooled == (4 if pooled.mode == "process" else 0)
+    table = "\\begin{table}\nx\n\\end{table}"
+    expected = [("section", 1), ("section", 4), ("section", 7), ("section", 10), ("dup", 1), ("lines", 13)] + \
+        [("table", number, 3 * number, table) for number in range(1, 5)]
+    for run in (inline, threaded, pooled):
+        assert run.issues == expected
+        assert run.duplicates_removed == 1
+        assert set(run.timings) == {"slow", "fast", "tables"}
+        assert run.timings["slow"] >= 0.05
+    print("✅ Detector registry merge passed")
+
+
+def test_duplicate_names_rejected():
+    registry = _registry()
+    try:
+        registry.register("slow", fast_lines)
+    except ValueError:
+        print("✅ Duplicate detector names rejected")
+    else:
+        raise AssertionError("duplicate detector name accepted")
+
+
+if __name__ == "__main__":
+    test_merge_is_deterministic_across_modes()
+    test_duplicate_names_rejected()
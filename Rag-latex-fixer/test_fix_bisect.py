@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test bisecting validation: only the fixes that break the document are
+rolled back, compiles are cached and the original's own errors are ignored
+"""
+
+import sys
+import threading
+import time
+sys.path.append('.')
+
+from models import FixSuggestion
+from utils.fix_bisect import FixBisector
+from utils.fix_spans import apply_fixes
+from utils.latex_validator import LatexValidator
+
+LINES = [f"\\item line {i}\n" for i in range(16)]
+DOCUMENT = "\\documentclass{article}\n\\begin{document}\n" + "".join(LINES) + "\\end{document}\n"
+
+
+def _applied(replacements, document=DOCUMENT):
+    """Apply one fix per (line index, new text)"""
+    fixes = []
+    for index, text in replacements:
+        start = document.index(LINES[index])
+        fixes.append(FixSuggestion(original_code=LINES[index], fixed_code=text, explanation=text.strip(),
+                                   confidence_score=0.9, changes_made=[text.strip()],
+                                   location={"start_pos": start, "end_pos": start + len(LINES[index])}))
+    return apply_fixes(document, fixes)
+
+
+def _compiler(broken=("BAD",), pairs=(), delay=0.0):
+    """Fake compile: fails on any `broken` marker, or on both halves of a pair"""
+    calls = []
+
+    def compile_check(latex):
+        calls.append(latex)
+        time.sleep(delay)
+        errors = [f"! {marker}" for marker in broken if marker in latex]
+        errors += [f"! {a}+{b}" for a, b in pairs if a in latex and b in latex]
+        return not errors, errors
+    return compile_check, calls
+
+
+def _syntax(latex):
+    return LatexValidator().check_syntax(latex)
+
+
+def test_breaking_fixes_are_isolated():
+    applied = _applied([(i, f"\\item fixed {i}{' BAD' if i in (3, 11) else ''}\n") for i in range(16)])
+    compile_check, calls = _compiler()
+    bisector = FixBisector(applied, _syntax, compile_check, workers=4)
+
+    breaking = bisector.find_breaking()
+    assert breaking == [3, 11]
+    kept = applied.roll_back(breaking, "breaks validation")
+    assert len(kept.applied) == 14 and "BAD" not in kept.latex and "fixed 10" in kept.latex
+    assert [reason for _, reason in kept.rolled_back] == ["breaks validation"] * 2
+
+    # About 2 compiles per level per breaking fix, none of them repeated
+    assert bisector.compile_count <= 2 * 2 * 4 + 2 and len(set(calls)) == len(calls)
+    print("✅ Breaking fixes isolated")
+
+
+def test_interacting_fixes_and_cheap_checks():
+    """Two fixes fine alone but not together: one of them goes"""
+    applied = _applied([(1, "\\item A\n"), (2, "\\item ok\n"), (9, "\\item B\n"), (12, "\\item SYNTAX\n")])
+    compile_check, calls = _compiler(broken=(), pairs=[("item A", "item B")])
+
+    def syntax_check(latex):
+        return ("SYNTAX" not in latex), (["bad syntax"] if "SYNTAX" in latex else [])
+
+    breaking = FixBisector(applied, syntax_check, compile_check).find_breaking()
+    assert breaking in ([0, 3], [2, 3])
+    assert all("SYNTAX" not in latex for latex in calls)  # rejected without a compile
+    print("✅ Interacting fixes passed")
+
+
+def test_original_errors_are_not_blamed():
+    applied = _applied([(0, "\\item fixed\n"), (5, "\\item NEW\n")])
+    compile_check, _ = _compiler(broken=("line 7", "NEW"))  # the original already fails on line 7
+    assert FixBisector(applied, _syntax, compile_check).find_breaking() == [1]
+    print("✅ Baseline errors passed")
+
+
+def test_unbalanced_original_keeps_balanced_fixes():
+    """The original has an unclosed brace; fixes that keep the balance are not blamed"""
+    document = DOCUMENT.replace("line 4\n", "line {4\n")
+    applied = _applied([(0, "\\item \\resizebox{\\linewidth}{!}{tabular}\n"), (8, "\\item BAD\n")],
+                       document)
+    assert len(applied.applied) == 2
+    compile_check, _ = _compiler()
+    assert FixBisector(applied, _syntax, compile_check).find_breaking() == [1]
+    print("✅ Unbalanced original passed")
+
+
+def test_branches_compile_in_parallel():
+    applied = _applied([(i, f"\\item fixed {i}{' BAD' if i in (1, 14) else ''}\n") for i in range(16)])
+    active, peak = [0], [0]
+    lock = threading.Lock()
+    compile_check, _ = _compiler(delay=0.02)
+
+    def tracked(latex):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        try:
+            return compile_check(latex)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    assert FixBisector(applied, _syntax, tracked, workers=4).find_breaking() == [1, 14]
+    assert 1 < peak[0] <= 4
+    print("✅ Parallel bisection passed")
+
+
+def test_validator_caches_compiles():
+    validator = LatexValidator()
+    runs = []
+    validator._run_compiler = lambda latex, compiler: runs.append(latex) or (True, "", [])
+    assert validator.compile_latex(DOCUMENT) == (True, "", [])
+    validator.compile_latex(DOCUMENT)
+    validator.compile_latex(DOCUMENT + "%")
+    assert len(runs) == 2
+    print("✅ Compile cache passed")
+
+
+if __name__ == "__main__":
+    test_breaking_fixes_are_isolated()
+    test_interacting_fixes_and_cheap_checks()
+    test_original_errors_are_not_blamed()
+    test_unbalanced_original_keeps_balanced_fixes()
+    test_branches_compile_in_parallel()
+    test_validator_caches_compiles()
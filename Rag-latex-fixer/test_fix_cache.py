@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test the persistent LLM fix cache
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+sys.path.append('.')
+
+from rag.fix_cache import FixCache, normalize_code
+
+
+def test_key_normalization():
+    """Indentation-only differences share a key; line breaks, model and examples do not"""
+    code = "\\begin{table}\n  \\caption{A}"
+    base = FixCache.make_key("table_not_centered", code, "IEEE_two_column", ["b", "a"], "gemini")
+    assert base == FixCache.make_key("table_not_centered", "\\begin{table}\t\r\n\\caption{A}  ",
+                                     "ieee_two_column", ["a", "b"], "gemini")
+    assert base != FixCache.make_key("table_not_centered", "\\begin{table} \\caption{A}",
+                                     "IEEE_two_column", ["a", "b"], "gemini")
+    assert base != FixCache.make_key("table_not_centered", code, "IEEE_two_column", ["a", "b"], "other-model")
+    assert base != FixCache.make_key("table_not_centered", code, "IEEE_two_column", ["a"], "gemini")
+
+    # A newline ends a comment, a blank line ends a paragraph
+    assert normalize_code("a  % c\n\tb") == "a % c\nb" != normalize_code("a % c b")
+    assert normalize_code("a\n\nb") != normalize_code("a\nb")
+    print("✅ Cache key normalization passed")
+
+
+def test_hits_ttl_and_size_bound():
+    """Hits report savings, entries expire and the LRU bound is enforced"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = FixCache(Path(temp_dir) / "fixes.sqlite", ttl_seconds=3600, max_entries=2)
+
+        assert cache.get("a") is None
+        cache.put("a", {"fixed_code": "A", "confidence": 0.9}, latency=2.0,
+                  prompt="x" * 4000, response="y" * 400)
+        assert cache.get("a") == {"fixed_code": "A", "confidence": 0.9}
+
+        stats = cache.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+        assert stats["saved_seconds"] == 2.0
+        assert stats["saved_usd"] > 0
+
+        time.sleep(0.01)
+        cache.put("b", {"fixed_code": "B"})
+        time.sleep(0.01)
+        cache.get("a")
+        time.sleep(0.01)
+        cache.put("c", {"fixed_code": "C"})
+        assert cache.get("b") is None  # least recently used, evicted
+        assert cache.get("a") is not None and cache.get("c") is not None
+
+        # Another instance on the same file sees the same entries and stats
+        shared = FixCache(Path(temp_dir) / "fixes.sqlite", ttl_seconds=3600, max_entries=2)
+        assert shared.stats()["hits"] == cache.stats()["hits"]
+
+        expired = FixCache(Path(temp_dir) / "fixes.sqlite", ttl_seconds=1, max_entries=2)
+        expired._conn.execute("UPDATE fixes SET created = created - 10")
+        assert expired.get("a") is None
+    print("✅ Fix cache hits, TTL and size bound passed")
+
+
+if __name__ == "__main__":
+    test_key_normalization()
+    test_hits_ttl_and_size_bound()
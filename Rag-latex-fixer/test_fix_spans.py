@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test span-based fix application: locating fixes, merging fixes of the same
+element, and rolling back only conflicting or broken fixes
+"""
+
+import sys
+sys.path.append('.')
+
+from detectors.style_detector import StyleIssueDetector
+from models import FixSuggestion
+from utils.fix_spans import apply_fixes, is_well_formed, locate_fix
+
+TABLE = "\\begin{table}\n\\begin{tabular}{ll}\na & b \\\\\n\\end{tabular}\n\\end{table}\n"
+DOCUMENT = "\\documentclass{article}\n\\begin{document}\n" + TABLE + "text\n" + TABLE + "\\end{document}\n"
+
+
+def _fix(original, fixed, start=None, confidence=0.9, name="fix"):
+    location = {"start_pos": start, "end_pos": start + len(original)} if start is not None else None
+    return FixSuggestion(original_code=original, fixed_code=fixed, explanation=name,
+                         confidence_score=confidence, changes_made=[name], location=location)
+
+
+def test_fix_applies_at_its_span():
+    """The second of two identical tables is fixed, not the first occurrence"""
+    second = DOCUMENT.rindex(TABLE)
+    fixed_table = TABLE.replace("\\begin{table}", "\\begin{table}[htbp]")
+    result = apply_fixes(DOCUMENT, [_fix(TABLE, fixed_table, second)])
+
+    assert result.latex == DOCUMENT[:second] + fixed_table + DOCUMENT[second + len(TABLE):]
+    assert result.latex.count("[htbp]") == 1 and not result.rolled_back
+
+    # A stale span is re-anchored to the nearest occurrence
+    assert locate_fix(DOCUMENT, _fix(TABLE, fixed_table, second + 3)) == (second, second + len(TABLE))
+    assert locate_fix(DOCUMENT, _fix("missing", "x", 0)) is None
+    print("✅ Span application passed")
+
+
+def test_fixes_of_one_element_are_merged():
+    """Fixes touching different lines of the same table are both applied"""
+    first = DOCUMENT.index(TABLE)
+    placement = _fix(TABLE, TABLE.replace("\\begin{table}\n", "\\begin{table}[htbp]\n"), first, name="placement")
+    centering = _fix(TABLE, TABLE.replace("\\begin{table}\n", "\\begin{table}\n\\centering\n"), first,
+                     confidence=0.8, name="centering")
+    result = apply_fixes(DOCUMENT, [placement, centering])
+    assert result.latex.startswith("\\documentclass{article}\n\\begin{document}\n\\begin{table}[htbp]\n")
+    assert result.latex.count("\\centering") == 1
+    assert [fix.explanation for fix in result.applied] == ["placement", "centering"]
+
+    # The same change twice is applied once; both fixes count as applied
+    again = _fix(TABLE, centering.fixed_code, first, confidence=0.5, name="again")
+    result = apply_fixes(DOCUMENT, [centering, again])
+    assert result.latex.count("\\centering") == 1 and len(result.applied) == 2
+    print("✅ Merging passed")
+
+
+def test_only_conflicting_and_broken_fixes_roll_back():
+    first = DOCUMENT.index(TABLE)
+    second = DOCUMENT.rindex(TABLE)
+    weak = _fix(TABLE, TABLE.replace("{ll}", "{lc}"), first, confidence=0.4, name="weak")
+    strong = _fix(TABLE, TABLE.replace("{ll}", "{|l|l|}"), first, confidence=0.9, name="strong")
+    broken = _fix(TABLE, TABLE.replace("\\end{table}", ""), second, name="broken")
+    other = _fix(TABLE, TABLE.replace("a & b", "A & B"), second, name="other")
+
+    result = apply_fixes(DOCUMENT, [weak, strong, broken, other])
+    assert [fix.explanation for fix in result.applied] == ["strong", "other"]
+    assert {fix.explanation: reason.split(' (')[0] for fix, reason in result.rolled_back} == {
+        "broken": "unbalanced braces or environments", "weak": "overlaps a higher-priority fix"}
+    assert "{|l|l|}" in result.latex and "A & B" in result.latex and "{lc}" not in result.latex
+
+    assert is_well_formed("\\textbf{a}", "\\emph{a}")
+    assert not is_well_formed("\\textbf{a}", "\\textbf{a")
+    assert not is_well_formed("\\begin{center}x\\end{center}", "\\begin{center}x")
+    print("✅ Rollback passed")
+
+
+def test_detector_locations_point_at_current_code():
+    latex = DOCUMENT.replace("text\n", "Name ${ }^{1}{ }^{2}$ text\n")
+    analysis = StyleIssueDetector().analyze_document(latex, "IEEE_two_column")
+    located = [issue for issue in analysis.detected_issues if "start_pos" in (issue.location or {})]
+    assert located
+    for issue in located:
+        assert latex[issue.location["start_pos"]:issue.location["end_pos"]] == issue.current_code
+    print("✅ Detector locations passed")
+
+
+if __name__ == "__main__":
+    test_fix_applies_at_its_span()
+    test_fixes_of_one_element_are_merged()
+    test_only_conflicting_and_broken_fixes_roll_back()
+    test_detector_locations_point_at_current_code()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Test font-metric width measurement: metric file parsing, built-in tables,
+document font detection and the per-font cache
+"""
+
+import struct
+import sys
+sys.path.append('.')
+
+from utils.font_metrics import (
+    PT_PER_CM, document_font, document_metrics, get_metrics, parse_afm, parse_tfm,
+    table_font_size
+)
+
+
+def _tfm(widths):
+    """Minimal TFM file: header (checksum, design size), char_info, widths"""
+    bc, ec = min(widths), max(widths)
+    table = [0] + sorted(set(widths.values()))
+    char_info = [(table.index(widths[code]) if code in widths else 0) for code in range(bc, ec + 1)]
+    lh, nw = 2, len(table)
+    lf = 6 + lh + len(char_info) + nw
+    data = struct.pack('>12H', lf, lh, bc, ec, nw, 1, 1, 0, 0, 0, 0, 0)
+    data += struct.pack('>Ii', 0, 10 << 20)
+    data += b''.join(struct.pack('>4B', index, 0, 0, 0) for index in char_info)
+    data += b''.join(struct.pack('>i', int(width * 2 ** 20)) for width in table)
+    return data
+
+
+def test_parse_metric_files():
+    afm = "StartCharMetrics 3\nC 32 ; WX 250 ; N space ; B 0 0 0 0 ;\nC 65 ; WX 722 ; N A ;\nC -1 ; WX 500 ; N uni ;\n"
+    assert parse_afm(afm) == {32: 0.25, 65: 0.722}
+
+    widths = parse_tfm(_tfm({65: 0.75, 66: 0.708, 68: 0.75}))
+    assert set(widths) == {65, 66, 68}  # 67 is missing from the font
+    assert abs(widths[66] - 0.708) < 1e-6
+    print("✅ AFM/TFM parsing passed")
+
+
+def test_builtin_widths():
+    times = get_metrics('times', 10)
+    assert abs(times.width('A') - 0.722 * 10 / PT_PER_CM) < 1e-9
+    assert times.width('MMMM') > 3 * times.width('iiii')
+    assert times.width('') == 0.0
+    assert times.width('é') > 0  # outside the table: average letter width
+    assert times.longest_word('a Transformer b') == times.width('Transformer')
+
+    # Sizes scale linearly; bold is wider; the same metrics are shared
+    assert abs(get_metrics('times', 20).width('Table') - 2 * times.width('Table')) < 1e-9
+    assert get_metrics('times', 10, bold=True).width('Table') > times.width('Table')
+    assert get_metrics('times', 10) is times
+    assert get_metrics('libertine', 9).source.startswith(('builtin:times', '/'))
+    print("✅ Built-in widths passed")
+
+
+def test_document_font():
+    assert document_font(r"\documentclass[conference]{IEEEtran}\begin{document}") == ('times', 10)
+    assert document_font(r"\documentclass[sigconf]{acmart}") == ('libertine', 9)
+    assert document_font(r"\documentclass[11pt]{article}\usepackage{mathptmx}") == ('times', 11)
+    assert document_font(r"\documentclass{article}\begin{document}\usepackage{times}") == ('cm', 10)
+
+    assert table_font_size(r"\centering\footnotesize\begin{tabular}{ll}") == 'footnotesize'
+    assert table_font_size(r"\begin{tabular}{ll}\small x", 'normalsize') == 'normalsize'
+    assert document_metrics(r"\documentclass[12pt]{article}", 'small').size_pt == 10.95
+    print("✅ Document font detection passed")
+
+
+if __name__ == "__main__":
+    test_parse_metric_files()
+    test_builtin_widths()
+    test_document_font()
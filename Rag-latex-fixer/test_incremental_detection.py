@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test incremental re-analysis: structures derived from the previous version
+match a full build, and only changed regions are checked again
+"""
+
+import sys
+from functools import partial
+sys.path.append('.')
+
+from detectors.registry import PARALLEL_MIN_CHARS, DetectorRegistry, Region, RegionCache
+from detectors import style_detector
+from detectors.style_detector import StyleIssueDetector
+from models import LatexIssue
+from utils.latex_structure import build_structure, diff_hunks, get_structure
+
+SECTION = ("\\section{Part %d}\n"
+           "Text with a note ${ }^{1}{ }^{2}$ here and {braces}.\n"
+           "\\begin{table}\n\\begin{tabular}{llllll}\na & b \\\\\n\\end{tabular}\n\\end{table}\n"
+           "\\begin{figure}[t]\n\\includegraphics[width=1.5\\linewidth]{x}\n\\end{figure}\n")
+DOCUMENT = ("\\documentclass[twocolumn]{article}\n\\title{T}\n\\author{A}\n\\begin{document}\n"
+            + "".join(SECTION % i for i in range(8))
+            + "\\begin{verbatim}\n{ not a brace\n\\end{verbatim}\n\\end{document}\n")
+
+
+def _fields(structure):
+    return (structure.line_starts, structure.braces, [vars(env) for env in structure.environments],
+            {name: [vars(command) for command in found] for name, found in structure.commands.items()})
+
+
+def test_derived_structure_matches_full_build():
+    edits = [
+        DOCUMENT.replace("here and {braces}", "there {and} {more}", 1),
+        DOCUMENT.replace("\\section{Part 3}\n", "\\section{Part 3}\n\\begin{table}[h]\nnew\n\\end{table}\n"),
+        DOCUMENT.replace(SECTION % 5, ""),
+    ]
+    previous = build_structure(DOCUMENT)
+    for edited in edits:
+        derived = previous.updated(edited, diff_hunks(DOCUMENT, edited))
+        assert derived.incremental
+        assert _fields(derived) == _fields(build_structure(edited))
+
+    # Unbalanced edits and edits inside verbatim fall back to a full build
+    for edited in (DOCUMENT.replace("here and {braces}", "here and {braces", 1),
+                   DOCUMENT.replace("{ not a brace", "{ still not a brace")):
+        derived = get_structure(edited, previous=previous)
+        assert not derived.incremental
+        assert _fields(derived) == _fields(build_structure(edited))
+    print("✅ Derived structures passed")
+
+
+def test_reanalysis_checks_only_changed_regions():
+    detector = StyleIssueDetector()
+    detector.analyze_document(DOCUMENT)
+
+    # A new table early on renumbers the later ones and shifts every offset
+    edited = DOCUMENT.replace("\\section{Part 1}\n", "\\section{Part 1}\n\\begin{table}\nx\n\\end{table}\n")
+    analysis = detector.analyze_document(edited)
+    expected = StyleIssueDetector().analyze_document(edited, structure=build_structure(edited))
+
+    assert [issue.model_dump() for issue in analysis.detected_issues] == \
+        [issue.model_dump() for issue in expected.detected_issues]
+    assert analysis.metadata["regions_reused"] > analysis.metadata["regions_checked"] // 2
+    for issue in analysis.detected_issues:
+        location = issue.location or {}
+        if "start_pos" in location:
+            assert edited[location["start_pos"]:location["end_pos"]] == issue.current_code
+    print("✅ Incremental re-analysis passed")
+
+
+def _fresh_cache_analysis(document, structure=None):
+    """Analysis with an empty region cache, so every region is checked (on processes if possible)"""
+    cache = style_detector._region_cache
+    style_detector._region_cache = RegionCache(LatexIssue.moved)
+    style_detector.DetectorRegistry = partial(DetectorRegistry, processes=True)
+    try:
+        return StyleIssueDetector().analyze_document(document, structure=structure)
+    finally:
+        style_detector._region_cache = cache
+        style_detector.DetectorRegistry = DetectorRegistry
+
+
+def _dump(analysis):
+    return [issue.model_dump() for issue in analysis.detected_issues]
+
+
+def test_large_documents_check_regions_on_processes_unless_derived():
+    """Regions of a fresh large document go to the process pool; after an edit they are reused"""
+    repeats = PARALLEL_MIN_CHARS // len(SECTION) + 1
+    document = DOCUMENT.replace(SECTION % 0, "".join(SECTION % i for i in range(repeats)))
+    edited = document.replace("here and {braces}", "there {and} {more}", 1)
+
+    pooled = _fresh_cache_analysis(edited, structure=build_structure(edited))
+    assert pooled.metadata["detector_mode"] in ("process", "thread")  # threads if the sandbox forbids processes
+
+    # Regions checked on their own text report the same issues, in place
+    derived = build_structure(document).updated(edited, diff_hunks(document, edited))
+    assert derived.incremental
+    inline = _fresh_cache_analysis(edited, structure=derived)
+    assert inline.metadata["detector_mode"] == "thread"
+    assert _dump(pooled) == _dump(inline)
+
+    detector = StyleIssueDetector()
+    detector.analyze_document(document)
+    analysis = detector.analyze_document(edited)
+    assert analysis.metadata["detector_mode"] == "thread"
+    assert analysis.metadata["regions_reused"] == analysis.metadata["regions_checked"] - 1
+    assert _dump(analysis) == _dump(pooled)
+    print("✅ Large document detection passed")
+
+
+def test_region_cache_shifts_moved_regions():
+    calls = []
+
+    def words(content, structure, region):
+        calls.append(region.start)
+        text = content[region.start:region.end]
+        return [(region.start + text.index("word"), region.context)] if "word" in text else []
+
+    def lines(content, structure):
+        starts = structure.line_starts
+        return [Region(start, end, context="line")
+                for start, end in zip(starts, starts[1:] + [len(content)]) if start < end]
+
+    cache = RegionCache(shift=lambda issue, offset, _: (issue[0] + offset, issue[1]))
+    registry = DetectorRegistry(issue_key=lambda issue: issue, region_cache=cache)
+    registry.register_regional("words", words, lines)
+
+    first = registry.run("a word\nplain\n")
+    assert first.issues == [(2, "line")] and first.regions_reused == 0
+    calls.clear()
+    second = registry.run("new line\na word\nplain\n")
+    assert second.issues == [(11, "line")]
+    assert calls == [0] and second.regions_reused == 2  # only the new line was checked
+    print("✅ Region cache passed")
+
+
+if __name__ == "__main__":
+    test_derived_structure_matches_full_build()
+    test_reanalysis_checks_only_changed_regions()
+    test_region_cache_shifts_moved_regions()
+    test_large_documents_check_regions_on_processes_unless_derived()
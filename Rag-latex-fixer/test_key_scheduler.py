@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Test the process-wide API key scheduler
+"""
+
+import asyncio
+import tempfile
+from pathlib import Path
+
+from doc_edit.key_scheduler import KeySaturatedError, KeyScheduler
+
+
+def test_least_loaded_and_shared_buckets():
+    """Requests spread over keys; a second scheduler on the same file sees the same budget"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / "keys.sqlite"
+        scheduler = KeyScheduler(["a", "b"], rpm=2, tpm=10000, path=path)
+
+        picked = [scheduler.try_acquire(100)[0] for _ in range(4)]
+        assert sorted(picked) == ["a", "a", "b", "b"]
+
+        # Another worker process shares the exhausted buckets
+        other = KeyScheduler(["a", "b"], rpm=2, tpm=10000, path=path)
+        key, wait = other.try_acquire(100)
+        assert key is None and 0 < wait <= 30
+
+        usage = scheduler.utilization()
+        assert usage["...a"]["rpm_utilization"] > 0.9
+        assert usage["...a"]["in_flight"] == 2
+    print("✅ Least-loaded selection and shared buckets passed")
+
+
+def test_release_rate_limit_and_queueing():
+    """429s cool a key down; saturated schedulers queue, then give up after max_wait"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        scheduler = KeyScheduler(["a", "b"], rpm=60, tpm=1000, path=Path(temp_dir) / "keys.sqlite")
+
+        key, _ = scheduler.try_acquire(900)
+        scheduler.release(key, tokens_used=100, tokens_reserved=900)
+        assert scheduler.utilization()[f"...{key}"]["tpm_utilization"] < 0.2
+
+        scheduler.release(key, rate_limited=True, cooldown=60)
+        for _ in range(5):
+            assert scheduler.try_acquire(10)[0] != key
+        scheduler.reset_cooldowns()
+        assert scheduler.utilization()[f"...{key}"]["cooling_for"] == 0
+
+        # Token budget exhausted on both keys: the request waits, then times out
+        tokens = KeyScheduler(["a", "b"], rpm=60, tpm=1000, path=Path(temp_dir) / "tokens.sqlite")
+        assert tokens.try_acquire(1000)[0] is not None
+        assert tokens.try_acquire(1000)[0] is not None
+        try:
+            asyncio.run(tokens.acquire(1000, max_wait=0.2))
+            assert False, "expected KeySaturatedError"
+        except KeySaturatedError:
+            pass
+
+        # A small request queues briefly until the request bucket refills
+        small = KeyScheduler(["c"], rpm=600, tpm=10**6, path=Path(temp_dir) / "small.sqlite")
+        for _ in range(600):
+            small.try_acquire(1)
+        assert asyncio.run(small.acquire(1, max_wait=1.0)) == "c"
+    print("✅ Rate-limit cool-down and queueing passed")
+
+
+if __name__ == "__main__":
+    test_least_loaded_and_shared_buckets()
+    test_release_rate_limit_and_queueing()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test multi-file projects and chunked processing: flattening, writing edits
+back to their files, and chunk issues matching whole-document issues
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+sys.path.append('.')
+
+from detectors.style_detector import DOCUMENT_CHECKS, REGIONAL_CHECKS, StyleIssueDetector
+from utils.latex_project import load_project, split_chunks
+from utils.latex_structure import build_structure
+
+MAIN = ("\\documentclass[twocolumn]{article}\n\\begin{document}\n\\section{Intro}\nIntro.\n"
+        "\\input{chapters/one}\n% \\input{chapters/commented}\n\\include{chapters/two}\n"
+        "\\input{missing}\n\\end{document}\n")
+ONE = "\\section{One}\nFirst ${ }^{1}$.\n\\input{chapters/two}\n"  # two is included again later
+TWO = "\\section{Two}\n\\begin{table}\n\\begin{tabular}{ll}\na & b\n\\end{tabular}\n\\end{table}\n"
+
+SECTION = ("\\section{Part %d}\n"
+           "Text with a note ${ }^{1}{ }^{2}$ here.\n"
+           "\\begin{table}\n\\begin{tabular}{llllll}\na & b \\\\\n\\end{tabular}\n\\end{table}\n"
+           "\\begin{figure}[t]\n\\section{Inside a float}\n\\includegraphics[width=1.5\\linewidth]{x}\n"
+           "\\end{figure}\n")
+DOCUMENT = ("\\documentclass[twocolumn]{article}\n\\title{T}\n\\author{A}\n\\begin{document}\n"
+            + "".join(SECTION % i for i in range(40)) + "\\end{document}\n")
+
+
+def _project(root: Path):
+    (root / "chapters").mkdir()
+    (root / "main.tex").write_text(MAIN, encoding='utf-8')
+    (root / "chapters" / "one.tex").write_text(ONE, encoding='utf-8')
+    (root / "chapters" / "two.tex").write_text(TWO, encoding='utf-8')
+    return load_project(root / "main.tex")
+
+
+def test_project_flattens_and_maps_edits_back():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        project = _project(Path(temp_dir))
+        assert list(project.files) == ["main.tex", "chapters/one.tex", "chapters/two.tex"]
+
+        flattened = project.flatten()
+        latex = flattened.latex
+        assert latex.count("\\section{Two}") == 1  # inlined where first included
+        assert "\\input{missing}" in latex and "\\input{chapters/commented}" in latex
+        for segment in flattened.segments:
+            content = flattened.files[segment.file]
+            assert latex[segment.start:segment.end] == \
+                content[segment.file_start:segment.file_start + segment.end - segment.start]
+
+        # Edits of the flattened text land in the file they fall in
+        table = latex.index("\\begin{table}")
+        intro = latex.index("Intro.")
+        fixed = latex[:intro] + "Introduction.\n" + latex[intro + 7:table] \
+            + "\\begin{table}[htbp]\n\\centering" + latex[table + len("\\begin{table}"):]
+        files, skipped = flattened.files_of(fixed)
+        assert skipped == []
+        assert files["chapters/two.tex"] == TWO.replace("\\begin{table}", "\\begin{table}[htbp]\n\\centering")
+        assert files["main.tex"] == MAIN.replace("Intro.", "Introduction.")
+        assert files["chapters/one.tex"] == ONE
+
+        # An edit across a file boundary is not applied anywhere
+        boundary = flattened.segments[1].start
+        files, skipped = flattened.unflatten([(boundary - 1, boundary + 1, "")])
+        assert files == flattened.files and len(skipped) == 1
+    print("✅ Project flattening passed")
+
+
+def test_chunks_cut_at_sections_outside_environments():
+    structure = build_structure(DOCUMENT)
+    chunks = split_chunks(DOCUMENT, 2000, structure=structure)
+    assert len(chunks) > 3
+    assert chunks[0].start == 0 and chunks[-1].end == len(DOCUMENT)
+    for chunk, following in zip(chunks, chunks[1:]):
+        assert chunk.end == following.start
+        assert DOCUMENT.startswith("\\section{Part", following.start)
+
+    for chunk in chunks:
+        context = chunk.context(DOCUMENT)
+        assert context.startswith("\\documentclass[twocolumn]") and context.endswith("\\end{document}\n")
+        assert build_structure(context).document is not None
+        own = context[chunk.context_start:chunk.end - chunk.offset]
+        assert own == DOCUMENT[chunk.start:chunk.end]
+    print("✅ Chunk splitting passed")
+
+
+def _chunked_issues(document, max_chars):
+    """Document-wide checks on the whole text, regional ones per chunk (as the pipeline does)"""
+    structure = build_structure(document)
+    issues = StyleIssueDetector().analyze_document(document, structure=structure,
+                                                   checks=DOCUMENT_CHECKS).detected_issues
+    for chunk in split_chunks(document, max_chars, structure=structure):
+        context = chunk.context(document)
+        context_structure = build_structure(context)
+        analysis = StyleIssueDetector().analyze_document(context, structure=context_structure,
+                                                         checks=REGIONAL_CHECKS,
+                                                         float_offsets=chunk.float_offsets(structure))
+        issues += chunk.own_issues(analysis.detected_issues, context_structure)
+    return issues
+
+
+def _issues(found):
+    return sorted((issue.type, issue.element, issue.description, str(issue.location),
+                   issue.current_code) for issue in found)
+
+
+def test_chunk_issues_match_whole_document():
+    whole = StyleIssueDetector().analyze_document(DOCUMENT, structure=build_structure(DOCUMENT))
+    issues = _chunked_issues(DOCUMENT, 2000)
+
+    # Same issues, floats numbered across the whole document
+    assert _issues(issues) == _issues(whole.detected_issues)
+    assert any(issue.element == "table_40" for issue in issues)
+    for issue in issues:
+        location = issue.location or {}
+        if "start_pos" in location:
+            assert DOCUMENT[location["start_pos"]:location["end_pos"]] == issue.current_code
+    print("✅ Chunk issues passed")
+
+
+def test_document_wide_checks_see_every_chunk():
+    """Tabs in one section, spaces in another: only the whole text shows the mix"""
+    document = DOCUMENT.replace("Text with a note", "\tText with a note", 1)
+    document = document.replace("\\section{Part 39}\n", "\\section{Part 39}\n  Indented.\n")
+    whole = StyleIssueDetector().analyze_document(document, structure=build_structure(document))
+    issues = _chunked_issues(document, 2000)
+
+    mixed = [issue for issue in issues if issue.description.startswith("Inconsistent indentation")]
+    assert len(mixed) == 1
+    assert _issues(issues) == _issues(whole.detected_issues)
+    print("✅ Document-wide checks passed")
+
+
+if __name__ == "__main__":
+    test_project_flattens_and_maps_edits_back()
+    test_chunks_cut_at_sections_outside_environments()
+    test_chunk_issues_match_whole_document()
+    test_document_wide_checks_see_every_chunk()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test the linear brace/environment matcher, including fuzz and
+adversarial-input timing checks
+"""
+
+import random
+import sys
+import time
+sys.path.append('.')
+
+from utils.latex_parser import LatexParser
+from utils.latex_scanner import (
+    balanced_argument, brace_map, command_arguments, environment_spans,
+    match_environments, replace_environments
+)
+
+# Whole-document scans must stay well clear of the multi-second stalls the
+# old regexes hit on these inputs
+TIME_LIMIT = 2.0
+
+
+def test_environment_pairs_and_nesting():
+    """\\begin/\\end pairs nest, unclosed environments are dropped"""
+    text = r"\begin{table}[h]\begin{tabular}{ll}a\end{tabular}\end{table}\begin{figure}x"
+    envs = match_environments(text)
+
+    assert [env.name for env in envs] == ['table', 'tabular']
+    table, tabular = envs
+    assert text[table.start:table.end].startswith(r'\begin{table}')
+    assert text[table.start:table.end].endswith(r'\end{table}')
+    assert text[tabular.body_start:tabular.body_end] == '{ll}a'
+    assert tabular.parent == 0 and tabular.depth == 1
+
+    # A stray \end and an \end that skips an unclosed inner environment
+    envs = match_environments(r"\end{table}\begin{table}\begin{center}x\end{table}")
+    assert [env.name for env in envs] == ['table']
+    print("✅ Environment pairing passed")
+
+
+def test_comments_escapes_and_verbatim():
+    """Commented, escaped and verbatim braces and tags never match"""
+    text = "\\begin{center}% \\end{center} {\n\\{ \\verb|}| \\\\{x}\\begin{verbatim}\\end{center}}\\end{verbatim}\\end{center}"
+    envs = match_environments(text)
+    assert [env.name for env in envs] == ['center', 'verbatim']
+    assert text[envs[0].end - len(r'\end{center}'):envs[0].end] == r'\end{center}'
+    assert envs[0].end == len(text)
+
+    braces = brace_map(text)
+    assert len(braces) == 1
+    open_pos, close_pos = next(iter(braces.items()))
+    assert text[open_pos:close_pos + 1] == '{x}'
+    print("✅ Comments, escapes and verbatim passed")
+
+
+def test_balanced_arguments():
+    text = r"\author {A {B} \and {C}} \title{unclosed {x}"
+    author = command_arguments(text, 'author')
+    assert len(author) == 1
+    start, arg_start, arg_end = author[0]
+    assert text[arg_start:arg_end] == r'A {B} \and {C}'
+    assert command_arguments(text, 'title') == []
+    assert balanced_argument(text, text.index('{x}')) == (text.index('{x}') + 1, text.index('{x}') + 2)
+    assert balanced_argument(text, 0) is None
+    print("✅ Balanced arguments passed")
+
+
+def test_replace_environments():
+    text = r"a\begin{table}1\begin{table}2\end{table}\end{table}b\begin{table*}3\end{table*}c\begin{table}"
+    assert [text[s.start:s.end] for s in environment_spans(text, ('table', 'table*'))] == [
+        r"\begin{table}1\begin{table}2\end{table}\end{table}", r"\begin{table*}3\end{table*}"]
+    assert replace_environments(text, ('table', 'table*'), lambda t: '[T]') == r"a[T]b[T]c\begin{table}"
+    print("✅ Environment replacement passed")
+
+
+def _reference(pieces):
+    """Brace and environment pairs computed directly from generator pieces"""
+    braces, envs = {}, []
+    brace_stack, env_stack = [], []
+    pos = 0
+    for piece in pieces:
+        if piece == '{':
+            brace_stack.append(pos)
+        elif piece == '}' and brace_stack:
+            braces[brace_stack.pop()] = pos
+        elif piece.startswith('\\begin'):
+            env_stack.append((piece[7:-1], pos))
+        elif piece.startswith('\\end'):
+            name = piece[5:-1]
+            for depth in range(len(env_stack) - 1, -1, -1):
+                if env_stack[depth][0] == name:
+                    envs.append((name, env_stack[depth][1], pos + len(piece)))
+                    del env_stack[depth:]
+                    break
+        pos += len(piece)
+    return braces, sorted(envs, key=lambda env: env[1])
+
+
+def test_fuzz_against_reference():
+    """Random tag/brace soup matches a straightforward stack reference"""
+    alphabet = ['{', '}', 'a', ' ', '\n', '\\\\', '\\begin{table}', '\\end{table}',
+                '\\begin{tabular}', '\\end{tabular}', '\\begin{table*}', '\\end{table*}']
+    rng = random.Random(1234)
+    for _ in range(500):
+        pieces = [rng.choice(alphabet) for _ in range(rng.randint(0, 60))]
+        text = ''.join(pieces)
+        braces, envs = _reference(pieces)
+
+        assert brace_map(text) == braces, text
+        assert [(env.name, env.start, env.end) for env in match_environments(text)] == envs, text
+    print("✅ Fuzz against reference passed")
+
+
+def _assert_fast(label, func, *args):
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    assert elapsed < TIME_LIMIT, f"{label} took {elapsed:.2f}s"
+    return elapsed
+
+
+def test_adversarial_inputs_are_linear():
+    """Malformed conversion output with unclosed structures scans quickly"""
+    parser = LatexParser()
+    cases = {
+        "unclosed tables": "\\begin{table}\nx & y \\\\\n" * 20000,
+        "unclosed braces": "\\author{" + "{a" * 50000,
+        "unclosed tags": "\\begin{" * 30000,
+        "unclosed options": "\\begin{table}[" * 20000,
+        "deep nesting": "\\begin{center}" * 20000 + "\\end{center}" * 20000,
+        "brace storm": "{}" * 50000 + "}" * 50000,
+    }
+    for label, text in cases.items():
+        _assert_fast(label + " (environments)", match_environments, text)
+        _assert_fast(label + " (tables)", parser.extract_tables, text)
+        _assert_fast(label + " (author)", parser.extract_element, text, "author")
+        _assert_fast(label + " (rewrite)", replace_environments, text, ('table', 'table*'), str.upper)
+    print("✅ Adversarial inputs passed")
+
+
+if __name__ == "__main__":
+    test_environment_pairs_and_nesting()
+    test_comments_escapes_and_verbatim()
+    test_balanced_arguments()
+    test_replace_environments()
+    test_fuzz_against_reference()
+    test_adversarial_inputs_are_linear()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test the single-pass LaTeX structure index
+"""
+
+import sys
+sys.path.append('.')
+
+from utils.latex_structure import build_structure, get_structure
+
+DOC = r"""\documentclass[10pt,twocolumn]{article}
+\usepackage{graphicx}
+\begin{document}
+\section{Intro}
+% \begin{table} commented out \end{table}
+\begin{table}[htbp]
+\centering
+\begin{tabular}{lc}
+a & b \\ 50\% \\
+\end{tabular}
+\end{table}
+\begin{verbatim}
+\begin{figure} not real
+\end{verbatim}
+\section*{More}
+\begin{table*}
+x
+\end{table*}
+\end{document}
+"""
+
+
+def test_environments_nesting_and_lines():
+    """Environments carry nesting, options and 1-based line numbers"""
+    s = build_structure(DOC)
+
+    tables = s.environments_named('table')
+    assert len(tables) == 1, "commented-out tables must be skipped"
+    table = tables[0]
+    assert table.options == 'htbp'
+    assert (table.start_line, table.end_line) == (6, 11)
+    assert s.environments[table.parent].name == 'document'
+
+    tabular = s.environments_named('tabular')[0]
+    assert s.environments[tabular.parent] is table
+    assert tabular.depth == table.depth + 1
+
+    assert not s.environments_named('figure'), "verbatim content must not be tokenized"
+    assert s.environments_named('table*')[0].options is None
+    print("✅ Environment index passed")
+
+
+def test_commands_lines_and_split():
+    """Commands, offset->line lookups and preamble/body split"""
+    s = build_structure(DOC)
+
+    assert s.count('section') == 1 and s.count('section*') == 1
+    assert s.command('usepackage').line == 2
+    assert s.line_of(0) == 1
+    assert s.line_of(DOC.index(r'\section*')) == 15
+    assert s.find_line(r'\centering') == 7
+    assert s.find_line('missing text') == 1
+    assert s.preamble.startswith(r'\documentclass') and r'\begin{document}' not in s.preamble
+    assert s.body.strip().endswith(r'\end{table*}')
+    assert s.lines(6, 7) == "\\begin{table}[htbp]\n\\centering"
+    print("✅ Commands and line table passed")
+
+
+def test_unclosed_environment_and_cache():
+    """Unclosed environments are dropped and structures are shared"""
+    s = build_structure(r"\begin{itemize}\begin{center}x\end{center}")
+    assert [env.name for env in s.environments] == ['center']
+    assert s.environments[0].parent is None and s.environments[0].depth == 0
+
+    assert get_structure(DOC) is get_structure(DOC)
+    print("✅ Unclosed environments and cache passed")
+
+
+if __name__ == "__main__":
+    test_environments_nesting_and_lines()
+    test_commands_lines_and_split()
+    test_unclosed_environment_and_cache()
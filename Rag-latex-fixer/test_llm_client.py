@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Test the shared async LLM client (no network: models are replaced by fakes)
+"""
+
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from google.api_core import exceptions as google_exceptions
+
+from doc_edit import llm_client
+from doc_edit.key_scheduler import KeyScheduler
+from doc_edit.llm_client import AsyncLLMClient, LLMError
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+    async def _chunks(self):
+        for part in self.text.split():
+            yield FakeResponse(part)
+
+    def __aiter__(self):
+        return self._chunks()
+
+
+class FakeModel:
+    """Rate limits key 'k1', rejects 'blocked' prompts, otherwise echoes"""
+    active = 0
+    peak = 0
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    async def generate_content_async(self, prompt, stream=False, request_options=None):
+        if self.api_key == "k1":
+            raise google_exceptions.ResourceExhausted("quota exceeded")
+        if prompt == "blocked":
+            raise ValueError("response blocked")
+        FakeModel.active += 1
+        FakeModel.peak = max(FakeModel.peak, FakeModel.active)
+        await asyncio.sleep(0.05)
+        FakeModel.active -= 1
+        return FakeResponse(f"{self.api_key} {prompt}")
+
+
+def _client(**kwargs):
+    llm_client._KeyState.model = lambda state, *args: FakeModel(state.api_key)
+    llm_client._key_states.clear()
+    state_path = Path(tempfile.mkdtemp()) / "keys.sqlite"
+    return AsyncLLMClient(["k1", "k2"], scheduler=KeyScheduler(["k1", "k2"], path=state_path), **kwargs)
+
+
+def test_rate_limit_rotates_key():
+    """A 429 on one key moves the request to another key and cools the first"""
+    client = _client()
+    assert client.generate_many(["a", "b", "c"]) == ["k2 a", "k2 b", "k2 c"]
+    stats = client.get_stats()
+    assert stats["...k1"]["rate_limited"] == 1
+    assert stats["...k1"]["cooling_for"] > 0
+    assert stats["...k2"]["requests"] == 3
+    print("✅ Rate-limited key rotation passed")
+
+
+def test_non_retryable_error_raises():
+    """Errors that are not 429/5xx/timeouts fail fast"""
+    client = _client()
+    started = time.perf_counter()
+    try:
+        client.generate_sync("blocked")
+        assert False, "expected LLMError"
+    except LLMError as e:
+        assert "blocked" in str(e)
+    assert time.perf_counter() - started < 1.0
+    print("✅ Non-retryable error passed")
+
+
+def test_concurrency_limit_and_streaming():
+    """Independent calls overlap up to the per-key limit; streams yield chunks"""
+    client = _client(max_concurrency_per_key=2)
+    FakeModel.peak = 0
+    results = client.generate_many([f"p{i}" for i in range(6)])
+    assert results == [f"k2 p{i}" for i in range(6)]
+    assert FakeModel.peak == 2
+
+    assert list(client.stream_sync("one two three")) == ["k2", "one", "two", "three"]
+
+    async def collect():
+        return [chunk async for chunk in client.stream("four five")]
+    assert asyncio.run(collect()) == ["k2", "four", "five"]
+    print("✅ Concurrency limit and streaming passed")
+
+
+class FakeService:
+    """Records requests; answers with one response, or streams one per word"""
+
+    def __init__(self):
+        self.requests = []
+
+    @staticmethod
+    def _response(text):
+        return glm.GenerateContentResponse(
+            candidates=[glm.Candidate(content=glm.Content(parts=[glm.Part(text=text)]))],
+            usage_metadata={"total_token_count": 7})
+
+    async def generate_content(self, request, **options):
+        self.requests.append((request, options))
+        return self._response("echo " + request.contents[0].parts[0].text)
+
+    async def stream_generate_content(self, request, **options):
+        self.requests.append((request, options))
+
+        async def chunks():
+            for word in request.contents[0].parts[0].text.split():
+                yield self._response(word)
+        return chunks()
+
+
+def test_key_model_uses_the_key_service():
+    service = FakeService()
+    config = genai.types.GenerationConfig(max_output_tokens=64, temperature=0.1)
+    model = llm_client._KeyModel(service, "gemini-2.5-flash", config, "Be brief")
+
+    async def run():
+        response = await model.generate_content_async("hello", request_options={"timeout": 5})
+        stream = await model.generate_content_async("one two", stream=True)
+        return response, [chunk.text async for chunk in stream]
+    response, chunks = asyncio.run(run())
+
+    assert response.text == "echo hello" and llm_client._usage(response) == 7
+    assert chunks == ["one", "two"]
+    request, options = service.requests[0]
+    assert options == {"timeout": 5}
+    assert request.model == "models/gemini-2.5-flash" and request.contents[0].role == "user"
+    assert request.generation_config.max_output_tokens == 64
+    assert request.system_instruction.parts[0].text == "Be brief"
+    print("✅ Per-key model passed")
+
+
+if __name__ == "__main__":
+    test_rate_limit_rotates_key()
+    test_non_retryable_error_raises()
+    test_concurrency_limit_and_streaming()
+    test_key_model_uses_the_key_service()
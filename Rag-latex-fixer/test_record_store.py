@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Test knowledge base corpus ingestion and the columnar record store
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+sys.path.append('.')
+
+from rag.corpus_ingestion import CorpusIngestor
+from rag.record_store import RecordStore
+
+KB_DIR = Path(__file__).parent / "knowledge_base"
+
+
+def test_ingestion_covers_all_corpora():
+    """Every knowledge base corpus should contribute records"""
+    records = CorpusIngestor(KB_DIR).ingest()
+    types = {r["type"] for r in records}
+
+    for expected in ["template", "fix", "pattern", "scenario", "package",
+                     "error_pattern", "formatting_rule"]:
+        assert expected in types, f"no records ingested for {expected}"
+    print(f"✅ Ingested {len(records)} records of types {sorted(types)}")
+
+
+def test_record_store_round_trip():
+    """Columns survive save/load and payloads are read lazily"""
+    records = [
+        {"type": "template", "format": "IEEE_two_column", "element": "table",
+         "category": "IEEE_two_column", "name": "table_spanning",
+         "description": "spanning table", "code": "\\begin{table*}\\end{table*}"},
+        {"type": "fix", "format": "generic", "element": "figure",
+         "category": "placement_fixes", "name": "add_figure_placement",
+         "description": "Add [htbp] – placement", "code": "\\begin{figure}[htbp]"},
+    ]
+    store = RecordStore.from_records(records)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store.save(Path(temp_dir))
+        loaded = RecordStore.load(Path(temp_dir))
+
+        assert len(loaded) == 2
+        assert loaded._payload is None
+        assert loaded.metadata(1)["description"] == "Add [htbp] – placement"
+        assert loaded.code(0) == records[0]["code"]
+        assert loaded.code(1) == records[1]["code"]
+        assert list(loaded.mask({"element": "figure"})) == [False, True]
+        assert list(loaded.mask({"type": "template", "format": "IEEE_two_column"})) == [True, False]
+        assert not loaded.mask({"format": "ACM"}).any()
+    print("✅ Record store round trip passed")
+
+
+if __name__ == "__main__":
+    test_ingestion_covers_all_corpora()
+    test_record_store_round_trip()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test the rule-based fix engine and the processor's fix rule sets
+"""
+
+import re
+import sys
+sys.path.append('.')
+
+from utils.fix_rules import (
+    ACM_TABLE_POSITION_2COL_RULES, AUTHOR_NAME_SPACING_RULES, AUTHOR_SUPERSCRIPT_RULES,
+    IEEE_AUTHOR_BLOCK_RULES, IEEE_TABLE_STAR_RULES, IMAGE_POSITION_RULES, IMAGE_SIZE_RULES,
+    table_placement_rules
+)
+from utils.rule_engine import FixRule, RuleReport, RuleSet, _literal_prefix, apply_rules
+
+
+def test_single_scan_matches_sub_chain():
+    """One scan gives what the chain of re.sub calls gave, and counts each rule"""
+    text = (r"\begin{figure}[h]\includegraphics{a.png}\end{figure}"
+            r"\begin{figure*}\includegraphics[width=\textwidth]{b}\end{figure*}")
+    expected = text
+    for rule in IMAGE_POSITION_RULES.rules + IMAGE_SIZE_RULES.rules:
+        expected = re.sub(rule.pattern, rule.replacement, expected)
+
+    fixed, report = apply_rules(text, IMAGE_POSITION_RULES, IMAGE_SIZE_RULES)
+    assert fixed == expected
+    assert report.scans == 2
+    assert report.fired == {'figure_position': 1, 'figure_star_add_position': 1,
+                            'image_width_cap': 1, 'image_default_width': 1}
+    print("✅ Single scan passed")
+
+
+def test_priority_and_conflicts():
+    """The first declared rule wins where several match; the others are reported"""
+    rules = RuleSet('demo', [
+        FixRule('long', r'abc', 'X'),
+        FixRule('short', r'ab', 'Y'),
+        FixRule('digits', r'\d+', lambda match: str(int(match.group()) * 2)),
+    ])
+    report = RuleReport()
+    assert rules.apply('ab abc 21', report) == 'Y X 42'
+    assert report.fired == {'short': 1, 'long': 1, 'digits': 1}
+    assert report.conflicts == [('long', 'short', 3)]
+    assert report.count('long', 'short') == 2
+
+    # Rewrites never overlap and the result is not rescanned
+    assert RuleSet('swap', [FixRule('a', 'a', 'b'), FixRule('b', 'b', 'a')]).apply('aabb') == 'bbaa'
+
+    try:
+        RuleSet('dup', [FixRule('x', 'a', 'b'), FixRule('x', 'c', 'd')])
+        assert False, "duplicate names should be rejected"
+    except ValueError:
+        pass
+    print("✅ Priority and conflicts passed")
+
+
+def test_flags_and_shared_prefix():
+    """Flags stay scoped to their rule; shared literal prefixes are factored out"""
+    assert [char for _, char in _literal_prefix(r'\\begin\{x\}(\[h\])?')] == list('\\begin{x}')
+    assert _literal_prefix(r'ab|cd') == []
+    assert [char for _, char in _literal_prefix(r'abc*')] == ['a', 'b']
+
+    rules = RuleSet('flags', [
+        FixRule('upper', r'\\Foo', 'F', flags=re.IGNORECASE),
+        FixRule('line', r'\\bar$', 'B', flags=re.MULTILINE),
+        FixRule('plain', r'\\baz', 'Z'),
+    ])
+    assert rules.apply('\\foo \\bar\n\\BAZ \\baz') == 'F B\n\\BAZ Z'
+
+    shared = RuleSet('shared', [FixRule('x', r'\\begin\{x\}', 'X'), FixRule('y', r'\\begin\{y\}', 'Y')])
+    assert shared._scanner((0, 1)).pattern.startswith(re.escape('\\begin{'))
+    assert shared.apply(r'\begin{x}\begin{y}\begin{z}') == r'XY\begin{z}'
+    print("✅ Flags and shared prefix passed")
+
+
+def test_guards():
+    """Guards are evaluated on the document before the scan"""
+    text = "\\usepackage{caption}\n\\begin{table}[h]x\\end{table}"
+    fixed, report = apply_rules(text, IEEE_TABLE_STAR_RULES)
+    assert fixed == "\\usepackage{caption}\n\\usepackage{stfloats}\n\\begin{table*}[!tb]x\\end{table*}"
+    assert apply_rules(fixed, IEEE_TABLE_STAR_RULES)[0].count('stfloats') == 1
+
+    # ACM: once a table* exists, plain tables keep their placement
+    assert apply_rules(r"\begin{table}[h]", ACM_TABLE_POSITION_2COL_RULES)[0] == r"\begin{table}[!t]"
+    mixed = r"\begin{table}[h]\begin{table*}"
+    assert apply_rules(mixed, ACM_TABLE_POSITION_2COL_RULES)[0] == r"\begin{table}[h]\begin{table*}[!t]"
+
+    # No guard passes: no scan at all
+    rules = table_placement_rules("IEEE", "1-column")
+    settled = "\\setcounter{topnumber}{2}\\topfraction\\begin{document}"
+    assert apply_rules(settled, rules) == (settled, RuleReport())
+    print("✅ Guards passed")
+
+
+def test_author_stages():
+    """Superscripts are cleaned before names are attached and the block is wrapped"""
+    text = r"\author{Jane  Doe and   John Roe} Jane ${ }^{1}{ }^{*}$ and John ${ }^{2}$ Roe $ { }^{3}$"
+    fixed, report = apply_rules(text, AUTHOR_SUPERSCRIPT_RULES, AUTHOR_NAME_SPACING_RULES,
+                                IEEE_AUTHOR_BLOCK_RULES)
+    assert fixed == r"\author{\IEEEauthorblockN{Jane Doe and John Roe}} Jane $^{1,*}$ and John $^{2}$ Roe$^{3}$"
+    assert report.scans == 3 and report.count('attach_superscript') == 1
+    print("✅ Author stages passed")
+
+
+if __name__ == "__main__":
+    test_single_scan_matches_sub_chain()
+    test_priority_and_conflicts()
+    test_flags_and_shared_prefix()
+    test_guards()
+    test_author_stages()
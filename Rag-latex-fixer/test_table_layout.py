@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test the table-layout module: cell parsing and the column-width solvers
+"""
+
+import sys
+import time
+sys.path.append('.')
+
+import numpy as np
+
+from utils.font_metrics import get_metrics
+from utils.table_layout import (
+    TableGrid, clean_cell, column_spec, content_lengths, content_weights,
+    fit_to_page, measured_column_widths, solve_column_widths, tabular_rows,
+    text_aware_widths
+)
+
+TABLE = r"""\begin{tabular}{|l|c|c|}
+\hline
+Model & \multicolumn{2}{|c|}{Glucose Error} \\
+\hline
+Name & MAE & RMSE \\
+\hline
+\textbf{Transformer} & 10.5 & 14.2 \\
+Linear & \multirow{2}{*}{12.0} & 16.8 \\
+\end{tabular}"""
+
+
+def test_parse_and_clean():
+    """Rows are split once; cells are cleaned and sized"""
+    assert clean_cell(r" \textbf{Raw} \emph{CGM} $x$ ") == "Raw CGM x"
+    assert clean_cell("a  {b}\n| c") == "a b c"
+
+    grid = TableGrid.parse(TABLE)
+    assert [row.cells for row in grid.rows[1:]] == [
+        ['Name', 'MAE', 'RMSE'], ['Transformer', '10.5', '14.2'], ['Linear', '12.0', '16.8']]
+    assert grid.rows[0].multicolumns == [(2, 'Glucose Error', 1)]
+    assert grid.rows[3].mentions_multirow
+    assert grid.rows[1].sizes == [(4, 1), (3, 1), (4, 1)]
+
+    chars, words = grid.matrices(4, [1, 2])
+    assert chars.shape == (2, 4) and chars[1, 0] == 11 and chars[0, 3] == 0
+    print("✅ Parse and clean passed")
+
+
+def test_content_lengths_and_spec():
+    """Headers count 2.5x and multicolumn sub-columns are balanced and padded"""
+    lengths, groups = content_lengths(TableGrid.parse(TABLE), 3)
+    assert lengths.tolist() == [27, 12, 12]
+    assert groups == {1: {'span': 2, 'header': 'Glucose Error', 'sub_cols': [1, 2]}}
+
+    widths = solve_column_widths(content_weights(lengths), 3, 13.2, 0.8, 6.0, False, False)
+    assert column_spec(widths) == '|p{6.0cm}|p{3.2cm}|p{3.2cm}|'
+
+    # No content: pattern-based layout
+    widths = solve_column_widths(None, 3, 13.2, 0.8, 6.0, True, False)
+    assert column_spec(widths) == '|p{3.5cm}|p{6.0cm}|p{3.5cm}|'
+    print("✅ Content lengths and column spec passed")
+
+
+def test_text_aware_and_fitting():
+    widths = text_aware_widths(TableGrid.parse(TABLE), 3)
+    assert np.all((widths >= 1.0) & (widths <= 5.0))
+    assert widths[0] == max(widths)
+
+    # Fits: widened to 90% of the usable width
+    fitted, shift = fit_to_page(np.array([1.0, 1.0, 1.0]), 10.8, 3)
+    assert shift == 0.0 and abs(fitted.sum() - 0.9 * (10.8 - 0.8)) < 1e-9
+
+    # Oversized: shifted left by at most 2.5cm, then scaled selectively
+    fitted, shift = fit_to_page(np.array([5.0, 5.0, 5.0]), 10.8, 3)
+    assert shift == 2.5 and abs(fitted.sum() - 12.5) < 1e-9
+    print("✅ Text-aware widths and page fitting passed")
+
+
+def test_measured_widths():
+    """Measured layouts use natural widths when they fit, wrap otherwise"""
+    metrics = get_metrics('times', 9)
+    table = r"""\begin{table}\begin{tabular}[t]{lll}
+Name & Value & Description of the column content that needs wrapping \\
+\hline
+\multicolumn{2}{c}{A fairly long group header} & x \\
+\end{tabular}\end{table}"""
+    rows = tabular_rows(table)
+    assert rows.startswith('\nName & Value')
+    grid = TableGrid.parse(rows, metrics)
+    assert measured_column_widths(TableGrid.parse(rows), 3, 10.0) is None
+
+    wide = measured_column_widths(grid, 3, 20.0)
+    description = metrics.width('Description of the column content that needs wrapping')
+    assert wide[2] >= description and wide[2] - description < 0.1
+    # The group header fits across the two columns it spans
+    assert wide[0] + wide[1] >= metrics.width('A fairly long group header')
+
+    narrow = measured_column_widths(grid, 3, 6.0)
+    assert narrow.sum() <= 6.0
+    assert narrow[2] >= metrics.width('Description') and narrow[2] < wide[2]
+    print("✅ Measured widths passed")
+
+
+def test_large_table_is_fast():
+    """A 300-row results table solves well under a second"""
+    rows = '\n'.join(' & '.join(f'\\textbf{{{r * c}}} value {c}' for c in range(12)) + r' \\ \hline'
+                     for r in range(300))
+    table = '\\begin{tabular}{' + 'l' * 12 + '}\n' + rows + '\n\\end{tabular}'
+
+    start = time.perf_counter()
+    grid = TableGrid.parse(table)
+    lengths, _ = content_lengths(grid, 12)
+    solve_column_widths(content_weights(lengths), 12, 11.4, 0.8, 6.0, False, True)
+    text_aware_widths(grid, 12)
+    assert time.perf_counter() - start < 1.0
+    print("✅ Large table passed")
+
+
+if __name__ == "__main__":
+    test_parse_and_clean()
+    test_content_lengths_and_spec()
+    test_text_aware_and_fitting()
+    test_measured_widths()
+    test_large_table_is_fast()
@@ -11,16 +11,42 @@ import argparse
 import numpy as np
 import subprocess
 import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dataclasses import dataclass
-from typing import List, Dict, Optional, Tuple
+from functools import partial
+from typing import List, Dict, Optional, Sequence, Tuple
 
 # Import our existing components
 sys.path.append('.')
 sys.path.append('./src')
 from enhanced_user_guided_rag import ContextAwareRAGFixer, DocumentContext
+from config import settings
 from detect_conversion_issues import DocumentFormatDetector
-from detectors.style_detector import StyleIssueDetector
+from detectors.style_detector import ALL_CHECKS, DOCUMENT_CHECKS, REGIONAL_CHECKS, StyleIssueDetector
+from detectors.registry import DetectionRun, DetectorRegistry
+from utils.latex_scanner import environment_spans, replace_environments
+from utils.latex_structure import LatexStructure, get_structure
+from utils.latex_project import Chunk, Flattened, load_project, split_chunks, write_files
+from utils.rule_engine import RuleReport, RuleSet, apply_rules
+from utils.fix_rules import (
+    ACM_TABLE_POSITION_2COL_RULES, ACM_TABLE_STAR_RULES, AUTHOR_BLOCK_RULES, AUTHOR_NAME_SPACING_RULES,
+    AUTHOR_SUPERSCRIPT_RULES, FIGURE_POSITION_1COL_RULES, FIGURE_POSITION_2COL_RULES, FIGURE_STAR_RULES,
+    IEEE_AUTHOR_BLOCK_RULES, IEEE_TABLE_POSITION_2COL_RULES, IEEE_TABLE_STAR_RULES, IMAGE_POSITION_RULES,
+    IMAGE_SIZE_RULES, MAX_IMAGE_WIDTH, TABLE_CENTERING_RULES, TABLE_POSITION_1COL_RULES, table_placement_rules
+)
+from utils.font_metrics import FONT_SIZES, TABCOLSEP_CM, FontMetrics, document_font, get_metrics, table_font_size
+from utils.table_layout import (
+    TableGrid, clean_cell, column_spec, content_lengths, content_weights, fit_to_page,
+    is_header_text, measured_column_widths, solve_column_widths, tabular_rows, text_aware_widths
+)
+
+
+def _issue_key(issue: Dict):
+    """Issues with the same type, text and line are reported once"""
+    return (issue.get('type'), issue.get('description'), issue.get('line_number'))
+
 
 @dataclass
 class ProcessingStats:
@@ -47,12 +73,106 @@ class UserGuidedLaTeXProcessor:
         self.style_detector = StyleIssueDetector()
         self.format_detector = DocumentFormatDetector()
         self.stats = ProcessingStats()
+        self.rule_report = RuleReport()  # fix rules fired in apply_fixes_to_document
+        self._structure: Optional[LatexStructure] = None  # of the last detected document
         
-    def detect_context_specific_issues(self, content: str) -> List[Dict]:
-        """Detect issues with context awareness"""
-        all_issues = []
+    def detect_context_specific_issues(self, content: str, chunk_chars: Optional[int] = None,
+                                       boundaries: Sequence[int] = ()) -> List[Dict]:
+        """
+        Detect issues with context awareness
+        
+        With `chunk_chars` (chunked mode for long documents) the document is
+        split at section and file boundaries (utils.latex_project) and the
+        chunks, each with the shared preamble, are checked in parallel; line
+        numbers are those of the whole document.
+        """
+        if chunk_chars:
+            run = self._detect_in_chunks(content, chunk_chars, boundaries)
+        else:
+            # One structure index for every detection phase; the phases are
+            # independent and run concurrently on large documents. After an
+            # edit (fix -> edit -> re-fix) it is derived from the last one
+            structure = get_structure(content, previous=self._structure)
+            self._structure = structure
+            run = self._detector_registry().run(content, structure)
         
         print(f"🔍 Phase 1: Standard LaTeX Issues ({self.context.conference_type} focus)")
+        print(f"   Found {len(run.issues_by_detector['style'])} context-prioritized style issues"
+              f" ({run.timings['style']:.2f}s)")
+        
+        print(f"🔍 Phase 2: Conversion Issues ({self.context.column_format} format)")
+        if self.context.conversion_applied:
+            print(f"   Found {len(run.issues_by_detector['conversion'])} conversion-specific issues"
+                  f" ({run.timings['conversion']:.2f}s)")
+        else:
+            print("   Skipping conversion detection (document not converted)")
+            
+        print(f"🔍 Phase 3: Conference-Specific Requirements")
+        print(f"   Found {len(run.issues_by_detector['conference'])} conference-specific issues"
+              f" ({run.timings['conference']:.2f}s)")
+        if run.duplicates_removed:
+            print(f"   Merged {run.duplicates_removed} duplicate issues")
+        
+        self.stats.total_issues = len(run.issues)
+        return run.issues
+    
+    def _detector_registry(self, style_checks: Sequence[str] = ALL_CHECKS) -> DetectorRegistry:
+        registry = DetectorRegistry(issue_key=_issue_key, processes=False)
+        registry.register("style", partial(self._detect_style_issues, checks=style_checks))
+        if self.context.conversion_applied:
+            registry.register("conversion", self._detect_prioritized_conversion_issues)
+        registry.register("conference", self._detect_conference_specific_issues)
+        return registry
+    
+    def _detect_in_chunks(self, content: str, chunk_chars: int,
+                          boundaries: Sequence[int] = ()) -> DetectionRun:
+        """
+        Run the document-wide detectors on the whole text and the regional
+        style checks chunk by chunk in parallel, and merge their issues
+        """
+        structure = get_structure(content)
+        chunks = split_chunks(content, chunk_chars, boundaries, structure)
+        print(f"🧩 Chunked mode: {len(chunks)} chunks of up to {chunk_chars} characters")
+        
+        # Conversion and conference rules and the style checks that need
+        # the whole document (mixed indentation, author, title)
+        merged = self._detector_registry(style_checks=DOCUMENT_CHECKS).run(content, structure)
+        merged.mode = "chunked"
+        seen = {_issue_key(issue) for issue in merged.issues}
+        
+        def detect(chunk: Chunk) -> Tuple[List[Dict], float]:
+            started = time.perf_counter()
+            context = chunk.context(content)
+            context_structure = get_structure(context)
+            issues = self._detect_style_issues(context, context_structure, checks=REGIONAL_CHECKS,
+                                               float_offsets=chunk.float_offsets(structure))
+            moved = []
+            for issue in issues:
+                if 'line_number' in issue:
+                    line = chunk.document_line(issue['line_number'], context_structure)
+                    if line is None:
+                        continue  # the shared preamble or end; reported by its own chunk
+                    issue = {**issue, 'line_number': line}
+                moved.append(issue)
+            return moved, time.perf_counter() - started
+        
+        with ThreadPoolExecutor(max_workers=max(1, settings.CHUNK_WORKERS)) as pool:
+            for issues, elapsed in pool.map(detect, chunks):
+                merged.issues_by_detector['style'].extend(issues)
+                merged.timings['style'] += elapsed
+                for issue in issues:
+                    key = _issue_key(issue)
+                    if key in seen:
+                        merged.duplicates_removed += 1
+                        continue
+                    seen.add(key)
+                    merged.issues.append(issue)
+        return merged
+    
+    def _detect_style_issues(self, content: str, structure: LatexStructure,
+                             checks: Sequence[str] = ALL_CHECKS,
+                             float_offsets: Optional[Dict[str, int]] = None) -> List[Dict]:
+        """Standard LaTeX issues, prioritized for the conference (see StyleIssueDetector.analyze_document)"""
         # Map conference type to format
         format_map = {
             "IEEE": "IEEE_two_column" if self.context.column_format == "2-column" else "IEEE_one_column",
@@ -63,7 +183,8 @@ class UserGuidedLaTeXProcessor:
         }
         format_name = format_map.get(self.context.conference_type, "generic")
         
-        analysis = self.style_detector.analyze_document(content, format_name)
+        analysis = self.style_detector.analyze_document(content, format_name, structure,
+                                                        checks=checks, float_offsets=float_offsets)
         style_issues_raw = analysis.detected_issues
         
         # Convert to dict format
@@ -73,7 +194,7 @@ class UserGuidedLaTeXProcessor:
                 'type': issue.type.value if hasattr(issue.type, 'value') else str(issue.type),
                 'severity': issue.severity.value if hasattr(issue.severity, 'value') else str(issue.severity),
                 'description': issue.description,
-                'line_number': getattr(issue.location, 'line', 1) if issue.location else 1
+                'line_number': (issue.location or {}).get('start_line', 1)
             })
         
         # Filter style issues by conference type
@@ -97,33 +218,22 @@ class UserGuidedLaTeXProcessor:
                 
             filtered_style_issues.append(issue)
         
-        all_issues.extend(filtered_style_issues)
-        print(f"   Found {len(filtered_style_issues)} context-prioritized style issues")
+        return filtered_style_issues
+    
+    def _detect_prioritized_conversion_issues(self, content: str, structure: LatexStructure) -> List[Dict]:
+        """Conversion issues with context-specific priorities"""
+        conversion_issues = self._detect_conversion_issues(content)
         
-        print(f"🔍 Phase 2: Conversion Issues ({self.context.column_format} format)")
-        if self.context.conversion_applied:
-            conversion_issues = self._detect_conversion_issues(content)
-            
-            # Add context-specific information
-            for issue in conversion_issues:
-                issue['context_priority'] = "HIGH"  # Conversion issues are always high priority
-                if self.context.column_format == "2-column" and "margin" in issue['description'].lower():
-                    issue['context_priority'] = "CRITICAL"
-                    
-            all_issues.extend(conversion_issues)
-            print(f"   Found {len(conversion_issues)} conversion-specific issues")
-        else:
-            print("   Skipping conversion detection (document not converted)")
-            
-        print(f"🔍 Phase 3: Conference-Specific Requirements")
-        conference_issues = self._detect_conference_specific_issues(content)
-        all_issues.extend(conference_issues)
-        print(f"   Found {len(conference_issues)} conference-specific issues")
+        # Add context-specific information
+        for issue in conversion_issues:
+            issue['context_priority'] = "HIGH"  # Conversion issues are always high priority
+            if self.context.column_format == "2-column" and "margin" in issue['description'].lower():
+                issue['context_priority'] = "CRITICAL"
         
-        self.stats.total_issues = len(all_issues)
-        return all_issues
+        return conversion_issues
     
-    def _detect_conference_specific_issues(self, content: str) -> List[Dict]:
+    def _detect_conference_specific_issues(self, content: str,
+                                           structure: Optional[LatexStructure] = None) -> List[Dict]:
         """Detect conference-specific formatting issues"""
         issues = []
         
@@ -150,7 +260,7 @@ class UserGuidedLaTeXProcessor:
                 })
             
             # Still check for table formatting (same as research papers)
-            table_issues = self._detect_table_formatting_issues(content)
+            table_issues = self._detect_table_formatting_issues(content, structure)
             issues.extend(table_issues)
             
             return issues
@@ -178,7 +288,7 @@ class UserGuidedLaTeXProcessor:
                 })
             
             # Check for table formatting issues (both 1-column and 2-column)
-            table_issues = self._detect_table_formatting_issues(content)
+            table_issues = self._detect_table_formatting_issues(content, structure)
             issues.extend(table_issues)
                 
         elif self.context.conference_type == "ACM":
@@ -231,7 +341,7 @@ class UserGuidedLaTeXProcessor:
                 })
             
             # Check for table formatting in ACM (both 1-column and 2-column)
-            table_issues = self._detect_table_formatting_issues(content)
+            table_issues = self._detect_table_formatting_issues(content, structure)
             issues.extend(table_issues)
                 
         elif self.context.conference_type == "GENERIC":
@@ -256,7 +366,7 @@ class UserGuidedLaTeXProcessor:
                 })
             
             # Ensure proper table placement without cutting text
-            table_issues = self._detect_table_formatting_issues(content)
+            table_issues = self._detect_table_formatting_issues(content, structure)
             issues.extend(table_issues)
                 
         # Check column format consistency for non-GENERIC conferences
@@ -275,17 +385,19 @@ class UserGuidedLaTeXProcessor:
                 
         return issues
     
-    def _detect_table_formatting_issues(self, content: str) -> List[Dict]:
+    def _detect_table_formatting_issues(self, content: str,
+                                        structure: Optional[LatexStructure] = None) -> List[Dict]:
         """Detect table formatting issues specific to conference requirements"""
         import re
         issues = []
         
-        # Find all table environments
-        table_pattern = r'\\begin\{table\*?\}.*?\\end\{table\*?\}'
-        tables = re.findall(table_pattern, content, re.DOTALL)
+        # Find all table environments (in document order)
+        structure = structure or get_structure(content)
+        table_envs = sorted(structure.environments_named('table', 'table*'), key=lambda env: env.start)
         
-        for i, table in enumerate(tables):
-            table_line = self._find_line_number(content, table[:50])  # Find approximate line
+        for i, env in enumerate(table_envs):
+            table = content[env.start:env.end]
+            table_line = env.start_line
             
             # IEEE specific table rules
             if self.context.conference_type == "IEEE":
@@ -400,9 +512,10 @@ class UserGuidedLaTeXProcessor:
                     })
         
         # Check figures for missing labels
-        figures = re.findall(r'\\begin\{figure\*?\}.*?\\end\{figure\*?\}', content, re.DOTALL)
-        for i, figure in enumerate(figures):
-            figure_line = content[:content.find(figure)].count('\n') + 1
+        figure_envs = sorted(structure.environments_named('figure', 'figure*'), key=lambda env: env.start)
+        for i, env in enumerate(figure_envs):
+            figure = content[env.start:env.end]
+            figure_line = env.start_line
             
             # Check for missing caption labels (good practice for all formats)
             if '\\caption{' in figure and '\\label{' not in figure:
@@ -650,78 +763,50 @@ class UserGuidedLaTeXProcessor:
         """Apply table formatting fixes"""
         import re
         
-        # IEEE specific table fixes
+        description = issue['description']
+        
+        # Conference-specific positioning rules (utils.fix_rules), one scan per set
+        rules = None
         if self.context.conference_type == "IEEE":
             if self.context.column_format == "2-column":
-                # IEEE 2-column: Convert ALL tables to table* with [!tb] positioning
-                if ('table*' in issue['description'] or 'span both columns' in issue['description']):
-                    content = re.sub(r'\\begin\{table\}(\[[^\]]*\])?', r'\\begin{table*}[!tb]', content)
-                    content = re.sub(r'\\end\{table\}', r'\\end{table*}', content)
-                    
-                    # Add stfloats package for better placement
-                    if '\\usepackage{stfloats}' not in content:
-                        content = re.sub(r'(\\usepackage\{caption\})', r'\1\n\\usepackage{stfloats}', content)
-                
-                elif 'positioning' in issue['description'].lower():
-                    # Fix positioning to [!tb] for IEEE 2-column
-                    content = re.sub(r'\\begin\{table\*?\}(\[[^\]]*\])?', r'\\begin{table*}[!tb]', content)
-                    
-                    if '\\usepackage{stfloats}' not in content:
-                        content = re.sub(r'(\\usepackage\{caption\})', r'\1\n\\usepackage{stfloats}', content)
-            
+                # IEEE 2-column: Convert ALL tables to table* with [!tb] positioning (+ stfloats)
+                if 'table*' in description or 'span both columns' in description:
+                    rules = IEEE_TABLE_STAR_RULES
+                elif 'positioning' in description.lower():
+                    rules = IEEE_TABLE_POSITION_2COL_RULES
             elif self.context.column_format == "1-column":
                 # IEEE 1-column: Use [htbp] positioning to appear naturally
-                if 'positioning' in issue['description'].lower():
-                    content = re.sub(r'\\begin\{table\}(\[[^\]]*\])?', r'\\begin{table}[htbp]', content)
+                if 'positioning' in description.lower():
+                    rules = TABLE_POSITION_1COL_RULES
         
-        # ACM specific table fixes
         elif self.context.conference_type == "ACM":
             if self.context.column_format == "2-column":
                 # ACM 2-column: ALL tables use table* with [!t] to span both columns
-                if 'table*' in issue['description'] or 'span both columns' in issue['description']:
-                    content = re.sub(r'\\begin\{table\}(\[[^\]]*\])?', r'\\begin{table*}[!t]', content)
-                    content = re.sub(r'\\end\{table\}', r'\\end{table*}', content)
-                elif 'positioning' in issue['description'].lower():
-                    # For existing table* keep it, for regular tables use [!t]
-                    if 'table*' in content:
-                        content = re.sub(r'\\begin\{table\*\}(\[[^\]]*\])?', r'\\begin{table*}[!t]', content)
-                    else:
-                        content = re.sub(r'\\begin\{table\}(\[[^\]]*\])?', r'\\begin{table}[!t]', content)
-            
+                if 'table*' in description or 'span both columns' in description:
+                    rules = ACM_TABLE_STAR_RULES
+                elif 'positioning' in description.lower():
+                    rules = ACM_TABLE_POSITION_2COL_RULES
             elif self.context.column_format == "1-column":
                 # ACM 1-column: Use [htbp] positioning to appear naturally
-                if 'positioning' in issue['description'].lower():
-                    content = re.sub(r'\\begin\{table\}(\[[^\]]*\])?', r'\\begin{table}[htbp]', content)
+                if 'positioning' in description.lower():
+                    rules = TABLE_POSITION_1COL_RULES
         
-        # GENERIC format table fixes - PRESERVE ORIGINAL POSITIONING
-        elif self.context.conference_type == "GENERIC":
-            # For GENERIC format, don't change positioning - preserve original
-            # Only apply positioning changes for IEEE/ACM which have specific requirements
-            pass
+        # GENERIC format: don't change positioning - preserve original
+        content, _ = self._apply_rules(content, rules)
         
         # Common fixes for all formats
-        if 'centering' in issue['description'].lower():
+        if 'centering' in description.lower():
             # Fix centering method for all formats
-            content = re.sub(r'\\begin\{center\}', r'\\centering', content)
-            content = re.sub(r'\\end\{center\}', '', content)
+            content, _ = self._apply_rules(content, TABLE_CENTERING_RULES)
             
             # Also apply smart word breaks to all tables to prevent overflow
-            def apply_word_breaks_to_table(match):
-                table_content = match.group(0)
-                return self._apply_smart_word_breaks(table_content)
-            
-            content = re.sub(r'\\begin\{table\*?\}.*?\\end\{table\*?\}', 
-                           apply_word_breaks_to_table, content, flags=re.DOTALL)
+            content = replace_environments(content, ('table', 'table*'), self._apply_smart_word_breaks)
             
         elif 'label' in issue['description'].lower():
             # Add missing table labels ONLY to captions that don't already have labels
             import re
             
-            # Find all table environments first
-            table_pattern = r'\\begin\{table\*?\}.*?\\end\{table\*?\}'
-            tables = re.findall(table_pattern, content, re.DOTALL)
-            
-            for table in tables:
+            def add_table_label(table):
                 # Check if this table has a caption but no label
                 if '\\caption{' in table and '\\label{' not in table:
                     # Find the caption in this specific table
@@ -733,16 +818,18 @@ class UserGuidedLaTeXProcessor:
                         label_text = re.sub(r'[^a-zA-Z0-9]+', '_', caption_text.lower())[:30]
                         label_text = re.sub(r'^_+|_+$', '', label_text)  # Remove leading/trailing underscores
                         
-                        # Replace the caption with caption + label in the content
-                        new_table = table.replace(caption, f"{caption}\n\\label{{tab:{label_text}}}")
-                        content = content.replace(table, new_table)
+                        # Replace the caption with caption + label
+                        return table.replace(caption, f"{caption}\n\\label{{tab:{label_text}}}")
+                return table
+            
+            content = replace_environments(content, ('table', 'table*'), add_table_label)
         
         # Fix wide tables with left-aligned columns - NEW APPROACH
         if 'overflow page margins' in issue['description'] or 'left-aligned columns' in issue['description']:
             # Find tables with |l|l|l|l| format and convert to fixed-width columns
-            def fix_table_columns_smart(match):
-                table_content = match.group(0)
-                
+            family, base_size = document_font(content)
+            
+            def fix_table_columns_smart(table_content):
                 # Find the tabular column specification
                 tabular_match = re.search(r'\\begin\{tabular\}\{([^}]+)\}', table_content)
                 if tabular_match:
@@ -773,13 +860,22 @@ class UserGuidedLaTeXProcessor:
                     
                     # Create expanded column widths
                     expanded_widths = [expanded_col_width] * total_cols
-                    expanded_table_width = sum(expanded_widths) + border_space
                     
                     # STEP 3: THEN SCALE DOWN - Check if we need to fit within constraints
                     # For GENERIC format with [ht] positioning, keep table conservative to avoid deferral
                     # Use only 25% of margin space to ensure table fits on page
                     max_reasonable_width = base_width + (margin_space * 0.25)  # Use 25% of margin space for safer fit
                     
+                    # MEASURED: size columns from the real width of their text in the
+                    # document font (at the table's size, \small unless declared)
+                    metrics = get_metrics(family, FONT_SIZES[base_size][table_font_size(table_content)])
+                    text_width = max_reasonable_width - border_space - total_cols * 2 * TABCOLSEP_CM
+                    measured = measured_column_widths(TableGrid.parse(tabular_rows(table_content), metrics),
+                                                      total_cols, text_width)
+                    if measured is not None:
+                        expanded_widths = measured.tolist()
+                    expanded_table_width = sum(expanded_widths) + border_space
+                    
                     if expanded_table_width > max_reasonable_width:
                         # Scale down to fit reasonably
                         usable_width = max_reasonable_width - border_space
@@ -833,72 +929,32 @@ class UserGuidedLaTeXProcessor:
             
             # Apply to all table environments - SAFER APPROACH
             # Find all table matches first, then process each individually
-            table_matches = list(re.finditer(r'\\begin\{table\*?\}.*?\\end\{table\*?\}', content, flags=re.DOTALL))
+            table_spans = environment_spans(content, ('table', 'table*'))
             
             # Process tables in reverse order to avoid position shifts
-            for match in reversed(table_matches):
+            for span in reversed(table_spans):
                 try:
-                    original_table = match.group(0)
-                    fixed_table = fix_table_columns_smart(match)
+                    original_table = content[span.start:span.end]
+                    fixed_table = fix_table_columns_smart(original_table)
                     if fixed_table and fixed_table != original_table:
-                        start, end = match.span()
-                        content = content[:start] + fixed_table + content[end:]
+                        content = content[:span.start] + fixed_table + content[span.end:]
                 except Exception as e:
                     # If table processing fails, skip this table to avoid corruption
                     print(f"Warning: Table processing failed, skipping: {e}")
                     continue
         
-        # Add float parameters based on conference and format
-        if 'setcounter' not in content or 'topfraction' not in content:
-            float_params = ""
-            if self.context.conference_type == "IEEE" and self.context.column_format == "2-column":
-                # IEEE 2-column: prevent tables floating to end
-                float_params = ("\n% Adjust float parameters for better table placement\n" +
-                              "\\setcounter{dbltopnumber}{2}\n" +
-                              "\\renewcommand{\\dbltopfraction}{0.9}\n" +
-                              "\\renewcommand{\\dblfloatpagefraction}{0.7}\n")
-            elif self.context.conference_type == "IEEE" and self.context.column_format == "1-column":
-                # IEEE 1-column: ensure tables don't break text
-                float_params = ("\n% Float parameters to ensure tables don't break text\n" +
-                              "\\setcounter{topnumber}{2}\n" +
-                              "\\renewcommand{\\topfraction}{0.9}\n" +
-                              "\\renewcommand{\\textfraction}{0.1}\n" +
-                              "\\renewcommand{\\floatpagefraction}{0.8}\n")
-            elif self.context.conference_type == "ACM":
-                # ACM format: ensure tables don't break text
-                float_params = ("\n% Float parameters to ensure tables don't break text\n" +
-                              "\\setcounter{topnumber}{2}\n" +
-                              "\\renewcommand{\\topfraction}{0.9}\n" +
-                              "\\renewcommand{\\textfraction}{0.1}\n" +
-                              "\\renewcommand{\\floatpagefraction}{0.8}\n")
-            elif self.context.conference_type == "GENERIC":
-                # GENERIC format: ensure tables don't cut text
-                float_params = ("\n% Float parameters to ensure tables don't break text\n" +
-                              "\\setcounter{topnumber}{2}\n" +
-                              "\\renewcommand{\\topfraction}{0.9}\n" +
-                              "\\renewcommand{\\textfraction}{0.1}\n" +
-                              "\\renewcommand{\\floatpagefraction}{0.8}\n")
-            
-            if float_params:
-                # Use string concatenation instead of r'\1' + float_params to avoid regex escape issues
-                content = re.sub(r'(\\begin\{document\})', lambda m: m.group(1) + float_params, content)
-        
-        # FINAL STEP: For GENERIC format, change [h] to [ht] to prevent table deferral
-        # [h] = "here only" - if table doesn't fit, LaTeX defers it to end
-        # [ht] = "here or top" - if table doesn't fit here, place at top of page
-        if self.context.conference_type == "GENERIC":
-            content = re.sub(r'\\begin\{table\}\[h\]', r'\\begin{table}[ht]', content)
-            content = re.sub(r'\\begin\{table\*\}\[h\]', r'\\begin{table*}[ht]', content)
+        # Add float parameters based on conference and format; for GENERIC also
+        # change [h] to [ht] to prevent table deferral ([h] = "here only" - if the
+        # table doesn't fit, LaTeX defers it to the end; [ht] allows the top of page)
+        content, _ = self._apply_rules(
+            content, table_placement_rules(self.context.conference_type, self.context.column_format)
+        )
             
         return content
     
     def _find_line_number(self, content: str, search_text: str) -> int:
         """Find line number of text in content"""
-        lines = content.split('\n')
-        for i, line in enumerate(lines, 1):
-            if search_text in line:
-                return i
-        return 1
+        return get_structure(content).find_line(search_text)
     
     def process_issues_with_context(self, issues: List[Dict]) -> List[Dict]:
         """Process issues using context-aware RAG"""
@@ -908,25 +964,24 @@ class UserGuidedLaTeXProcessor:
         priority_order = {"CRITICAL": 0, "HIGH": 1, "MEDIUM": 2, "LOW": 3}
         sorted_issues = sorted(issues, key=lambda x: priority_order.get(x.get('context_priority', 'LOW'), 3))
         
-        for i, issue in enumerate(sorted_issues, 1):
-            print(f"🛠️  Processing Issue {i}/{len(issues)}: {issue['description']}")
-            print(f"   Priority: {issue.get('context_priority', 'MEDIUM')}")
-            
-            # Create issue query for RAG
+        # Retrieval is local; LLM fix generation for independent issues overlaps
+        retrieved = []
+        for issue in sorted_issues:
             issue_query = f"{issue['description']} {issue.get('type', '')} {self.context.conference_type}"
-            
-            # Retrieve contextual examples
-            examples = self.rag_fixer.retrieve_contextual_examples(
+            retrieved.append(self.rag_fixer.retrieve_contextual_examples(
                 issue_query, self.context, top_k=3
-            )
-            
+            ))
+        
+        fix_results = self.rag_fixer.generate_contextual_fixes([
+            (issue['description'], self.context, examples)
+            for issue, examples in zip(sorted_issues, retrieved)
+        ])
+        
+        for i, (issue, examples, fix_result) in enumerate(zip(sorted_issues, retrieved, fix_results), 1):
+            print(f"🛠️  Processing Issue {i}/{len(issues)}: {issue['description']}")
+            print(f"   Priority: {issue.get('context_priority', 'MEDIUM')}")
             print(f"   📚 Retrieved {len(examples)} contextual examples")
             
-            # Generate context-aware fix
-            fix_result = self.rag_fixer.generate_contextual_fix(
-                issue['description'], self.context, examples
-            )
-            
             # Combine issue info with fix
             processed_fix = {
                 'issue': issue,
@@ -955,6 +1010,7 @@ class UserGuidedLaTeXProcessor:
         """Apply all fixes to the original document content"""
         modified_content = original_content
         applied_fixes = []
+        self.rule_report = RuleReport()
         
         print(f"\n🔧 APPLYING FIXES TO DOCUMENT")
         print("-" * 40)
@@ -1031,54 +1087,33 @@ class UserGuidedLaTeXProcessor:
         # POST-PROCESSING: Limit all image sizes to maximum 50% width
         modified_content = self._limit_image_sizes(modified_content)
         
+        self._print_rule_report()
         return modified_content
     
+    def _print_rule_report(self):
+        """Summarize which fix rules fired, in how many scans, and any conflicts"""
+        report = self.rule_report
+        if not report.fired:
+            return
+        print(f"\n📋 Fix rules: {sum(report.fired.values())} rewrites in {report.scans} scans")
+        for name, count in sorted(report.fired.items(), key=lambda item: -item[1]):
+            print(f"   • {name}: {count}")
+        for winner, shadowed, offset in report.conflicts:
+            print(f"   ⚠️  {winner} overrode {shadowed} at offset {offset}")
+    
     def _force_image_positioning_here(self, content: str) -> str:
         """
         Force all figure environments to use [h] positioning to keep images
         at their exact location and prevent floating to document end
         """
-        import re
-        
         print(f"\n🔒 LOCKING IMAGE POSITIONS")
         print("-" * 40)
         
-        # Replace all figure* positioning with [!htbp] for better placement
-        # Pattern: \begin{figure*}[any positioning]
-        count_figure_star = len(re.findall(r'\\begin\{figure\*\}\[[^\]]*\]', content))
-        content = re.sub(
-            r'\\begin\{figure\*\}\[[^\]]*\]',
-            r'\\begin{figure*}[!htbp]',
-            content
-        )
-        
-        # Replace all figure positioning with [!htbp] for better placement
-        # Pattern: \begin{figure}[any positioning]
-        count_figure = len(re.findall(r'\\begin\{figure\}\[[^\]]*\]', content))
-        content = re.sub(
-            r'\\begin\{figure\}\[[^\]]*\]',
-            r'\\begin{figure}[!htbp]',
-            content
-        )
-        
-        # Add [!htbp] to figures without positioning
-        # Pattern: \begin{figure*} (no positioning)
-        count_no_pos_star = len(re.findall(r'\\begin\{figure\*\}(?!\[)', content))
-        content = re.sub(
-            r'\\begin\{figure\*\}(?!\[)',
-            r'\\begin{figure*}[!htbp]',
-            content
-        )
-        
-        # Pattern: \begin{figure} (no positioning)
-        count_no_pos = len(re.findall(r'\\begin\{figure\}(?!\[)', content))
-        content = re.sub(
-            r'\\begin\{figure\}(?!\[)',
-            r'\\begin{figure}[!htbp]',
-            content
-        )
+        # Replace all figure/figure* positioning with [!htbp] for better placement,
+        # and add it to figures without positioning (one scan, see utils.fix_rules)
+        content, report = self._apply_rules(content, IMAGE_POSITION_RULES)
         
-        total_locked = count_figure_star + count_figure + count_no_pos_star + count_no_pos
+        total_locked = sum(report.fired.values())
         if total_locked > 0:
             print(f"   ✅ Applied [!htbp] positioning to {total_locked} images")
             print(f"   📌 Images will stay closer: here, top, bottom, or page")
@@ -1092,61 +1127,35 @@ class UserGuidedLaTeXProcessor:
         Limit all image widths to maximum 50% to prevent oversized images
         that cause floating to document end
         """
-        import re
-        
         print(f"\n📏 LIMITING IMAGE SIZES")
         print("-" * 40)
         
-        max_width = "0.5"  # 50% width
-        count_resized = 0
-        
-        # Find all includegraphics commands with width specifications
-        # Pattern: \includegraphics[width=...]{filename}
-        
-        # 1. Replace width=\textwidth or width=1\textwidth or width=1.0\textwidth
-        patterns_to_replace = [
-            (r'\\includegraphics\[width=\\textwidth\]', r'\\includegraphics[width=' + max_width + r'\\textwidth]'),
-            (r'\\includegraphics\[width=1\\textwidth\]', r'\\includegraphics[width=' + max_width + r'\\textwidth]'),
-            (r'\\includegraphics\[width=1\.0\\textwidth\]', r'\\includegraphics[width=' + max_width + r'\\textwidth]'),
-            (r'\\includegraphics\[width=0\.[6-9]\\textwidth\]', r'\\includegraphics[width=' + max_width + r'\\textwidth]'),
-            (r'\\includegraphics\[width=\\columnwidth\]', r'\\includegraphics[width=' + max_width + r'\\columnwidth]'),
-            (r'\\includegraphics\[width=1\\columnwidth\]', r'\\includegraphics[width=' + max_width + r'\\columnwidth]'),
-            (r'\\includegraphics\[width=1\.0\\columnwidth\]', r'\\includegraphics[width=' + max_width + r'\\columnwidth]'),
-            (r'\\includegraphics\[width=0\.[6-9]\\columnwidth\]', r'\\includegraphics[width=' + max_width + r'\\columnwidth]'),
-        ]
-        
-        for pattern, replacement in patterns_to_replace:
-            matches = re.findall(pattern, content)
-            if matches:
-                count_resized += len(matches)
-                content = re.sub(pattern, replacement, content)
-        
-        # 2. Add width to images without size specification
-        # Pattern: \includegraphics{filename} (no width)
-        images_no_width = re.findall(r'\\includegraphics\{[^}]+\}', content)
-        if images_no_width:
-            for img in images_no_width:
-                # Only process if no [ ] after \includegraphics
-                if '[' not in img:
-                    new_img = img.replace(r'\includegraphics{', r'\includegraphics[width=' + max_width + r'\textwidth]{')
-                    content = content.replace(img, new_img)
-                    count_resized += 1
+        # Full-width images are capped and unsized images get a width (one scan)
+        content, report = self._apply_rules(content, IMAGE_SIZE_RULES)
         
+        count_resized = sum(report.fired.values())
         if count_resized > 0:
-            print(f"   ✅ Limited {count_resized} images to maximum {max_width} (50%) width")
+            print(f"   ✅ Limited {count_resized} images to maximum {MAX_IMAGE_WIDTH} (50%) width")
             print(f"   📐 Smaller images help prevent floating to document end")
         else:
             print(f"   ℹ️  All images already have appropriate sizing")
         
         return content
     
-    def _calculate_optimal_column_widths(self, total_cols: int, original_spec: str, table_content: str = "", apply_positioning: bool = False) -> str:
+    def _apply_rules(self, content: str, *rule_sets: Optional[RuleSet]) -> Tuple[str, RuleReport]:
+        """Apply rule sets in order and add what fired to self.rule_report"""
+        content, report = apply_rules(content, *[rules for rules in rule_sets if rules])
+        self.rule_report.merge(report)
+        return content, report
+    
+    def _calculate_optimal_column_widths(self, total_cols: int, original_spec: str, table_content: str = "",
+                                         apply_positioning: bool = False, metrics: Optional[FontMetrics] = None) -> str:
         """
         Content-aware algorithm to calculate optimal column widths dynamically
         Analyzes actual text content in each column to determine optimal widths
+        (parsed once into a TableGrid, solved with utils.table_layout; measured
+        in the document font when metrics are given)
         """
-        import re
-        
         if total_cols <= 0:
             return original_spec
             
@@ -1165,473 +1174,46 @@ class UserGuidedLaTeXProcessor:
         usable_width = available_width - border_space
         
         # CONTENT-AWARE: Analyze actual column content including sub-columns
-        column_content_lengths = []
+        weights = None
         if table_content:
             try:
-                # Extract table rows (between \hline or \\)
-                rows = re.split(r'\\\\|\\hline', table_content)
-                
-                max_lengths_per_col = [0] * total_cols
-                multicolumn_groups = {}  # Track which columns are grouped under multicolumn headers
-                
-                for row_idx, row in enumerate(rows):
-                    # Skip empty rows or rows with only whitespace
-                    if not row.strip() or '\\begin{tabular}' in row or '\\end{tabular}' in row:
-                        continue
-                    
-                    # Detect multicolumn headers (like \multicolumn{2}{|c|}{Age})
-                    multicolumn_matches = list(re.finditer(r'\\multicolumn\{(\d+)\}\{[^}]*\}\{([^}]*)\}', row))
-                    
-                    if multicolumn_matches:
-                        # This row has multicolumn headers - track the groupings
-                        col_position = 0
-                        for match in multicolumn_matches:
-                            span = int(match.group(1))  # Number of columns spanned
-                            header_text = match.group(2)  # Header text
-                            
-                            # Find the column position by counting & before this match
-                            cells_before = row[:match.start()].count('&')
-                            col_position = cells_before
-                            
-                            # Mark these columns as a group
-                            if col_position not in multicolumn_groups:
-                                multicolumn_groups[col_position] = {
-                                    'span': span,
-                                    'header': header_text,
-                                    'sub_cols': list(range(col_position, min(col_position + span, total_cols)))
-                                }
-                    
-                    # Split by & to get individual cells
-                    cells = row.split('&')
-                    
-                    # Skip rows with multicolumn (we'll analyze sub-columns in other rows)
-                    if multicolumn_matches:
-                        continue
-                    
-                    for idx, cell in enumerate(cells[:total_cols]):
-                        # ENHANCED CELL CLEANING: More thorough text extraction
-                        clean_cell = cell
-                        
-                        # Remove multirow commands but keep the text
-                        clean_cell = re.sub(r'\\multirow\{[^}]*\}\{[^}]*\}\{([^}]*)\}', r'\1', clean_cell)
-                        
-                        # Remove other LaTeX commands but keep text content
-                        clean_cell = re.sub(r'\\textbf\{([^}]*)\}', r'\1', clean_cell)
-                        clean_cell = re.sub(r'\\emph\{([^}]*)\}', r'\1', clean_cell)
-                        clean_cell = re.sub(r'\\[a-zA-Z]+\{([^}]*)\}', r'\1', clean_cell)
-                        clean_cell = re.sub(r'\\[a-zA-Z]+', '', clean_cell)
-                        
-                        # Clean special characters and spacing
-                        clean_cell = re.sub(r'[\{\}\$\|#\\]', '', clean_cell)
-                        clean_cell = re.sub(r'\s+', ' ', clean_cell)  # normalize whitespace
-                        clean_cell = clean_cell.strip()
-                        
-                        # Calculate content length (characters) - account for word spacing
-                        if clean_cell:
-                            # For multi-word cells, add extra space for word breaks
-                            word_count = len(clean_cell.split())
-                            content_length = len(clean_cell)
-                            if word_count > 1:
-                                content_length += (word_count - 1) * 0.5  # extra space between words
-                            
-                            if content_length > max_lengths_per_col[idx]:
-                                max_lengths_per_col[idx] = int(content_length)
-                
-                # CRITICAL: Also analyze header row content (not just data)
-                # Find ALL header rows (before first \\hline\\hline or first data row)
-                header_row_count = 0
-                for row_idx, row in enumerate(rows):
-                    if not row.strip() or '\\begin{tabular}' in row or '\\end{tabular}' in row:
-                        continue
-                    
-                    # Stop at double hline (end of headers) or if we see numeric data (start of data rows)
-                    if '\\hline' in row and row_idx > 0 and '\\hline' in rows[row_idx - 1]:
-                        break
-                    
-                    # Skip multicolumn/multirow rows from analysis but don't stop
-                    if '\\multicolumn' in row or '\\multirow' in row:
-                        continue
-                    
-                    # This is a regular header row - analyze it with enhanced cleaning
-                    cells = row.split('&')
-                    for idx, cell in enumerate(cells[:total_cols]):
-                        # ENHANCED HEADER CLEANING: Same thorough approach as data rows
-                        clean_cell = cell
-                        
-                        # Remove LaTeX commands but preserve text
-                        clean_cell = re.sub(r'\\textbf\{([^}]*)\}', r'\1', clean_cell)
-                        clean_cell = re.sub(r'\\emph\{([^}]*)\}', r'\1', clean_cell)
-                        clean_cell = re.sub(r'\\[a-zA-Z]+\{([^}]*)\}', r'\1', clean_cell)
-                        clean_cell = re.sub(r'\\[a-zA-Z]+', '', clean_cell)
-                        
-                        # Clean special characters
-                        clean_cell = re.sub(r'[\{\}\$\|#\\]', '', clean_cell)
-                        clean_cell = re.sub(r'\s+', ' ', clean_cell)
-                        clean_cell = clean_cell.strip()
-                        
-                        if clean_cell:
-                            # For headers, account for word spacing and give extra weight
-                            word_count = len(clean_cell.split())
-                            header_length = len(clean_cell)
-                            if word_count > 1:
-                                header_length += (word_count - 1) * 0.5
-                            
-                            # Give headers 2.5x weight since they're critical for readability
-                            weighted_length = int(header_length * 2.5)
-                            if weighted_length > max_lengths_per_col[idx]:
-                                max_lengths_per_col[idx] = weighted_length
-                    
-                    header_row_count += 1
-                    # Analyze at most 2 header rows (main headers + sub-headers)
-                    if header_row_count >= 2:
-                        break
-                
-                # Adjust widths for multicolumn groups DYNAMICALLY
-                # Sub-columns must accommodate BOTH the multicolumn header AND their own headers
-                for group_start, group_info in multicolumn_groups.items():
-                    sub_cols = group_info['sub_cols']
-                    # Clean multicolumn header text
-                    header_text = group_info['header']
-                    header_text = re.sub(r'\\[a-zA-Z]+\{[^}]*\}', '', header_text)
-                    header_text = re.sub(r'\\[a-zA-Z]+', '', header_text)
-                    header_text = re.sub(r'\{|\}|\$|\||#', '', header_text)
-                    header_length = len(header_text.strip())
-                    
-                    # Calculate total width of sub-columns
-                    total_sub_width = sum(max_lengths_per_col[col] for col in sub_cols)
-                    
-                    # DYNAMIC: Calculate required width based on multicolumn header length
-                    # Add 40% padding for spacing + centering of multicolumn header
-                    required_width = header_length * 1.4
-                    
-                    if required_width > total_sub_width:
-                        # Distribute the required width equally among sub-columns
-                        width_per_subcol = required_width / len(sub_cols)
-                        for col in sub_cols:
-                            # Use the maximum of current width or proportional width
-                            max_lengths_per_col[col] = max(
-                                max_lengths_per_col[col],
-                                int(width_per_subcol)
-                            )
-                    
-                    # ENHANCED SUB-COLUMN BALANCING: Ensure fairness within multicolumn groups
-                    # Sub-columns under same multicolumn header should be more balanced
-                    if len(sub_cols) > 1:
-                        # Calculate the maximum width among sub-columns in this group
-                        max_subcol_width = max(max_lengths_per_col[col] for col in sub_cols)
-                        min_balanced_width = max_subcol_width * 0.7  # At least 70% of the largest
-                        
-                        # Ensure no sub-column is too narrow compared to its siblings
-                        for col in sub_cols:
-                            if max_lengths_per_col[col] < min_balanced_width:
-                                max_lengths_per_col[col] = int(min_balanced_width)
-                    
-                    # DYNAMIC MINIMUM: Ensure each sub-column can fit its own header text
-                    for col in sub_cols:
-                        # Calculate minimum based on actual content + padding
-                        min_for_content = max_lengths_per_col[col] * 1.25  # 25% padding
-                        if max_lengths_per_col[col] < min_for_content:
-                            max_lengths_per_col[col] = int(min_for_content)
+                lengths, multicolumn_groups = content_lengths(TableGrid.parse(table_content, metrics), total_cols)
                 
                 # Store multicolumn_groups for later use in width enforcement
                 self._last_multicolumn_groups = multicolumn_groups
-                self._last_max_lengths_per_col = max_lengths_per_col.copy()
-                
-                # Convert character lengths to relative weights
-                total_chars = sum(max_lengths_per_col) if sum(max_lengths_per_col) > 0 else total_cols
-                
-                if total_chars > 0:
-                    for max_len in max_lengths_per_col:
-                        # Weight based on content: more characters = more width
-                        # Normalize to get proportion of total width
-                        weight = max_len / total_chars if total_chars > 0 else 1.0 / total_cols
-                        column_content_lengths.append(weight)
+                self._last_max_lengths_per_col = [int(length) for length in lengths]
+                weights = content_weights(lengths)
                         
             except Exception as e:
                 # If content analysis fails, fall back to pattern-based
                 print(f"Content analysis failed: {e}, using pattern-based distribution")
-                column_content_lengths = []
                 self._last_multicolumn_groups = {}
                 self._last_max_lengths_per_col = []
         
-        # Calculate column widths based on content or pattern
-        column_widths = []
-        
-        if column_content_lengths and len(column_content_lengths) == total_cols:
-            # CONTENT-BASED DISTRIBUTION
-            for weight in column_content_lengths:
-                # Allocate width proportional to content length
-                width = usable_width * weight
-                
-                # Apply min/max constraints
-                width = max(min_col_width, min(width, max_col_width))
-                column_widths.append(width)
-
-            # --- TWO-PASS VALIDATION ---
-            # PASS 1: Sanity check for small tables that were overestimated
-            is_small_table = total_cols <= 6 and "\\multicolumn" not in table_content
-            initial_total_width = sum(column_widths)
-
-            if is_small_table and initial_total_width > usable_width:
-                # This table is likely overestimated. Reset and use a safe, balanced approach.
-                avg_width = usable_width / total_cols
-                column_widths = [max(min_col_width, avg_width) for _ in range(total_cols)]
-                
-                # Scale to fit exactly
-                current_total = sum(column_widths)
-                if current_total > usable_width:
-                    scale_factor = usable_width / current_total
-                    column_widths = [max(min_col_width, w * scale_factor) for w in column_widths]
-
-            # PASS 2: Apply fitting logic for all other tables
-            total_width = sum(column_widths)
-
-            if total_width < usable_width:
-                # This table fits. Let's make it look better.
-                
-                # 1. Enforce a reasonable minimum width for readability
-                reasonable_min = 1.2
-                for i in range(len(column_widths)):
-                    if column_widths[i] < reasonable_min:
-                        column_widths[i] = reasonable_min
-                
-                # 2. Recalculate total width after enforcing minimums
-                total_after_min = sum(column_widths)
-                
-                # 3. Scale up to use the available space, but don't make it too wide
-                if total_after_min < usable_width:
-                    target_width = usable_width * 0.95
-                    if total_after_min < target_width:
-                        scale_factor = target_width / total_after_min
-                        column_widths = [min(w * scale_factor, max_col_width) for w in column_widths]
-                
-                # 4. If enforcing minimums made it too wide, scale it back down to fit
-                elif total_after_min > usable_width:
-                    scale_factor = usable_width / total_after_min
-                    column_widths = [max(min_col_width, w * scale_factor) for w in column_widths]
-            
-            else: # total_width >= usable_width
-                if apply_positioning:
-                    # POSITIONING MODE
-                    overflow_amount = total_width - usable_width
-                    max_shift_compensation = 2.0
-                    
-                    if overflow_amount > max_shift_compensation:
-                        # Severe overflow: Redistribute from wide to tight columns
-                        donor_cols = [ (i, w) for i, w in enumerate(column_widths) if w > 3.0 ]
-                        tight_cols = [ (i, w) for i, w in enumerate(column_widths) if w < 1.0 ]
-                        
-                        if donor_cols and tight_cols:
-                            total_donor_space = sum(max(0, w - 2.0) for _, w in donor_cols)
-                            total_tight_need = sum(max(0, 1.0 - w) for _, w in tight_cols)
-                            
-                            if total_donor_space > 0 and total_tight_need > 0:
-                                redistribute_amount = min(total_donor_space * 0.6, total_tight_need)
-                                
-                                for i, width in donor_cols:
-                                    donor_share = max(0, width - 2.0) / total_donor_space if total_donor_space > 0 else 0
-                                    donation = redistribute_amount * donor_share
-                                    column_widths[i] = max(2.0, width - donation)
-                                
-                                for i, width in tight_cols:
-                                    tight_share = max(0, 1.0 - width) / total_tight_need if total_tight_need > 0 else 0
-                                    addition = redistribute_amount * tight_share
-                                    column_widths[i] = min(1.5, width + addition)
-                
-                else:
-                    # SCALING MODE: Aggressive compression
-                    excess = total_width - usable_width
-                    compressible_cols = [i for i, w in enumerate(column_widths) if w > (min_col_width + 0.2)]
-                    min_total = sum(w for i, w in enumerate(column_widths) if i not in compressible_cols)
-                    
-                    if compressible_cols and (usable_width - min_total) > 0:
-                        available_for_wide_cols = usable_width - min_total
-                        current_wide_total = sum(column_widths[i] for i in compressible_cols)
-                        
-                        if current_wide_total > available_for_wide_cols:
-                            scale_factor = available_for_wide_cols / current_wide_total
-                            for i in compressible_cols:
-                                column_widths[i] *= scale_factor
-                    else:
-                        scale_factor = usable_width / total_width
-                        column_widths = [max(w * scale_factor, min_col_width) for w in column_widths]
-                
-        else:
-            # FALLBACK: PATTERN-BASED DISTRIBUTION
-            base_width = usable_width / total_cols
-            
-            if total_cols <= 2:
-                column_widths = [min(base_width, max_col_width) for _ in range(total_cols)]
-            elif total_cols == 3:
-                column_widths = [
-                    min(base_width * 0.8, max_col_width * 0.6),
-                    min(base_width * 1.4, max_col_width),
-                    min(base_width * 0.8, max_col_width * 0.8)
-                ]
-            elif total_cols == 4:
-                column_widths = [
-                    min(base_width * 0.6, max_col_width * 0.4),
-                    min(base_width * 1.2, max_col_width * 0.7),
-                    min(base_width * 1.4, max_col_width),
-                    min(base_width * 0.8, max_col_width * 0.6)
-                ]
-            else:
-                for i in range(total_cols):
-                    if i == 0 or i == total_cols - 1:
-                        width = min(base_width * 0.7, max_col_width * 0.5)
-                    elif i == 1 or i == total_cols - 2:
-                        width = min(base_width * 0.9, max_col_width * 0.7)
-                    else:
-                        width = min(base_width * 1.1, max_col_width * 0.8)
-                    column_widths.append(width)
-        
-        # Final adjustments: ensure all widths meet minimum requirement
-        column_widths = [max(w, min_col_width) for w in column_widths]
-        
-        # Final check: Apply smart scaling strategy for severe overflow in positioning mode
-        total_final = sum(column_widths)
-        if total_final > usable_width and apply_positioning:
-            if total_final > usable_width * 1.3:
-                sorted_indices = sorted(range(len(column_widths)), key=lambda i: column_widths[i], reverse=True)
-                target_width = usable_width * 1.2
-                excess = total_final - target_width
-                
-                for idx in sorted_indices[:len(sorted_indices)//2]:
-                    if excess <= 0: break
-                    current_width = column_widths[idx]
-                    reduction = min(excess * 0.5, current_width - min_col_width)
-                    column_widths[idx] -= reduction
-                    excess -= reduction
-        
-        # Generate the column specification
-        col_specs = [f'p{{{width:.1f}cm}}' for width in column_widths]
-        new_spec = '|' + '|'.join(col_specs) + '|'
-        
-        return new_spec
+        is_small_table = total_cols <= 6 and "\\multicolumn" not in table_content
+        column_widths = solve_column_widths(weights, total_cols, usable_width, min_col_width,
+                                            max_col_width, is_small_table, apply_positioning)
+        return column_spec(column_widths)
     
-    def _calculate_text_aware_column_widths(self, table_content: str, total_cols: int) -> list:
+    def _calculate_text_aware_column_widths(self, table_content: str, total_cols: int,
+                                            metrics: Optional[FontMetrics] = None) -> list:
         """
         GENERIC text-aware column width calculation for any LaTeX table
         Analyzes actual text content in each column to determine optimal widths
         """
-        import re
-        
-        # Initialize column content lengths
-        max_content_per_col = [0] * total_cols
-        
-        # Extract table rows (between \hline or \\)
-        rows = re.split(r'\\\\|\\hline', table_content)
-        
-        # Analyze both header and data rows
-        for row in rows:
-            # Skip empty rows or structural rows  
-            if not row.strip() or '\\begin{tabular}' in row or '\\end{tabular}' in row:
-                continue
-            
-            # Handle multicolumn headers - extract their text and distribute
-            if '\\multicolumn' in row:
-                self._process_multicolumn_row(row, max_content_per_col, total_cols)
-                continue
-            
-            # Process regular data/header rows
-            cells = row.split('&')
-            
-            for col_idx, cell in enumerate(cells[:total_cols]):
-                clean_cell = self._clean_cell_content(cell)
-                
-                if clean_cell:
-                    # Calculate content length accounting for word spacing
-                    char_count = len(clean_cell)
-                    word_count = len(clean_cell.split())
-                    if word_count > 1:
-                        char_count += (word_count - 1) * 0.4  # Space between words
-                    
-                    # Give headers extra weight (1.5x) for prominence
-                    if self._is_header_content(clean_cell):
-                        char_count *= 1.5
-                    
-                    # Update maximum for this column
-                    if char_count > max_content_per_col[col_idx]:
-                        max_content_per_col[col_idx] = char_count
-        
-        # Convert character counts to cm widths with smart minimums
-        column_widths = []
-        for col_idx, char_count in enumerate(max_content_per_col):
-            if char_count == 0:
-                # Empty column - use small default
-                width_cm = 1.0
-            else:
-                # Dynamic conversion: 0.11cm per character + 25% padding
-                width_cm = char_count * 0.11 * 1.25
-                # Enforce reasonable bounds
-                width_cm = max(width_cm, 1.0)  # Minimum 1.0cm
-                width_cm = min(width_cm, 5.0)  # Maximum 5.0cm for readability
-            
-            column_widths.append(width_cm)
-        
-        return column_widths
-    
-    def _process_multicolumn_row(self, row: str, max_content_per_col: list, total_cols: int):
-        """
-        Process multicolumn headers and distribute their width requirements
-        """
-        import re
-        
-        # Find multicolumn commands: \multicolumn{span}{alignment}{text}
-        multicolumn_matches = list(re.finditer(r'\\multicolumn\{(\d+)\}\{[^}]*\}\{([^}]*)\}', row))
-        
-        current_col = 0
-        for match in multicolumn_matches:
-            span = int(match.group(1))
-            header_text = self._clean_cell_content(match.group(2))
-            
-            if header_text:
-                # Distribute header width across spanned columns
-                char_count = len(header_text) * 1.2  # Headers get extra weight
-                width_per_col = char_count / span
-                
-                for i in range(span):
-                    if current_col + i < total_cols:
-                        if width_per_col > max_content_per_col[current_col + i]:
-                            max_content_per_col[current_col + i] = width_per_col
-            
-            current_col += span
+        return text_aware_widths(TableGrid.parse(table_content, metrics), total_cols).tolist()
     
     def _is_header_content(self, text: str) -> bool:
         """
         Detect if content is likely a header (short, capitalized, etc.)
         """
-        # Simple heuristics: short text with capitals, common header words
-        if len(text) < 3:
-            return True
-        
-        header_indicators = ['type', 'name', 'age', 'dataset', 'model', 'parameters', 
-                           'subjects', 'diabetes', 'cgm', 'raw', 'processed']
-        
-        return (text.lower() in header_indicators or 
-                len(text.split()) <= 3 and any(c.isupper() for c in text))
+        return is_header_text(text)
     
     def _clean_cell_content(self, cell: str) -> str:
         """
         Clean cell content to extract readable text
         """
-        import re
-        
-        clean_cell = cell.strip()
-        
-        # Remove LaTeX commands but keep their content
-        clean_cell = re.sub(r'\\multirow\{[^}]*\}\{[^}]*\}\{([^}]*)\}', r'\1', clean_cell)
-        clean_cell = re.sub(r'\\textbf\{([^}]*)\}', r'\1', clean_cell)
-        clean_cell = re.sub(r'\\emph\{([^}]*)\}', r'\1', clean_cell)
-        clean_cell = re.sub(r'\\[a-zA-Z]+\{([^}]*)\}', r'\1', clean_cell)
-        clean_cell = re.sub(r'\\[a-zA-Z]+', '', clean_cell)
-        
-        # Remove special characters and normalize whitespace
-        clean_cell = re.sub(r'[\{\}\$\|#\\]', '', clean_cell)
-        clean_cell = re.sub(r'\s+', ' ', clean_cell)
-        clean_cell = clean_cell.strip()
-        
-        return clean_cell
+        return clean_cell(cell)
     
     def _apply_positioning_and_scaling(self, widths: list, total_width: float, page_width: float, total_cols: int) -> tuple:
         """
@@ -1640,108 +1222,9 @@ class UserGuidedLaTeXProcessor:
         2. For oversized tables: position left, then selectively scale only wide columns
         Returns: (final_widths, positioning_shift)
         """
-        final_widths = widths.copy()
-        positioning_shift = 0.0
-        
-        # Calculate available width (page width minus borders)
-        usable_width = page_width - 0.2 * (total_cols + 1)
-        current_width = sum(final_widths)
-        
-        if current_width <= usable_width:
-            # CASE 1: Table fits within page margins
-            self._optimize_fitting_table(final_widths, usable_width, total_cols)
-            
-        else:
-            # CASE 2: Table exceeds page margins - apply positioning and scaling
-            positioning_shift, final_widths = self._handle_oversized_table(
-                final_widths, current_width, usable_width, total_cols
-            )
-        
-        return final_widths, positioning_shift
-    
-    def _optimize_fitting_table(self, widths: list, usable_width: float, total_cols: int):
-        """
-        Optimize tables that fit within margins - ensure minimums and scale up
-        """
-        # Step 1: Ensure reasonable minimums for readability
-        min_width = max(1.0, usable_width / (total_cols * 3))  # Dynamic minimum
-        
-        for i in range(len(widths)):
-            if widths[i] < min_width:
-                widths[i] = min_width
-        
-        # Step 2: Scale up to use available space effectively
-        current_total = sum(widths)
-        
-        if current_total < usable_width * 0.8:  # Using less than 80% of space
-            # Scale up to use 90% of available width for better appearance
-            target_width = usable_width * 0.9
-            scale_factor = target_width / current_total
-            
-            # Apply scaling with maximum limits
-            for i in range(len(widths)):
-                widths[i] = min(widths[i] * scale_factor, 4.5)  # Max 4.5cm per column
-    
-    def _handle_oversized_table(self, widths: list, current_width: float, usable_width: float, total_cols: int) -> tuple:
-        """
-        Handle tables that exceed page margins with positioning and selective scaling
-        """
-        overflow = current_width - usable_width
-        positioning_shift = 0.0
-        
-        # Step 1: POSITIONING - Shift table left to balance margins
-        max_positioning = min(2.5, overflow * 0.7)  # Up to 2.5cm shift
-        positioning_shift = max_positioning
-        
-        # Step 2: Check remaining overflow after positioning
-        effective_width = usable_width + positioning_shift
-        remaining_overflow = current_width - effective_width
-        
-        if remaining_overflow > 0.3:  # Still significant overflow
-            # Step 3: SELECTIVE SCALING - Only scale columns with extra space
-            self._apply_selective_scaling(widths, remaining_overflow, effective_width)
-        
-        return positioning_shift, widths
+        final_widths, positioning_shift = fit_to_page(np.array(widths, dtype=float), page_width, total_cols)
+        return final_widths.tolist(), positioning_shift
     
-    def _apply_selective_scaling(self, widths: list, overflow: float, target_width: float):
-        """
-        Apply selective scaling only to columns that have room to shrink
-        """
-        # Identify scalable vs. protected columns
-        scalable_indices = []
-        protected_indices = []
-        
-        for i, width in enumerate(widths):
-            # Protect narrow columns and those with critical content
-            min_safe_width = max(0.9, width * 0.65)  # Never below 65% of original
-            
-            if width > min_safe_width + 0.4:  # Has significant room to scale
-                scalable_indices.append(i)
-            else:
-                protected_indices.append(i)
-        
-        if scalable_indices:
-            # Calculate how much scalable columns need to give up
-            protected_total = sum(widths[i] for i in protected_indices)
-            available_for_scalable = target_width - protected_total
-            current_scalable_total = sum(widths[i] for i in scalable_indices)
-            
-            if current_scalable_total > available_for_scalable:
-                # Scale down only the scalable columns
-                scale_factor = available_for_scalable / current_scalable_total
-                
-                for i in scalable_indices:
-                    original_width = widths[i]
-                    scaled_width = original_width * scale_factor
-                    # Ensure we don't scale below safe minimum
-                    min_safe = max(0.9, original_width * 0.65)
-                    widths[i] = max(scaled_width, min_safe)
-        else:
-            # No scalable columns - apply gentle proportional scaling to all
-            scale_factor = target_width / sum(widths)
-            for i in range(len(widths)):
-                widths[i] = max(widths[i] * scale_factor, 0.8)  # Absolute minimum 0.8cm
-
     def _calculate_actual_table_width(self, column_spec: str, total_cols: int) -> float:
         """
         Calculate the actual width of a table based on its column specification
@@ -1774,11 +1257,7 @@ class UserGuidedLaTeXProcessor:
         if 'label' in issue['description'].lower():
             # Add missing figure labels ONLY to captions that don't already have labels
             
-            # Find all figure environments first
-            figure_pattern = r'\\begin\{figure\*?\}.*?\\end\{figure\*?\}'
-            figures = re.findall(figure_pattern, content, re.DOTALL)
-            
-            for figure in figures:
+            def add_figure_label(figure):
                 # Check if this figure has a caption but no label
                 if '\\caption{' in figure and '\\label{' not in figure:
                     # Find the caption in this specific figure
@@ -1790,53 +1269,45 @@ class UserGuidedLaTeXProcessor:
                         label_text = re.sub(r'[^a-zA-Z0-9]+', '_', caption_text.lower())[:30]
                         label_text = re.sub(r'^_+|_+$', '', label_text)  # Remove leading/trailing underscores
                         
-                        # Replace the caption with caption + label in the content
-                        new_figure = figure.replace(caption, f"{caption}\n\\label{{fig:{label_text}}}")
-                        content = content.replace(figure, new_figure)
+                        # Replace the caption with caption + label
+                        return figure.replace(caption, f"{caption}\n\\label{{fig:{label_text}}}")
+                return figure
+            
+            content = replace_environments(content, ('figure', 'figure*'), add_figure_label)
         
         elif 'figure* environment' in issue['description'].lower() and '2-column' in issue['description'].lower():
             # Convert single column figures to figure* for 2-column format
-            content = re.sub(r'\\begin\{figure\}\[h\]', r'\\begin{figure*}[!t]', content)
-            content = re.sub(r'\\begin\{figure\}', r'\\begin{figure*}[!t]', content)
-            content = re.sub(r'\\end\{figure\}', r'\\end{figure*}', content)
+            content, _ = self._apply_rules(content, FIGURE_STAR_RULES)
             
             # Fix image width to use \textwidth for figure*
-            content = re.sub(
-                r'(\\begin\{figure\*\}.*?\\includegraphics\[)width=\\columnwidth(\])',
-                r'\1width=\\textwidth\2',
-                content,
-                flags=re.DOTALL
+            content = replace_environments(
+                content, ('figure*',),
+                lambda figure: figure.replace('\\includegraphics[width=\\columnwidth]',
+                                              '\\includegraphics[width=\\textwidth]')
             )
         
         elif 'textwidth' in issue['description'].lower() and 'figure*' in issue['description'].lower():
             # Fix figure* to use \textwidth instead of \columnwidth
-            figure_pattern = r'\\begin\{figure\*\}.*?\\end\{figure\*\}'
-            figures = re.findall(figure_pattern, content, re.DOTALL)
-            
-            for figure in figures:
-                if 'width=\\columnwidth' in figure:
-                    new_figure = figure.replace('width=\\columnwidth', 'width=\\textwidth')
-                    content = content.replace(figure, new_figure)
+            content = replace_environments(
+                content, ('figure*',),
+                lambda figure: figure.replace('width=\\columnwidth', 'width=\\textwidth')
+            )
         
         elif 'columnwidth' in issue['description'].lower() and 'single column' in issue['description'].lower():
             # Fix single column figures to use \columnwidth
-            figure_pattern = r'\\begin\{figure\}(?!\*).*?\\end\{figure\}'
-            figures = re.findall(figure_pattern, content, re.DOTALL)
-            
-            for figure in figures:
-                if 'width=\\textwidth' in figure:
-                    new_figure = figure.replace('width=\\textwidth', 'width=\\columnwidth')
-                    content = content.replace(figure, new_figure)
+            content = replace_environments(
+                content, ('figure',),
+                lambda figure: figure.replace('width=\\textwidth', 'width=\\columnwidth')
+            )
         
         elif 'positioning [h]' in issue['description'].lower() or 'text overlap' in issue['description'].lower():
             # Fix figure positioning to prevent overlap
             if self.context.column_format == '2-column':
                 # For 2-column, use [!t] for figures* (top of page)
-                content = re.sub(r'\\begin\{figure\*\}\[h\]', r'\\begin{figure*}[!t]', content)
-                content = re.sub(r'\\begin\{figure\}\[h\]', r'\\begin{figure}[!tbp]', content)
+                content, _ = self._apply_rules(content, FIGURE_POSITION_2COL_RULES)
             else:
                 # For 1-column, use [!tbp] for better placement
-                content = re.sub(r'\\begin\{figure\*?\}\[h\]', r'\\begin{figure}[!tbp]', content)
+                content, _ = self._apply_rules(content, FIGURE_POSITION_1COL_RULES)
         
         return content
     
@@ -1908,39 +1379,13 @@ class UserGuidedLaTeXProcessor:
     
     def _apply_author_fix(self, content: str) -> str:
         """Apply author formatting fix"""
-        import re
-        
-        # Fix common author spacing issues for all formats
-        # Fix problematic spacing patterns like "{ }^{1}{ }^{*}"
-        content = re.sub(r'\$\{\s*\}\s*\^\{([^}]+)\}\s*\{\s*\}\s*\^\{([^}]+)\}\s*\$', r'$^{\1,\2}$', content)
-        content = re.sub(r'\$\{\s*\}\s*\^\{([^}]+)\}\s*\$', r'$^{\1}$', content)
+        # Fix common author spacing issues for all formats: "{ }^{1}{ }^{*}"
+        # superscripts, spaces before them, then the author block itself
+        # (cleaned, and for IEEE wrapped in \IEEEauthorblockN, in one scan)
+        author_block = IEEE_AUTHOR_BLOCK_RULES if self.context.conference_type == 'IEEE' else AUTHOR_BLOCK_RULES
+        content, _ = self._apply_rules(content, AUTHOR_SUPERSCRIPT_RULES, AUTHOR_NAME_SPACING_RULES, author_block)
         
-        # Fix excessive spaces in author names
-        content = re.sub(r'([A-Za-z]+)\s+\$\s*\{\s*\}\s*\^\{', r'\1$^{', content)
-        
-        # Clean up multiple consecutive spaces in author block
-        author_pattern = r'\\author\{([^}]+)\}'
-        def clean_author_spacing(match):
-            author_content = match.group(1)
-            # Clean up excessive spaces and fix superscript formatting
-            author_content = re.sub(r'\s+', ' ', author_content)  # Multiple spaces to single
-            author_content = re.sub(r'\s*\$\s*\{\s*\}\s*\^\{([^}]+)\}\s*\$', r'$^{\1}$', author_content)
-            return f'\\author{{{author_content}}}'
-        
-        content = re.sub(author_pattern, clean_author_spacing, content)
-        
-        if self.context.conference_type == 'IEEE':
-            # Find and replace author block with IEEE format
-            author_pattern = r'\\author\{([^}]+)\}'
-            
-            def replace_author(match):
-                current_authors = match.group(1)
-                # Simple IEEE author format
-                return f'\\author{{\\IEEEauthorblockN{{{current_authors}}}}}'
-            
-            content = re.sub(author_pattern, replace_author, content)
-        
-        elif self.context.conference_type == 'ACM':
+        if self.context.conference_type == 'ACM':
             # Convert old-style author format to proper ACM format
             content = self._convert_to_acm_author_format(content)
                 
@@ -2108,8 +1553,15 @@ class UserGuidedLaTeXProcessor:
                     
         return content
 
-    def generate_output_files(self, original_content: str, fixes: List[Dict], base_output_path: str, test_name: str = None):
-        """Generate both the fixed file and the report"""
+    def generate_output_files(self, original_content: str, fixes: List[Dict], base_output_path: str, test_name: str = None,
+                              flattened: Optional[Flattened] = None):
+        """
+        Generate both the fixed file and the report
+        
+        For a multi-file project, `original_content` is the flattened text
+        (`flattened`); the fixes are written back to each file, the included
+        ones next to the fixed main file at their relative paths
+        """
         
         # Generate fixed document
         fixed_content = self.apply_fixes_to_document(original_content, fixes)
@@ -2119,8 +1571,11 @@ class UserGuidedLaTeXProcessor:
             fixed_file_path = f"{os.path.dirname(base_output_path)}/{test_name}.tex"
         else:
             fixed_file_path = f"{base_output_path}_USER_GUIDED_FIXED.tex"
+        main_content = fixed_content
+        if flattened and len(flattened.files) > 1:
+            main_content = self._write_project_files(flattened, fixed_content, os.path.dirname(fixed_file_path))
         with open(fixed_file_path, 'w', encoding='utf-8') as f:
-            f.write(fixed_content)
+            f.write(main_content)
         print(f"✅ Generated fixed document: {fixed_file_path}")
         
         # Generate report
@@ -2131,6 +1586,21 @@ class UserGuidedLaTeXProcessor:
         self.generate_output_report(fixes, report_path, len(original_content), len(fixed_content))
         
         return fixed_file_path, report_path
+    
+    def _write_project_files(self, flattened: Flattened, fixed_content: str, output_dir: str) -> str:
+        """Write the fixed included files under output_dir; returns the fixed main file"""
+        if flattened.root and Path(output_dir).resolve() == flattened.root.resolve():
+            print("⚠️  Output directory is the project directory: writing one flattened file "
+                  "instead of overwriting the included files")
+            return fixed_content
+        files, skipped = flattened.files_of(fixed_content)
+        if skipped:
+            print(f"⚠️  {len(skipped)} edits span more than one project file; "
+                  f"written to the included files unchanged")
+        main_content = files.pop(flattened.main)
+        for path in write_files(files, output_dir):
+            print(f"✅ Generated fixed include: {path}")
+        return main_content
 
     def generate_output_report(self, fixes: List[Dict], output_path: str, original_size: int = 0, fixed_size: int = 0):
         """Generate comprehensive output with context information"""
@@ -2155,11 +1625,26 @@ class UserGuidedLaTeXProcessor:
             f"- **Original Size**: {original_size} characters",
             f"- **Fixed Size**: {fixed_size} characters",
             f"- **Size Change**: {'+' if fixed_size > original_size else ''}{fixed_size - original_size} characters",
-            f"",
-            f"## Generated Fixes",
             f""
         ]
         
+        cache = getattr(self.rag_fixer, 'cache', None)
+        if cache:
+            cache_stats = cache.stats()
+            report_lines.extend([
+                f"## Fix Cache",
+                f"- **Hit Rate**: {cache_stats['hit_rate']:.1%} ({cache_stats['hits']} hits / {cache_stats['misses']} misses)",
+                f"- **Cached Fixes**: {cache_stats['entries']}",
+                f"- **Latency Saved**: {cache_stats['saved_seconds']:.1f}s",
+                f"- **Cost Saved**: ${cache_stats['saved_usd']:.4f}",
+                f""
+            ])
+        
+        report_lines.extend([
+            f"## Generated Fixes",
+            f""
+        ])
+        
         for i, fix_info in enumerate(fixes, 1):
             issue = fix_info['issue']
             fix = fix_info['fix']
@@ -2450,6 +1935,8 @@ def main():
     parser.add_argument('--output-dir', default='output', help='Output directory')
     parser.add_argument('--test-name', help='Custom name for test output files')
     parser.add_argument('--compile-pdf', action='store_true', help='Compile fixed LaTeX to PDF after processing')
+    parser.add_argument('--chunked', action='store_true',
+                       help='Detect issues chunk by chunk in parallel (long documents and multi-file projects)')
     
     args = parser.parse_args()
     
@@ -2501,11 +1988,14 @@ def main():
         print("⚡ Processing Mode: Full conference-specific processing")
     print("=" * 50)
     
-    # Read input file
+    # Read input file, with every file it \\input's or \\include's
     try:
-        with open(args.file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        print(f"✅ Loaded document ({len(content)} characters)")
+        flattened = load_project(args.file).flatten()
+        content = flattened.latex
+        if len(flattened.files) > 1:
+            print(f"✅ Loaded project with {len(flattened.files)} files ({len(content)} characters)")
+        else:
+            print(f"✅ Loaded document ({len(content)} characters)")
     except FileNotFoundError:
         print(f"❌ File not found: {args.file}")
         return
@@ -2514,7 +2004,9 @@ def main():
     processor = UserGuidedLaTeXProcessor(api_key, context)
     
     # Detect issues with context awareness
-    issues = processor.detect_context_specific_issues(content)
+    issues = processor.detect_context_specific_issues(
+        content, chunk_chars=settings.CHUNK_CHARS if args.chunked else None,
+        boundaries=flattened.boundaries())
     
     if not issues:
         print("✨ No issues detected! Document appears to be properly formatted.")
@@ -2532,7 +2024,8 @@ def main():
     base_name = os.path.splitext(os.path.basename(args.file))[0]
     base_output_path = os.path.join(args.output_dir, base_name)
     
-    fixed_file, report_file = processor.generate_output_files(content, fixes, base_output_path, args.test_name)
+    fixed_file, report_file = processor.generate_output_files(content, fixes, base_output_path, args.test_name,
+                                                               flattened=flattened)
     
     # ALWAYS search for and copy images (not just when compiling PDF)
     source_file_dir = os.path.dirname(args.file)
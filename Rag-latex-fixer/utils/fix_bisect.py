@@ -0,0 +1,139 @@
+"""
+Bisecting validation of applied fixes
+
+When the fixed document fails validation, throwing every fix away loses
+the good ones with the bad. FixBisector instead searches the applied fixes
+(utils.fix_spans.AppliedFixes) for a small set whose removal makes the
+document valid again:
+
+- A candidate document is valid if it introduces no problem the original
+  did not have: first the cheap syntax check, then a compile, whose result
+  is cached by content. Syntax problems are compared by kind (which
+  environment is unmatched, how far the braces are off), not by message:
+  a fix that keeps an unbalanced original exactly as unbalanced changes
+  the brace counts in the message but adds no problem
+- The fix set is split in half and each half is checked on its own; halves
+  that pass are kept, failing halves are split further. If both halves pass
+  but not together, the second half is searched again on top of the first
+- The two halves of a split are searched in parallel, so their compiles run
+  concurrently (bounded by `workers`)
+- The surviving fixes are checked together at the end and searched again
+  if they still fail
+
+With k breaking fixes among n this takes about 2k log2(n) compiles, in
+about log2(n) rounds when there are enough workers, instead of one rerun
+per fix.
+"""
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from utils.fix_spans import AppliedFixes
+
+Check = Callable[[str], Tuple[bool, List[str]]]  # document -> (ok, errors)
+
+_BRACE_COUNTS = re.compile(r'Unmatched braces: (\d+) opening, (\d+) closing')
+
+
+def syntax_kinds(problems: Sequence[str]) -> Set[str]:
+    """Syntax problems without their counts; unmatched braces keep only the balance"""
+    kinds = set()
+    for problem in problems:
+        counts = _BRACE_COUNTS.match(problem)
+        if counts:
+            problem = f"Unmatched braces: {int(counts.group(1)) - int(counts.group(2)):+d}"
+        kinds.add(problem)
+    return kinds
+
+
+class FixBisector:
+    """Find the applied fixes that break validation"""
+
+    def __init__(self, applied: AppliedFixes, syntax_check: Check, compile_check: Check,
+                 workers: int = 0):
+        """
+        Args:
+            applied: Fixes spliced into applied.original
+            syntax_check: Cheap check, e.g. LatexValidator.check_syntax
+            compile_check: Full check, e.g. a LatexValidator.compile_latex wrapper
+            workers: Concurrent compiles (0 = CPU count)
+        """
+        self.applied = applied
+        self.syntax_check = syntax_check
+        self.compile_check = compile_check
+        self._compiles = threading.Semaphore(workers or os.cpu_count() or 1)
+        self._results: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+        self._baseline_lock = threading.Lock()
+        self.compile_count = 0
+
+        # Problems the original already has are not blamed on any fix
+        self._baseline_syntax = syntax_kinds(syntax_check(applied.original)[1])
+        self._baseline_errors: Optional[Set[str]] = None
+
+    def _baseline(self) -> Set[str]:
+        with self._baseline_lock:
+            if self._baseline_errors is None:
+                ok, errors = self._compile(self.applied.original)
+                self._baseline_errors = set() if ok else set(errors)
+            return self._baseline_errors
+
+    def _compile(self, latex: str) -> Tuple[bool, List[str]]:
+        with self._compiles:
+            with self._lock:
+                self.compile_count += 1
+            return self.compile_check(latex)
+
+    def passes(self, keep: Sequence[int]) -> bool:
+        """Whether the original plus the fixes at positions `keep` is valid"""
+        latex = self.applied.latex_with(keep)
+        key = hashlib.sha256(latex.encode('utf-8')).hexdigest()
+        with self._lock:
+            if key in self._results:
+                return self._results[key]
+
+        ok, problems = self.syntax_check(latex)
+        if not ok and not syntax_kinds(problems) <= self._baseline_syntax:
+            result = False
+        else:
+            ok, errors = self._compile(latex)
+            result = ok or set(errors) <= self._baseline()
+
+        with self._lock:
+            self._results[key] = result
+        return result
+
+    def find_breaking(self) -> List[int]:
+        """Positions (in applied.applied) of the fixes to roll back"""
+        drop: List[int] = []
+        while True:
+            kept = [i for i in range(len(self.applied.applied)) if i not in drop]
+            if self.passes(kept):
+                return sorted(drop)
+            # Survivors of separately searched halves can still clash together
+            found = self._search([], kept)
+            if not found:
+                return sorted(drop + kept)  # failing for a reason no subset explains
+            drop += found
+
+    def _search(self, base: List[int], candidates: List[int]) -> List[int]:
+        """Fixes among `candidates` to drop so the rest of each half passes on top of `base`"""
+        if not candidates or self.passes(base + candidates):
+            return []
+        if len(candidates) == 1:
+            return candidates
+
+        middle = len(candidates) // 2
+        left, right = candidates[:middle], candidates[middle:]
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            right_search = pool.submit(self._search, base, right)
+            drop_left = self._search(base, left)
+            drop_right = right_search.result()
+
+        if not drop_left and not drop_right:
+            # Each half is fine alone, not together: search one on top of the other
+            return self._search(base + left, right)
+        return drop_left + drop_right
@@ -0,0 +1,165 @@
+"""
+Declarative fix rules for UserGuidedLaTeXProcessor
+
+Each group of rewrites the processor used to run as a chain of whole-
+document re.sub calls is a RuleSet here (see utils.rule_engine), compiled
+once at import. Rules in one set never need each other's output, so a set
+is a single scan; sets that do depend on each other are separate stages.
+"""
+import re
+from functools import lru_cache
+from typing import Optional
+
+from utils.rule_engine import FixRule, RuleSet
+
+MAX_IMAGE_WIDTH = "0.5"  # fraction of \textwidth / \columnwidth
+
+_TABLE_BEGIN = r'\\begin\{table\}(\[[^\]]*\])?'
+_TABLE_END = r'\\end\{table\}'
+
+
+def _without(text: str):
+    return lambda document: text not in document
+
+
+_STFLOATS = FixRule('add_stfloats', r'\\usepackage\{caption\}', r'\g<0>\n\\usepackage{stfloats}',
+                    when=_without('\\usepackage{stfloats}'))
+
+# --- Figures -----------------------------------------------------------------
+
+# [!htbp] on every figure: keeps images near their source position
+IMAGE_POSITION_RULES = RuleSet('image_positioning', [
+    FixRule('figure_star_position', r'\\begin\{figure\*\}\[[^\]]*\]', r'\\begin{figure*}[!htbp]'),
+    FixRule('figure_position', r'\\begin\{figure\}\[[^\]]*\]', r'\\begin{figure}[!htbp]'),
+    FixRule('figure_star_add_position', r'\\begin\{figure\*\}(?!\[)', r'\\begin{figure*}[!htbp]'),
+    FixRule('figure_add_position', r'\\begin\{figure\}(?!\[)', r'\\begin{figure}[!htbp]'),
+])
+
+# Full-width and unsized images are limited to MAX_IMAGE_WIDTH
+IMAGE_SIZE_RULES = RuleSet('image_sizes', [
+    FixRule('image_width_cap',
+            r'\\includegraphics\[width=(?:1(?:\.0)?|0\.[6-9])?\\(textwidth|columnwidth)\]',
+            r'\\includegraphics[width=' + MAX_IMAGE_WIDTH + r'\\\1]'),
+    FixRule('image_default_width', r'\\includegraphics\{([^}\[]+)\}',
+            r'\\includegraphics[width=' + MAX_IMAGE_WIDTH + r'\\textwidth]{\1}'),
+])
+
+# Single-column figures become figure* (2-column layouts)
+FIGURE_STAR_RULES = RuleSet('figure_star', [
+    FixRule('figure_star_begin', r'\\begin\{figure\}(?:\[h\])?', r'\\begin{figure*}[!t]'),
+    FixRule('figure_star_end', r'\\end\{figure\}', r'\\end{figure*}'),
+])
+
+FIGURE_POSITION_2COL_RULES = RuleSet('figure_position_2col', [
+    FixRule('figure_star_top', r'\\begin\{figure\*\}\[h\]', r'\\begin{figure*}[!t]'),
+    FixRule('figure_float', r'\\begin\{figure\}\[h\]', r'\\begin{figure}[!tbp]'),
+])
+
+FIGURE_POSITION_1COL_RULES = RuleSet('figure_position_1col', [
+    FixRule('figure_float', r'\\begin\{figure\*?\}\[h\]', r'\\begin{figure}[!tbp]'),
+])
+
+# --- Tables ------------------------------------------------------------------
+
+IEEE_TABLE_STAR_RULES = RuleSet('ieee_table_star', [
+    FixRule('table_star_begin', _TABLE_BEGIN, r'\\begin{table*}[!tb]'),
+    FixRule('table_star_end', _TABLE_END, r'\\end{table*}'),
+    _STFLOATS,
+])
+
+IEEE_TABLE_POSITION_2COL_RULES = RuleSet('ieee_table_position_2col', [
+    FixRule('table_star_position', r'\\begin\{table\*?\}(\[[^\]]*\])?', r'\\begin{table*}[!tb]'),
+    _STFLOATS,
+])
+
+TABLE_POSITION_1COL_RULES = RuleSet('table_position_1col', [
+    FixRule('table_position', _TABLE_BEGIN, r'\\begin{table}[htbp]'),
+])
+
+ACM_TABLE_STAR_RULES = RuleSet('acm_table_star', [
+    FixRule('table_star_begin', _TABLE_BEGIN, r'\\begin{table*}[!t]'),
+    FixRule('table_star_end', _TABLE_END, r'\\end{table*}'),
+])
+
+# Existing table* floats keep their star; otherwise plain tables go to the top
+ACM_TABLE_POSITION_2COL_RULES = RuleSet('acm_table_position_2col', [
+    FixRule('table_star_top', r'\\begin\{table\*\}(\[[^\]]*\])?', r'\\begin{table*}[!t]',
+            when=lambda document: 'table*' in document),
+    FixRule('table_top', _TABLE_BEGIN, r'\\begin{table}[!t]',
+            when=lambda document: 'table*' not in document),
+])
+
+TABLE_CENTERING_RULES = RuleSet('table_centering', [
+    FixRule('center_begin', r'\\begin\{center\}', r'\\centering'),
+    FixRule('center_end', r'\\end\{center\}', ''),
+])
+
+_DOUBLE_COLUMN_FLOATS = ("\n% Adjust float parameters for better table placement\n" +
+                         "\\setcounter{dbltopnumber}{2}\n" +
+                         "\\renewcommand{\\dbltopfraction}{0.9}\n" +
+                         "\\renewcommand{\\dblfloatpagefraction}{0.7}\n")
+_SINGLE_COLUMN_FLOATS = ("\n% Float parameters to ensure tables don't break text\n" +
+                         "\\setcounter{topnumber}{2}\n" +
+                         "\\renewcommand{\\topfraction}{0.9}\n" +
+                         "\\renewcommand{\\textfraction}{0.1}\n" +
+                         "\\renewcommand{\\floatpagefraction}{0.8}\n")
+
+
+def float_parameters(conference_type: str, column_format: str) -> Optional[str]:
+    """Float placement parameters added after \\begin{document}, if any"""
+    if conference_type == "IEEE" and column_format == "2-column":
+        return _DOUBLE_COLUMN_FLOATS  # IEEE 2-column: prevent tables floating to end
+    if conference_type in ("IEEE", "ACM", "GENERIC"):
+        return _SINGLE_COLUMN_FLOATS  # ensure tables don't break text
+    return None
+
+
+@lru_cache(maxsize=None)
+def table_placement_rules(conference_type: str, column_format: str) -> Optional[RuleSet]:
+    """
+    Float parameters for the format, plus (GENERIC) [h] -> [ht] so a table
+    that does not fit goes to the top of the page instead of the end
+    """
+    rules = []
+    params = float_parameters(conference_type, column_format)
+    if params:
+        rules.append(FixRule(
+            'float_parameters', r'\\begin\{document\}', lambda match: match.group(0) + params,
+            when=lambda document: 'setcounter' not in document or 'topfraction' not in document
+        ))
+    if conference_type == "GENERIC":
+        rules.append(FixRule('table_here_or_top', r'\\begin\{table\}\[h\]', r'\\begin{table}[ht]'))
+        rules.append(FixRule('table_star_here_or_top', r'\\begin\{table\*\}\[h\]', r'\\begin{table*}[ht]'))
+    return RuleSet(f'table_placement_{conference_type}', rules) if rules else None
+
+# --- Authors -----------------------------------------------------------------
+
+# "{ }^{1}{ }^{*}" style affiliation marks from PDF conversion
+AUTHOR_SUPERSCRIPT_RULES = RuleSet('author_superscripts', [
+    FixRule('merge_superscripts', r'\$\{\s*\}\s*\^\{([^}]+)\}\s*\{\s*\}\s*\^\{([^}]+)\}\s*\$', r'$^{\1,\2}$'),
+    FixRule('clean_superscript', r'\$\{\s*\}\s*\^\{([^}]+)\}\s*\$', r'$^{\1}$'),
+])
+
+# Runs on the cleaned superscripts: no space between a name and its mark
+# (a match always starts a word; the lookbehind just skips trying mid-word)
+AUTHOR_NAME_SPACING_RULES = RuleSet('author_name_spacing', [
+    FixRule('attach_superscript', r'(?<![A-Za-z])([A-Za-z]+)\s+\$\s*\{\s*\}\s*\^\{', r'\1$^{'),
+])
+
+_AUTHOR = r'\\author\{([^}]+)\}'
+
+
+def _clean_author(authors: str) -> str:
+    authors = re.sub(r'\s+', ' ', authors)  # Multiple spaces to single
+    return re.sub(r'\s*\$\s*\{\s*\}\s*\^\{([^}]+)\}\s*\$', r'$^{\1}$', authors)
+
+
+AUTHOR_BLOCK_RULES = RuleSet('author_block', [
+    FixRule('clean_author_block', _AUTHOR, lambda match: f'\\author{{{_clean_author(match.group(1))}}}'),
+])
+
+# IEEE: cleaned and wrapped in \IEEEauthorblockN in the same scan
+IEEE_AUTHOR_BLOCK_RULES = RuleSet('ieee_author_block', [
+    FixRule('ieee_author_block', _AUTHOR,
+            lambda match: f'\\author{{\\IEEEauthorblockN{{{_clean_author(match.group(1))}}}}}'),
+])
@@ -0,0 +1,212 @@
+"""
+Span-based application of generated fixes
+
+A FixSuggestion carries the source span of the issue it fixes (location
+start_pos/end_pos, set by the detector). Fixes are applied as
+(start, end, replacement) edits sorted and joined in one rebuild, instead
+of one str.replace per fix on the first textual occurrence:
+
+- A fix whose span no longer holds its original code is re-anchored to the
+  nearest occurrence of that code, or dropped if there is none
+- Each fix is reduced to its changed lines, so fixes of the same element
+  (e.g. one adding \\centering, one adding [htbp] to the same table) are
+  both applied when they touch different lines
+- Where changes overlap, the higher-confidence fix wins and the other is
+  rolled back; fixes that unbalance braces or environments are rolled back
+
+Only the rolled back fixes are lost; everything else is applied.
+"""
+import re
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from models import FixSuggestion
+from utils.latex_scanner import tokenize
+
+Edit = Tuple[int, int, str]  # (start, end, replacement), absolute offsets
+
+
+@dataclass
+class AppliedFixes:
+    """Result of apply_fixes"""
+    original: str
+    latex: str
+    applied: List[FixSuggestion] = field(default_factory=list)
+    rolled_back: List[Tuple[FixSuggestion, str]] = field(default_factory=list)  # (fix, reason)
+    edits: List[Edit] = field(default_factory=list)  # what was spliced into the original
+    fix_edits: List[List[Edit]] = field(default_factory=list)  # edits of each applied fix
+
+    def latex_with(self, keep: Sequence[int]) -> str:
+        """The original with only the applied fixes at positions `keep`"""
+        return splice(self.original, sorted({edit for i in keep for edit in self.fix_edits[i]}))
+
+    def roll_back(self, drop: Sequence[int], reason: str) -> 'AppliedFixes':
+        """A copy with the applied fixes at positions `drop` rolled back"""
+        dropped = set(drop)
+        keep = [i for i in range(len(self.applied)) if i not in dropped]
+        return AppliedFixes(
+            original=self.original,
+            latex=self.latex_with(keep),
+            applied=[self.applied[i] for i in keep],
+            rolled_back=self.rolled_back + [(self.applied[i], reason) for i in drop],
+            edits=sorted({edit for i in keep for edit in self.fix_edits[i]}),
+            fix_edits=[self.fix_edits[i] for i in keep]
+        )
+
+
+def splice(content: str, edits: List[Edit]) -> str:
+    """Apply sorted, non-overlapping (start, end, replacement) edits in one pass"""
+    pieces = []
+    position = 0
+    for start, end, replacement in edits:
+        pieces.append(content[position:start])
+        pieces.append(replacement)
+        position = end
+    pieces.append(content[position:])
+    return ''.join(pieces)
+
+
+def balance(code: str) -> Dict[str, int]:
+    """Net braces and \\begin/\\end per environment (comments and verbatim skipped)"""
+    counts = Counter()
+    for kind, value, _, _ in tokenize(code):
+        if kind == 'open':
+            counts['{'] += 1
+        elif kind == 'close':
+            counts['{'] -= 1
+        elif kind == 'begin':
+            counts[value] += 1
+        elif kind == 'end':
+            counts[value] -= 1
+    return {key: count for key, count in counts.items() if count}
+
+
+def is_well_formed(original: str, fixed: str) -> bool:
+    """A fix must not change the brace/environment balance of the code it replaces"""
+    return balance(original) == balance(fixed)
+
+
+def locate_fix(latex: str, fix: FixSuggestion, line_starts: Optional[List[int]] = None) -> Optional[Tuple[int, int]]:
+    """
+    Span of fix.original_code in `latex`: the fix's own span if it still holds
+    that code, else the occurrence nearest to it (or to its start line)
+    """
+    code = fix.original_code
+    if not code:
+        return None
+    location = fix.location or {}
+    start = location.get("start_pos")
+    if start is not None and latex.startswith(code, start):
+        return start, start + len(code)
+
+    if start is None and location.get("start_line") and line_starts:
+        line = min(location["start_line"], len(line_starts))
+        start = line_starts[line - 1]
+
+    best = None
+    position = latex.find(code)
+    while position >= 0:
+        if start is None:
+            best = position
+            break
+        if best is None or abs(position - start) < abs(best - start):
+            best = position
+        elif position > start:
+            break  # occurrences only move further away from here on
+        position = latex.find(code, position + 1)
+    return (best, best + len(code)) if best is not None else None
+
+
+def fix_hunks(latex: str, start: int, end: int, replacement: str) -> List[Edit]:
+    """The lines of latex[start:end] that `replacement` changes, as absolute edits"""
+    old_lines = latex[start:end].splitlines(keepends=True)
+    new_lines = replacement.splitlines(keepends=True)
+    offsets = [start]
+    for line in old_lines:
+        offsets.append(offsets[-1] + len(line))
+
+    hunks = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_opcodes():
+        if tag != 'equal':
+            hunks.append((offsets[i1], offsets[i2], ''.join(new_lines[j1:j2])))
+    return hunks
+
+
+def describe(fix: FixSuggestion) -> str:
+    """Short label of a fix for logs"""
+    return fix.changes_made[0] if fix.changes_made else fix.original_code[:50]
+
+
+def _overlaps(a: Edit, b: Edit) -> bool:
+    if a[0] == a[1] == b[0] == b[1]:
+        return True  # two insertions at one offset: order would be arbitrary
+    return a[0] < b[1] and b[0] < a[1]
+
+
+def _conflict(accepted: List[Edit], keys: List[Tuple[int, int]], hunk: Edit) -> Optional[int]:
+    """
+    Index of an accepted hunk that `hunk` overlaps, -1 if it duplicates one
+    exactly, None if it is free. `accepted` is sorted and non-overlapping
+    """
+    start, end, _ = hunk
+    i = bisect_left(keys, (start, end))
+    if i < len(accepted) and accepted[i] == hunk:
+        return -1
+    if i > 0 and _overlaps(accepted[i - 1], hunk):
+        return i - 1
+    while i < len(accepted) and accepted[i][0] <= end:
+        if _overlaps(accepted[i], hunk):
+            return i
+        i += 1
+    return None
+
+
+def apply_fixes(latex: str, fixes: List[FixSuggestion]) -> AppliedFixes:
+    """
+    Apply `fixes` to `latex` as span edits in one rebuild; fixes that are
+    broken or lose a conflict are rolled back (see module docstring)
+    """
+    result = AppliedFixes(original=latex, latex=latex)
+    line_starts = None
+    if any((fix.location or {}).get("start_pos") is None for fix in fixes):
+        line_starts = [0] + [match.end() for match in re.finditer('\n', latex)]
+
+    candidates = []
+    for order, fix in enumerate(fixes):
+        if not is_well_formed(fix.original_code, fix.fixed_code):
+            result.rolled_back.append((fix, "unbalanced braces or environments"))
+            continue
+        span = locate_fix(latex, fix, line_starts)
+        if span is None:
+            result.rolled_back.append((fix, "original code not found"))
+            continue
+        candidates.append((order, fix, fix_hunks(latex, span[0], span[1], fix.fixed_code)))
+
+    # Highest confidence first; ties go to the earlier fix
+    candidates.sort(key=lambda candidate: (-candidate[1].confidence_score, candidate[0]))
+    accepted: List[Edit] = []
+    keys: List[Tuple[int, int]] = []
+    owners: List[FixSuggestion] = []
+    applied: Dict[int, Tuple[FixSuggestion, List[Edit]]] = {}
+    for order, fix, hunks in candidates:
+        clashes = [_conflict(accepted, keys, hunk) for hunk in hunks]
+        blocking = [j for j in clashes if j is not None and j >= 0]
+        if blocking:
+            result.rolled_back.append((fix, f"overlaps a higher-priority fix ({describe(owners[blocking[0]])})"))
+            continue
+        for hunk, clash in zip(hunks, clashes):
+            if clash is None:
+                index = bisect_left(keys, (hunk[0], hunk[1]))
+                accepted.insert(index, hunk)
+                keys.insert(index, (hunk[0], hunk[1]))
+                owners.insert(index, fix)
+        applied[order] = (fix, hunks)
+
+    result.edits = accepted
+    result.latex = splice(latex, accepted)
+    result.applied = [applied[order][0] for order in sorted(applied)]
+    result.fix_edits = [applied[order][1] for order in sorted(applied)]
+    return result
@@ -0,0 +1,253 @@
+"""
+Font metrics: real string widths for table layout
+
+Column widths used to be estimated from character counts (0.11cm per
+character, 2.5 characters per cm, fixed cm per column count), which over-
+or under-allocates depending on the letters involved. FontMetrics holds
+per-character advance widths from the document font's metric file:
+
+- TFM files (TeX font metrics, binary) and AFM files (Adobe, text), found
+  with kpsewhich when a TeX installation is available
+- Built-in tables otherwise: Times Roman/Bold from the Adobe core AFMs and
+  Computer Modern Roman from cmr10.tfm
+
+Metrics are cached per (family, size, bold) in get_metrics(), and each one
+is a 256-entry lookup table (cm per character code) with a cache of the
+strings it has measured.
+"""
+import re
+import shutil
+import struct
+import subprocess
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+PT_PER_CM = 72.27 / 2.54  # TeX points
+TABCOLSEP_CM = 6.0 / PT_PER_CM  # default \tabcolsep, on each side of a cell
+
+# Advance widths of ASCII 32..126 in 1/1000 em
+_TIMES_ROMAN = [
+    250, 333, 408, 500, 500, 833, 778, 333, 333, 333, 500, 564, 250, 333, 250, 278,
+    500, 500, 500, 500, 500, 500, 500, 500, 500, 500, 278, 278, 564, 564, 564, 444,
+    921, 722, 667, 667, 722, 611, 556, 722, 722, 333, 389, 722, 611, 889, 722, 722,
+    556, 722, 667, 556, 611, 722, 722, 944, 722, 722, 611, 333, 278, 333, 469, 500,
+    333, 444, 500, 444, 500, 444, 333, 500, 500, 278, 278, 500, 278, 778, 500, 500,
+    500, 500, 333, 389, 278, 500, 500, 722, 500, 500, 444, 480, 200, 480, 541,
+]
+_TIMES_BOLD = [
+    250, 333, 555, 500, 500, 1000, 833, 333, 333, 333, 500, 570, 250, 333, 250, 278,
+    500, 500, 500, 500, 500, 500, 500, 500, 500, 500, 333, 333, 570, 570, 570, 500,
+    930, 722, 667, 722, 722, 667, 611, 778, 778, 389, 500, 778, 667, 944, 722, 778,
+    611, 778, 722, 556, 667, 722, 722, 1000, 722, 722, 667, 333, 278, 333, 581, 500,
+    333, 500, 556, 444, 556, 444, 333, 500, 556, 278, 333, 556, 278, 833, 556, 500,
+    556, 556, 444, 389, 333, 556, 500, 722, 500, 500, 444, 394, 220, 394, 520,
+]
+# cmr10 (OT1); characters it lacks (< > | _ { } \ ^ ~) use the math/symbol font widths
+_CM_ROMAN = [
+    333, 278, 500, 833, 500, 833, 778, 278, 389, 389, 500, 778, 278, 333, 278, 500,
+    500, 500, 500, 500, 500, 500, 500, 500, 500, 500, 278, 278, 778, 778, 778, 472,
+    778, 750, 708, 722, 764, 681, 653, 785, 750, 361, 514, 778, 625, 917, 750, 778,
+    681, 778, 736, 556, 722, 750, 750, 1028, 750, 750, 611, 278, 500, 278, 500, 500,
+    278, 500, 556, 444, 556, 444, 306, 500, 556, 278, 306, 528, 278, 833, 556, 500,
+    556, 528, 392, 394, 389, 556, 528, 722, 528, 528, 444, 500, 278, 500, 500,
+]
+BUILTIN_METRICS = {
+    ('times', False): _TIMES_ROMAN,
+    ('times', True): _TIMES_BOLD,
+    ('cm', False): _CM_ROMAN,
+}
+MAX_CACHED_STRINGS = 50_000
+
+# Bold widths for families without bold metrics
+BOLD_FACTOR = 1.1
+
+# Metric files to try (with kpsewhich) before the built-in tables
+FONT_FILES = {
+    ('times', False): ['ptmr8r.tfm', 'ptmr8a.afm'],
+    ('times', True): ['ptmb8r.tfm', 'ptmb8a.afm'],
+    ('cm', False): ['cmr10.tfm'],
+    ('cm', True): ['cmbx10.tfm'],
+    ('libertine', False): ['LinLibertineT-tlf-t1.tfm'],
+    ('libertine', True): ['LinLibertineTB-tlf-t1.tfm'],
+}
+# Closest built-in family when no metric file is available
+FALLBACK_FAMILY = {'libertine': 'times'}
+
+# Relative font sizes (pt) per base size of the document class
+FONT_SIZES = {
+    9: {'normalsize': 9, 'small': 8, 'footnotesize': 7, 'scriptsize': 6},
+    10: {'normalsize': 10, 'small': 9, 'footnotesize': 8, 'scriptsize': 7},
+    11: {'normalsize': 10.95, 'small': 10, 'footnotesize': 9, 'scriptsize': 8},
+    12: {'normalsize': 12, 'small': 10.95, 'footnotesize': 10, 'scriptsize': 8},
+}
+
+_DOCUMENTCLASS = re.compile(r'\\documentclass\s*(?:\[([^\]]*)\])?\s*\{([^}]*)\}')
+_TIMES_PACKAGES = re.compile(r'\\usepackage\s*(?:\[[^\]]*\])?\s*\{[^}]*\b(times|mathptmx|newtxtext|txfonts|ptm)\b')
+_LIBERTINE_PACKAGES = re.compile(r'\\usepackage\s*(?:\[[^\]]*\])?\s*\{[^}]*\b(libertine|linuxlibertine)\b')
+_BODY = re.compile(r'\\begin\s*\{document\}')
+
+
+def parse_afm(text: str) -> Dict[int, float]:
+    """Character code -> width (em) from an AFM file's CharMetrics"""
+    widths = {}
+    for match in re.finditer(r'^C\s+(\d+)\s*;\s*WX\s+([\d.]+)', text, re.MULTILINE):
+        widths[int(match.group(1))] = float(match.group(2)) / 1000
+    return widths
+
+
+def parse_tfm(data: bytes) -> Dict[int, float]:
+    """Character code -> width (em, i.e. design size) from a TFM file"""
+    lf, lh, bc, ec, nw = struct.unpack('>5H', data[:10])
+    if len(data) < lf * 4 or ec < bc:
+        raise ValueError("truncated or empty TFM file")
+    char_info = 24 + lh * 4
+    width_table = char_info + (ec - bc + 1) * 4
+    fix_words = struct.unpack(f'>{nw}i', data[width_table:width_table + nw * 4])
+
+    widths = {}
+    for code in range(bc, ec + 1):
+        width_index = data[char_info + (code - bc) * 4]
+        if width_index:  # 0 means the character does not exist
+            widths[code] = fix_words[width_index] / 2 ** 20
+    return widths
+
+
+def _find_font_file(name: str) -> Optional[str]:
+    if not shutil.which('kpsewhich'):
+        return None
+    try:
+        result = subprocess.run(['kpsewhich', name], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def load_widths(family: str, bold: bool = False) -> Tuple[Dict[int, float], str]:
+    """
+    Character widths (em) of a font and where they came from: a metric
+    file on the system, a built-in table, or a fallback family.
+    """
+    for name in FONT_FILES.get((family, bold), []):
+        path = _find_font_file(name)
+        if not path:
+            continue
+        try:
+            if name.endswith('.tfm'):
+                with open(path, 'rb') as f:
+                    widths = parse_tfm(f.read())
+            else:
+                with open(path, encoding='latin-1') as f:
+                    widths = parse_afm(f.read())
+        except (OSError, ValueError, struct.error):
+            continue
+        if widths:
+            return widths, path
+
+    table = BUILTIN_METRICS.get((family, bold))
+    if table:
+        return {32 + i: width / 1000 for i, width in enumerate(table)}, f'builtin:{family}'
+    if bold and (family, False) in BUILTIN_METRICS:
+        widths, source = load_widths(family, False)
+        return {code: width * BOLD_FACTOR for code, width in widths.items()}, source + ' (bold estimate)'
+    return load_widths(FALLBACK_FAMILY.get(family, 'cm'), bold)
+
+
+@dataclass
+class FontMetrics:
+    """Width lookup table for one font at one size"""
+    family: str
+    size_pt: float
+    bold: bool
+    source: str
+    table: np.ndarray = field(repr=False)  # cm per character code 0..255
+    default_cm: float  # characters outside the table or missing from the font
+    _cache: Dict[str, float] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_widths(cls, widths: Dict[int, float], family: str, size_pt: float,
+                    bold: bool = False, source: str = '') -> 'FontMetrics':
+        cm_per_em = size_pt / PT_PER_CM
+        letters = [widths[code] for code in range(ord('a'), ord('z') + 1) if code in widths]
+        default_cm = (sum(letters) / len(letters) if letters else 0.5) * cm_per_em
+        table = np.full(256, default_cm)
+        for code, width in widths.items():
+            if 0 <= code < 256:
+                table[code] = width * cm_per_em
+        return cls(family, size_pt, bold, source, table, default_cm)
+
+    def width(self, text: str) -> float:
+        """Natural width of `text` in cm (no kerning or ligatures)"""
+        cached = self._cache.get(text)
+        if cached is None:
+            codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+            widths = np.where(codes < 256, self.table[np.minimum(codes, 255)], self.default_cm)
+            if len(self._cache) >= MAX_CACHED_STRINGS:
+                self._cache.clear()
+            self._cache[text] = cached = float(widths.sum())
+        return cached
+
+    def longest_word(self, text: str) -> float:
+        """Width in cm of the widest word, the narrowest a column can wrap it"""
+        return max((self.width(word) for word in text.split()), default=0.0)
+
+
+_metrics_cache: Dict[Tuple[str, float, bool], FontMetrics] = {}
+_metrics_lock = threading.Lock()
+
+
+def get_metrics(family: str = 'cm', size_pt: float = 10.0, bold: bool = False) -> FontMetrics:
+    """Shared metrics for a font family at a size, loaded once"""
+    key = (family, float(size_pt), bold)
+    with _metrics_lock:
+        metrics = _metrics_cache.get(key)
+    if metrics is None:
+        widths, source = load_widths(family, bold)
+        metrics = FontMetrics.from_widths(widths, family, size_pt, bold, source)
+        with _metrics_lock:
+            metrics = _metrics_cache.setdefault(key, metrics)
+    return metrics
+
+
+def document_font(latex: str) -> Tuple[str, int]:
+    """
+    (family, base size in pt) of a document, from its class, class options
+    and font packages; LaTeX's defaults are Computer Modern at 10pt
+    """
+    body = _BODY.search(latex)
+    preamble = latex[:body.start()] if body else latex
+    documentclass = _DOCUMENTCLASS.search(preamble)
+    options, doc_class = (documentclass.group(1) or '', documentclass.group(2).strip()) if documentclass else ('', '')
+
+    size = re.search(r'\b(9|10|11|12)pt\b', options)
+    if size:
+        base_size = int(size.group(1))
+    elif doc_class == 'acmart' and re.search(r'\bsig(conf|plan|chi)', options):
+        base_size = 9  # acmart's conference formats
+    else:
+        base_size = 10
+
+    if doc_class == 'acmart' or _LIBERTINE_PACKAGES.search(preamble):
+        family = 'libertine'
+    elif doc_class == 'IEEEtran' or _TIMES_PACKAGES.search(preamble):
+        family = 'times'
+    else:
+        family = 'cm'
+    return family, base_size
+
+
+def document_metrics(latex: str, size: str = 'normalsize', bold: bool = False) -> FontMetrics:
+    """Metrics of the document's font at a relative size (\\small, ...)"""
+    family, base_size = document_font(latex)
+    return get_metrics(family, FONT_SIZES[base_size].get(size, base_size), bold)
+
+
+def table_font_size(table_content: str, default: str = 'small') -> str:
+    """Relative size declared before a table's tabular, or `default`"""
+    prefix = table_content.split('\\begin{tabular}')[0]
+    for size in ('scriptsize', 'footnotesize', 'small', 'normalsize'):
+        if '\\' + size in prefix:
+            return size
+    return default
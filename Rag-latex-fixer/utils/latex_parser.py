@@ -5,6 +5,9 @@ import re
 from typing import Dict, List, Tuple, Optional
 from pathlib import Path
 
+from utils.latex_scanner import balanced_argument
+from utils.latex_structure import Environment, LatexStructure, get_structure
+
 
 class LatexParser:
     """Parse and analyze LaTeX document structure"""
@@ -51,117 +54,69 @@ class LatexParser:
         
         return False
     
-    def extract_element(self, latex: str, element_type: str) -> Optional[Dict[str, any]]:
+    def extract_element(self, latex: str, element_type: str,
+                        structure: Optional[LatexStructure] = None) -> Optional[Dict[str, any]]:
         """
         Extract specific elements like \\author, \\title, etc.
         """
-        # Pattern to match \element{...} with nested braces support
-        pattern = rf'\\{element_type}\s*{{([^{{}}]*(?:{{[^{{}}]*}}[^{{}}]*)*)}}'
-        match = re.search(pattern, latex, re.DOTALL)
+        structure = structure or get_structure(latex)
         
-        if match:
-            start_pos = match.start()
-            end_pos = match.end()
+        # First \element whose argument is a balanced {...} group
+        for command in structure.commands.get(element_type, []):
+            argument = balanced_argument(latex, command.end, structure.braces)
+            if not argument:
+                continue
             
-            # Find line numbers
-            lines_before = latex[:start_pos].count('\n')
-            lines_in_element = match.group(0).count('\n')
+            start_pos = command.start
+            end_pos = argument[1] + 1
             
             return {
-                "content": match.group(1),
-                "full_match": match.group(0),
-                "start_line": lines_before + 1,
-                "end_line": lines_before + lines_in_element + 1,
+                "content": latex[argument[0]:argument[1]],
+                "full_match": latex[start_pos:end_pos],
+                "start_line": structure.line_of(start_pos),
+                "end_line": structure.line_of(end_pos - 1),
                 "start_pos": start_pos,
                 "end_pos": end_pos
             }
         return None
     
-    def extract_all_environments(self, latex: str, env_name: str) -> List[Dict[str, any]]:
+    def extract_all_environments(self, latex: str, env_name: str,
+                                 structure: Optional[LatexStructure] = None) -> List[Dict[str, any]]:
         """
         Extract all instances of a specific environment
         """
-        environments = []
-        pattern = rf'\\begin\{{{env_name}\}}(.*?)\\end\{{{env_name}\}}'
-        
-        for match in re.finditer(pattern, latex, re.DOTALL):
-            start_pos = match.start()
-            end_pos = match.end()
-            lines_before = latex[:start_pos].count('\n')
-            lines_in_env = match.group(0).count('\n')
-            
-            environments.append({
-                "content": match.group(1),
-                "full_match": match.group(0),
-                "start_line": lines_before + 1,
-                "end_line": lines_before + lines_in_env + 1,
-                "start_pos": start_pos,
-                "end_pos": end_pos
-            })
-        
-        return environments
+        structure = structure or get_structure(latex)
+        return [structure.environment_dict(env) for env in structure.environments_named(env_name)]
     
-    def extract_tables(self, latex: str) -> List[Dict[str, any]]:
-        """Extract all table environments"""
-        tables = []
-        
-        # Find table environments
-        table_envs = self.extract_all_environments(latex, "table")
-        table_star_envs = self.extract_all_environments(latex, "table\\*")
-        
-        all_tables = table_envs + table_star_envs
-        
-        for table in all_tables:
+    def _extract_floats(self, latex: str, float_name: str,
+                        structure: Optional[LatexStructure] = None) -> List[Dict[str, any]]:
+        """Extract float environments (plain, then starred) with layout details"""
+        structure = structure or get_structure(latex)
+        return [self.float_details(latex, env, structure)
+                for env in structure.environments_named(float_name, float_name + "*")]
+    
+    def float_details(self, latex: str, env: Environment, structure: LatexStructure) -> Dict[str, any]:
+        """One float environment with layout details"""
+        body = latex[env.body_start:env.body_end]
+        return {
+            **structure.environment_dict(env),
             # Check if centering is present
-            has_centering = r'\centering' in table['full_match'] or \
-                          r'\begin{center}' in table['full_match']
-            
-            # Check for placement parameters
-            placement_match = re.search(r'\\begin\{table\*?\}\[(.*?)\]', table['full_match'])
-            placement = placement_match.group(1) if placement_match else None
-            
+            "has_centering": r'\centering' in body or r'\begin{center}' in body,
+            # Placement parameters, e.g. [htbp]
+            "placement": env.options,
             # Check if it's spanning columns
-            is_spanning = 'table*' in table['full_match']
-            
-            tables.append({
-                **table,
-                "has_centering": has_centering,
-                "placement": placement,
-                "is_spanning": is_spanning
-            })
-        
-        return tables
+            "is_spanning": env.name.endswith('*')
+        }
+    
+    def extract_tables(self, latex: str,
+                       structure: Optional[LatexStructure] = None) -> List[Dict[str, any]]:
+        """Extract all table environments"""
+        return self._extract_floats(latex, "table", structure)
     
-    def extract_figures(self, latex: str) -> List[Dict[str, any]]:
+    def extract_figures(self, latex: str,
+                        structure: Optional[LatexStructure] = None) -> List[Dict[str, any]]:
         """Extract all figure environments"""
-        figures = []
-        
-        # Find figure environments
-        figure_envs = self.extract_all_environments(latex, "figure")
-        figure_star_envs = self.extract_all_environments(latex, "figure\\*")
-        
-        all_figures = figure_envs + figure_star_envs
-        
-        for figure in all_figures:
-            # Check if centering is present
-            has_centering = r'\centering' in figure['full_match'] or \
-                          r'\begin{center}' in figure['full_match']
-            
-            # Check for placement parameters
-            placement_match = re.search(r'\\begin\{figure\*?\}\[(.*?)\]', figure['full_match'])
-            placement = placement_match.group(1) if placement_match else None
-            
-            # Check if it's spanning columns
-            is_spanning = 'figure*' in figure['full_match']
-            
-            figures.append({
-                **figure,
-                "has_centering": has_centering,
-                "placement": placement,
-                "is_spanning": is_spanning
-            })
-        
-        return figures
+        return self._extract_floats(latex, "figure", structure)
     
     def check_element_centering(self, element_code: str) -> bool:
         """Check if element has centering commands"""
@@ -173,19 +128,16 @@ class LatexParser:
         return any(re.search(pattern, element_code) for pattern in centering_patterns)
     
     def extract_context(self, latex: str, start_line: int, end_line: int, 
-                       context_lines: int = 5) -> str:
+                       context_lines: int = 5,
+                       structure: Optional[LatexStructure] = None) -> str:
         """Extract code with surrounding context"""
-        lines = latex.split('\n')
-        start_idx = max(0, start_line - context_lines - 1)
-        end_idx = min(len(lines), end_line + context_lines)
-        return '\n'.join(lines[start_idx:end_idx])
+        structure = structure or get_structure(latex)
+        return structure.lines(start_line - context_lines, end_line + context_lines)
     
-    def get_preamble(self, latex: str) -> str:
+    def get_preamble(self, latex: str, structure: Optional[LatexStructure] = None) -> str:
         """Extract document preamble"""
-        match = re.search(r'(.*?)\\begin\{document\}', latex, re.DOTALL)
-        return match.group(1) if match else ""
+        return (structure or get_structure(latex)).preamble
     
-    def get_document_body(self, latex: str) -> str:
+    def get_document_body(self, latex: str, structure: Optional[LatexStructure] = None) -> str:
         """Extract document body"""
-        match = re.search(r'\\begin\{document\}(.*?)\\end\{document\}', latex, re.DOTALL)
-        return match.group(1) if match else ""
+        return (structure or get_structure(latex)).body
@@ -0,0 +1,340 @@
+"""
+Multi-file projects and chunking of long documents
+
+A thesis is usually a main file that \\input's or \\include's one file per
+chapter. load_project() reads the main file and every file it includes
+(recursively, relative to the main file's directory). flatten() inlines
+them into one text and keeps where each file's text landed, so edits made
+on the flattened text are written back to the file they fall in
+(Flattened.unflatten).
+
+split_chunks() cuts a long document into chunks that can be processed
+independently:
+
+- Cuts are made at lines that start a \\part/\\chapter/\\section and at the
+  edges of included files, never inside an environment other than document
+- Consecutive sections are packed into chunks of at most `max_chars`; a
+  longer section stays whole
+- The preamble (up to the \\begin{document} line) is shared: every chunk's
+  context document is the preamble, the chunk and \\end{document}
+  (Chunk.context), so document-wide settings such as two-column layout
+  apply to each chunk
+- Only checks that look at one region at a time can run on a chunk;
+  document-wide checks still need the whole text, and float numbers are
+  shifted by Chunk.float_offsets to stay document numbers
+"""
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from models import LatexIssue
+from utils.fix_spans import Edit, splice
+from utils.latex_scanner import balanced_argument
+from utils.latex_structure import LatexStructure, diff_hunks, get_structure
+
+MAX_CHUNK_CHARS = 40_000
+
+CHUNK_HEADINGS = ("part", "chapter", "section")
+
+INCLUDE_COMMANDS = ("input", "include")
+
+FLOAT_NAMES = ("table", "figure")
+
+
+@dataclass
+class Segment:
+    """Where a piece of a file sits in the flattened text"""
+    file: str
+    start: int  # offsets in the flattened text
+    end: int
+    file_start: int  # offset of the piece in its file
+
+
+@dataclass
+class Flattened:
+    """A project inlined into one text"""
+    latex: str
+    files: Dict[str, str]  # original content per file
+    segments: List[Segment] = field(default_factory=list)  # sorted; text between them is glue
+    main: str = ''
+    root: Optional[Path] = None
+
+    def __post_init__(self):
+        self._starts = [segment.start for segment in self.segments]
+
+    def segment_of(self, start: int, end: int) -> Optional[Segment]:
+        """The segment that contains all of [start, end), if any"""
+        i = bisect_right(self._starts, start) - 1
+        # An insertion at a boundary belongs to the segment it ends
+        if start == end and i > 0 and self.segments[i - 1].end == start:
+            i -= 1
+        if i >= 0 and end <= self.segments[i].end:
+            return self.segments[i]
+        return None
+
+    def boundaries(self) -> List[int]:
+        """Offsets where one file's text starts or ends"""
+        return sorted({offset for segment in self.segments for offset in (segment.start, segment.end)})
+
+    def unflatten(self, edits: Sequence[Edit]) -> Tuple[Dict[str, str], List[Edit]]:
+        """
+        Apply edits of the flattened text to the files
+
+        Returns:
+            Tuple of (content of every file, edits that span more than one
+            file or touch the glue between them and were not applied)
+        """
+        per_file: Dict[str, List[Edit]] = {}
+        skipped = []
+        for start, end, replacement in edits:
+            segment = self.segment_of(start, end)
+            if segment is None:
+                skipped.append((start, end, replacement))
+                continue
+            shift = segment.file_start - segment.start
+            per_file.setdefault(segment.file, []).append((start + shift, end + shift, replacement))
+
+        files = dict(self.files)
+        for name, file_edits in per_file.items():
+            files[name] = splice(self.files[name], sorted(file_edits))
+        return files, skipped
+
+    def files_of(self, fixed_latex: str) -> Tuple[Dict[str, str], List[Edit]]:
+        """unflatten() the line diff between the flattened text and `fixed_latex`"""
+        return self.unflatten(diff_hunks(self.latex, fixed_latex, max_change=1.0))
+
+
+@dataclass
+class LatexProject:
+    """A main file and the files it includes"""
+    root: Path
+    main: str  # path of the main file, relative to root
+    files: Dict[str, str] = field(default_factory=dict)  # content per relative path, main first
+
+    def flatten(self) -> Flattened:
+        """Inline every \\input/\\include; each file is inlined where it is first included"""
+        pieces: List[str] = []
+        segments: List[Segment] = []
+        length = [0]
+
+        def emit(text: str, file: Optional[str] = None, file_start: int = 0):
+            if file is not None and text:
+                segments.append(Segment(file, length[0], length[0] + len(text), file_start))
+            pieces.append(text)
+            length[0] += len(text)
+
+        def inline(name: str, seen: set):
+            content = self.files[name]
+            position = 0
+            for start, end, target, command in _inclusions(content):
+                path = _resolve(target)
+                if path not in self.files or path in seen:
+                    continue  # missing, or included before (keep the command)
+                emit(content[position:start], name, position)
+                seen.add(path)
+                if command == 'include':
+                    emit("\\clearpage\n")
+                inline(path, seen)
+                if command == 'include':
+                    emit("\n\\clearpage")
+                position = end
+            emit(content[position:], name, position)
+
+        inline(self.main, {self.main})
+        return Flattened(''.join(pieces), dict(self.files), segments, self.main, self.root)
+
+
+def write_files(files: Dict[str, str], output_dir) -> List[Path]:
+    """Write `files` (relative path -> content) under output_dir"""
+    written = []
+    for name, content in files.items():
+        path = Path(output_dir) / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding='utf-8')
+        written.append(path)
+    return written
+
+
+def _inclusions(content: str) -> List[Tuple[int, int, str, str]]:
+    """(start, end, target, command) of every \\input{...}/\\include{...}, comments skipped"""
+    structure = get_structure(content)
+    found = []
+    for command in INCLUDE_COMMANDS:
+        for occurrence in structure.commands.get(command, ()):
+            argument = balanced_argument(content, occurrence.end, structure.braces)
+            if argument:
+                found.append((occurrence.start, argument[1] + 1,
+                              content[argument[0]:argument[1]].strip(), command))
+    return sorted(found)
+
+
+def _resolve(target: str) -> str:
+    """Project path of an included file; LaTeX resolves against the main file's directory"""
+    path = target if Path(target).suffix == '.tex' else target + '.tex'
+    return Path(path).as_posix()
+
+
+def load_project(main_file) -> LatexProject:
+    """Read `main_file` and every file it includes, recursively"""
+    main_path = Path(main_file)
+    project = LatexProject(root=main_path.parent, main=main_path.name)
+    pending = [main_path.name]
+    while pending:
+        name = pending.pop(0)
+        if name in project.files:
+            continue
+        path = project.root / name
+        try:
+            project.files[name] = path.read_text(encoding='utf-8')
+        except (FileNotFoundError, IsADirectoryError, UnicodeDecodeError) as e:
+            if name == project.main:
+                raise
+            logger.warning(f"Skipping included file {name}: {e}")
+            continue
+        pending.extend(_resolve(target)
+                       for _, _, target, _ in _inclusions(project.files[name]))
+    return project
+
+
+def _clamp_line(line: int, structure: LatexStructure) -> int:
+    return min(max(line, 1), len(structure.line_starts))
+
+
+def has_position(issue: LatexIssue) -> bool:
+    """Whether the issue says where in the document it is"""
+    location = issue.location or {}
+    return "start_pos" in location or "start_line" in location
+
+
+@dataclass
+class Chunk:
+    """A span of a document processed on its own (absolute offsets)"""
+    start: int
+    end: int
+    preamble_end: int  # the shared preamble is latex[:preamble_end]
+    closing_start: int  # latex[closing_start:] closes the document (\\end{document} on)
+    line_offset: int = 0  # line in the document = line in the context + line_offset
+
+    @property
+    def context_start(self) -> int:
+        """Where the chunk's own text starts in its context document"""
+        return 0 if self.start == 0 else self.preamble_end
+
+    @property
+    def offset(self) -> int:
+        """Offset in the document = offset in the context + offset"""
+        return self.start - self.context_start
+
+    def owns(self, position: int) -> bool:
+        """Whether a context offset falls in the chunk's own text"""
+        return self.context_start <= position < self.end - self.offset
+
+    def own_issues(self, issues: Sequence[LatexIssue], structure: LatexStructure) -> List[LatexIssue]:
+        """
+        The issues found in the chunk's own text, moved to document offsets
+        and lines; issues without a position are kept as they are
+
+        Args:
+            issues: Issues detected in the chunk's context
+            structure: Structure of the chunk's context
+        """
+        owned = []
+        for issue in issues:
+            if not has_position(issue):
+                owned.append(issue)
+                continue
+            position = issue.location.get("start_pos")
+            if position is None:
+                position = structure.line_starts[_clamp_line(issue.location["start_line"], structure) - 1]
+            if self.owns(position):
+                owned.append(issue.moved(self.offset, self.line_offset))
+        return owned
+
+    def document_line(self, line: int, structure: LatexStructure) -> Optional[int]:
+        """Document line of a line of the context; None outside the chunk's own text"""
+        line = _clamp_line(line, structure)
+        return line + self.line_offset if self.owns(structure.line_starts[line - 1]) else None
+
+    def float_offsets(self, structure: LatexStructure,
+                      names: Sequence[str] = FLOAT_NAMES) -> Dict[str, int]:
+        """
+        Per float name, the number to add to a float's number in the context
+        to get its number in the document: the `name`/`name*` floats before
+        the chunk's own text, less those the context repeats (the preamble's)
+
+        Args:
+            structure: Structure of the whole document
+        """
+        offsets = {}
+        for name in names:
+            starts = [env.start for env in structure.environments_named(name, name + "*")]
+            repeated = sum(start < self.preamble_end for start in starts) if self.start else 0
+            offsets[name] = sum(start < self.start for start in starts) - repeated
+        return offsets
+
+    def context(self, latex: str) -> str:
+        """The shared preamble, the chunk, and the end of the document"""
+        closing = ''
+        if self.end < self.closing_start:
+            closing = ('' if latex[self.end - 1] == '\n' else '\n') + latex[self.closing_start:]
+        if self.start == 0:
+            return latex[:self.end] + closing
+        return latex[:self.preamble_end] + latex[self.start:self.end] + closing
+
+
+def split_chunks(latex: str, max_chars: int = MAX_CHUNK_CHARS,
+                 boundaries: Sequence[int] = (),
+                 structure: Optional[LatexStructure] = None) -> List[Chunk]:
+    """
+    Cut `latex` into chunks of about `max_chars` (see module docstring)
+
+    Args:
+        boundaries: Further offsets where a cut may be made, e.g. the
+            edges of included files (Flattened.boundaries)
+    """
+    structure = structure or get_structure(latex)
+    preamble_end, closing_start = 0, len(latex)
+    if structure.document:
+        line_end = latex.find('\n', structure.document.start)
+        preamble_end = line_end + 1 if line_end >= 0 else len(latex)
+        closing_start = structure.document.body_end
+
+    cuts = set(offset for offset in boundaries if preamble_end < offset < closing_start)
+    for name in CHUNK_HEADINGS:
+        for command in structure.commands.get(name, ()):
+            line_start = structure.line_starts[command.line - 1]
+            if preamble_end < line_start < closing_start and not latex[line_start:command.start].strip():
+                cuts.add(line_start)
+
+    # No cut inside an environment (other than document)
+    spans = sorted((env.start, env.end) for env in structure.environments if env.name != 'document')
+    covered: List[Tuple[int, int]] = []
+    for start, end in spans:
+        if covered and start < covered[-1][1]:
+            covered[-1] = (covered[-1][0], max(covered[-1][1], end))
+        else:
+            covered.append((start, end))
+    covered_starts = [start for start, _ in covered]
+
+    def inside(offset: int) -> bool:
+        i = bisect_right(covered_starts, offset) - 1
+        return i >= 0 and covered[i][0] < offset < covered[i][1]
+
+    bounds = [0] + sorted(cut for cut in cuts if not inside(cut)) + [len(latex)]
+    chunks: List[Chunk] = []
+    start = 0
+    for i in range(1, len(bounds)):
+        end = bounds[i]
+        following = bounds[i + 1] if i + 1 < len(bounds) else None
+        if following is not None and following - start <= max_chars:
+            continue  # the next section still fits
+        chunks.append(Chunk(start, end, preamble_end, closing_start))
+        start = end
+
+    for chunk in chunks:
+        if chunk.start:
+            chunk.line_offset = structure.line_of(chunk.start) - structure.line_of(preamble_end)
+    return [chunk for chunk in chunks if chunk.end > chunk.start]
@@ -0,0 +1,187 @@
+"""
+Linear-time LaTeX brace and environment matcher
+
+Regexes like \\begin\\{table\\*?\\}.*?\\\\end\\{table\\*?\\} (DOTALL) or the
+nested-brace pattern [^{}]*(?:{[^{}]*}[^{}]*)* rescan the rest of the
+document for every unclosed environment or brace, which stalls on
+malformed conversion output. Everything here is one left-to-right pass
+with a stack:
+
+- tokenize(): escapes, comments, \\begin/\\end tags, commands and braces;
+  comments and verbatim content are skipped
+- match_environments(): \\begin/\\end pairs with nesting
+- brace_map() / balanced_argument(): balanced {...} groups
+- environment_spans() / replace_environments(): outermost spans of the
+  named environments, and a re.sub-like rewrite over them
+
+Unclosed environments and braces never match; unmatched closers are
+ignored.
+"""
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+VERBATIM_ENVIRONMENTS = {'verbatim', 'Verbatim', 'lstlisting', 'minted', 'comment'}
+
+# Every alternative is bounded by the token it matches, so a failed attempt
+# never scans past the next newline, brace or name
+_TOKEN = re.compile(r"""
+    (?P<escape>\\[\\%{}$&\#_])
+  | (?P<comment>%[^\n]*)
+  | \\begin[ \t]*\{[ \t]*(?P<begin>[a-zA-Z@*]+)[ \t]*\}
+  | \\end[ \t]*\{[ \t]*(?P<end>[a-zA-Z@*]+)[ \t]*\}
+  | \\verb\*?(?P<verb>[^a-zA-Z\s*])
+  | \\(?P<command>[a-zA-Z@]+\*?)
+  | (?P<open>\{)
+  | (?P<close>\})
+""", re.VERBOSE)
+
+Token = Tuple[str, str, int, int]  # (kind, value, start, end)
+
+
+@dataclass
+class EnvironmentSpan:
+    """A matched \\begin{name} ... \\end{name} (absolute offsets)"""
+    name: str
+    start: int
+    body_start: int
+    body_end: int = -1
+    end: int = -1
+    parent: Optional[int] = None  # position of the enclosing span in the result
+    depth: int = 0
+
+    @property
+    def closed(self) -> bool:
+        return self.end >= 0
+
+
+def tokenize(text: str) -> Iterator[Token]:
+    """
+    Yield (kind, value, start, end) for every begin, end, command, open and
+    close token, skipping escapes, comments, \\verb and verbatim bodies.
+    A begin token of a verbatim environment is followed directly by its end
+    token (if there is one).
+    """
+    pos = 0
+    search = _TOKEN.search
+    while True:
+        match = search(text, pos)
+        if not match:
+            return
+        pos = match.end()
+        kind = match.lastgroup
+
+        if kind in ('escape', 'comment'):
+            continue
+        if kind == 'verb':
+            close = text.find(match.group('verb'), pos)
+            newline = text.find('\n', pos)
+            if close >= 0 and (newline < 0 or close < newline):
+                pos = close + 1
+            continue
+
+        value = match.group(kind)
+        yield kind, value, match.start(), pos
+
+        if kind == 'begin' and value in VERBATIM_ENVIRONMENTS:
+            # Nothing inside is LaTeX; jump straight to the closing tag
+            close = re.compile(r'\\end[ \t]*\{[ \t]*' + re.escape(value) + r'[ \t]*\}').search(text, pos)
+            if not close:
+                return
+            yield 'end', value, close.start(), close.end()
+            pos = close.end()
+
+
+def match_environments(text: str, tokens: Optional[Sequence[Token]] = None) -> List[EnvironmentSpan]:
+    """
+    All environments in order of their \\begin, closed ones only.
+
+    An \\end closes the innermost open environment of the same name; any
+    environments opened inside it and never closed are dropped. An \\end
+    with no open environment of its name is ignored.
+    """
+    opened: List[EnvironmentSpan] = []
+    stack: List[int] = []
+    for kind, value, start, end in (tokenize(text) if tokens is None else tokens):
+        if kind == 'begin':
+            opened.append(EnvironmentSpan(value, start, end, parent=stack[-1] if stack else None))
+            stack.append(len(opened) - 1)
+        elif kind == 'end':
+            for depth in range(len(stack) - 1, -1, -1):
+                env = opened[stack[depth]]
+                if env.name == value:
+                    env.body_end, env.end = start, end
+                    del stack[depth:]
+                    break
+
+    closed = [env for env in opened if env.closed]
+    # Renumber parents now that unclosed environments are gone (parents
+    # start earlier, so they are always renumbered first)
+    positions = {id(env): i for i, env in enumerate(closed)}
+    for env in closed:
+        parent = opened[env.parent] if env.parent is not None else None
+        while parent is not None and id(parent) not in positions:
+            parent = opened[parent.parent] if parent.parent is not None else None
+        env.parent = positions[id(parent)] if parent is not None else None
+        env.depth = closed[env.parent].depth + 1 if env.parent is not None else 0
+    return closed
+
+
+def brace_map(text: str, tokens: Optional[Sequence[Token]] = None) -> Dict[int, int]:
+    """Offset of every balanced '{' -> offset of its matching '}'"""
+    braces: Dict[int, int] = {}
+    stack: List[int] = []
+    for kind, _, start, _ in (tokenize(text) if tokens is None else tokens):
+        if kind == 'open':
+            stack.append(start)
+        elif kind == 'close' and stack:
+            braces[stack.pop()] = start
+    return braces
+
+
+def balanced_argument(text: str, pos: int, braces: Optional[Dict[int, int]] = None) -> Optional[Tuple[int, int]]:
+    """
+    Span of the contents of the {...} group starting at `pos` (after
+    optional whitespace), or None if there is no balanced group there
+    """
+    while pos < len(text) and text[pos] in ' \t\n':
+        pos += 1
+    if pos >= len(text) or text[pos] != '{':
+        return None
+    close = (brace_map(text) if braces is None else braces).get(pos)
+    return (pos + 1, close) if close is not None else None
+
+
+def command_arguments(text: str, name: str) -> List[Tuple[int, int, int]]:
+    """(command start, argument start, argument end) of every \\name{...}"""
+    tokens = list(tokenize(text))
+    braces = brace_map(text, tokens)
+    found = []
+    for kind, value, start, end in tokens:
+        if kind == 'command' and value == name:
+            argument = balanced_argument(text, end, braces)
+            if argument:
+                found.append((start, argument[0], argument[1]))
+    return found
+
+
+def environment_spans(text: str, names: Sequence[str]) -> List[EnvironmentSpan]:
+    """Outermost environments named any of `names`, in document order"""
+    names = set(names)
+    spans = []
+    for env in match_environments(text):
+        if env.name in names and (not spans or env.start >= spans[-1].end):
+            spans.append(env)
+    return spans
+
+
+def replace_environments(text: str, names: Sequence[str], repl: Callable[[str], str]) -> str:
+    """Replace each outermost environment in `names` with repl(its full text)"""
+    pieces = []
+    last = 0
+    for env in environment_spans(text, names):
+        pieces.append(text[last:env.start])
+        pieces.append(repl(text[env.start:env.end]))
+        last = env.end
+    pieces.append(text[last:])
+    return ''.join(pieces)
@@ -0,0 +1,364 @@
+"""
+Single-pass LaTeX structure index for the detectors
+
+One run of the linear scanner (utils.latex_scanner) produces everything
+the detectors used to rescan the document for:
+
+- Environments with nesting (parent/depth), options and line numbers
+- Commands by name (\\documentclass, \\author, \\section, ...)
+- Matching braces, so balanced command arguments are a lookup
+- A line-start table, so offset -> line lookups are a bisect
+- The preamble/body split around \\begin{document}
+
+Comments are skipped and verbatim-like environments are not tokenized.
+Structures are cached by content (get_structure), so every detector that
+looks at the same text shares one index.
+
+After an edit, the structure of the new text can be derived from the
+previous one (get_structure(latex, previous=...)): braces, commands and
+environments away from the edited lines are shifted, and only the edited
+lines are tokenized again. This is exact when both the previous text and
+the edited lines are balanced; otherwise the document is rebuilt.
+"""
+import re
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils.latex_scanner import VERBATIM_ENVIRONMENTS, Token, brace_map, match_environments, tokenize
+
+MAX_CACHED_STRUCTURES = 16
+
+# Derive a structure incrementally only while the edited text is at most
+# this share of the document; beyond it a fresh build is as cheap
+MAX_INCREMENTAL_CHANGE = 0.5
+
+Hunk = Tuple[int, int, str]  # (start, end, replacement) in the previous text
+
+_OPTIONS = re.compile(r'[ \t]*\[([^\]\n]*)\]')
+
+
+@dataclass
+class Environment:
+    """A closed \\begin{name} ... \\end{name} span (absolute offsets)"""
+    name: str
+    start: int
+    body_start: int
+    body_end: int = -1
+    end: int = -1
+    depth: int = 0
+    parent: Optional[int] = None  # position of the enclosing environment in environments
+    options: Optional[str] = None  # [...] directly after \begin{name}
+    start_line: int = 0
+    end_line: int = 0
+
+    def moved(self, offset: int, lines: int) -> 'Environment':
+        """The same environment moved by `offset` characters and `lines` lines, outside any structure"""
+        return replace(self, start=self.start + offset, body_start=self.body_start + offset,
+                       body_end=self.body_end + offset, end=self.end + offset, parent=None,
+                       start_line=self.start_line + lines, end_line=self.end_line + lines)
+
+
+@dataclass
+class Command:
+    name: str
+    start: int
+    end: int
+    line: int
+
+
+@dataclass
+class LatexStructure:
+    """Structure index of one document; build with get_structure()"""
+    content: str
+    line_starts: List[int] = field(default_factory=list)
+    environments: List[Environment] = field(default_factory=list)
+    commands: Dict[str, List[Command]] = field(default_factory=dict)
+    braces: Dict[int, int] = field(default_factory=dict)  # '{' offset -> matching '}' offset
+    document: Optional[Environment] = None
+    balanced: bool = True  # every brace and environment is matched
+    incremental: bool = False  # derived from a previous structure
+
+    def line_of(self, pos: int) -> int:
+        """1-based line number of a character offset"""
+        return bisect_right(self.line_starts, pos)
+
+    def find_line(self, text: str, default: int = 1) -> int:
+        """Line of the first occurrence of `text`, or `default`"""
+        pos = self.content.find(text)
+        return self.line_of(pos) if pos >= 0 else default
+
+    def lines(self, start_line: int, end_line: int) -> str:
+        """Text of lines start_line..end_line (1-based, inclusive, clamped)"""
+        start_line = max(1, start_line)
+        end_line = min(len(self.line_starts), end_line)
+        if start_line > end_line:
+            return ""
+        start = self.line_starts[start_line - 1]
+        end = self.line_starts[end_line] - 1 if end_line < len(self.line_starts) else len(self.content)
+        return self.content[start:end]
+
+    def environments_named(self, *names: str) -> List[Environment]:
+        """Environments with any of `names`, grouped in the order of `names`"""
+        return [env for name in names for env in self.environments if env.name == name]
+
+    def command(self, name: str) -> Optional[Command]:
+        """First occurrence of \\name"""
+        found = self.commands.get(name)
+        return found[0] if found else None
+
+    def count(self, name: str) -> int:
+        return len(self.commands.get(name, ()))
+
+    @property
+    def preamble(self) -> str:
+        return self.content[:self.document.start] if self.document else ""
+
+    @property
+    def body(self) -> str:
+        if not self.document:
+            return ""
+        return self.content[self.document.body_start:self.document.body_end]
+
+    def environment_dict(self, env: Environment) -> Dict[str, any]:
+        """Environment in the dict shape LatexParser has always returned"""
+        return {
+            "content": self.content[env.body_start:env.body_end],
+            "full_match": self.content[env.start:env.end],
+            "start_line": env.start_line,
+            "end_line": env.end_line,
+            "start_pos": env.start,
+            "end_pos": env.end
+        }
+
+    def updated(self, new_content: str, hunks: Sequence[Hunk]) -> 'LatexStructure':
+        """
+        Structure of `new_content`, given the line-level (start, end,
+        replacement) hunks that turn this structure's content into it.
+
+        Falls back to a full build when this structure or an edited region
+        is not balanced, a brace pair or environment tag is cut by a hunk,
+        or a hunk touches a verbatim environment.
+        """
+        if not hunks:
+            return self
+        content = self.content
+        changed = sum(max(end - start, len(replacement)) for start, end, replacement in hunks)
+        if not self.balanced or changed > MAX_INCREMENTAL_CHANGE * max(len(new_content), 1):
+            return build_structure(new_content)
+        for start, end, replacement in hunks:
+            # Tokens never span a newline, so whole-line hunks rescan exactly
+            if ((start and content[start - 1] != '\n') or (end and content[end - 1] != '\n')
+                    or (end < len(content) and replacement and not replacement.endswith('\n'))):
+                return build_structure(new_content)
+
+        hunks = sorted(hunks)
+        starts = [start for start, _, _ in hunks]
+        deltas = [0]
+        for start, end, replacement in hunks:
+            deltas.append(deltas[-1] + len(replacement) - (end - start))
+
+        def hunk_of(position: int) -> Optional[int]:
+            """Index of the hunk containing `position`, if any"""
+            i = bisect_right(starts, position) - 1
+            return i if i >= 0 and position < hunks[i][1] else None
+
+        def touched(start: int, end: int) -> bool:
+            """Whether a hunk replaces or inserts text within [start, end]"""
+            i = bisect_right(starts, end)
+            return i > 0 and hunks[i - 1][1] >= start
+
+        def shift(position: int) -> int:
+            # Positions outside hunks: every hunk before them has ended
+            return position + deltas[bisect_right(starts, position)]
+
+        braces = {}
+        for open_pos, close_pos in self.braces.items():
+            inside = hunk_of(open_pos), hunk_of(close_pos)
+            if inside == (None, None):
+                braces[shift(open_pos)] = shift(close_pos)
+            elif inside[0] != inside[1]:
+                return build_structure(new_content)  # the pair crosses a hunk edge
+
+        environments = []
+        for env in self.environments:
+            # A tag is on one line, so it is either inside a hunk or untouched
+            opening, closing = hunk_of(env.start), hunk_of(env.body_end)
+            if opening is not None and opening == closing:
+                continue  # wholly inside one hunk: rescanned below
+            if opening is not None or closing is not None:
+                return build_structure(new_content)
+            if env.name in VERBATIM_ENVIRONMENTS and touched(env.body_start, env.body_end):
+                return build_structure(new_content)
+            environments.append(replace(env, start=shift(env.start), body_start=shift(env.body_start),
+                                        body_end=shift(env.body_end), end=shift(env.end)))
+
+        commands = [replace(command, start=shift(command.start), end=shift(command.end))
+                    for found in self.commands.values() for command in found
+                    if hunk_of(command.start) is None]
+
+        for i, (start, end, replacement) in enumerate(hunks):
+            new_start = start + deltas[i]
+            tokens = [(kind, value, token_start + new_start, token_end + new_start)
+                      for kind, value, token_start, token_end in tokenize(replacement)]
+            segment_braces = brace_map(new_content, tokens)
+            spans = match_environments(new_content, tokens)
+            if not _is_balanced(tokens, segment_braces, spans):
+                return build_structure(new_content)
+            braces.update(segment_braces)
+            environments.extend(Environment(span.name, span.start, span.body_start, span.body_end, span.end)
+                                for span in spans)
+            commands.extend(Command(value, token_start, token_end, 0)
+                            for kind, value, token_start, token_end in tokens if kind == 'command')
+
+        return _assemble(new_content, braces, environments, commands, incremental=True)
+
+
+def _is_balanced(tokens: Sequence[Token], braces: Dict[int, int], environments: Sequence) -> bool:
+    """Every brace and \\begin/\\end token in `tokens` is part of a matched pair"""
+    opens = sum(1 for kind, _, _, _ in tokens if kind in ('open', 'close'))
+    tags = sum(1 for kind, _, _, _ in tokens if kind in ('begin', 'end'))
+    return opens == 2 * len(braces) and tags == 2 * len(environments)
+
+
+def _assemble(latex: str, braces: Dict[int, int], environments: List[Environment],
+              commands: List[Command], incremental: bool = False) -> LatexStructure:
+    """Finish a structure: line numbers, options, nesting and the document span"""
+    structure = LatexStructure(content=latex, braces=braces, incremental=incremental)
+    structure.line_starts = [0] + [m.end() for m in re.finditer('\n', latex)]
+    line_of = structure.line_of
+
+    commands.sort(key=lambda command: command.start)
+    for command in commands:
+        command.line = line_of(command.start)
+        structure.commands.setdefault(command.name, []).append(command)
+
+    # Balanced environments nest properly, so a stack of open spans gives
+    # each one its parent
+    environments.sort(key=lambda env: env.start)
+    stack: List[int] = []
+    for i, env in enumerate(environments):
+        while stack and environments[stack[-1]].end <= env.start:
+            stack.pop()
+        env.parent = stack[-1] if stack else None
+        env.depth = len(stack)
+        options = _OPTIONS.match(latex, env.body_start)
+        env.options = options.group(1) if options else None
+        env.start_line = line_of(env.start)
+        env.end_line = line_of(env.end - 1)
+        stack.append(i)
+    structure.environments = environments
+
+    documents = structure.environments_named('document')
+    structure.document = documents[0] if documents else None
+    return structure
+
+
+def diff_hunks(base: str, modified: str, max_change: float = MAX_INCREMENTAL_CHANGE) -> List[Hunk]:
+    """
+    Line-level change set turning `base` into `modified`
+
+    When more than `max_change` of the lines differ it is one hunk over the
+    changed region; pass 1.0 to always match line by line.
+    """
+    if base == modified:
+        return []
+    a = _lines(base)
+    b = _lines(modified)
+
+    # Trim the common head and tail so the matcher only sees the edited region
+    head = 0
+    while head < len(a) and head < len(b) and a[head] == b[head]:
+        head += 1
+    tail = 0
+    while tail < len(a) - head and tail < len(b) - head and a[-1 - tail] == b[-1 - tail]:
+        tail += 1
+
+    offsets = [0]
+    for line in a:
+        offsets.append(offsets[-1] + len(line))
+
+    middle_a = a[head:len(a) - tail]
+    middle_b = b[head:len(b) - tail]
+    if max(len(middle_a), len(middle_b)) > max_change * max(len(a), len(b)):
+        # Mostly rewritten: one hunk, without the quadratic matcher
+        return [(offsets[head], offsets[len(a) - tail], ''.join(middle_b))]
+
+    hunks = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, middle_a, middle_b, autojunk=False).get_opcodes():
+        if tag != 'equal':
+            hunks.append((offsets[head + i1], offsets[head + i2], ''.join(middle_b[j1:j2])))
+    return hunks
+
+
+def _lines(text: str) -> List[str]:
+    """Lines split on '\\n' only (tokens never span one; str.splitlines splits on more)"""
+    lines = text.split('\n')
+    last = lines.pop()
+    return [line + '\n' for line in lines] + ([last] if last else [])
+
+
+def build_structure(latex: str) -> LatexStructure:
+    """Tokenize `latex` once and index its structure"""
+    structure = LatexStructure(content=latex)
+    structure.line_starts = [0] + [m.end() for m in re.finditer('\n', latex)]
+    line_of = structure.line_of
+
+    tokens = list(tokenize(latex))
+    for kind, name, start, end in tokens:
+        if kind == 'command':
+            structure.commands.setdefault(name, []).append(Command(name, start, end, line_of(start)))
+    structure.braces = brace_map(latex, tokens)
+
+    for span in match_environments(latex, tokens):
+        options = _OPTIONS.match(latex, span.body_start)
+        structure.environments.append(Environment(
+            name=span.name,
+            start=span.start,
+            body_start=span.body_start,
+            body_end=span.body_end,
+            end=span.end,
+            depth=span.depth,
+            parent=span.parent,
+            options=options.group(1) if options else None,
+            start_line=line_of(span.start),
+            end_line=line_of(span.end - 1)
+        ))
+
+    documents = structure.environments_named('document')
+    structure.document = documents[0] if documents else None
+    structure.balanced = _is_balanced(tokens, structure.braces, structure.environments)
+    return structure
+
+
+_cache: 'OrderedDict[Tuple[int, int], LatexStructure]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_structure(latex: str, previous: Optional[LatexStructure] = None) -> LatexStructure:
+    """
+    Shared structure index for `latex`, cached by content hash.
+
+    With `previous` (the structure of the text before an edit) a cache miss
+    is filled incrementally from the line diff instead of a full build.
+    """
+    key = (len(latex), hash(latex))
+    with _cache_lock:
+        structure = _cache.get(key)
+        if structure is not None and structure.content == latex:
+            _cache.move_to_end(key)
+            return structure
+
+    if previous is not None and previous.content != latex:
+        structure = previous.updated(latex, diff_hunks(previous.content, latex))
+    else:
+        structure = build_structure(latex)
+
+    with _cache_lock:
+        _cache[key] = structure
+        while len(_cache) > MAX_CACHED_STRUCTURES:
+            _cache.popitem(last=False)
+    return structure
@@ -1,13 +1,18 @@
 """
 LaTeX compilation and validation utilities
 """
+import hashlib
 import subprocess
 import tempfile
 import shutil
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from typing import Tuple, List, Optional
 import re
 
+MAX_CACHED_COMPILES = 32
+
 
 class LatexValidator:
     """Validate LaTeX documents by compilation"""
@@ -15,15 +20,34 @@ class LatexValidator:
     def __init__(self, timeout: int = 30):
         self.timeout = timeout
         self.latex_compilers = ['pdflatex', 'xelatex', 'lualatex']
+        # Compiles are deterministic: results are cached by content (thread-safe)
+        self._compile_cache: 'OrderedDict[str, Tuple[bool, str, List[str]]]' = OrderedDict()
+        self._cache_lock = threading.Lock()
         
     def compile_latex(self, latex_content: str, 
                      compiler: str = 'pdflatex') -> Tuple[bool, str, List[str]]:
         """
-        Compile LaTeX content and return results
+        Compile LaTeX content and return results (cached by content)
         
         Returns:
             Tuple of (success, log_content, errors)
         """
+        key = hashlib.sha256(f"{compiler}\0{latex_content}".encode('utf-8')).hexdigest()
+        with self._cache_lock:
+            if key in self._compile_cache:
+                self._compile_cache.move_to_end(key)
+                return self._compile_cache[key]
+        
+        result = self._run_compiler(latex_content, compiler)
+        
+        with self._cache_lock:
+            self._compile_cache[key] = result
+            while len(self._compile_cache) > MAX_CACHED_COMPILES:
+                self._compile_cache.popitem(last=False)
+        return result
+    
+    def _run_compiler(self, latex_content: str, compiler: str) -> Tuple[bool, str, List[str]]:
+        """Compile in a fresh temporary directory"""
         # Create temporary directory
         with tempfile.TemporaryDirectory() as temp_dir:
             temp_path = Path(temp_dir)
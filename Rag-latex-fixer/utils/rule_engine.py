@@ -0,0 +1,182 @@
+"""
+Rule-based fix engine
+
+A fix is declared as a FixRule: a pattern plus a rewrite (a re template or
+a function of the match), optionally guarded by a predicate on the
+document. A RuleSet compiles its rules once into a single alternation, so
+applying it is one left-to-right scan of the document instead of one
+re.sub (and often one re.findall to count) per rule:
+
+- At each position the first declared rule that matches wins, as if it had
+  run first in a chain of re.sub calls; any other rule that also matches
+  there is recorded as a conflict
+- Scanning resumes after the rewritten span, so rewrites never overlap
+- Rules whose output another rule must see go in a later RuleSet (a stage)
+
+apply_rules() runs stages in order and returns a RuleReport of which rules
+fired, how often, and the conflicts.
+"""
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+Replacement = Union[str, Callable[[re.Match], str]]
+
+# Inline flags that can be scoped to one alternative, (?ims:...)
+_SCOPED_FLAGS = ((re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'))
+_METACHARS = set('.^$*+?{}[]|()\\')
+_QUANTIFIERS = set('*+?{')
+
+
+def _literal_prefix(pattern: str) -> List[Tuple[str, str]]:
+    """
+    Leading fixed characters of a pattern as (source, char) pairs: the
+    pattern for \\begin{table} starts with its 13 characters. None if the
+    pattern has a top-level alternation
+    """
+    depth, in_class, i = 0, False, 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            i += 1
+        elif in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+        elif char in '()':
+            depth += 1 if char == '(' else -1
+        elif char == '|' and depth == 0:
+            return []
+        i += 1
+
+    tokens, i = [], 0
+    while i < len(pattern):
+        if pattern[i] == '\\' and i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+            source, char = pattern[i:i + 2], pattern[i + 1]
+        elif pattern[i] not in _METACHARS:
+            source, char = pattern[i], pattern[i]
+        else:
+            break
+        if i + len(source) < len(pattern) and pattern[i + len(source)] in _QUANTIFIERS:
+            break  # quantified: not a fixed character
+        tokens.append((source, char))
+        i += len(source)
+    return tokens
+
+
+@dataclass(frozen=True)
+class FixRule:
+    """A pattern and its rewrite"""
+    name: str
+    pattern: str
+    replacement: Replacement
+    flags: int = 0  # re.IGNORECASE, re.MULTILINE and/or re.DOTALL
+    when: Optional[Callable[[str], bool]] = None  # guard, checked on the text before the scan
+
+    def compiled(self) -> re.Pattern:
+        return re.compile(self.pattern, self.flags)
+
+    def scoped(self, skip: int = 0) -> str:
+        """Pattern with its flags inlined, for use inside an alternation (minus `skip` source chars)"""
+        letters = ''.join(letter for flag, letter in _SCOPED_FLAGS if self.flags & flag)
+        pattern = self.pattern[skip:]
+        return f'(?{letters}:{pattern})' if letters else f'(?:{pattern})'
+
+
+@dataclass
+class RuleReport:
+    """What a run of the engine did"""
+    fired: Dict[str, int] = field(default_factory=dict)  # rule name -> replacements
+    conflicts: List[Tuple[str, str, int]] = field(default_factory=list)  # (winner, shadowed, offset)
+    scans: int = 0
+
+    def count(self, *names: str) -> int:
+        return sum(self.fired.get(name, 0) for name in names)
+
+    def merge(self, other: 'RuleReport'):
+        for name, count in other.fired.items():
+            self.fired[name] = self.fired.get(name, 0) + count
+        self.conflicts.extend(other.conflicts)
+        self.scans += other.scans
+
+
+class RuleSet:
+    """Rules applied together in one scan; compiled once, on construction"""
+
+    def __init__(self, name: str, rules: Sequence[FixRule]):
+        if len({rule.name for rule in rules}) != len(rules):
+            raise ValueError(f"Duplicate rule names in {name}")
+        self.name = name
+        self.rules = list(rules)
+        self._compiled = [rule.compiled() for rule in self.rules]
+        self._scanners: Dict[Tuple[int, ...], re.Pattern] = {}
+        self._lock = threading.Lock()
+        self._scanner(tuple(range(len(self.rules))))
+
+    def _scanner(self, active: Tuple[int, ...]) -> re.Pattern:
+        """
+        Alternation of the active rules, each in a group named after its index.
+        A literal prefix shared by all of them is factored out in front, so
+        the scan can jump between occurrences of it instead of trying every
+        alternative at every position.
+        """
+        with self._lock:
+            scanner = self._scanners.get(active)
+            if scanner is None:
+                prefixes = [[] if self.rules[i].flags & re.IGNORECASE else _literal_prefix(self.rules[i].pattern)
+                            for i in active]
+                shared = 0
+                while all(len(prefix) > shared for prefix in prefixes) and \
+                        len({prefix[shared][1] for prefix in prefixes}) == 1:
+                    shared += 1
+                lead = prefixes[0][:shared] if shared else []
+                alternation = '|'.join(
+                    f'(?P<r{i}>{self.rules[i].scoped(sum(len(source) for source, _ in prefix[:shared]))})'
+                    for i, prefix in zip(active, prefixes)
+                )
+                literal = re.escape(''.join(char for _, char in lead))
+                scanner = re.compile(f'{literal}(?:{alternation})' if literal else alternation)
+                self._scanners[active] = scanner
+        return scanner
+
+    def apply(self, text: str, report: Optional[RuleReport] = None) -> str:
+        """Rewrite every match of every (unguarded or enabled) rule in one scan"""
+        report = report if report is not None else RuleReport()
+        active = tuple(i for i, rule in enumerate(self.rules) if rule.when is None or rule.when(text))
+        if not active:
+            return text
+        report.scans += 1
+
+        pieces = []
+        last = 0
+        for match in self._scanner(active).finditer(text):
+            index = int(match.lastgroup[1:])
+            start = match.start()
+            # Same span and groups as the rule on its own at this position
+            rule_match = self._compiled[index].match(text, start)
+            rule = self.rules[index]
+            if rule_match is None or rule_match.end() != match.end():
+                continue  # lookbehind/anchor behaving differently at pos; leave untouched
+            for other in active:
+                if other != index and self._compiled[other].match(text, start):
+                    report.conflicts.append((rule.name, self.rules[other].name, start))
+
+            replacement = rule.replacement
+            pieces.append(text[last:start])
+            pieces.append(replacement(rule_match) if callable(replacement) else rule_match.expand(replacement))
+            last = match.end()
+            report.fired[rule.name] = report.fired.get(rule.name, 0) + 1
+
+        if last == 0 and not pieces:
+            return text
+        pieces.append(text[last:])
+        return ''.join(pieces)
+
+
+def apply_rules(text: str, *stages: RuleSet) -> Tuple[str, RuleReport]:
+    """Apply rule sets in order (one scan each) and report what fired"""
+    report = RuleReport()
+    for stage in stages:
+        text = stage.apply(text, report)
+    return text, report
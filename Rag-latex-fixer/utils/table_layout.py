@@ -0,0 +1,488 @@
+"""
+Table layout: parse a LaTeX table once, then allocate column widths with
+NumPy
+
+TableGrid splits a table into rows and cleaned cells a single time (with
+precompiled patterns, each distinct cell cleaned once) and exposes per-cell
+length/word matrices. The width solvers below are the column-width
+algorithms of UserGuidedLaTeXProcessor expressed as array operations over
+those matrices:
+
+- content_lengths() / solve_column_widths(): _calculate_optimal_column_widths
+- text_aware_widths(): _calculate_text_aware_column_widths
+- fit_to_page() and helpers: _apply_positioning_and_scaling
+
+They produce the same widths as the original per-row Python loops. Given
+font metrics (utils.font_metrics), a grid measures its cells instead of
+counting characters, and measured_column_widths() sizes columns from
+real text widths.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.font_metrics import FontMetrics
+from utils.latex_scanner import balanced_argument, environment_spans
+
+_ROW_SPLIT = re.compile(r'\\\\|\\hline')
+# The solvers' estimate of one character's width
+CM_PER_CHAR = 0.11
+
+# Arguments before the rows: [pos] is optional, then {width} (if any) and {spec}
+_TABULAR_ARGUMENTS = {'tabular': 1, 'tabular*': 2, 'tabularx': 2}
+_POSITION = re.compile(r'\s*\[[^\]]*\]')
+
+_MULTICOLUMN = re.compile(r'\\multicolumn\{(\d+)\}\{[^}]*\}\{([^}]*)\}')
+
+# Cell text cleaning, applied in this order; each command pattern only runs
+# when its literal prefix occurs in the cell
+_CELL_COMMANDS = [
+    ('\\multirow', re.compile(r'\\multirow\{[^}]*\}\{[^}]*\}\{([^}]*)\}'), r'\1'),
+    ('\\textbf', re.compile(r'\\textbf\{([^}]*)\}'), r'\1'),
+    ('\\emph', re.compile(r'\\emph\{([^}]*)\}'), r'\1'),
+    ('\\', re.compile(r'\\[a-zA-Z]+\{([^}]*)\}'), r'\1'),
+    ('\\', re.compile(r'\\[a-zA-Z]+'), ''),
+]
+_MARKUP = str.maketrans('', '', '{}$|#\\')
+_WHITESPACE = re.compile(r'\s+')
+
+# Multicolumn group labels drop command arguments entirely
+_LABEL_CLEANING = [
+    (re.compile(r'\\[a-zA-Z]+\{[^}]*\}'), ''),
+    (re.compile(r'\\[a-zA-Z]+'), ''),
+    (re.compile(r'\{|\}|\$|\||#'), ''),
+]
+
+HEADER_WORDS = {'type', 'name', 'age', 'dataset', 'model', 'parameters',
+                'subjects', 'diabetes', 'cgm', 'raw', 'processed'}
+
+
+def clean_cell(cell: str) -> str:
+    """Readable text of a table cell (LaTeX commands and markup removed)"""
+    for prefix, pattern, repl in _CELL_COMMANDS:
+        if prefix in cell:
+            cell = pattern.sub(repl, cell)
+    return _WHITESPACE.sub(' ', cell.translate(_MARKUP)).strip()
+
+
+def clean_label(text: str) -> str:
+    """Text of a \\multicolumn header, with command arguments dropped"""
+    for pattern, repl in _LABEL_CLEANING:
+        text = pattern.sub(repl, text)
+    return text.strip()
+
+
+def is_header_text(text: str) -> bool:
+    """Heuristic: short, capitalized or common header words"""
+    if len(text) < 3:
+        return True
+    return (text.lower() in HEADER_WORDS or
+            len(text.split()) <= 3 and any(c.isupper() for c in text))
+
+
+@dataclass
+class TableRow:
+    cells: List[str]  # cleaned text of every & cell
+    sizes: List[Tuple[float, int]]  # (characters, words) of every cleaned cell
+    word_widths: List[float]  # cm of each cell's widest word (measured grids only)
+    multicolumns: List[Tuple[int, str, int]]  # (span, raw header text, cells before it)
+    mentions_multicolumn: bool
+    mentions_multirow: bool
+
+
+@dataclass
+class TableGrid:
+    """
+    Content rows of a table (structural and empty rows dropped). With
+    metrics, cell "characters" are measured widths in units of CM_PER_CHAR,
+    so wide and narrow letters count for what they really take up.
+    """
+    rows: List[TableRow] = field(default_factory=list)
+    metrics: Optional[FontMetrics] = None
+
+    @classmethod
+    def parse(cls, table_content: str, metrics: Optional[FontMetrics] = None) -> 'TableGrid':
+        grid = cls(metrics=metrics)
+        cleaned: Dict[str, Tuple[str, Tuple[float, int], float]] = {}
+        for row in _ROW_SPLIT.split(table_content):
+            # Skip empty rows or structural rows
+            if not row.strip() or '\\begin{tabular}' in row or '\\end{tabular}' in row:
+                continue
+            cells, sizes, word_widths = [], [], []
+            for cell in row.split('&'):
+                if cell not in cleaned:
+                    text = clean_cell(cell)
+                    word_width = metrics.longest_word(text) if metrics else 0.0
+                    cleaned[cell] = (text, (grid.text_length(text), len(text.split())), word_width)
+                text, size, word_width = cleaned[cell]
+                cells.append(text)
+                sizes.append(size)
+                word_widths.append(word_width)
+            grid.rows.append(TableRow(
+                cells=cells,
+                sizes=sizes,
+                word_widths=word_widths,
+                multicolumns=[(int(m.group(1)), m.group(2), row[:m.start()].count('&'))
+                              for m in _MULTICOLUMN.finditer(row)],
+                mentions_multicolumn='\\multicolumn' in row,
+                mentions_multirow='\\multirow' in row
+            ))
+        return grid
+
+    def text_length(self, text: str):
+        """Length of `text` in characters (measured if the grid has metrics)"""
+        return self.metrics.width(text) / CM_PER_CHAR if self.metrics else len(text)
+
+    def matrices(self, total_cols: int, rows: Optional[List[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (characters, words) of the first `total_cols` cells of the given
+        rows, as (rows x total_cols) arrays; missing and empty cells are 0
+        """
+        rows = range(len(self.rows)) if rows is None else rows
+        chars = np.zeros((len(rows), total_cols))
+        words = np.zeros((len(rows), total_cols))
+        for i, row_idx in enumerate(rows):
+            for j, (n_chars, n_words) in enumerate(self.rows[row_idx].sizes[:total_cols]):
+                if n_chars:
+                    chars[i, j] = n_chars
+                    words[i, j] = n_words
+        return chars, words
+
+
+def tabular_rows(table_content: str) -> str:
+    """
+    Rows of every tabular in a table, without the \\begin{tabular}{spec}
+    line. TableGrid.parse() skips the chunk holding \\begin{tabular} (as the
+    original solvers did), which loses the first row unless an \\hline
+    follows the spec; measured layouts parse these rows instead.
+    """
+    bodies = []
+    for env in environment_spans(table_content, tuple(_TABULAR_ARGUMENTS)):
+        pos = env.body_start
+        position = _POSITION.match(table_content, pos)
+        if position:
+            pos = position.end()
+        for _ in range(_TABULAR_ARGUMENTS[env.name]):
+            argument = balanced_argument(table_content, pos)
+            if argument is None:
+                break
+            pos = argument[1] + 1
+        bodies.append(table_content[pos:env.body_end])
+    return '\\\\\n'.join(bodies)
+
+
+def _spaced(chars: np.ndarray, words: np.ndarray, per_gap: float) -> np.ndarray:
+    """Character count plus `per_gap` for each gap between words"""
+    return np.where(words > 1, chars + (words - 1) * per_gap, chars)
+
+
+def _total(values: np.ndarray) -> float:
+    """Left-to-right sum, so totals (and the widths derived from them) round
+    exactly as the original loops did; ndarray.sum() sums pairwise"""
+    return sum(values.tolist())
+
+
+def _column_max(values: np.ndarray, total_cols: int) -> np.ndarray:
+    return values.max(axis=0) if len(values) else np.zeros(total_cols)
+
+
+def content_lengths(grid: TableGrid, total_cols: int) -> Tuple[np.ndarray, Dict[int, Dict]]:
+    """
+    Required length per column (in characters) and the multicolumn groups.
+
+    Data rows count their longest cell, the first two header rows count
+    2.5x, and columns under a \\multicolumn header grow to fit it. Raises
+    ZeroDivisionError for a multicolumn group that starts past the last
+    column, like the original loop did.
+    """
+    groups: Dict[int, Dict] = {}
+    data_rows = []
+    for row_idx, row in enumerate(grid.rows):
+        for span, header, col_position in row.multicolumns:
+            if col_position not in groups:
+                groups[col_position] = {
+                    'span': span,
+                    'header': header,
+                    'sub_cols': list(range(col_position, min(col_position + span, total_cols)))
+                }
+        # Rows with multicolumn headers are analyzed through their sub-columns
+        if not row.multicolumns:
+            data_rows.append(row_idx)
+
+    chars, words = grid.matrices(total_cols, data_rows)
+    lengths = _column_max(np.floor(_spaced(chars, words, 0.5)), total_cols)
+
+    # Header rows: the first two without multicolumn/multirow cells
+    header_rows = [i for i, row in enumerate(grid.rows)
+                   if not (row.mentions_multicolumn or row.mentions_multirow)][:2]
+    chars, words = grid.matrices(total_cols, header_rows)
+    lengths = np.maximum(lengths, _column_max(np.floor(_spaced(chars, words, 0.5) * 2.5), total_cols))
+
+    # Sub-columns must accommodate both the multicolumn header and their own
+    for group in groups.values():
+        sub_cols = np.array(group['sub_cols'], dtype=int)
+        required_width = grid.text_length(clean_label(group['header'])) * 1.4  # 40% padding
+        if required_width > _total(lengths[sub_cols]):
+            lengths[sub_cols] = np.maximum(lengths[sub_cols], int(required_width / len(sub_cols)))
+        if len(sub_cols) > 1:
+            # No sub-column below 70% of its widest sibling
+            min_balanced_width = lengths[sub_cols].max() * 0.7
+            lengths[sub_cols] = np.where(lengths[sub_cols] < min_balanced_width,
+                                         np.floor(min_balanced_width), lengths[sub_cols])
+        lengths[sub_cols] = np.floor(lengths[sub_cols] * 1.25)  # 25% padding
+
+    return lengths, groups
+
+
+def content_weights(lengths: np.ndarray) -> np.ndarray:
+    """Share of the table width each column's content asks for"""
+    total = _total(lengths)
+    return lengths / (total if total > 0 else len(lengths))
+
+
+def solve_column_widths(weights: Optional[np.ndarray], total_cols: int, usable_width: float,
+                        min_col_width: float, max_col_width: float,
+                        small_table: bool, apply_positioning: bool) -> np.ndarray:
+    """
+    Column widths (cm) from content weights, or from the column pattern
+    when there are no weights.
+
+    Args:
+        weights: content_weights() of the table, or None
+        small_table: At most 6 columns and no \\multicolumn
+        apply_positioning: Oversized tables are shifted into the margin
+            instead of being compressed
+    """
+    if weights is not None and len(weights) == total_cols:
+        # CONTENT-BASED DISTRIBUTION with min/max constraints
+        widths = np.clip(usable_width * weights, min_col_width, max_col_width)
+
+        # Small tables that were overestimated get a balanced layout
+        if small_table and _total(widths) > usable_width:
+            widths = np.full(total_cols, max(min_col_width, usable_width / total_cols))
+            if _total(widths) > usable_width:
+                widths = np.maximum(min_col_width, widths * (usable_width / _total(widths)))
+
+        total_width = _total(widths)
+        if total_width < usable_width:
+            # Fits: enforce a readable minimum, then use the space
+            widths = np.maximum(widths, 1.2)
+            total_after_min = _total(widths)
+            if total_after_min < usable_width:
+                target_width = usable_width * 0.95
+                if total_after_min < target_width:
+                    widths = np.minimum(widths * (target_width / total_after_min), max_col_width)
+            elif total_after_min > usable_width:
+                widths = np.maximum(min_col_width, widths * (usable_width / total_after_min))
+        elif apply_positioning:
+            if total_width - usable_width > 2.0:
+                widths = _redistribute(widths)
+        else:
+            # Compress the wide columns, keep the narrow ones
+            compressible = widths > (min_col_width + 0.2)
+            min_total = _total(widths[~compressible])
+            if compressible.any() and (usable_width - min_total) > 0:
+                available_for_wide_cols = usable_width - min_total
+                current_wide_total = _total(widths[compressible])
+                if current_wide_total > available_for_wide_cols:
+                    widths[compressible] *= available_for_wide_cols / current_wide_total
+            else:
+                widths = np.maximum(widths * (usable_width / total_width), min_col_width)
+    else:
+        widths = _pattern_widths(total_cols, usable_width, max_col_width)
+
+    widths = np.maximum(widths, min_col_width)
+
+    # Severe overflow in positioning mode: trim the wider half of the columns
+    total_final = _total(widths)
+    if apply_positioning and total_final > usable_width * 1.3:
+        excess = total_final - usable_width * 1.2
+        for idx in np.argsort(-widths, kind='stable')[:total_cols // 2]:
+            if excess <= 0:
+                break
+            reduction = min(excess * 0.5, widths[idx] - min_col_width)
+            widths[idx] -= reduction
+            excess -= reduction
+
+    return widths
+
+
+def _redistribute(widths: np.ndarray) -> np.ndarray:
+    """Move width from wide (>3cm) columns to tight (<1cm) ones"""
+    donors = widths > 3.0
+    tight = widths < 1.0
+    donor_room = np.where(donors, np.maximum(0, widths - 2.0), 0)
+    tight_need = np.where(tight, np.maximum(0, 1.0 - widths), 0)
+    total_donor_space = _total(donor_room)
+    total_tight_need = _total(tight_need)
+    if not (donors.any() and tight.any() and total_donor_space > 0 and total_tight_need > 0):
+        return widths
+
+    amount = min(total_donor_space * 0.6, total_tight_need)
+    widths = widths.copy()
+    widths[donors] = np.maximum(2.0, widths[donors] - amount * (donor_room[donors] / total_donor_space))
+    widths[tight] = np.minimum(1.5, widths[tight] + amount * (tight_need[tight] / total_tight_need))
+    return widths
+
+
+def _pattern_widths(total_cols: int, usable_width: float, max_col_width: float) -> np.ndarray:
+    """Fallback when the content could not be analyzed"""
+    base_width = usable_width / total_cols
+    if total_cols <= 2:
+        return np.full(total_cols, min(base_width, max_col_width))
+    if total_cols == 3:
+        return np.array([
+            min(base_width * 0.8, max_col_width * 0.6),
+            min(base_width * 1.4, max_col_width),
+            min(base_width * 0.8, max_col_width * 0.8)
+        ])
+    if total_cols == 4:
+        return np.array([
+            min(base_width * 0.6, max_col_width * 0.4),
+            min(base_width * 1.2, max_col_width * 0.7),
+            min(base_width * 1.4, max_col_width),
+            min(base_width * 0.8, max_col_width * 0.6)
+        ])
+    # Narrow outer columns, wider middle ones
+    widths = np.full(total_cols, min(base_width * 1.1, max_col_width * 0.8))
+    widths[[1, -2]] = min(base_width * 0.9, max_col_width * 0.7)
+    widths[[0, -1]] = min(base_width * 0.7, max_col_width * 0.5)
+    return widths
+
+
+def text_aware_widths(grid: TableGrid, total_cols: int) -> np.ndarray:
+    """Column widths (cm) at CM_PER_CHAR per character plus 25% padding, 1-5cm"""
+    content_per_col = np.zeros(total_cols)
+
+    plain_rows = []
+    for row_idx, row in enumerate(grid.rows):
+        if not row.mentions_multicolumn:
+            plain_rows.append(row_idx)
+            continue
+        # Multicolumn headers spread their width over the spanned columns
+        current_col = 0
+        for span, header, _ in row.multicolumns:
+            header_text = clean_cell(header)
+            if header_text:
+                width_per_col = grid.text_length(header_text) * 1.2 / span
+                spanned = slice(current_col, min(current_col + span, total_cols))
+                content_per_col[spanned] = np.maximum(content_per_col[spanned], width_per_col)
+            current_col += span
+
+    chars, words = grid.matrices(total_cols, plain_rows)
+    counts = _spaced(chars, words, 0.4)
+    # Headers get extra weight (1.5x) for prominence
+    headers: Dict[str, bool] = {}
+    for i, row_idx in enumerate(plain_rows):
+        for j, cell in enumerate(grid.rows[row_idx].cells[:total_cols]):
+            if cell and cell not in headers:
+                headers[cell] = is_header_text(cell)
+            if cell and headers[cell]:
+                counts[i, j] *= 1.5
+    content_per_col = np.maximum(content_per_col, _column_max(counts, total_cols))
+
+    return np.where(content_per_col == 0, 1.0,
+                    np.clip(content_per_col * CM_PER_CHAR * 1.25, 1.0, 5.0))
+
+
+def measured_column_widths(grid: TableGrid, total_cols: int, text_width: float) -> Optional[np.ndarray]:
+    """
+    p{} widths (cm) from measured text, fitting `text_width` (the table
+    width minus \\tabcolsep padding and rules), or None without metrics or
+    content.
+
+    Columns get their natural width (widest cell) when everything fits on
+    one line. Otherwise each column keeps room for its widest word and the
+    remaining space goes to columns in proportion to how much they would
+    have to wrap. Widths are rounded up to the 0.1cm the spec is written in.
+    """
+    if grid.metrics is None:
+        return None
+    natural = np.zeros(total_cols)
+    floor = np.zeros(total_cols)
+    for row in grid.rows:
+        if row.multicolumns:
+            continue
+        count = min(len(row.cells), total_cols)
+        widths = np.array([size[0] for size in row.sizes[:count]]) * CM_PER_CHAR
+        natural[:count] = np.maximum(natural[:count], widths)
+        floor[:count] = np.maximum(floor[:count], row.word_widths[:count])
+    # Spanned columns together must hold their \multicolumn header
+    for row in grid.rows:
+        for span, header, col_position in row.multicolumns:
+            spanned = slice(col_position, min(col_position + span, total_cols))
+            width = grid.metrics.width(clean_label(header))
+            shortfall = width - _total(natural[spanned])
+            if shortfall > 0 and spanned.stop > spanned.start:
+                natural[spanned] += shortfall / (spanned.stop - spanned.start)
+    if not natural.any():
+        return None
+
+    # Leave room for rounding every column up to the next 0.1cm
+    text_width -= 0.1 * total_cols
+    if _total(natural) <= text_width:
+        widths = natural
+    elif _total(floor) >= text_width:
+        # Not even the widest words fit: shrink proportionally, words overflow
+        widths = floor * (max(text_width, 0.0) / _total(floor))
+    else:
+        wrap = natural - floor
+        widths = floor + wrap * ((text_width - _total(floor)) / _total(wrap))
+    return np.maximum(np.ceil(widths * 10 - 1e-9) / 10, 0.1)
+
+
+def fit_to_page(widths: np.ndarray, page_width: float, total_cols: int) -> Tuple[np.ndarray, float]:
+    """
+    Widths that fit `page_width`, and how far (cm) to shift the table left.
+    Fitting tables are widened; oversized ones are shifted, then only their
+    wide columns are scaled.
+    """
+    usable_width = page_width - 0.2 * (total_cols + 1)
+    current_width = _total(widths)
+    if current_width <= usable_width:
+        return optimize_fitting(widths, usable_width, total_cols), 0.0
+    shift, widths = handle_oversized(widths, current_width, usable_width, total_cols)
+    return widths, shift
+
+
+def optimize_fitting(widths: np.ndarray, usable_width: float, total_cols: int) -> np.ndarray:
+    """Ensure readable minimums, then scale up tables using under 80% of the space"""
+    widths = np.maximum(widths, max(1.0, usable_width / (total_cols * 3)))
+    current_total = _total(widths)
+    if current_total < usable_width * 0.8:
+        widths = np.minimum(widths * (usable_width * 0.9 / current_total), 4.5)
+    return widths
+
+
+def handle_oversized(widths: np.ndarray, current_width: float, usable_width: float,
+                     total_cols: int) -> Tuple[float, np.ndarray]:
+    """Shift left by up to 2.5cm, then scale selectively if still too wide"""
+    positioning_shift = min(2.5, (current_width - usable_width) * 0.7)
+    effective_width = usable_width + positioning_shift
+    remaining_overflow = current_width - effective_width
+    if remaining_overflow > 0.3:
+        widths = selective_scaling(widths, remaining_overflow, effective_width)
+    return positioning_shift, widths
+
+
+def selective_scaling(widths: np.ndarray, overflow: float, target_width: float) -> np.ndarray:
+    """Scale down only columns with room to shrink (never below 65% or 0.9cm)"""
+    min_safe = np.maximum(0.9, widths * 0.65)
+    scalable = widths > min_safe + 0.4
+    if scalable.any():
+        available_for_scalable = target_width - _total(widths[~scalable])
+        current_scalable_total = _total(widths[scalable])
+        if current_scalable_total > available_for_scalable:
+            scale_factor = available_for_scalable / current_scalable_total
+            widths = widths.copy()
+            widths[scalable] = np.maximum(widths[scalable] * scale_factor, min_safe[scalable])
+        return widths
+    # No scalable columns - gentle proportional scaling of all
+    return np.maximum(widths * (target_width / _total(widths)), 0.8)
+
+
+def column_spec(widths: np.ndarray) -> str:
+    """|p{..cm}|p{..cm}|... for the given widths"""
+    return '|' + '|'.join(f'p{{{width:.1f}cm}}' for width in widths) + '|'
@@ -1,4 +1,11 @@
 import re
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent / 'Rag-latex-fixer'))
+from utils.font_metrics import document_metrics, table_font_size
+from utils.latex_scanner import environment_spans, replace_environments
+from utils.table_layout import TableGrid, measured_column_widths, tabular_rows
 
 def fix_latex_table_generic(latex_code: str) -> str:
     """
@@ -45,32 +52,39 @@ def fix_latex_table_generic(latex_code: str) -> str:
         return max_cols if max_cols > 0 else 3
 
     def calculate_column_width(num_cols):
-        """Calculate appropriate column width based on number of columns"""
+        """Calculate appropriate column width (cm) based on number of columns"""
         if num_cols <= 2:
-            return "6cm"
+            return 6.0
         elif num_cols == 3:
-            return "4cm" 
+            return 4.0
         elif num_cols == 4:
-            return "3cm"
+            return 3.0
         elif num_cols == 5:
-            return "2.5cm"
+            return 2.5
         else:
-            return "2cm"
+            return 2.0
+    
+    def calculate_column_widths(full_table, num_cols):
+        """Per-column widths (cm) from the measured width of each column's text
+        in the document font, within the same total as the fixed widths"""
+        width = calculate_column_width(num_cols)
+        metrics = document_metrics(corrected_code, table_font_size(full_table, 'normalsize'))
+        measured = measured_column_widths(TableGrid.parse(tabular_rows(full_table), metrics), num_cols, width * num_cols)
+        return measured.tolist() if measured is not None else [width] * num_cols
     
-    def fix_table_tabular(match):
+    def fix_table_tabular(full_table):
         """Fix a single table's tabular definition and add adjustbox"""
-        full_table = match.group(0)
         print(f"🔍 Processing table: '{full_table[:100]}...'")
         
         # Detect actual columns from this specific table's data
         num_cols = detect_table_columns(full_table)
         print(f"� Detected {num_cols} columns in this table")
         
-        # Calculate appropriate column width
-        width = calculate_column_width(num_cols)
+        # Calculate appropriate column widths
+        widths = calculate_column_widths(full_table, num_cols)
         
         # Generate clean column specification: |p{width}|p{width}|...|
-        new_spec = '|' + '|'.join([f'p{{{width}}}'] * num_cols) + '|'
+        new_spec = '|' + '|'.join(f'p{{{width:g}cm}}' for width in widths) + '|'
         print(f"✅ Generated clean spec: '{new_spec}'")
         
         # Replace the corrupted tabular definition with clean one
@@ -85,19 +99,20 @@ def fix_latex_table_generic(latex_code: str) -> str:
         fixed_table = re.sub(r'\\begin\{adjustbox\}\{max width=\\textwidth\}\s*', '', fixed_table)
         fixed_table = re.sub(r'\\end\{adjustbox\}', '', fixed_table)
         
-        # Wrap the tabular with adjustbox for automatic scaling
-        fixed_table = re.sub(
-            r'(\\begin\{tabular\}.*\\end\{tabular\})',
-            r'\\begin{adjustbox}{max width=\\textwidth}\n\1\n\\end{adjustbox}',
-            fixed_table,
-            flags=re.DOTALL
-        )
+        # Wrap the tabular(s) with adjustbox for automatic scaling
+        tabulars = environment_spans(fixed_table, ('tabular',))
+        if tabulars:
+            start, end = tabulars[0].start, tabulars[-1].end
+            fixed_table = (fixed_table[:start] +
+                           '\\begin{adjustbox}{max width=\\textwidth}\n' +
+                           fixed_table[start:end] +
+                           '\n\\end{adjustbox}' +
+                           fixed_table[end:])
         
         return fixed_table
     
     # Process each table individually (table, table*, etc.)
-    table_pattern = r'\\begin\{table[*]?\}.*?\\end\{table[*]?\}'
-    corrected_code = re.sub(table_pattern, fix_table_tabular, corrected_code, flags=re.DOTALL)
+    corrected_code = replace_environments(corrected_code, ('table', 'table*'), fix_table_tabular)
     
     print("✅ Successfully processed all tables with generic column detection and adjustbox wrapping.")
     return corrected_code
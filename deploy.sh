@@ -127,6 +127,7 @@ setup_venv() {
     # Install requirements
     sudo -u "$APP_USER" bash -c "source venv/bin/activate && pip install --upgrade pip setuptools wheel > /dev/null 2>&1"
     sudo -u "$APP_USER" bash -c "source venv/bin/activate && pip install -r requirements.txt > /dev/null 2>&1"
+    sudo -u "$APP_USER" bash -c "source venv/bin/activate && pip install --no-deps -e . > /dev/null 2>&1"
     
     log_success "Virtual environment setup complete"
 }
@@ -89,7 +89,6 @@ class DocumentEditV1BatchRequest(BaseModel):
     file_id: str = Field(..., description="ID of uploaded LaTeX file")
     queries: List[str] = Field(..., description="List of natural language editing instructions")
     compile_pdf: bool = Field(False, description="Whether to compile to PDF after editing")
-    delay: float = Field(1.5, description="Delay between operations in seconds for rate limiting")
     images_dir_id: Optional[str] = Field(None, description="Optional: ID of uploaded images directory")
 
 class DocumentEditV1BatchResponse(BaseModel):
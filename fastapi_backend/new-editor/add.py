@@ -1,6 +1,7 @@
 """
 Simple Add Module for LaTeX Documents
-Uses pure string manipulation and regex - no parsers, no complex dependencies.
+Uses plain string slicing, with section positions looked up in the shared
+document index (document_index.py).
 
 Provides functionality to add:
 - Sentences (at start of section, after section, at end of document)
@@ -11,17 +12,25 @@ Provides functionality to add:
 import re
 from typing import Tuple, Optional
 
+from document_index import Section, get_index
+
 
 class SimpleAdder:
     """
     Simple string-based adder for LaTeX documents.
-    Uses pure regex and string slicing - no parsers.
+    Locates sections through the document index and edits by string slicing.
     """
     
     def __init__(self):
         """Initialize the SimpleAdder."""
         pass
     
+    @staticmethod
+    def _after_header(content: str, section: Section) -> int:
+        """Position right after a section header and the whitespace following it"""
+        body = content[section.header_end:section.body_end]
+        return section.header_end + len(body) - len(body.lstrip())
+    
     # ========================================================================
     # SENTENCE ADDITION
     # ========================================================================
@@ -42,16 +51,13 @@ class SimpleAdder:
         print(f"\n➕ Adding sentence at START of section: '{section_name}'")
         
         # Find the section
-        # Pattern: \section{name} followed by content
-        pattern = r'(\\(?:sub)*section\*?\{[^}]*' + re.escape(section_name) + r'[^}]*\})\s*'
-        
-        match = re.search(pattern, content, re.IGNORECASE)
-        if not match:
+        section = get_index(content).find_section(section_name)
+        if not section:
             print(f"  ❌ Section '{section_name}' not found")
             return content, 0
         
         # Insert sentence right after section header
-        insert_pos = match.end()
+        insert_pos = self._after_header(content, section)
         
         # Ensure sentence ends with period and has proper spacing
         if not sentence.strip().endswith('.'):
@@ -78,17 +84,14 @@ class SimpleAdder:
         """
         print(f"\n➕ Adding sentence at END of section: '{section_name}'")
         
-        # Find the section and its content
-        # Pattern: section header + content until next section or end
-        pattern = r'(\\(?:sub)*section\*?\{[^}]*' + re.escape(section_name) + r'[^}]*\})(.*?)(?=\\(?:sub)*section|\Z)'
-        
-        match = re.search(pattern, content, re.IGNORECASE | re.DOTALL)
-        if not match:
+        # Find the section and its content (until the next heading)
+        section = get_index(content).find_section(section_name)
+        if not section:
             print(f"  ❌ Section '{section_name}' not found")
             return content, 0
         
         # Insert position is at the end of section content (before next section)
-        insert_pos = match.end(2)  # End of group 2 (section content)
+        insert_pos = section.body_end
         
         # Ensure sentence ends with period
         if not sentence.strip().endswith('.'):
@@ -118,11 +121,11 @@ class SimpleAdder:
             sentence = sentence.strip() + '.'
         
         # Find \end{document} if it exists
-        end_doc_match = re.search(r'\\end\{document\}', content)
+        document = get_index(content).find_environment('document')
         
-        if end_doc_match:
+        if document:
             # Add before \end{document}
-            insert_pos = end_doc_match.start()
+            insert_pos = document.body_end
             modified = content[:insert_pos] + '\n' + sentence.strip() + '\n\n' + content[insert_pos:]
             print(f"  ✅ Added sentence before \\end{{document}}")
         else:
@@ -152,9 +155,9 @@ class SimpleAdder:
         print(f"\n➕ Adding section at START: '{section_name}'")
         
         # Find first section
-        first_section = re.search(r'\\(?:sub)*section\*?\{', content)
+        sections = get_index(content).sections
         
-        if not first_section:
+        if not sections:
             print(f"  ❌ No existing sections found")
             return content, 0
         
@@ -165,7 +168,7 @@ class SimpleAdder:
         new_section += '\n'
         
         # Insert before first section
-        insert_pos = first_section.start()
+        insert_pos = sections[0].start
         modified = content[:insert_pos] + new_section + content[insert_pos:]
         
         print(f"  ✅ Added section at start")
@@ -192,11 +195,11 @@ class SimpleAdder:
             new_section += section_content.strip() + '\n'
         
         # Find \end{document} if it exists
-        end_doc_match = re.search(r'\\end\{document\}', content)
+        document = get_index(content).find_environment('document')
         
-        if end_doc_match:
+        if document:
             # Add before \end{document}
-            insert_pos = end_doc_match.start()
+            insert_pos = document.body_end
             modified = content[:insert_pos] + new_section + '\n' + content[insert_pos:]
             print(f"  ✅ Added section before \\end{{document}}")
         else:
@@ -222,12 +225,10 @@ class SimpleAdder:
         """
         print(f"\n➕ Adding section '{new_section_name}' AFTER '{after_section}'")
         
-        # Find the target section and its content
-        # Pattern matches: section header + content until next section or \end{document} or end of string
-        pattern = r'(\\(?:sub)*section\*?\{[^}]*' + re.escape(after_section) + r'[^}]*\})(.*?)(?=\\(?:sub)*section|\\end\{document\}|\Z)'
-        
-        match = re.search(pattern, content, re.IGNORECASE | re.DOTALL)
-        if not match:
+        # Find the target section, its content and subsections (until the next
+        # heading of the same or higher level, \end{document} or end of string)
+        section = get_index(content).find_section(after_section)
+        if not section:
             print(f"  ❌ Section '{after_section}' not found")
             return content, 0
         
@@ -238,7 +239,7 @@ class SimpleAdder:
         new_section += '\n'
         
         # Insert after the target section (at end of its content)
-        insert_pos = match.end()
+        insert_pos = section.end
         modified = content[:insert_pos] + new_section + content[insert_pos:]
         
         print(f"  ✅ Added section after '{after_section}'")
@@ -283,15 +284,13 @@ class SimpleAdder:
         print(f"\n➕ Adding content at START of section: '{section_name}'")
         
         # Find the section
-        pattern = r'(\\(?:sub)*section\*?\{[^}]*' + re.escape(section_name) + r'[^}]*\})\s*'
-        
-        match = re.search(pattern, content, re.IGNORECASE)
-        if not match:
+        section = get_index(content).find_section(section_name)
+        if not section:
             print(f"  ❌ Section '{section_name}' not found")
             return content, 0
         
         # Insert content right after section header
-        insert_pos = match.end()
+        insert_pos = self._after_header(content, section)
         
         # Add content with proper spacing
         modified = content[:insert_pos] + '\n' + new_content.strip() + '\n\n' + content[insert_pos:]
@@ -315,15 +314,13 @@ class SimpleAdder:
         print(f"\n➕ Adding content at END of section: '{section_name}'")
         
         # Find the section and its content
-        pattern = r'(\\(?:sub)*section\*?\{[^}]*' + re.escape(section_name) + r'[^}]*\})(.*?)(?=\\(?:sub)*section|\Z)'
-        
-        match = re.search(pattern, content, re.IGNORECASE | re.DOTALL)
-        if not match:
+        section = get_index(content).find_section(section_name)
+        if not section:
             print(f"  ❌ Section '{section_name}' not found")
             return content, 0
         
         # Insert at end of section content
-        insert_pos = match.end(2)
+        insert_pos = section.body_end
         
         # Add content with proper spacing
         modified = content[:insert_pos] + '\n' + new_content.strip() + '\n' + content[insert_pos:]
@@ -347,10 +344,12 @@ class SimpleAdder:
         Returns:
             Tuple of (modified_content, success_count)
         """
-        import google.generativeai as genai
         import os
+        from pathlib import Path
         from dotenv import load_dotenv
         
+        from doc_edit.llm_client import LLMError, collect_api_keys, get_client
+        
         # Load environment variables from parent directory
         env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
         load_dotenv(env_path)
@@ -376,7 +375,7 @@ class SimpleAdder:
             print(f"  📍 Positioning: Before '{target_section}'")
         elif any(word in section_lower for word in ["limitation", "limitations"]):
             # Try to place before Future Works or Conclusion
-            if re.search(r'\\(?:sub)*section\*?\{[^}]*future[^}]*\}', content, re.IGNORECASE):
+            if get_index(content).find_section('future'):
                 target_section = "Future"
                 position = "before"
             else:
@@ -393,7 +392,7 @@ class SimpleAdder:
             print(f"  📍 Positioning: After '{target_section}'")
         else:
             # Default: Try before Conclusion, or at end if no Conclusion
-            if re.search(r'\\(?:sub)*section\*?\{[^}]*conclusion[^}]*\}', content, re.IGNORECASE):
+            if get_index(content).find_section('conclusion'):
                 target_section = "Conclusion"
                 position = "before"
                 print(f"  📍 Positioning: Before '{target_section}' (default)")
@@ -405,12 +404,7 @@ class SimpleAdder:
         section_content = ""
         if description and description.strip():
             try:
-                # Load environment variables (same location as main.py)
-                from dotenv import load_dotenv
-                from pathlib import Path
-                
                 # .env is in the parent directory of fastapi_backend
-                # Path: /Users/.../final with fast api copy/.env
                 env_path = Path.cwd().parent / '.env'
                 if not env_path.exists():
                     # Fallback: try from __file__ location
@@ -420,18 +414,7 @@ class SimpleAdder:
                 print(f"  📁 Loading .env from: {env_path}")
                 
                 # Get API keys from environment (same pattern as QueryParser)
-                api_keys = []
-                
-                # Try primary key first
-                primary_key = os.getenv('GEMINI_API_KEY')
-                if primary_key and primary_key.strip():
-                    api_keys.append(primary_key)
-                
-                # Try numbered keys (API_KEY1 to API_KEY39)
-                for i in range(1, 40):
-                    key = os.getenv(f'API_KEY{i}')
-                    if key and key.strip():
-                        api_keys.append(key)
+                api_keys = collect_api_keys()
                 
                 if not api_keys:
                     print(f"  ⚠️ No Gemini API keys found, using description as content")
@@ -439,9 +422,6 @@ class SimpleAdder:
                 else:
                     print(f"  🔑 Found {len(api_keys)} API key(s)")
                     
-                    # Generate content with AI
-                    import random
-                    
                     # Prepare prompt
                     prompt = f"""You are writing content for a LaTeX academic document.
 
@@ -458,41 +438,16 @@ The content should be:
 
 Only return the section content, no additional formatting or section headers."""
                     
-                    # Try with key rotation (up to 3 attempts)
-                    max_retries = 3
-                    generation_success = False
-                    
-                    for attempt in range(max_retries):
-                        try:
-                            selected_key = random.choice(api_keys)
-                            genai.configure(api_key=selected_key)
-                            # Use Gemini 2.5 Flash for better quality
-                            model = genai.GenerativeModel("gemini-2.5-flash")
-                            
-                            print(f"  🤖 Generating content (attempt {attempt + 1}/{max_retries})...")
-                            response = model.generate_content(prompt)
-                            section_content = response.text.strip()
-                            print(f"  ✅ Generated {len(section_content)} characters of content")
-                            print(f"  Preview: {section_content[:100]}...")
-                            generation_success = True
-                            break
-                            
-                        except Exception as retry_error:
-                            if "quota" in str(retry_error).lower() or "429" in str(retry_error):
-                                print(f"  ⚠️ Quota exceeded on attempt {attempt + 1}, trying another key...")
-                                # Remove the failed key from list for this session
-                                if selected_key in api_keys:
-                                    api_keys.remove(selected_key)
-                                if not api_keys:
-                                    print(f"  ❌ All keys exhausted")
-                                    break
-                                continue
-                            else:
-                                # Other error, don't retry
-                                print(f"  ❌ Generation error: {type(retry_error).__name__}")
-                                break
-                    
-                    if not generation_success:
+                    # Use Gemini 2.5 Flash for better quality; the client retries
+                    # rate limits on other keys (up to 3 attempts)
+                    try:
+                        print(f"  🤖 Generating content...")
+                        client = get_client(api_keys, "gemini-2.5-flash")
+                        section_content = client.generate_sync(prompt, max_retries=2).strip()
+                        print(f"  ✅ Generated {len(section_content)} characters of content")
+                        print(f"  Preview: {section_content[:100]}...")
+                    except LLMError as e:
+                        print(f"  ❌ Generation error: {str(e)[:100]}")
                         print(f"  Using description as content")
                         section_content = description
                     
@@ -510,16 +465,15 @@ Only return the section content, no additional formatting or section headers."""
             return self.add_section_at_end(content, section_name, section_content)
         else:
             # Find the target section
-            pattern = r'\\(?:sub)*section\*?\{[^}]*' + re.escape(target_section.lower()) + r'[^}]*\}'
-            match = re.search(pattern, content, re.IGNORECASE)
+            target = get_index(content).find_section(target_section)
             
-            if not match:
+            if not target:
                 print(f"  ⚠️ Target section '{target_section}' not found, adding at end")
                 return self.add_section_at_end(content, section_name, section_content)
             
             if position == "before":
                 # Add before the target section
-                insert_pos = match.start()
+                insert_pos = target.start
                 new_section = f"\n\\section{{{section_name}}}\n{section_content}\n\n"
                 modified = content[:insert_pos] + new_section + content[insert_pos:]
                 print(f"  ✅ Added section '{section_name}' before '{target_section}'")
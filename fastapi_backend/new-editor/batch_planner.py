@@ -0,0 +1,209 @@
+"""
+BATCH EDIT PLANNER
+Lets DocumentEditor.batch_edit run independent edits at the same time.
+
+1. Plan: resolve every parsed edit to the spans it is expected to touch
+   (its section, the lines holding its matches, the table environments,
+   or the whole document when that cannot be predicted)
+2. Schedule: an edit depends on every earlier edit whose spans overlap its
+   own, and on every earlier edit whose written text may contain what it
+   looks for (read after write: "replace X with Y" then "bold Y"; edits
+   writing AI-generated text count as writing anything). Edits are grouped
+   into rounds by dependency depth, so edits in the same round never
+   overlap or feed each other
+3. Merge: each edit in a round runs against the same base; its real change
+   set is recovered with a line diff and all change sets are spliced into
+   the base in one pass (offsets are rebased implicitly). An edit whose
+   changes touch another's is re-run sequentially afterwards.
+"""
+
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from document_index import get_index
+from splice import diff_hunks, splice
+from term_matcher import TermMatcher
+
+Span = Tuple[int, int]
+Hunk = Tuple[int, int, str]  # (base_start, base_end, replacement)
+
+SECTION_ACTIONS = {'modify_section_ai', 'replace_section_content', 'add_content_to_section', 'remove_section'}
+TABLE_PATTERN = re.compile(
+    r'\\begin\{(table|tabular|longtable)\*?\}.*?\\end\{\1\*?\}', re.DOTALL
+)
+
+
+def section_span(content: str, section_name: str, subtree: bool = False) -> Optional[Span]:
+    """
+    Header start to the end of the section body (the next heading), or to
+    the end of its subsections with `subtree`, as the editors resolve it
+    """
+    section = get_index(content).find_section(section_name)
+    if not section:
+        return None
+    return section.start, section.end if subtree else section.body_end
+
+
+def _line_span(content: str, start: int, end: int) -> Span:
+    """Widen a span to whole lines, the granularity edits are diffed at"""
+    line_start = content.rfind('\n', 0, start) + 1
+    line_end = content.find('\n', end)
+    return line_start, len(content) if line_end == -1 else line_end + 1
+
+
+def predict_spans(content: str, parsed: Optional[Dict]) -> List[Span]:
+    """
+    Spans of `content` an edit is expected to modify.
+
+    Unknown or unpredictable edits claim the whole document, which makes
+    them run on their own, in order.
+    """
+    whole = [(0, len(content))]
+    if not parsed:
+        return []
+    action = parsed.get('action', '')
+    target = parsed.get('target') or ''
+
+    if action in SECTION_ACTIONS:
+        # Removing a section takes its subsections with it
+        span = section_span(content, parsed.get('section_name') or target,
+                            subtree=action == 'remove_section')
+        return [span] if span else whole
+
+    if action == 'add_section':
+        # New sections land next to the hinted section; without a hint the
+        # adder picks a position itself
+        if target and parsed.get('position'):
+            span = section_span(content, target, subtree=True)
+            return [span] if span else whole
+        return whole
+
+    if action == 'remove_table':
+        spans = [m.span() for m in TABLE_PATTERN.finditer(content)]
+        return spans or whole
+
+    if parsed.get('targets'):
+        # Term lists are matched in one pass with the multi-term matcher
+        spans = [_line_span(content, m.start(), m.end())
+                 for m in TermMatcher(parsed['targets']).finditer(content)]
+        return spans or whole
+
+    if parsed.get('operation') in ('replace', 'format', 'remove') and target and target != 'all':
+        spans = [_line_span(content, m.start(), m.end())
+                 for m in re.finditer(re.escape(target), content, re.IGNORECASE)]
+        # No literal match: the editor may still match a LaTeX-escaped form
+        return spans or whole
+
+    return whole
+
+
+def _reads(parsed: Optional[Dict]) -> List[str]:
+    """Text an edit looks for: its targets, the section it works on, or table environments"""
+    if not parsed:
+        return []
+    action = parsed.get('action', '')
+    target = parsed.get('target') or ''
+
+    if action in SECTION_ACTIONS:
+        return [parsed.get('section_name') or target]
+    if action == 'add_section':
+        return [target] if target and parsed.get('position') else []
+    if action == 'remove_table':
+        return ['\\begin{tab', '\\begin{longtable']
+    if parsed.get('targets'):
+        return list(parsed['targets'])
+    if parsed.get('operation') in ('replace', 'format', 'remove') and target and target != 'all':
+        return [target]
+    return []
+
+
+def _writes(content: str, parsed: Optional[Dict]) -> Optional[List[str]]:
+    """
+    Text an edit leaves where it changes `content`: inserted text, or the
+    lines of its matches after the replacement or removal (which can join
+    neighbouring words into a new match). None when the text is generated
+    by the AI and cannot be known before the edit runs.
+    """
+    if not parsed:
+        return []
+    operation = parsed.get('operation')
+    action = parsed.get('action', '')
+    target = parsed.get('target') or ''
+    new_text = parsed.get('new_text') or ''
+
+    if operation == 'modify' or action == 'add_section':
+        return None
+    if action == 'replace_section_content':
+        return None if parsed.get('convert_to_latex') else [new_text]
+    if operation == 'add':
+        return [new_text]
+    if operation not in ('replace', 'remove') or action in SECTION_ACTIONS or action == 'remove_table':
+        return []  # formatting only wraps text that is already there
+    if parsed.get('targets'):
+        return None
+    if not target or target == 'all':
+        return []
+
+    replacement = new_text if operation == 'replace' else ''
+    pattern = re.compile(re.escape(target), re.IGNORECASE)
+    spans = {_line_span(content, m.start(), m.end()) for m in pattern.finditer(content)}
+    # No literal match: the editor may still match a LaTeX-escaped form
+    return [pattern.sub(lambda m: replacement, content[start:end]) for start, end in sorted(spans)] or \
+        [replacement]
+
+
+def feeds(written: Optional[List[str]], read: Sequence[str]) -> bool:
+    """True if text an edit writes may contain what a later edit looks for"""
+    if not read:
+        return False
+    if written is None:
+        return True
+    return any(r.lower() in w.lower() for r in read if r for w in written)
+
+
+def spans_overlap(a: Sequence[Span], b: Sequence[Span]) -> bool:
+    """
+    True if any span of `a` overlaps any span of `b`.
+
+    Adjacent spans (one ends where the next starts, e.g. neighbouring
+    sections) are independent; two insertions at the same point are not,
+    since their order would be ambiguous.
+    """
+    for a_start, a_end in a:
+        for b_start, b_end in b:
+            if a_start < b_end and b_start < a_end:
+                return True
+            if a_start == a_end == b_start == b_end:
+                return True
+    return False
+
+
+def plan_rounds(content: str, parsed_queries: List[Optional[Dict]]) -> List[List[int]]:
+    """
+    Group edit indices into rounds that can run concurrently.
+
+    An edit's round is one past the latest round of any earlier edit it
+    overlaps or reads the output of, so dependent edits keep their
+    relative order.
+    """
+    spans = [predict_spans(content, parsed) for parsed in parsed_queries]
+    reads = [_reads(parsed) for parsed in parsed_queries]
+    writes = [_writes(content, parsed) for parsed in parsed_queries]
+    depth = []
+    for i, own in enumerate(spans):
+        depth.append(1 + max((depth[j] for j in range(i)
+                              if spans_overlap(own, spans[j]) or feeds(writes[j], reads[i])), default=-1))
+
+    rounds: List[List[int]] = [[] for _ in range(max(depth, default=-1) + 1)]
+    for i, d in enumerate(depth):
+        rounds[d].append(i)
+    return rounds
+
+
+def apply_hunks(base: str, hunks: List[Hunk]) -> str:
+    """Splice non-overlapping hunks (from any number of edits) into `base`"""
+    return splice(base, sorted(hunks, key=lambda h: (h[0], h[1])))
+
+
+def hunk_spans(hunks: List[Hunk]) -> List[Span]:
+    return [(start, end) for start, end, _ in hunks]
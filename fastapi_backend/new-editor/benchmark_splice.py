@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmark for the multi-match splice engine
+Runs the replace/format/remove engines on synthetic documents of growing
+size (with a very common target word) and compares against the old
+per-match `content[:start] + new + content[end:]` loop
+"""
+
+import argparse
+import random
+import re
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+from format import SimpleFormatter
+from remove import SimpleRemover
+from replace import SimpleReplacer
+
+VOCABULARY = ("the model data results training network layer accuracy loss "
+              "we show that our method improves over baseline on every benchmark").split()
+
+
+def make_document(size: int, seed: int) -> str:
+    """LaTeX-ish document of roughly `size` characters; 'the' is ~1 word in 15"""
+    rng = random.Random(seed)
+    lines = ["\\documentclass{article}", "\\begin{document}"]
+    length = 0
+    section = 0
+    while length < size:
+        if rng.random() < 0.02:
+            section += 1
+            line = f"\\section{{Part {section}}}"
+        else:
+            line = " ".join(rng.choice(VOCABULARY) for _ in range(14)).capitalize() + "."
+        lines.append(line)
+        length += len(line) + 1
+    lines.append("\\end{document}")
+    return "\n".join(lines) + "\n"
+
+
+def old_splice(content: str, pattern: str, replace) -> str:
+    """Reference: the per-match copy loop the engines used before"""
+    modified = content
+    for match in reversed(list(re.finditer(pattern, content, re.IGNORECASE))):
+        start, end = match.span()
+        modified = modified[:start] + replace(content[start:end]) + modified[end:]
+    return modified
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    with redirect_stdout(StringIO()):
+        result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark single-pass splicing against per-match copying')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[125_000, 250_000, 500_000, 1_000_000],
+                        help='Document sizes in characters')
+    parser.add_argument('--word', default='the', help='Target word (common words stress the loop)')
+    parser.add_argument('--skip-old', action='store_true', help='Skip the quadratic reference loop')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    replacer = SimpleReplacer(use_api_rotation=False)
+    formatter = SimpleFormatter()
+    remover = SimpleRemover()
+    word_pattern = r'\b' + re.escape(args.word) + r'\b'
+
+    print(f"{'size (KB)':>10}{'matches':>9}{'replace':>10}{'bold':>10}{'highlight':>11}"
+          f"{'remove':>10}{'ms/MB':>8}{'old loop':>10}")
+    for size in args.sizes:
+        content = make_document(size, args.seed)
+        matches = len(re.findall(word_pattern, content, re.IGNORECASE))
+
+        replaced, replace_s = timed(replacer.replace_word, content, args.word, 'a')
+        _, bold_s = timed(formatter.bold_word, content, args.word)
+        _, highlight_s = timed(formatter.highlight_word, content, args.word, 'red')
+        _, remove_s = timed(remover.remove_word, content, args.word)
+        per_mb = replace_s * 1000 / (len(content) / 1_000_000)
+
+        old_column = '-'
+        if not args.skip_old:
+            expected, old_s = timed(old_splice, content, word_pattern,
+                                    lambda text: replacer._preserve_case(text, 'a'))
+            assert expected == replaced[0], "splice output differs from the reference loop"
+            old_column = f"{old_s * 1000:.0f}"
+
+        print(f"{len(content) / 1000:>10.0f}{matches:>9}{replace_s * 1000:>10.1f}{bold_s * 1000:>10.1f}"
+              f"{highlight_s * 1000:>11.1f}{remove_s * 1000:>10.1f}{per_mb:>8.1f}{old_column:>10}")
+    print("(times in ms; ms/MB is for replace and stays flat when scaling is linear)")
+
+
+if __name__ == "__main__":
+    main()
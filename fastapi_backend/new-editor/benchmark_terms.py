@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark for bulk term formatting
+Bolds a growing list of terms with SimpleFormatter.format_terms (one
+compiled matcher, one splice) and with one bold_word/bold_phrase call per
+term, on the same synthetic document
+"""
+
+import argparse
+import random
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+from benchmark_splice import make_document
+from format import SimpleFormatter
+
+
+def make_terms(count: int, seed: int) -> list:
+    """Mix of document words, two-word phrases and made-up terms that never match"""
+    rng = random.Random(seed)
+    words = "the model data results training network layer accuracy loss".split()
+    terms = set()
+    while len(terms) < count:
+        kind = rng.random()
+        if kind < 0.2:
+            terms.add(rng.choice(words))
+        elif kind < 0.4:
+            terms.add(f"{rng.choice(words)} {rng.choice(words)}")
+        else:
+            terms.add(''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 12))))
+    return sorted(terms)
+
+
+def per_term(formatter: SimpleFormatter, content: str, terms: list) -> str:
+    """Reference: one full-document pass per term"""
+    for term in terms:
+        if ' ' in term:
+            content, _ = formatter.bold_phrase(content, term)
+        else:
+            content, _ = formatter.bold_word(content, term)
+    return content
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    with redirect_stdout(StringIO()):
+        result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark one-pass multi-term formatting against per-term passes')
+    parser.add_argument('--size', type=int, default=500_000, help='Document size in characters')
+    parser.add_argument('--terms', type=int, nargs='+', default=[1, 10, 100, 1000],
+                        help='Numbers of terms to format')
+    parser.add_argument('--skip-old', action='store_true', help='Skip the per-term reference')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    formatter = SimpleFormatter()
+    content = make_document(args.size, args.seed)
+
+    print(f"document: {len(content) / 1000:.0f} KB")
+    print(f"{'terms':>7}{'matches':>9}{'bulk (ms)':>11}{'per-term (ms)':>15}")
+    for count in args.terms:
+        terms = make_terms(count, args.seed)
+        (_, matches), bulk_s = timed(formatter.format_terms, content, terms, 'bold')
+
+        old_column = '-'
+        if not args.skip_old:
+            _, old_s = timed(per_term, formatter, content, terms)
+            old_column = f"{old_s * 1000:.0f}"
+
+        print(f"{count:>7}{matches:>9}{bulk_s * 1000:>11.1f}{old_column:>15}")
+    print("(per-term output differs where terms overlap: later passes re-match inside \\textbf{...})")
+
+
+if __name__ == "__main__":
+    main()
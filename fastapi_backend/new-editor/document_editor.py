@@ -8,8 +8,11 @@ Natural language interface for document editing:
 - Return formatted result
 """
 
-import time
-from typing import Dict, Tuple, Optional
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Tuple, Optional
+from batch_planner import spans_overlap, apply_hunks, diff_hunks, hunk_spans, plan_rounds
+from document_index import get_index
 from query_parser import QueryParser
 from replace import SimpleReplacer
 from format import SimpleFormatter
@@ -38,24 +41,34 @@ class DocumentEditor:
         # Initialize query parser
         self.parser = QueryParser()
         
-        # Initialize editing engines
+        # Initialize editing engines. They are stateless after construction
+        # (their only attribute is the shared LLM client, whose requests all
+        # run on its own event loop), so batch_edit rounds share them across
+        # threads; the caches they use (document index, context stats) are locked
         self.replacer = SimpleReplacer()
         self.formatter = SimpleFormatter()
         self.remover = SimpleRemover()
         self.adder = SimpleAdder()
         self.modifier = SimpleModifier()
         
+        # Concurrent edits per batch_edit round
+        self.max_workers = int(os.getenv('BATCH_EDIT_WORKERS', '8'))
+        
         print("="*70)
         print("✅ DOCUMENT EDITOR READY")
         print("="*70 + "\n")
     
-    def edit(self, content: str, user_query: str) -> Tuple[str, Dict]:
+    def edit(self, content: str, user_query: str, parsed: Optional[Dict] = None,
+             on_chunk: Optional[Callable[[str], None]] = None) -> Tuple[str, Dict]:
         """
         Main entry point - parse query and execute editing action.
         
         Args:
             content: LaTeX document content
             user_query: Natural language query from user
+            parsed: Already-parsed query (skips parsing, used by batch_edit)
+            on_chunk: Receives the rewritten text as it streams in, for AI
+                section rewrites (other operations do not call it)
             
         Returns:
             Tuple of (modified_content, result_info)
@@ -71,7 +84,8 @@ class DocumentEditor:
         print("="*70)
         
         # Parse the query
-        parsed = self.parser.parse_query(user_query)
+        if parsed is None:
+            parsed = self.parser.parse_query(user_query)
         
         if not parsed:
             return content, {
@@ -93,6 +107,9 @@ class DocumentEditor:
         
         # Execute the appropriate action
         try:
+            # Editors share this index (section tree, math/comment masks)
+            index = get_index(content)
+            
             if operation == 'replace':
                 result_content, result_info = self._execute_replace(content, parsed)
             elif operation == 'format':
@@ -102,7 +119,7 @@ class DocumentEditor:
             elif operation == 'add':
                 result_content, result_info = self._execute_add(content, parsed)
             elif operation == 'modify':
-                result_content, result_info = self._execute_modify(content, parsed)
+                result_content, result_info = self._execute_modify(content, parsed, on_chunk)
             else:
                 return content, {
                     'success': False,
@@ -110,6 +127,11 @@ class DocumentEditor:
                     'operation': operation
                 }
             
+            # Derive the next index from this one, so a follow-up edit on the
+            # result does not reparse the whole document
+            if result_content != content:
+                get_index(result_content, previous=index)
+            
             # Add parsed info to result
             result_info.update({
                 'operation': operation,
@@ -194,7 +216,10 @@ class DocumentEditor:
             'italic_paragraph': lambda: self.formatter.italic_paragraph(content, target),
         }
         
-        if action in method_map:
+        if parsed.get('targets'):
+            # List of terms ("bold 'X', 'Y' and 'Z'"): one pass for all
+            modified, count = self.formatter.format_terms(content, parsed['targets'], format_type, color)
+        elif action in method_map:
             modified, count = method_map[action]()
         else:
             # Fallback to auto-detect
@@ -309,7 +334,8 @@ class DocumentEditor:
             'position': position
         }
     
-    def _execute_modify(self, content: str, parsed: Dict) -> Tuple[str, Dict]:
+    def _execute_modify(self, content: str, parsed: Dict,
+                        on_chunk: Optional[Callable[[str], None]] = None) -> Tuple[str, Dict]:
         """Execute modify operation - AI-powered section improvement"""
         action = parsed['action']
         section_name = parsed.get('section_name', parsed['target'])
@@ -319,7 +345,8 @@ class DocumentEditor:
         modified, count = self.modifier.modify_section_ai(
             content, 
             section_name, 
-            instruction
+            instruction,
+            on_chunk=on_chunk
         )
         
         return modified, {
@@ -329,44 +356,133 @@ class DocumentEditor:
             'instruction': instruction
         }
     
-    def batch_edit(self, content: str, queries: list, delay: float = 1.5) -> Tuple[str, list]:
+    def bulk_edit(self, content: str, operation: str, terms,
+                  format_action: str = 'bold', color: str = 'yellow') -> Tuple[str, Dict]:
+        """
+        Format or replace many terms at once, without parsing a query per term.
+        
+        All terms are found in one pass with a compiled multi-term matcher and
+        applied in one splice, so the cost is linear in the document size
+        however many terms there are.
+        
+        Args:
+            content: LaTeX document content
+            operation: 'format' or 'replace'
+            terms: List of terms to format, or {old: new} for replace
+            format_action: 'bold', 'italic' or 'highlight' (format only)
+            color: Highlight color (format only)
+            
+        Returns:
+            Tuple of (modified_content, result_info)
+        """
+        index = get_index(content)
+        
+        if operation == 'replace':
+            if not isinstance(terms, dict):
+                return content, {
+                    'success': False,
+                    'error': 'Bulk replace needs an {old: new} mapping',
+                    'operation': operation
+                }
+            modified, count = self.replacer.replace_terms(content, terms)
+        elif operation == 'format':
+            if format_action not in ('bold', 'italic', 'highlight'):
+                return content, {
+                    'success': False,
+                    'error': f'Unknown format action: {format_action}',
+                    'operation': operation
+                }
+            modified, count = self.formatter.format_terms(content, list(terms), format_action, color)
+        else:
+            return content, {
+                'success': False,
+                'error': f'Unknown bulk operation: {operation}',
+                'operation': operation
+            }
+        
+        if modified != content:
+            get_index(modified, previous=index)
+        
+        return modified, {
+            'success': True,
+            'changes': count,
+            'operation': operation,
+            'method': f'bulk_{operation}',
+            'terms': len(terms),
+            'format_type': format_action if operation == 'format' else None,
+            'color': color if operation == 'format' and format_action == 'highlight' else None
+        }
+    
+    def batch_edit(self, content: str, queries: list) -> Tuple[str, list]:
         """
-        Execute multiple editing operations in sequence with delays.
+        Execute multiple editing operations.
+        
+        All queries are parsed up front (one Gemini request for the ones the
+        local parser and cache cannot answer). The batch planner then groups
+        edits whose target spans do not overlap into rounds; edits in a round
+        run concurrently (including their LLM calls) and their changes are
+        merged into one document. An edit waits for every earlier edit that
+        touches its spans or may write its target. Edits whose actual
+        changes collide are re-run in order on the merged result. API
+        pacing is left to the shared key scheduler.
         
         Args:
             content: LaTeX document content
             queries: List of natural language queries
-            delay: Delay in seconds between operations (default: 1.5s)
             
         Returns:
-            Tuple of (final_content, list_of_results)
+            Tuple of (final_content, list_of_results) with results in query order
         """
         print("\n" + "="*70)
         print(f"BATCH EDITING: {len(queries)} operations")
-        print(f"Delay between operations: {delay}s")
-        print(f"Estimated time: ~{len(queries) * delay / 60:.1f} minutes")
         print("="*70)
         
+        parsed_queries = self.parser.parse_batch_queries(queries)
+        rounds = plan_rounds(content, parsed_queries)
+        print(f"\n🧭 Plan: {len(queries)} edits in {len(rounds)} round(s), "
+              f"up to {max((len(r) for r in rounds), default=0)} at a time")
+        
         current_content = content
-        results = []
+        results = [None] * len(queries)
         
-        for i, query in enumerate(queries, 1):
-            print(f"\n[{i}/{len(queries)}] Processing: '{query}'")
-            
-            # Add delay before each operation (except first)
-            if i > 1:
-                print(f"  ⏳ Waiting {delay}s to avoid rate limits...")
-                time.sleep(delay)
+        def run(i: int, base: str) -> Tuple[str, Dict]:
+            print(f"\n[{i + 1}/{len(queries)}] Processing: '{queries[i]}'")
+            return self.edit(base, queries[i], parsed=parsed_queries[i])
+        
+        for round_indices in rounds:
+            base = current_content
+            if len(round_indices) == 1:
+                outputs = [run(round_indices[0], base)]
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(round_indices))) as pool:
+                    outputs = list(pool.map(lambda i: run(i, base), round_indices))
             
-            modified, result = self.edit(current_content, query)
+            # Merge in query order; a collision defers the later edit (and
+            # anything touching it) to a sequential re-run
+            accepted, blocked, deferred = [], [], []
+            for i, (modified, result) in zip(round_indices, outputs):
+                hunks = diff_hunks(base, modified) if result['success'] else []
+                spans = hunk_spans(hunks)
+                if spans and (spans_overlap(spans, hunk_spans(accepted)) or spans_overlap(spans, blocked)):
+                    blocked.extend(spans)
+                    deferred.append(i)
+                    continue
+                accepted.extend(hunks)
+                results[i] = result
+            current_content = apply_hunks(base, accepted)
             
+            for i in deferred:
+                print(f"\n  ↪️  Edit {i + 1} conflicts with an earlier edit, re-running on the merged document")
+                modified, result = run(i, current_content)
+                if result['success']:
+                    current_content = modified
+                results[i] = result
+        
+        for i, result in enumerate(results, 1):
             if result['success']:
-                current_content = modified
-                results.append(result)
-                print(f"  ✅ Success: {result['changes']} changes")
+                print(f"  ✅ [{i}] Success: {result['changes']} changes")
             else:
-                results.append(result)
-                print(f"  ⚠️  Failed: {result.get('error', 'Unknown error')}")
+                print(f"  ⚠️  [{i}] Failed: {result.get('error', 'Unknown error')}")
         
         print("\n" + "="*70)
         print(f"BATCH COMPLETE: {sum(1 for r in results if r['success'])}/{len(queries)} succeeded")
@@ -374,7 +490,6 @@ class DocumentEditor:
         
         return current_content, results
 
-
 def main():
     """Demo usage"""
     # Sample LaTeX content
@@ -0,0 +1,520 @@
+"""
+LATEX DOCUMENT INDEX
+Parsed model of a LaTeX document, built in one pass and shared by every
+editor operation instead of each one rescanning the raw text.
+
+- Section tree: headings with header/body/subtree offsets
+- Environment spans: \\begin{...} ... \\end{...}
+- Masks: comment, math and verbatim regions that text edits must not touch
+- Preamble: loaded packages
+
+Indexes are cached by content hash (get_index). After an edit, the index of
+the new content is derived from the previous one: offsets are shifted and
+only the edited lines are rescanned, unless the edit cuts through a
+structure (a math span, an environment tag, a heading) in which case the
+document is rebuilt.
+"""
+
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Iterable, List, Match, Optional, Sequence, Tuple
+
+from splice import diff_hunks
+
+SECTION_LEVELS = {'part': -1, 'chapter': 0, 'section': 1, 'subsection': 2, 'subsubsection': 3}
+MATH_ENVIRONMENTS = {
+    'equation', 'align', 'gather', 'multline', 'eqnarray', 'flalign', 'alignat',
+    'displaymath', 'math',
+}
+VERBATIM_ENVIRONMENTS = {'verbatim', 'Verbatim', 'lstlisting', 'minted', 'comment'}
+MAX_CACHED_INDEXES = 32
+
+_TOKEN = re.compile(r"""
+    (?P<skip>\\\\|\\[%$&\#_{}])
+  | (?P<comment>%)
+  | (?P<display>\$\$|\\\[)
+  | (?P<inline>\$|\\\()
+  | \\begin\s*\{(?P<begin>[^}]*)\}
+  | \\end\s*\{(?P<end>[^}]*)\}
+  | \\verb\*?(?P<verb>[^a-zA-Z\s*])
+  | \\(?P<heading>part|chapter|section|subsection|subsubsection)(?![a-zA-Z])(?P<star>\*?)
+  | (?P<package>\\usepackage)(?![a-zA-Z])
+""", re.VERBOSE)
+_CLOSERS = {'$$': '$$', '\\[': '\\]', '$': '$', '\\(': '\\)'}
+
+
+@dataclass
+class Section:
+    """A heading; offsets are absolute positions in the document"""
+    level: int
+    command: str
+    title: str
+    starred: bool
+    start: int
+    header_end: int
+    body_end: int = 0  # next heading of any level (or \end{document})
+    end: int = 0  # end of the subtree: next heading at the same or a higher level
+    parent: Optional[int] = None  # position of the parent in DocumentIndex.sections
+
+
+@dataclass
+class Environment:
+    name: str
+    start: int
+    end: int
+    body_start: int
+    body_end: int
+
+
+@dataclass
+class Package:
+    name: str
+    options: str
+    start: int
+    end: int
+
+
+@dataclass
+class _Scan:
+    masks: List[Tuple[int, int, str]]
+    environments: List[Environment]
+    sections: List[Section]
+    packages: List[Package]
+    complete: bool
+
+
+def _base_name(environment: str) -> str:
+    return environment.strip().rstrip('*')
+
+
+def _find_unescaped(text: str, token: str, position: int) -> int:
+    """Next occurrence of `token` not preceded by an odd number of backslashes"""
+    while True:
+        found = text.find(token, position)
+        if found <= 0:
+            return found
+        backslashes = 0
+        while found - backslashes - 1 >= 0 and text[found - backslashes - 1] == '\\':
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return found
+        position = found + 1
+
+
+def _balanced(text: str, position: int, opener: str, closer: str) -> int:
+    """Position just past the group opened at `position`, or -1"""
+    depth = 0
+    i = position
+    while i < len(text):
+        char = text[i]
+        if char == '\\':
+            i += 2  # Escaped character, e.g. \{ or \}
+            continue
+        if char == opener:
+            depth += 1
+        elif char == closer:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return -1
+
+
+def _skip_spaces(text: str, position: int) -> int:
+    while position < len(text) and text[position] in ' \t\n':
+        position += 1
+    return position
+
+
+def _argument(text: str, position: int) -> Tuple[Optional[str], Optional[str], int]:
+    """Parse an optional [..] then a required {..}: (options, argument, end)"""
+    position = _skip_spaces(text, position)
+    options = None
+    if position < len(text) and text[position] == '[':
+        close = _balanced(text, position, '[', ']')
+        if close == -1:
+            return None, None, position
+        options = text[position + 1:close - 1]
+        position = _skip_spaces(text, close)
+    if position >= len(text) or text[position] != '{':
+        return options, None, position
+    close = _balanced(text, position, '{', '}')
+    if close == -1:
+        return options, None, position
+    return options, text[position + 1:close - 1], close
+
+
+def normalize_title(title: str) -> str:
+    """Heading text as a reader sees it: escapes resolved, spacing collapsed"""
+    title = re.sub(r'\\([&%#$_])', r'\1', title).replace('~', ' ')
+    return re.sub(r'\s+', ' ', title).strip()
+
+
+def _scan(text: str, start: int = 0, stop: Optional[int] = None) -> _Scan:
+    """Tokenize text[start:stop]; offsets in the result are absolute"""
+    stop = len(text) if stop is None else stop
+    masks, environments, sections, packages = [], [], [], []
+    stack = []
+    complete = True
+    position = start
+
+    while True:
+        match = _TOKEN.search(text, position, stop)
+        if not match:
+            break
+        kind = 'heading' if match.lastgroup == 'star' else match.lastgroup
+        position = match.end()
+
+        if kind == 'skip':
+            continue
+
+        if kind == 'comment':
+            line_end = text.find('\n', match.start(), stop)
+            end = stop if line_end == -1 else line_end
+            masks.append((match.start(), end, 'comment'))
+            position = end
+            continue
+
+        if kind in ('display', 'inline'):
+            opener = match.group(kind)
+            closer = _CLOSERS[opener]
+            close = _find_unescaped(text, closer, match.end())
+            if close == -1 or close + len(closer) > stop:
+                complete = False
+                continue
+            masks.append((match.start(), close + len(closer), 'math'))
+            position = close + len(closer)
+            continue
+
+        if kind == 'verb':
+            close = text.find(match.group('verb'), match.end(), stop)
+            if close == -1:
+                complete = False
+                continue
+            masks.append((match.start(), close + 1, 'verbatim'))
+            position = close + 1
+            continue
+
+        if kind == 'begin':
+            name = match.group('begin').strip()
+            base = _base_name(name)
+            if base in MATH_ENVIRONMENTS or base in VERBATIM_ENVIRONMENTS:
+                end_tag = re.compile(r'\\end\s*\{' + re.escape(name) + r'\}')
+                close = end_tag.search(text, match.end(), stop)
+                if not close:
+                    complete = False
+                    continue
+                mask_kind = 'math' if base in MATH_ENVIRONMENTS else (
+                    'comment' if base == 'comment' else 'verbatim')
+                masks.append((match.start(), close.end(), mask_kind))
+                environments.append(Environment(name, match.start(), close.end(), match.end(), close.start()))
+                position = close.end()
+            else:
+                stack.append((name, match.start(), match.end()))
+            continue
+
+        if kind == 'end':
+            name = match.group('end').strip()
+            for depth in range(len(stack) - 1, -1, -1):
+                if stack[depth][0] == name:
+                    _, begin_start, begin_end = stack[depth]
+                    del stack[depth:]
+                    environments.append(Environment(name, begin_start, match.end(), begin_end, match.start()))
+                    break
+            else:
+                complete = False
+            continue
+
+        if kind == 'heading':
+            command = match.group('heading')
+            _, title, end = _argument(text, match.end())
+            if title is None:
+                continue
+            if end > stop:
+                complete = False
+                continue
+            sections.append(Section(SECTION_LEVELS[command], command, normalize_title(title),
+                                    bool(match.group('star')), match.start(), end))
+            position = end
+            continue
+
+        if kind == 'package':
+            options, names, end = _argument(text, match.end())
+            if names is None:
+                continue
+            if end > stop:
+                complete = False
+                continue
+            for name in names.split(','):
+                if name.strip():
+                    packages.append(Package(name.strip(), options or '', match.start(), end))
+            position = end
+
+    if stack:
+        complete = False
+    environments.sort(key=lambda e: e.start)
+    return _Scan(masks, environments, sections, packages, complete)
+
+
+class DocumentIndex:
+    """
+    One-pass structural index of a LaTeX document.
+
+    Lookups use binary search over sorted offsets. Build with
+    get_index(content) to share indexes between operations.
+    """
+
+    def __init__(self, content: str, scan: Optional[_Scan] = None):
+        self.content = content
+        scan = scan or _scan(content)
+        self.masks = sorted(scan.masks)
+        self.environments = sorted(scan.environments, key=lambda e: e.start)
+        self.sections = sorted(scan.sections, key=lambda s: s.start)
+        self.packages = sorted(scan.packages, key=lambda p: p.start)
+        self.complete = scan.complete
+        self.incremental = False
+        self._finalize()
+
+    def _finalize(self):
+        self._mask_starts = [start for start, _, _ in self.masks]
+        self._environment_starts = [e.start for e in self.environments]
+        self._section_starts = [s.start for s in self.sections]
+
+        document = next((e for e in self.environments if e.name == 'document'), None)
+        self.document_start = document.body_start if document else 0
+        self.document_end = document.body_end if document else len(self.content)
+
+        stack: List[int] = []
+        for i, section in enumerate(self.sections):
+            following = self.sections[i + 1].start if i + 1 < len(self.sections) else len(self.content)
+            limit = self.document_end if section.start < self.document_end else len(self.content)
+            section.body_end = min(following, limit)
+            while stack and self.sections[stack[-1]].level >= section.level:
+                self.sections[stack.pop()].end = section.start
+            section.parent = stack[-1] if stack else None
+            stack.append(i)
+        for i in stack:
+            section = self.sections[i]
+            section.end = self.document_end if section.start < self.document_end else len(self.content)
+
+        self._titles = {}
+        for section in self.sections:
+            self._titles.setdefault(section.title.lower(), section)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def mask_at(self, position: int) -> Optional[Tuple[int, int, str]]:
+        """The comment/math/verbatim region containing `position`, if any"""
+        i = bisect_right(self._mask_starts, position) - 1
+        if i >= 0 and position < self.masks[i][1]:
+            return self.masks[i]
+        return None
+
+    def is_masked(self, position: int) -> bool:
+        return self.mask_at(position) is not None
+
+    def unmasked(self, matches: Iterable[Match]) -> List[Match]:
+        """
+        Matches that start and end in ordinary text.
+
+        A match may contain a whole math span (a sentence with inline
+        math), but not begin or end inside one, or inside a comment.
+        """
+        return [m for m in matches
+                if not self.is_masked(m.start()) and not self.is_masked(max(m.start(), m.end() - 1))]
+
+    def find_section(self, name: str) -> Optional[Section]:
+        """
+        First heading whose title contains the words of `name` in order.
+
+        Separators between words may differ (spaces, &, \\&), and matching
+        is case-insensitive, like the editors' section regexes.
+        """
+        wanted = normalize_title(name or '')
+        if not wanted:
+            return None
+        exact = self._titles.get(wanted.lower())
+        if exact:
+            return exact
+        words = [w for w in re.split(r'[\s&]+', wanted) if w]
+        if not words:
+            return None
+        pattern = re.compile(r'[\s]*(?:&|#|%|\$)?[\s]*'.join(re.escape(w) for w in words), re.IGNORECASE)
+        return next((s for s in self.sections if pattern.search(s.title)), None)
+
+    def section_at(self, position: int) -> Optional[Section]:
+        """Innermost heading whose subtree contains `position`"""
+        i = bisect_right(self._section_starts, position) - 1
+        while i is not None and i >= 0:
+            section = self.sections[i]
+            if position < section.end:
+                return section
+            i = section.parent
+        return None
+
+    def children(self, section: Section) -> List[Section]:
+        position = self.sections.index(section)
+        return [s for s in self.sections if s.parent == position]
+
+    def find_environment(self, name: str) -> Optional[Environment]:
+        """First environment with this name (case-insensitive, star optional)"""
+        wanted = name.strip().lower()
+        for environment in self.environments:
+            if environment.name.lower() in (wanted, wanted + '*'):
+                return environment
+        return None
+
+    def environments_named(self, *names: str) -> List[Environment]:
+        wanted = {n.lower() for n in names}
+        return [e for e in self.environments if _base_name(e.name).lower() in wanted]
+
+    def environment_at(self, position: int) -> Optional[Environment]:
+        """Innermost environment containing `position`"""
+        # Nested environments start later, so the first hit walking back is innermost
+        i = bisect_right(self._environment_starts, position) - 1
+        while i >= 0:
+            if position < self.environments[i].end:
+                return self.environments[i]
+            i -= 1
+        return None
+
+    def has_package(self, name: str) -> bool:
+        return any(p.name == name for p in self.packages)
+
+    # ------------------------------------------------------------------
+    # Incremental update
+    # ------------------------------------------------------------------
+
+    def updated(self, new_content: str, hunks: Sequence[Tuple[int, int, str]]) -> 'DocumentIndex':
+        """
+        Index of `new_content`, given the (start, end, replacement) hunks that
+        turn this index's content into it.
+
+        Structures untouched by the hunks are shifted; the edited regions are
+        rescanned. Falls back to a full build when a hunk cuts a structure or
+        the rescan is not self-contained.
+        """
+        if not hunks:
+            return self
+        if not self.complete:
+            return DocumentIndex(new_content)
+
+        hunks = sorted(hunks)
+        starts = [h[0] for h in hunks]
+        ends = [h[1] for h in hunks]
+        deltas = [0]
+        for start, end, replacement in hunks:
+            deltas.append(deltas[-1] + len(replacement) - (end - start))
+
+        def shift_start(position):
+            return position + deltas[bisect_right(ends, position)]
+
+        def shift_end(position):
+            # Hunks that start at or after an end position do not move it
+            return position + deltas[bisect_left(starts, position)]
+
+        def relation(start, end):
+            """'drop' if inside a hunk, 'cut' if partially covered, else 'keep'"""
+            i = bisect_right(starts, end) - 1
+            while i >= 0 and ends[i] >= start:
+                h_start, h_end = starts[i], ends[i]
+                if h_start <= start and end <= h_end and h_end > h_start:
+                    return 'drop'
+                if h_start < end and start < h_end:
+                    return 'cut'
+                i -= 1
+            return 'keep'
+
+        masks, environments, sections, packages = [], [], [], []
+        for start, end, kind in self.masks:
+            state = relation(start, end)
+            if state == 'cut':
+                return DocumentIndex(new_content)
+            if state == 'keep':
+                masks.append((shift_start(start), shift_end(end), kind))
+
+        for environment in self.environments:
+            if relation(environment.start, environment.end) == 'drop':
+                continue
+            # Both tags must be untouched; edits inside the body are fine
+            if (relation(environment.start, environment.body_start) != 'keep' or
+                    relation(environment.body_end, environment.end) != 'keep'):
+                return DocumentIndex(new_content)
+            environments.append(Environment(
+                environment.name, shift_start(environment.start), shift_end(environment.end),
+                shift_end(environment.body_start), shift_start(environment.body_end)))
+
+        for section in self.sections:
+            state = relation(section.start, section.header_end)
+            if state == 'cut':
+                return DocumentIndex(new_content)
+            if state == 'keep':
+                sections.append(replace(section, start=shift_start(section.start),
+                                        header_end=shift_end(section.header_end)))
+
+        for package in self.packages:
+            state = relation(package.start, package.end)
+            if state == 'cut':
+                return DocumentIndex(new_content)
+            if state == 'keep':
+                packages.append(replace(package, start=shift_start(package.start),
+                                        end=shift_end(package.end)))
+
+        for i, (start, end, replacement) in enumerate(hunks):
+            new_start = start + deltas[i]
+            scan = _scan(new_content, new_start, new_start + len(replacement))
+            if not scan.complete:
+                return DocumentIndex(new_content)
+            masks.extend(scan.masks)
+            environments.extend(scan.environments)
+            sections.extend(scan.sections)
+            packages.extend(scan.packages)
+
+        index = DocumentIndex(new_content, _Scan(masks, environments, sections, packages, True))
+        index.incremental = True
+        return index
+
+
+_cache: 'OrderedDict[Tuple[int, int], DocumentIndex]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_index(content: str, previous: Optional[DocumentIndex] = None) -> DocumentIndex:
+    """
+    Shared index for `content`, cached by content hash.
+
+    With `previous` (the index of the text before an edit) a cache miss is
+    filled incrementally from the line diff instead of a full parse.
+    """
+    key = (len(content), hash(content))
+    with _cache_lock:
+        index = _cache.get(key)
+        if index is not None and index.content == content:
+            _cache.move_to_end(key)
+            return index
+
+    if previous is not None and previous.content != content:
+        index = previous.updated(content, diff_hunks(previous.content, content))
+    else:
+        index = DocumentIndex(content)
+
+    with _cache_lock:
+        _cache[key] = index
+        while len(_cache) > MAX_CACHED_INDEXES:
+            _cache.popitem(last=False)
+    return index
+
+
+def find_unmasked(content: str, pattern: str, flags: int = 0) -> List[Match]:
+    """
+    All matches of `pattern` outside math, comments and verbatim.
+
+    Editing text inside $...$ or a % comment would either break the math
+    or have no visible effect, so those matches are skipped.
+    """
+    return get_index(content).unmasked(re.finditer(pattern, content, flags))
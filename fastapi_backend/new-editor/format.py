@@ -7,6 +7,10 @@ No complex logic, just direct LaTeX formatting.
 import re
 from typing import Tuple, List, Optional
 
+from document_index import find_unmasked, get_index
+from splice import splice_matches
+from term_matcher import TermMatcher
+
 
 def ensure_package(content: str, package: str, options: str = None) -> str:
     """
@@ -21,36 +25,34 @@ def ensure_package(content: str, package: str, options: str = None) -> str:
     Returns:
         Modified content with package ensured
     """
-    # Check if package is already loaded (with or without options)
-    package_pattern = r'\\usepackage(?:\[.*?\])?\{' + re.escape(package) + r'\}'
-    if re.search(package_pattern, content):
+    # Check if package is already loaded (with or without options, alone or
+    # in a list; commented-out \\usepackage lines do not count)
+    index = get_index(content)
+    if index.has_package(package):
         return content  # Package already present
     
+    if options:
+        new_package = f'\\usepackage[{options}]{{{package}}}\n'
+    else:
+        new_package = f'\\usepackage{{{package}}}\n'
+    
     # Find the best place to add the package
-    # Try to add after \documentclass
+    # Try to add after \\documentclass
     documentclass_match = re.search(r'\\documentclass.*?\n', content)
+    document = index.find_environment('document')
     if documentclass_match:
         insert_pos = documentclass_match.end()
-        if options:
-            new_package = f'\\usepackage[{options}]{{{package}}}\n'
-        else:
-            new_package = f'\\usepackage{{{package}}}\n'
-        return content[:insert_pos] + new_package + content[insert_pos:]
-    
-    # Fallback: add before \begin{document}
-    begin_doc_match = re.search(r'\\begin\{document\}', content)
-    if begin_doc_match:
-        insert_pos = begin_doc_match.start()
-        if options:
-            new_package = f'\\usepackage[{options}]{{{package}}}\n'
-        else:
-            new_package = f'\\usepackage{{{package}}}\n'
-        return content[:insert_pos] + new_package + content[insert_pos:]
-    
-    # No good place found - just prepend
-    if options:
-        return f'\\usepackage[{options}]{{{package}}}\n' + content
-    return f'\\usepackage{{{package}}}\n' + content
+    elif document:
+        # Fallback: add before \\begin{document}
+        insert_pos = document.start
+    else:
+        # No good place found - just prepend
+        insert_pos = 0
+    
+    modified = content[:insert_pos] + new_package + content[insert_pos:]
+    # Warm the index for the edited document from the current one
+    get_index(modified, previous=index)
+    return modified
 
 
 class SimpleFormatter:
@@ -60,6 +62,13 @@ class SimpleFormatter:
         """Initialize formatter"""
         pass
     
+    @staticmethod
+    def _highlight(text: str, color: str) -> str:
+        """\\hl{} from soul for yellow, \\colorbox for other colors"""
+        if color.lower() == 'yellow':
+            return f'\\hl{{{text}}}'
+        return f'\\colorbox{{{color}}}{{{text}}}'
+    
     # ========================================================================
     # HIGHLIGHT OPERATIONS
     # ========================================================================
@@ -86,7 +95,7 @@ class SimpleFormatter:
         pattern = r'\b' + re.escape(word) + r'\b'
         
         # Find all matches
-        matches = list(re.finditer(pattern, content, re.IGNORECASE))
+        matches = find_unmasked(content, pattern, re.IGNORECASE)
         count = len(matches)
         
         if count == 0:
@@ -95,18 +104,8 @@ class SimpleFormatter:
         
         print(f"  📍 Found {count} occurrences")
         
-        # Replace from end to start (avoid offset issues)
-        modified = content
-        for match in reversed(matches):
-            start, end = match.span()
-            word_text = content[start:end]
-            
-            # Use \hl{} from soul package for yellow, or \colorbox for other colors
-            if color.lower() == 'yellow':
-                highlighted = f'\\hl{{{word_text}}}'
-            else:
-                highlighted = f'\\colorbox{{{color}}}{{{word_text}}}'
-            modified = modified[:start] + highlighted + modified[end:]
+        # Single pass over all matches
+        modified = splice_matches(content, matches, lambda text: self._highlight(text, color))
         
         print(f"  ✅ Highlighted {count} occurrences")
         return modified, count
@@ -133,7 +132,7 @@ class SimpleFormatter:
         pattern = re.escape(phrase)
         
         # Find all matches
-        matches = list(re.finditer(pattern, content, re.IGNORECASE))
+        matches = find_unmasked(content, pattern, re.IGNORECASE)
         count = len(matches)
         
         if count == 0:
@@ -142,18 +141,8 @@ class SimpleFormatter:
         
         print(f"  📍 Found {count} occurrences")
         
-        # Replace from end to start
-        modified = content
-        for match in reversed(matches):
-            start, end = match.span()
-            phrase_text = content[start:end]
-            
-            # Use \hl{} from soul package for yellow, or \colorbox for other colors
-            if color.lower() == 'yellow':
-                highlighted = f'\\hl{{{phrase_text}}}'
-            else:
-                highlighted = f'\\colorbox{{{color}}}{{{phrase_text}}}'
-            modified = modified[:start] + highlighted + modified[end:]
+        # Single pass over all matches
+        modified = splice_matches(content, matches, lambda text: self._highlight(text, color))
         
         print(f"  ✅ Highlighted {count} occurrences")
         return modified, count
@@ -177,33 +166,27 @@ class SimpleFormatter:
         content = ensure_package(content, 'soul')
         
         # Try exact match first
-        if sentence in content:
+        exact = find_unmasked(content, re.escape(sentence))
+        if exact:
             if color.lower() == 'yellow':
                 highlighted = f'\\hl{{{sentence}}}'
             else:
                 highlighted = f'\\colorbox{{{color}}}{{{sentence}}}'
-            modified = content.replace(sentence, highlighted)
-            count = content.count(sentence)
+            modified = splice_matches(content, exact, lambda text: highlighted)
+            count = len(exact)
             print(f"  ✅ Highlighted {count} occurrence(s)")
             return modified, count
         
         # Try case-insensitive
         pattern = re.escape(sentence)
-        matches = list(re.finditer(pattern, content, re.IGNORECASE))
+        matches = find_unmasked(content, pattern, re.IGNORECASE)
         
         if matches:
             count = len(matches)
             print(f"  📍 Found {count} match(es)")
             
-            modified = content
-            for match in reversed(matches):
-                start, end = match.span()
-                sentence_text = content[start:end]
-                if color.lower() == 'yellow':
-                    highlighted = f'\\hl{{{sentence_text}}}'
-                else:
-                    highlighted = f'\\colorbox{{{color}}}{{{sentence_text}}}'
-                modified = modified[:start] + highlighted + modified[end:]
+            # Single pass over all matches
+            modified = splice_matches(content, matches, lambda text: self._highlight(text, color))
             
             print(f"  ✅ Highlighted {count} occurrence(s)")
             return modified, count
@@ -230,22 +213,23 @@ class SimpleFormatter:
         content = ensure_package(content, 'soul')
         
         # Try exact match first
-        if paragraph_text in content:
+        exact = find_unmasked(content, re.escape(paragraph_text))
+        if exact:
             if color.lower() == 'yellow':
                 highlighted = f'\\hl{{{paragraph_text}}}'
             else:
                 highlighted = f'\\colorbox{{{color}}}{{{paragraph_text}}}'
-            modified = content.replace(paragraph_text, highlighted, 1)
+            modified = content[:exact[0].start()] + highlighted + content[exact[0].end():]
             print(f"  ✅ Highlighted paragraph (exact match)")
             return modified, 1
         
         # Normalize whitespace and try flexible matching
         # Replace multiple spaces/newlines with flexible pattern
         normalized_pattern = re.sub(r'\s+', r'\\s+', re.escape(paragraph_text))
-        match = re.search(normalized_pattern, content, re.IGNORECASE | re.DOTALL)
+        matches = find_unmasked(content, normalized_pattern, re.IGNORECASE | re.DOTALL)
         
-        if match:
-            start, end = match.span()
+        if matches:
+            start, end = matches[0].span()
             para_text = content[start:end]
             if color.lower() == 'yellow':
                 highlighted = f'\\hl{{{para_text}}}'
@@ -272,16 +256,56 @@ class SimpleFormatter:
         """
         print(f"\n🎨 Highlighting {len(sentences)} sentences in {color}")
         
-        modified = content
-        total_count = 0
+        # One pass for all sentences (a sentence inside another is not
+        # wrapped twice)
+        return self.format_terms(content, sentences, 'highlight', color)
+    
+    def format_terms(self, content: str, terms: List[str], format_action: str = 'bold',
+                     color: str = 'yellow') -> Tuple[str, int]:
+        """
+        Bold, italicize or highlight many terms in a single pass.
+        
+        All terms are found with one compiled matcher and wrapped in one
+        splice, so the cost does not grow with the number of terms. Single
+        words match on word boundaries, phrases anywhere, case-insensitive.
+        
+        Args:
+            content: LaTeX document content
+            terms: Words, phrases or sentences to format
+            format_action: 'bold', 'italic' or 'highlight'
+            color: Highlight color
+            
+        Returns:
+            (modified_content, total_count)
+        """
+        print(f"\n🎨 Formatting {len(terms)} terms ({format_action})")
         
-        for i, sentence in enumerate(sentences, 1):
-            print(f"  Sentence {i}/{len(sentences)}: '{sentence[:40]}...'")
-            modified, count = self.highlight_sentence(modified, sentence, color)
-            total_count += count
+        if format_action == 'highlight':
+            content = ensure_package(content, 'xcolor')
+            content = ensure_package(content, 'soul')
+            wrap = lambda text: self._highlight(text, color)
+        elif format_action == 'italic':
+            wrap = lambda text: f'\\textit{{{text}}}'
+        else:
+            wrap = lambda text: f'\\textbf{{{text}}}'
         
-        print(f"  ✅ Total highlighted: {total_count}")
-        return modified, total_count
+        matcher = TermMatcher(terms)
+        matches = get_index(content).unmasked(matcher.finditer(content))
+        
+        if not matches:
+            print(f"  ❌ None of the terms found")
+            return content, 0
+        
+        found = {matcher.term(match) for match in matches}
+        missing = [term for term in matcher.terms.values() if term not in found]
+        print(f"  📍 Found {len(matches)} match(es) of {len(found)}/{len(matcher)} terms")
+        if missing:
+            print(f"  ⚠️  Not found: {', '.join(missing[:5])}{'...' if len(missing) > 5 else ''}")
+        
+        modified = splice_matches(content, matches, wrap)
+        
+        print(f"  ✅ Formatted {len(matches)} occurrence(s)")
+        return modified, len(matches)
     
     # ========================================================================
     # BOLD OPERATIONS
@@ -309,7 +333,7 @@ class SimpleFormatter:
         pattern = r'\b' + re.escape(word) + r'\b'
         
         # Find all matches
-        matches = list(re.finditer(pattern, content, re.IGNORECASE))
+        matches = find_unmasked(content, pattern, re.IGNORECASE)
         count = len(matches)
         
         if count == 0:
@@ -318,15 +342,8 @@ class SimpleFormatter:
         
         print(f"  📍 Found {count} occurrences")
         
-        # Replace from end to start
-        modified = content
-        for match in reversed(matches):
-            start, end = match.span()
-            word_text = content[start:end]
-            
-            # Wrap in \textbf
-            bolded = f'\\textbf{{{word_text}}}'
-            modified = modified[:start] + bolded + modified[end:]
+        # Single pass over all matches
+        modified = splice_matches(content, matches, lambda text: f'\\textbf{{{text}}}')
         
         print(f"  ✅ Made {count} occurrences bold")
         return modified, count
@@ -348,7 +365,7 @@ class SimpleFormatter:
         pattern = re.escape(phrase)
         
         # Find all matches
-        matches = list(re.finditer(pattern, content, re.IGNORECASE))
+        matches = find_unmasked(content, pattern, re.IGNORECASE)
         count = len(matches)
         
         if count == 0:
@@ -357,15 +374,8 @@ class SimpleFormatter:
         
         print(f"  📍 Found {count} occurrences")
         
-        # Replace from end to start
-        modified = content
-        for match in reversed(matches):
-            start, end = match.span()
-            phrase_text = content[start:end]
-            
-            # Wrap in \textbf
-            bolded = f'\\textbf{{{phrase_text}}}'
-            modified = modified[:start] + bolded + modified[end:]
+        # Single pass over all matches
+        modified = splice_matches(content, matches, lambda text: f'\\textbf{{{text}}}')
         
         print(f"  ✅ Made {count} occurrences bold")
         return modified, count
@@ -384,27 +394,24 @@ class SimpleFormatter:
         print(f"\n**𝗕** Making sentence bold: '{sentence[:50]}...'")
         
         # Try exact match
-        if sentence in content:
+        exact = find_unmasked(content, re.escape(sentence))
+        if exact:
             bolded = f'\\textbf{{{sentence}}}'
-            modified = content.replace(sentence, bolded)
-            count = content.count(sentence)
+            modified = splice_matches(content, exact, lambda text: bolded)
+            count = len(exact)
             print(f"  ✅ Made {count} occurrence(s) bold")
             return modified, count
         
         # Try case-insensitive
         pattern = re.escape(sentence)
-        matches = list(re.finditer(pattern, content, re.IGNORECASE))
+        matches = find_unmasked(content, pattern, re.IGNORECASE)
         
         if matches:
             count = len(matches)
             print(f"  📍 Found {count} match(es)")
             
-            modified = content
-            for match in reversed(matches):
-                start, end = match.span()
-                sentence_text = content[start:end]
-                bolded = f'\\textbf{{{sentence_text}}}'
-                modified = modified[:start] + bolded + modified[end:]
+            # Single pass over all matches
+            modified = splice_matches(content, matches, lambda text: f'\\textbf{{{text}}}')
             
             print(f"  ✅ Made {count} occurrence(s) bold")
             return modified, count
@@ -426,18 +433,19 @@ class SimpleFormatter:
         print(f"\n**𝗕** Making paragraph bold ({len(paragraph_text)} chars)")
         
         # Try exact match first
-        if paragraph_text in content:
+        exact = find_unmasked(content, re.escape(paragraph_text))
+        if exact:
             bolded = f'\\textbf{{{paragraph_text}}}'
-            modified = content.replace(paragraph_text, bolded, 1)
+            modified = content[:exact[0].start()] + bolded + content[exact[0].end():]
             print(f"  ✅ Made paragraph bold (exact match)")
             return modified, 1
         
         # Flexible whitespace matching
         normalized_pattern = re.sub(r'\s+', r'\\s+', re.escape(paragraph_text))
-        match = re.search(normalized_pattern, content, re.IGNORECASE | re.DOTALL)
+        matches = find_unmasked(content, normalized_pattern, re.IGNORECASE | re.DOTALL)
         
-        if match:
-            start, end = match.span()
+        if matches:
+            start, end = matches[0].span()
             para_text = content[start:end]
             bolded = f'\\textbf{{{para_text}}}'
             modified = content[:start] + bolded + content[end:]
@@ -468,7 +476,7 @@ class SimpleFormatter:
         pattern = r'\b' + re.escape(word) + r'\b'
         
         # Find all matches
-        matches = list(re.finditer(pattern, content, re.IGNORECASE))
+        matches = find_unmasked(content, pattern, re.IGNORECASE)
         count = len(matches)
         
         if count == 0:
@@ -477,15 +485,8 @@ class SimpleFormatter:
         
         print(f"  📍 Found {count} occurrences")
         
-        # Replace from end to start
-        modified = content
-        for match in reversed(matches):
-            start, end = match.span()
-            word_text = content[start:end]
-            
-            # Wrap in \textit
-            italicized = f'\\textit{{{word_text}}}'
-            modified = modified[:start] + italicized + modified[end:]
+        # Single pass over all matches
+        modified = splice_matches(content, matches, lambda text: f'\\textit{{{text}}}')
         
         print(f"  ✅ Made {count} occurrences italic")
         return modified, count
@@ -507,7 +508,7 @@ class SimpleFormatter:
         pattern = re.escape(phrase)
         
         # Find all matches
-        matches = list(re.finditer(pattern, content, re.IGNORECASE))
+        matches = find_unmasked(content, pattern, re.IGNORECASE)
         count = len(matches)
         
         if count == 0:
@@ -516,15 +517,8 @@ class SimpleFormatter:
         
         print(f"  📍 Found {count} occurrences")
         
-        # Replace from end to start
-        modified = content
-        for match in reversed(matches):
-            start, end = match.span()
-            phrase_text = content[start:end]
-            
-            # Wrap in \textit
-            italicized = f'\\textit{{{phrase_text}}}'
-            modified = modified[:start] + italicized + modified[end:]
+        # Single pass over all matches
+        modified = splice_matches(content, matches, lambda text: f'\\textit{{{text}}}')
         
         print(f"  ✅ Made {count} occurrences italic")
         return modified, count
@@ -543,27 +537,24 @@ class SimpleFormatter:
         print(f"\n*𝐼* Making sentence italic: '{sentence[:50]}...'")
         
         # Try exact match
-        if sentence in content:
+        exact = find_unmasked(content, re.escape(sentence))
+        if exact:
             italicized = f'\\textit{{{sentence}}}'
-            modified = content.replace(sentence, italicized)
-            count = content.count(sentence)
+            modified = splice_matches(content, exact, lambda text: italicized)
+            count = len(exact)
             print(f"  ✅ Made {count} occurrence(s) italic")
             return modified, count
         
         # Try case-insensitive
         pattern = re.escape(sentence)
-        matches = list(re.finditer(pattern, content, re.IGNORECASE))
+        matches = find_unmasked(content, pattern, re.IGNORECASE)
         
         if matches:
             count = len(matches)
             print(f"  📍 Found {count} match(es)")
             
-            modified = content
-            for match in reversed(matches):
-                start, end = match.span()
-                sentence_text = content[start:end]
-                italicized = f'\\textit{{{sentence_text}}}'
-                modified = modified[:start] + italicized + modified[end:]
+            # Single pass over all matches
+            modified = splice_matches(content, matches, lambda text: f'\\textit{{{text}}}')
             
             print(f"  ✅ Made {count} occurrence(s) italic")
             return modified, count
@@ -585,18 +576,19 @@ class SimpleFormatter:
         print(f"\n*𝐼* Making paragraph italic ({len(paragraph_text)} chars)")
         
         # Try exact match first
-        if paragraph_text in content:
+        exact = find_unmasked(content, re.escape(paragraph_text))
+        if exact:
             italicized = f'\\textit{{{paragraph_text}}}'
-            modified = content.replace(paragraph_text, italicized, 1)
+            modified = content[:exact[0].start()] + italicized + content[exact[0].end():]
             print(f"  ✅ Made paragraph italic (exact match)")
             return modified, 1
         
         # Flexible whitespace matching
         normalized_pattern = re.sub(r'\s+', r'\\s+', re.escape(paragraph_text))
-        match = re.search(normalized_pattern, content, re.IGNORECASE | re.DOTALL)
+        matches = find_unmasked(content, normalized_pattern, re.IGNORECASE | re.DOTALL)
         
-        if match:
-            start, end = match.span()
+        if matches:
+            start, end = matches[0].span()
             para_text = content[start:end]
             italicized = f'\\textit{{{para_text}}}'
             modified = content[:start] + italicized + content[end:]
@@ -0,0 +1,230 @@
+"""
+SECTION-SCOPED LLM CONTEXT
+Compact document context for the AI edit paths (modify_section_ai,
+_ai_replace_sentence).
+
+A prompt gets the target text (the section body to rewrite, or the window
+to search) and, where it helps, a little orientation:
+- an outline: section titles, \\label names and the definitions of the
+  macros the target uses
+- a bounded window of the text around the target
+
+The extra material is capped well below what the call site sent before
+(EXTRA_RATIO of it, and at most LLM_CONTEXT_TOKENS, ~4 characters per token
+like the shared client's estimate); the target is never cut. The search
+window of _ai_replace_sentence is no larger than the 2000-character prefix
+it replaces. Every build is recorded against the prompt material the call
+site sent before, so get_context_stats() reports real savings (negative
+when a prompt grew).
+"""
+
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from document_index import DocumentIndex, Section, get_index
+
+CHARS_PER_TOKEN = 4
+MAX_EXTRA_TOKENS = int(os.getenv('LLM_CONTEXT_TOKENS', '250'))
+EXTRA_RATIO = 0.25  # outline + neighbours, as a share of what was sent before
+REPLACE_WINDOW_CHARS = 2000  # _ai_replace_sentence used to send content[:2000]
+
+_LABEL = re.compile(r'\\label\{([^}]+)\}')
+_MACRO_DEFINITION = re.compile(
+    r'^[ \t]*\\(?:(?:re|provide)?newcommand\*?\s*\{?\\(?P<command>[A-Za-z]+)\}?'
+    r'|def\s*\\(?P<def>[A-Za-z]+)'
+    r'|DeclareMathOperator\*?\s*\{\\(?P<operator>[A-Za-z]+)\}).*$',
+    re.MULTILINE
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+@dataclass
+class LLMContext:
+    """Prompt material for one AI edit; offsets are positions in the document"""
+    target: str
+    start: int
+    end: int
+    outline: str
+    before: str
+    after: str
+    baseline_tokens: int  # what the call site sent before for the same request
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.target + self.outline + self.before + self.after)
+
+    @property
+    def saved_tokens(self) -> int:
+        """Tokens saved against the baseline; negative when the prompt grew"""
+        return self.baseline_tokens - self.tokens
+
+    def render(self, before_title: str = 'PRECEDING TEXT', after_title: str = 'FOLLOWING TEXT') -> str:
+        """Outline and neighbouring text as prompt blocks (the target is placed by the caller)"""
+        blocks = []
+        if self.outline:
+            blocks.append(f"DOCUMENT OUTLINE:\n{self.outline}")
+        if self.before:
+            blocks.append(f"{before_title} (excerpt):\n...{self.before}")
+        if self.after:
+            blocks.append(f"{after_title} (excerpt):\n{self.after}...")
+        return '\n\n'.join(blocks)
+
+
+class ContextStats:
+    """Thread-safe running totals of context sizes, overall and per operation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict[str, int]] = {}
+
+    def record(self, operation: str, context: LLMContext):
+        with self._lock:
+            for key in ('all', operation):
+                totals = self._totals.setdefault(key, {'requests': 0, 'tokens_sent': 0, 'baseline_tokens': 0})
+                totals['requests'] += 1
+                totals['tokens_sent'] += context.tokens
+                totals['baseline_tokens'] += context.baseline_tokens
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            stats = {}
+            for key, totals in self._totals.items():
+                saved = totals['baseline_tokens'] - totals['tokens_sent']
+                stats[key] = dict(totals, tokens_saved=saved,
+                                  saved_ratio=round(saved / totals['baseline_tokens'], 3)
+                                  if totals['baseline_tokens'] else 0.0)
+            return stats
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+
+_stats = ContextStats()
+
+
+def get_context_stats() -> Dict[str, Dict[str, float]]:
+    """Tokens sent vs. what the same call sites sent before, under 'all' and per operation"""
+    return _stats.snapshot()
+
+
+def _recorded(operation: str, context: LLMContext) -> LLMContext:
+    _stats.record(operation, context)
+    print(f"  📉 Context: ~{context.tokens} tokens (previously ~{context.baseline_tokens}, "
+          f"{context.saved_tokens} saved)")
+    return context
+
+
+def _outline(index: DocumentIndex, target: str, highlight: Optional[Section]) -> List[str]:
+    """Outline lines, most important first: macros the target uses, titles, labels"""
+    content = index.content
+    lines = []
+
+    used = set(re.findall(r'\\([A-Za-z]+)', target))
+    for match in _MACRO_DEFINITION.finditer(content):
+        name = match.group('command') or match.group('def') or match.group('operator')
+        if name in used and not index.is_masked(match.start()):
+            lines.append(match.group(0).strip())
+    if lines:
+        lines.insert(0, 'Macros used:')
+
+    if index.sections:
+        lines.append('Sections:')
+        for section in index.sections:
+            marker = '  <-- target' if section is highlight else ''
+            lines.append(f"{'  ' * max(0, section.level - 1)}- {section.title}{marker}")
+
+    labels = [m.group(1) for m in _LABEL.finditer(content) if not index.is_masked(m.start())]
+    if labels:
+        lines.append('Labels: ' + ', '.join(labels))
+    return lines
+
+
+def _fit_lines(lines: List[str], budget_chars: int) -> str:
+    kept, used = [], 0
+    for line in lines:
+        if used + len(line) + 1 > budget_chars:
+            break
+        kept.append(line)
+        used += len(line) + 1
+    return '\n'.join(kept)
+
+
+def _window_before(content: str, position: int, chars: int, floor: int = 0) -> str:
+    """Up to `chars` characters ending at `position`, starting on a line boundary"""
+    start = max(floor, position - chars)
+    if start > floor:
+        line_start = content.find('\n', start, position)
+        start = line_start + 1 if line_start != -1 else position
+    return content[start:position]
+
+
+def _window_after(content: str, position: int, chars: int, ceiling: int) -> str:
+    """Up to `chars` characters starting at `position`, ending on a line boundary"""
+    end = min(ceiling, position + chars)
+    if end < ceiling:
+        line_end = content.rfind('\n', position, end)
+        end = line_end + 1 if line_end != -1 else position
+    return content[position:end]
+
+
+def build_context(content: str, start: int, end: int, operation: str, baseline_tokens: int,
+                  extra_tokens: Optional[int] = None, section: Optional[Section] = None) -> LLMContext:
+    """
+    Context for the target content[start:end] (empty for an insertion point).
+
+    Args:
+        content: LaTeX document content
+        start, end: Target span
+        operation: Name under which the build is recorded
+        baseline_tokens: Prompt material the call site sent before
+        extra_tokens: Cap on outline + neighbouring text (defaults to
+            LLM_CONTEXT_TOKENS); never more than EXTRA_RATIO of the baseline
+        section: Section to mark in the outline
+    """
+    index = get_index(content)
+    cap = MAX_EXTRA_TOKENS if extra_tokens is None else extra_tokens
+    remaining = min(cap, int(baseline_tokens * EXTRA_RATIO)) * CHARS_PER_TOKEN
+    target = content[start:end]
+
+    # The outline may use half of the extra budget, the neighbouring text the rest
+    outline = _fit_lines(_outline(index, target, section), remaining // 2)
+    remaining -= len(outline)
+    # Split the rest evenly; a side with less text leaves its share to the other
+    after_available = max(0, index.document_end - end)
+    before = _window_before(content, start, remaining - min(after_available, remaining // 2),
+                            floor=index.document_start)
+    after = _window_after(content, end, remaining - len(before), ceiling=index.document_end)
+
+    return _recorded(operation, LLMContext(target, start, end, outline, before, after, baseline_tokens))
+
+
+def section_context(content: str, section: Section, operation: str,
+                    extra_tokens: Optional[int] = None) -> LLMContext:
+    """Context for rewriting a section body (header excluded); the body alone was sent before"""
+    body = content[section.header_end:section.body_end]
+    return build_context(content, section.header_end, section.body_end, operation,
+                         estimate_tokens(body.strip()), extra_tokens, section=section)
+
+
+def window_context(content: str, position: int, operation: str,
+                   max_chars: int = REPLACE_WINDOW_CHARS) -> LLMContext:
+    """
+    At most `max_chars` of text around `position`, on line boundaries, for
+    finding a passage that starts near a known location (no outline or
+    extra neighbours). Most of the window follows `position`.
+    """
+    before = _window_before(content, position, max_chars // 4)
+    start = position - len(before)
+    end = position + len(_window_after(content, position, max_chars - len(before), len(content)))
+    if end == position:
+        end = min(len(content), position + max_chars - len(before))  # one long line: cut it
+
+    return _recorded(operation, LLMContext(content[start:end], start, end, '', '', '',
+                                           estimate_tokens(content[:max_chars])))
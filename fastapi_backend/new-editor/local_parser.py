@@ -0,0 +1,351 @@
+"""
+LOCAL QUERY PARSER
+Deterministic, grammar-based parsing for common edit commands.
+
+Returns the same dict schema as QueryParser.parse_query with a confidence
+score. Clear commands ("replace 'accuracy' with 'precision'",
+"make 'neural network' bold", "bold 'CNN', 'RNN' and 'LSTM'",
+"remove all tables") parse in microseconds; anything ambiguous scores low
+so the caller can defer to Gemini.
+"""
+
+import re
+from typing import Dict, Optional, Callable, List, Tuple
+
+
+COLORS = ['yellow', 'red', 'green', 'blue', 'cyan', 'magenta', 'orange', 'pink']
+
+_KIND = r'(?:(?P<kind>word|phrase|term|sentence|paragraph)\s*(?P<colon>:)?\s+)?'
+_ALL = r'(?:all\s+(?:(?:the\s+)?(?:occurrences|instances|mentions)\s+of\s+)?)?'
+_SCOPE = r'(?:\s+(?:in|throughout|across)\s+(?:the\s+)?(?:entire\s+|whole\s+)?(?:document|paper|text|file))?'
+_END = r'\s*(?P<stop>[.!])?\s*$'
+_COLOR = r'(?:\s+(?:in|with|using)\s+(?P<color>' + '|'.join(COLORS) + r')(?:\s+colou?r)?)?'
+
+# Words that signal an instruction rather than literal replacement text
+_INSTRUCTION_START = re.compile(
+    r'^(?:be|make|sound|read|focus|become|look|emphasi[sz]e|include|mention|reflect)\b', re.I
+)
+_CONNECTIVES = re.compile(r'\s(?:with|to|by|into|from|in)\s', re.I)
+# Ordinals and quantifiers select parts of the document ("the last sentence",
+# "every heading"); they are not literal text to search for
+_SELECTOR = re.compile(
+    r'\b(?:first|second|third|fourth|fifth|last|next|previous|final|every|each|all|any|'
+    r'other|whole|entire|\d+(?:st|nd|rd|th))\b', re.I
+)
+# Section and structure names ("delete the introduction", "bold the abstract",
+# "replace section 2 with ...") and pronouns ("make it bold") point at a
+# part of the document, not at literal text
+_STRUCTURE = re.compile(
+    r'^(?:the\s+)?(?:title|abstract|introduction|conclusions?|references|bibliography|appendix|'
+    r'acknowledge?ments?|figures?|tables?|equations?|captions?|headings?|'
+    r'(?:sub)?sections?(?:\s+\S+)?|chapters?(?:\s+\S+)?|(?:figure|table|equation)\s+\S+|'
+    r'\S+\s+(?:(?:sub)?section|table|figure|equation)s?|'
+    r'it|this|that|these|those|them|everything|anything|something|all)$', re.I
+)
+# "CNN, RNN and LSTM": unquoted lists are ambiguous (one phrase or several terms?)
+_UNQUOTED_LIST = re.compile(r',|\s(?:and|or|&)\s', re.I)
+# "change color to blue" asks for formatting, not a word replacement
+_STYLE_WORDS = re.compile(
+    r'^(?:' + '|'.join(COLORS) + r'|bold|italics?|underlined?|bigger|smaller|larger|'
+    r'(?:upper|lower)case|capitali[sz]ed)$', re.I
+)
+
+# "'X', 'Y' and 'Z'": several quoted terms for one format command
+_QUOTED = r'"[^"]+"|\'[^\']+\'|“[^”]+”'
+_QUOTED_LIST = re.compile(
+    r'^(?:(?:words|phrases|terms)\s+)?(?:' + _QUOTED + r')(?:\s*(?:,|,?\s+and)\s*(?:' + _QUOTED + r'))+$', re.I
+)
+
+
+def _rule(pattern: str) -> re.Pattern:
+    return re.compile(pattern, re.IGNORECASE | re.DOTALL)
+
+
+class LocalQueryParser:
+    """
+    Compiled rule set for edit commands.
+
+    Each rule is a full-match regex plus a builder that turns the match into
+    a parse result. Rules are tried in order; the first match wins.
+    """
+
+    def __init__(self):
+        self.rules: List[Tuple[re.Pattern, Callable]] = [
+            # REMOVE tables / equations
+            (_rule(r'^(?:remove|delete|erase|drop)\s+(?:all\s+(?:of\s+)?)?(?:the\s+)?'
+                   r'(?P<kind>tables?|equations?)(?:\s+from\s+(?:the\s+)?(?:document|paper))?' + _END),
+             self._remove_all_objects),
+            (_rule(r'^(?:remove|delete|erase|drop)\s+(?:the\s+)?(?P<kind>table|equation)\s+'
+                   r'(?:with\s+(?:the\s+)?(?:caption|label)|captioned|labell?ed)\s+(?P<target>.+?)' + _END),
+             self._remove_object),
+
+            # REMOVE sections
+            (_rule(r'^(?:remove|delete|drop)\s+(?:the\s+)?(?:entire\s+|whole\s+)?section\s+'
+                   r'(?:called\s+|named\s+|titled\s+)?(?P<section>.+?)' + _END),
+             self._remove_section),
+            (_rule(r'^(?:remove|delete|drop)\s+(?:the\s+)?(?:entire\s+|whole\s+)?(?P<section>.+?)\s+section' + _END),
+             self._remove_section),
+
+            # REPLACE section content
+            (_rule(r'^(?:replace|change|set)\s+(?:the\s+)?(?:content\s+of\s+(?:the\s+)?)?(?P<section>.+?)\s+'
+                   r'section(?:\'s)?(?:\s+content)?\s+(?:with|to)\s*:?\s*(?P<new>.+?)\s*$'),
+             self._replace_section),
+
+            # REPLACE text
+            (_rule(r'^(?:replace|change|swap|substitute)\s+' + _ALL + r'(?:the\s+)?' + _KIND +
+                   r'(?P<target>.+?)\s+(?:with|to|by|for)\s+(?P<new>.+?)' + _SCOPE + _END),
+             self._replace_text),
+
+            # REMOVE text
+            (_rule(r'^(?:remove|delete|erase)\s+' + _ALL + r'(?:the\s+|this\s+)?' + _KIND +
+                   r'(?P<target>.+?)' + _SCOPE + _END),
+             self._remove_text),
+
+            # MODIFY section with AI
+            (_rule(r'^(?:modify|improve|enhance|refine|revise|rewrite|polish)\s+(?:the\s+)?(?P<section>.+?)'
+                   r'(?:\s+section)?\s+(?:to|so\s+(?:that|it)|by|focusing\s+on|with\s+(?:a\s+)?focus\s+on)\s+'
+                   r'(?P<new>.+?)\s*$'),
+             self._modify_section),
+            (_rule(r'^make\s+(?:the\s+)?(?P<section>.+?)\s+section\s+(?P<new>(?:more|less)\s+.+?)\s*$'),
+             self._modify_section),
+
+            # FORMAT: "bold X", "highlight X in red", "italicize the word X"
+            (_rule(r'^(?P<fmt>bold|embolden|italici[sz]e|italic|highlight)\s+' + _ALL + r'(?:the\s+|this\s+)?' +
+                   _KIND + r'(?P<target>.+?)' + _COLOR + _SCOPE + _END),
+             self._format),
+            # FORMAT: "make this sentence bold: X"
+            (_rule(r'^make\s+(?:the\s+|this\s+)?(?P<kind>word|phrase|term|sentence|paragraph)\s+'
+                   r'(?P<fmt>bold|italics?|italici[sz]ed)\s*(?P<colon>:)\s*(?P<target>.+?)\s*$'),
+             self._format),
+            # FORMAT: "make X bold", "make the word X italic"
+            (_rule(r'^make\s+' + _ALL + r'(?:the\s+|this\s+)?' + _KIND + r'(?P<target>.+?)\s+'
+                   r'(?P<fmt>bold|italics?|italici[sz]ed)' + _SCOPE + _END),
+             self._format),
+
+            # ADD a new section relative to another
+            (_rule(r'^(?:add|create|insert)\s+(?:a\s+)?(?:new\s+)?section\s+(?:called\s+|named\s+|titled\s+)?'
+                   r'(?P<name>.+?)\s+(?P<pos>before|after)\s+(?:the\s+)?(?P<section>.+?)(?:\s+section)?' + _END),
+             self._add_section),
+            # ADD content: "add this to Methods section: ..."
+            (_rule(r'^(?:add|append|insert)\s+(?:this\s+|the\s+following\s+)?'
+                   r'(?:(?:new\s+)?(?:content|text|sentence|paragraph)\s+)?'
+                   r'(?:to|in|into|at\s+the\s+end\s+of)\s+(?:the\s+)?(?P<section>.+?)(?:\s+section)?\s*:\s*(?P<new>.+?)\s*$'),
+             self._add_content),
+            # ADD quoted content: "add 'X' to Methods"
+            (_rule(r'^(?:add|append|insert)\s+(?P<new>"[^"]+"|\'[^\']+\'|“[^”]+”)\s+(?:to|in|into)\s+'
+                   r'(?:the\s+)?(?P<section>.+?)(?:\s+section)?' + _END),
+             self._add_content),
+        ]
+
+    # ------------------------------------------------------------------
+    # Entry point
+    # ------------------------------------------------------------------
+
+    def parse(self, user_query: str) -> Optional[Dict[str, any]]:
+        """
+        Parse a query with the compiled rules.
+
+        Returns:
+            Parsed dict (QueryParser schema, with confidence) or None if no rule matches
+        """
+        query = re.sub(r'\s+', ' ', user_query or '').strip()
+        if not query:
+            return None
+
+        for pattern, build in self.rules:
+            match = pattern.match(query)
+            if match:
+                result = build(match)
+                if result:
+                    return result
+        return None
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _unquote(text: str) -> Tuple[str, bool]:
+        """Strip one pair of surrounding quotes; report whether the text was quoted"""
+        text = (text or '').strip()
+        for left, right in (('"', '"'), ("'", "'"), ('“', '”'), ('‘', '’'), ('`', '`')):
+            if len(text) >= 2 and text.startswith(left) and text.endswith(right) \
+                    and left not in text[1:-1].replace(right, ''):
+                return text[1:-1].strip(), True
+        return text, False
+
+    @staticmethod
+    def _target_type(text: str, kind: Optional[str]) -> str:
+        """Explicit kind keyword, else sentence punctuation, else word count"""
+        if kind:
+            kind = kind.lower()
+            return 'word' if kind == 'term' and ' ' not in text else ('phrase' if kind == 'term' else kind)
+        words = len(text.split())
+        if words >= 3 and text.endswith(('.', '!', '?', '."', '!"', '?"')):
+            return 'sentence'
+        if words == 1:
+            return 'word'
+        if words <= 4:
+            return 'phrase'
+        if words <= 15:
+            return 'sentence'
+        return 'paragraph'
+
+    @staticmethod
+    def _restore_stop(text: str, target_type: str, m: re.Match) -> str:
+        """Sentences keep the full stop that _END split off"""
+        stop = m.groupdict().get('stop')
+        return text + stop if stop and target_type in ('sentence', 'paragraph') else text
+
+    @staticmethod
+    def _clean_section(name: str) -> str:
+        name, _ = LocalQueryParser._unquote(name)
+        return re.sub(r'^(?:the\s+)', '', name, flags=re.I).strip()
+
+    @staticmethod
+    def _result(operation: str, action: str, target: str, target_type: str, confidence: float,
+                new_text: str = None, format_action: str = None, color: str = None,
+                section_name: str = None, position: str = None,
+                convert_to_latex: bool = False) -> Dict[str, any]:
+        return {
+            'operation': operation,
+            'action': action,
+            'target': target,
+            'new_text': new_text,
+            'target_type': target_type,
+            'format_action': format_action,
+            'color': color,
+            'section_name': section_name,
+            'position': position,
+            'convert_to_latex': convert_to_latex,
+            'confidence': round(max(0.0, min(1.0, confidence)), 2),
+        }
+
+    @staticmethod
+    def _text_confidence(text: str, quoted: bool) -> float:
+        """
+        Quoted slots are unambiguous. Unquoted ones lose confidence per extra
+        connective, and fall below the Gemini threshold when they select
+        document parts (ordinals, quantifiers, structure names, pronouns) or
+        list several items
+        """
+        if quoted:
+            return 0.97
+        if _STRUCTURE.match(text) or _SELECTOR.search(text) or _UNQUOTED_LIST.search(text):
+            return 0.5
+        penalty = 0.15 * len(_CONNECTIVES.findall(f' {text} '))
+        return 0.9 - penalty
+
+    # ------------------------------------------------------------------
+    # Rule builders
+    # ------------------------------------------------------------------
+
+    def _remove_all_objects(self, m: re.Match) -> Dict[str, any]:
+        kind = 'table' if m.group('kind').lower().startswith('table') else 'equation'
+        return self._result('remove', f'remove_{kind}', 'all', kind, 0.95)
+
+    def _remove_object(self, m: re.Match) -> Dict[str, any]:
+        kind = m.group('kind').lower()
+        target, quoted = self._unquote(m.group('target'))
+        return self._result('remove', f'remove_{kind}', target, kind, 0.95 if quoted else 0.9)
+
+    def _remove_section(self, m: re.Match) -> Optional[Dict[str, any]]:
+        section = self._clean_section(m.group('section'))
+        if not section:
+            return None
+        return self._result('remove', 'remove_section', section, 'section', 0.95, section_name=section)
+
+    def _remove_text(self, m: re.Match) -> Optional[Dict[str, any]]:
+        target, quoted = self._unquote(m.group('target'))
+        if not target:
+            return None
+        kind = m.group('kind')
+        confidence = self._text_confidence(target, quoted or bool(m.group('colon')))
+        if not kind and not quoted and re.fullmatch(r'[A-Z][\w-]*', target):
+            confidence = 0.6  # "remove Methods" may mean the section
+        target_type = self._target_type(target, kind)
+        target = self._restore_stop(target, target_type, m)
+        if target_type == 'paragraph':
+            target_type = 'sentence'  # no remove_paragraph action
+        return self._result('remove', f'remove_{target_type}', target, target_type, confidence)
+
+    def _replace_section(self, m: re.Match) -> Optional[Dict[str, any]]:
+        section = self._clean_section(m.group('section'))
+        new_text, _ = self._unquote(m.group('new'))
+        if not section or not new_text:
+            return None
+        return self._result('replace', 'replace_section_content', section, 'section', 0.9,
+                            new_text=new_text, section_name=section, convert_to_latex=True)
+
+    def _replace_text(self, m: re.Match) -> Optional[Dict[str, any]]:
+        target, target_quoted = self._unquote(m.group('target'))
+        new_text, new_quoted = self._unquote(m.group('new'))
+        if not target or not new_text:
+            return None
+
+        confidence = min(self._text_confidence(target, target_quoted),
+                         self._text_confidence(new_text, new_quoted))
+        if not new_quoted and _INSTRUCTION_START.match(new_text):
+            confidence = 0.4  # "change the introduction to be more concise" is a modify request
+        elif not new_quoted and _STYLE_WORDS.match(new_text):
+            confidence = 0.5  # "change color to blue" is a formatting request
+
+        target_type = self._target_type(target, m.group('kind'))
+        new_text = self._restore_stop(new_text, target_type, m)
+        if target_type == 'paragraph':
+            target_type = 'sentence'  # no replace_paragraph action
+        return self._result('replace', f'replace_{target_type}', target, target_type, confidence,
+                            new_text=new_text)
+
+    def _modify_section(self, m: re.Match) -> Optional[Dict[str, any]]:
+        section = self._clean_section(m.group('section'))
+        instruction = m.group('new').strip()
+        if not section or not instruction or len(section.split()) > 5:
+            return None
+        return self._result('modify', 'modify_section_ai', section, 'section', 0.88,
+                            new_text=instruction, section_name=section)
+
+    def _format(self, m: re.Match) -> Optional[Dict[str, any]]:
+        fmt = m.group('fmt').lower()
+        format_action = 'bold' if fmt in ('bold', 'embolden') else \
+            'highlight' if fmt == 'highlight' else 'italic'
+
+        color = None
+        if format_action == 'highlight':
+            color = (m.groupdict().get('color') or 'yellow').lower()
+
+        if _QUOTED_LIST.match(m.group('target')):
+            # Term list: formatted in one pass by SimpleFormatter.format_terms
+            terms = [self._unquote(item)[0] for item in re.findall(_QUOTED, m.group('target'))]
+            target_type = 'word' if all(len(term.split()) == 1 for term in terms) else 'phrase'
+            result = self._result('format', f'{format_action}_terms', ', '.join(terms), target_type, 0.97,
+                                  format_action=format_action, color=color)
+            result['targets'] = terms
+            return result
+
+        target, quoted = self._unquote(m.group('target'))
+        if not target:
+            return None
+
+        target_type = self._target_type(target, m.groupdict().get('kind'))
+        target = self._restore_stop(target, target_type, m)
+        confidence = self._text_confidence(target, quoted or bool(m.groupdict().get('colon')))
+        return self._result('format', f'{format_action}_{target_type}', target, target_type, confidence,
+                            format_action=format_action, color=color)
+
+    def _add_section(self, m: re.Match) -> Optional[Dict[str, any]]:
+        name = self._clean_section(m.group('name'))
+        reference = self._clean_section(m.group('section'))
+        if not name or not reference:
+            return None
+        return self._result('add', 'add_section', reference, 'section', 0.88,
+                            new_text='', section_name=name, position=m.group('pos').lower())
+
+    def _add_content(self, m: re.Match) -> Optional[Dict[str, any]]:
+        section = self._clean_section(m.group('section'))
+        new_text, _ = self._unquote(m.group('new'))
+        if not section or not new_text or len(section.split()) > 5:
+            return None
+        return self._result('add', 'add_content_to_section', section, 'section', 0.9,
+                            new_text=new_text, section_name=section, position='replace',
+                            convert_to_latex=True)
@@ -8,52 +8,34 @@ Two modes:
 
 import re
 import os
-from typing import Tuple, Optional, List
+from typing import Callable, Tuple, Optional, List
 from pathlib import Path
-import google.generativeai as genai
 from dotenv import load_dotenv
 
+from document_index import get_index
+from llm_context import section_context
+
+from doc_edit.llm_client import LLMError, collect_api_keys, get_client
 
-class APIKeyRotator:
-    """Simple API key rotation to avoid rate limits"""
-    
-    def __init__(self):
-        """Load all API keys from .env file"""
-        # Load .env file
-        env_path = Path(__file__).parent.parent.parent / '.env'
-        load_dotenv(env_path)
-        
-        # Collect all API keys
-        self.api_keys = []
-        
-        # Primary key
-        primary_key = os.getenv('GEMINI_API_KEY')
-        if primary_key:
-            self.api_keys.append(primary_key)
-        
-        # Backup keys (API_KEY1 to API_KEY30)
-        for i in range(1, 31):
-            key = os.getenv(f'API_KEY{i}')
-            if key and key.strip():  # Only add non-empty keys
-                self.api_keys.append(key)
-        
-        self.current_index = 0
-        print(f"  🔑 Loaded {len(self.api_keys)} API keys for rotation")
-    
-    def get_next_key(self) -> Optional[str]:
-        """Get the next API key in rotation"""
-        if not self.api_keys:
-            return None
-        
-        key = self.api_keys[self.current_index]
-        self.current_index = (self.current_index + 1) % len(self.api_keys)
-        return key
-    
-    def get_current_key(self) -> Optional[str]:
-        """Get current API key without rotating"""
-        if not self.api_keys:
-            return None
-        return self.api_keys[self.current_index]
+
+# Text a model may wrap its answer in; never shown to streaming clients
+_OPENING_FENCES = ('```latex', '```')
+_OPENING_FENCE = re.compile(r'^\s*```(?:latex)?\s*')
+
+
+def _visible_span(text: str) -> Tuple[int, int]:
+    """
+    Part of a partial response that can be shown: after an opening code
+    fence, before trailing whitespace/backticks that may turn out to be the
+    closing fence. (0, 0) while the start is still undecided.
+    """
+    head = text.lstrip()
+    if any(fence.startswith(head) or (head.startswith(fence) and head[len(fence):].strip() == '')
+           for fence in _OPENING_FENCES):
+        return 0, 0
+    start = _OPENING_FENCE.match(text).end() if head.startswith('```') else 0
+    end = len(text.rstrip(' \t\n`'))
+    return start, max(start, end)
 
 
 class SimpleModifier:
@@ -66,80 +48,77 @@ class SimpleModifier:
         Args:
             use_api_rotation: Whether to use API key rotation (default: True)
         """
-        self.model = None
-        self.api_rotator = None
+        self.client = None
         
         if use_api_rotation:
-            self.api_rotator = APIKeyRotator()
-            if self.api_rotator.api_keys:
-                # Get model name from .env or use default
-                env_path = Path(__file__).parent.parent.parent / '.env'
-                load_dotenv(env_path)
+            # Get keys and model name from .env
+            env_path = Path(__file__).parent.parent.parent / '.env'
+            load_dotenv(env_path)
+            api_keys = collect_api_keys()
+            if api_keys:
                 model_name = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash-exp')
-                
-                # Configure with first key
-                first_key = self.api_rotator.get_current_key()
-                genai.configure(api_key=first_key)
-                self.model = genai.GenerativeModel(model_name)
-                print(f"  ✅ Gemini configured with {model_name} ({len(self.api_rotator.api_keys)} keys)")
+                self.client = get_client(api_keys, model_name)
+                print(f"  ✅ Gemini configured with {model_name} ({len(api_keys)} keys)")
             else:
                 print("  ⚠️  No API keys found in .env file")
     
     def _try_with_rotation(self, prompt: str, max_retries: int = 5) -> Optional[str]:
         """
-        Try API call with key rotation on failure.
+        Generate text through the shared LLM client.
+        
+        The client rotates keys on rate limits and retries 429/5xx errors
+        with jittered backoff.
         
         Args:
             prompt: The prompt to send to Gemini
-            max_retries: Maximum number of retries with different keys
+            max_retries: Maximum number of attempts across keys
             
         Returns:
             Generated text or None if all attempts fail
         """
-        if not self.model or not self.api_rotator:
+        if not self.client:
             return None
         
-        # Get model name from env
-        env_path = Path(__file__).parent.parent.parent / '.env'
-        load_dotenv(env_path)
-        model_name = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash-exp')
+        try:
+            return self.client.generate_sync(prompt, max_retries=max_retries - 1).strip()
+        except LLMError as e:
+            print(f"  ❌ API error: {str(e)[:200]}")
+            return None
+    
+    def _stream_with_rotation(self, prompt: str, on_chunk: Callable[[str], None],
+                              max_retries: int = 5) -> Optional[str]:
+        """
+        Stream text through the shared LLM client, passing new text to
+        `on_chunk` as it arrives.
         
-        for attempt in range(max_retries):
-            try:
-                # Try with current key (rotate on first attempt if needed)
-                if attempt > 0:
-                    # Get next key for retry
-                    next_key = self.api_rotator.get_next_key()
-                    if not next_key:
-                        print(f"  ❌ No more keys available after {attempt} attempts")
-                        return None
-                    genai.configure(api_key=next_key)
-                    self.model = genai.GenerativeModel(model_name)
-                    print(f"  🔄 Rotated to new API key (attempt {attempt + 1}/{max_retries})")
-                
-                # Make API call
-                response = self.model.generate_content(prompt)
-                return response.text.strip()
-                
-            except Exception as e:
-                error_msg = str(e).lower()
-                
-                # Check if it's a rate limit error
-                if 'quota' in error_msg or 'rate' in error_msg or 'limit' in error_msg or '429' in error_msg or 'resource_exhausted' in error_msg:
-                    if attempt < max_retries - 1:
-                        print(f"  ⚠️  Rate limit hit (attempt {attempt + 1}/{max_retries}), rotating to next API key...")
-                        # Continue to next iteration which will rotate key
-                        continue
-                    else:
-                        print(f"  ❌ Rate limit hit on all {max_retries} attempts")
-                        return None
-                else:
-                    # Non-rate-limit error - don't retry with different keys
-                    print(f"  ❌ API error: {str(e)[:200]}")
-                    return None
+        Keys are rotated and errors retried only until the first chunk; a
+        markdown code fence around the answer is never forwarded.
         
-        print(f"  ❌ Failed after {max_retries} attempts with different API keys")
-        return None
+        Args:
+            prompt: The prompt to send to Gemini
+            on_chunk: Called with each newly visible piece of text
+            max_retries: Maximum number of attempts across keys
+            
+        Returns:
+            Full generated text or None if the request fails
+        """
+        if not self.client:
+            return None
+        
+        text = ''
+        sent = 0
+        try:
+            for chunk in self.client.stream_sync(prompt, max_retries=max_retries - 1):
+                text += chunk
+                start, end = _visible_span(text)
+                sent = max(sent, start)
+                if end > sent:
+                    on_chunk(text[sent:end])
+                    sent = end
+        except LLMError as e:
+            print(f"  ❌ Streaming failed: {e}")
+            return None
+        return text.strip()
     
     def modify_section_direct(self, content: str, section_name: str, new_content: str) -> Tuple[str, int]:
         """
@@ -159,62 +138,30 @@ class SimpleModifier:
         """
         print(f"\n🔄 Direct replacement of '{section_name}' section")
         
-        # Pattern to find section (supports \section, \section*, with numbers, etc.)
-        # Handle special characters by splitting into words and matching flexibly
-        # This handles cases like "Results & Discussion" where & might be written as & or \& in LaTeX
-        
-        # Split section name into meaningful words (handle spaces, &, and other separators)
-        # Normalize: remove extra spaces and handle & as a separator
-        normalized_name = re.sub(r'\s+', ' ', section_name.strip())
-        name_words = re.split(r'[\s&]+', normalized_name)
-        name_words = [w.strip() for w in name_words if w.strip()]  # Remove empty strings
-        
-        if not name_words:
-            print(f"  ❌ Invalid section name: '{section_name}'")
-            return content, 0
-        
-        if len(name_words) > 1:
-            # For multi-word names: match all words in order (allows for LaTeX escaping of special chars)
-            word_patterns = []
-            for word in name_words:
-                # Escape the word for regex
-                escaped_word = re.escape(word)
-                word_patterns.append(escaped_word)
-            
-            # Join words with pattern that allows:
-            # - Spaces
-            # - Ampersands (both & and \& for LaTeX)
-            # - Other whitespace
-            # Pattern: word1 [spaces/&/\\&] word2 [spaces/&/\\&] word3 ...
-            separator_pattern = r'[\s]*(?:\\?&|\\?#|\\?%|\\?\$)?[\s]*'
-            word_pattern = separator_pattern.join(word_patterns)
-        else:
-            # Single word: just escape it (no special handling needed for single words)
-            word_pattern = re.escape(name_words[0])
+        # Section lookup (supports \section, \section*, subsections) goes through
+        # the shared document index; names match word by word, so "Results &
+        # Discussion" finds "Results \& Discussion"
+        section = get_index(content).find_section(section_name)
         
-        # Build final pattern: section command + flexible name matching + content until next section
-        pattern = r'(\\(?:sub)*section\*?\{[^}]*?' + word_pattern + r'[^}]*?\})(.*?)(?=\\(?:sub)*section|\Z)'
-        
-        match = re.search(pattern, content, re.IGNORECASE | re.DOTALL)
-        
-        if not match:
+        if not section:
             print(f"  ❌ Section '{section_name}' not found")
             return content, 0
         
         # Replace content but keep section header
-        section_header = match.group(1)
-        old_content = match.group(2)
+        section_header = content[section.start:section.header_end]
+        old_content = content[section.header_end:section.body_end]
         
         # Build new section
         new_section = section_header + '\n' + new_content.strip() + '\n\n'
         
         # Replace in document
-        modified = content[:match.start()] + new_section + content[match.end():]
+        modified = content[:section.start] + new_section + content[section.body_end:]
         
         print(f"  ✅ Replaced {len(old_content)} chars with {len(new_content)} chars")
         return modified, 1
     
-    def modify_section_ai(self, content: str, section_name: str, instruction: str) -> Tuple[str, int]:
+    def modify_section_ai(self, content: str, section_name: str, instruction: str,
+                          on_chunk: Optional[Callable[[str], None]] = None) -> Tuple[str, int]:
         """
         AI IMPROVEMENT: Use Gemini to improve/modify section based on instructions.
         
@@ -228,56 +175,42 @@ class SimpleModifier:
             content: LaTeX document content
             section_name: Name of section to modify
             instruction: How to improve/modify the section
+            on_chunk: If given, the rewrite is streamed and each new piece of
+                text is passed to it as it arrives (before splicing)
             
         Returns:
             (modified_content, success_count)
         """
-        if not self.model:
+        if not self.client:
             print("  ❌ Gemini API key not configured")
             return content, 0
         
         print(f"\n🤖 AI improvement of '{section_name}' section")
         print(f"   Instruction: {instruction}")
         
-        # Find the section (use same improved pattern as modify_section_direct)
-        # Handle special characters by splitting into words and matching flexibly
-        normalized_name = re.sub(r'\s+', ' ', section_name.strip())
-        name_words = re.split(r'[\s&]+', normalized_name)
-        name_words = [w.strip() for w in name_words if w.strip()]
-        
-        if not name_words:
-            print(f"  ❌ Invalid section name: '{section_name}'")
-            return content, 0
-        
-        if len(name_words) > 1:
-            word_patterns = []
-            for word in name_words:
-                escaped_word = re.escape(word)
-                word_patterns.append(escaped_word)
-            # Join words allowing spaces and LaTeX-escaped special characters between words
-            separator_pattern = r'[\s]*(?:\\?&|\\?#|\\?%|\\?\$)?[\s]*'
-            word_pattern = separator_pattern.join(word_patterns)
-        else:
-            word_pattern = re.escape(name_words[0])
+        # Find the section (same lookup as modify_section_direct)
+        section = get_index(content).find_section(section_name)
         
-        pattern = r'(\\(?:sub)*section\*?\{[^}]*?' + word_pattern + r'[^}]*?\})(.*?)(?=\\(?:sub)*section|\Z)'
-        
-        match = re.search(pattern, content, re.IGNORECASE | re.DOTALL)
-        
-        if not match:
+        if not section:
             print(f"  ❌ Section '{section_name}' not found")
             return content, 0
         
-        section_header = match.group(1)
-        old_content = match.group(2).strip()
+        section_header = content[section.start:section.header_end]
+        old_content = content[section.header_end:section.body_end].strip()
         
         print(f"  📖 Original content: {len(old_content)} characters")
         
+        # The section plus a small outline and nearby text (capped at a quarter of the section)
+        context = section_context(content, section, 'modify_section_ai')
+        
         # Build AI prompt
         prompt = f"""You are a LaTeX document editor. Your task is to modify the following section content.
 
 SECTION: {section_name}
 
+CONTEXT FROM THE REST OF THE DOCUMENT (for reference only, do not rewrite it):
+{context.render() or "(none)"}
+
 ORIGINAL CONTENT:
 {old_content}
 
@@ -295,8 +228,11 @@ REQUIREMENTS:
 MODIFIED CONTENT:"""
 
         try:
-            # Get AI response with rotation support
-            new_content = self._try_with_rotation(prompt)
+            # Get AI response with rotation support (streamed if requested)
+            if on_chunk:
+                new_content = self._stream_with_rotation(prompt, on_chunk)
+            else:
+                new_content = self._try_with_rotation(prompt)
             
             if not new_content:
                 print(f"  ❌ AI modification failed: No response from API")
@@ -313,7 +249,7 @@ MODIFIED CONTENT:"""
             new_section = section_header + '\n' + new_content + '\n\n'
             
             # Replace in document
-            modified = content[:match.start()] + new_section + content[match.end():]
+            modified = content[:section.start] + new_section + content[section.body_end:]
             
             return modified, 1
             
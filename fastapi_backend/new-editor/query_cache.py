@@ -0,0 +1,245 @@
+"""
+PARSED-QUERY CACHE
+Remembers validated QueryParser results so repeated (or slightly rephrased)
+instructions skip Gemini.
+
+- Key: normalized query text (whitespace and quote styles unified)
+- Value: the dict accepted by QueryParser._validate_result
+- Storage: local SQLite file shared by every worker, LRU-evicted
+- Version: prompt version + model name; bumping either hides old entries
+- Optional: embedding lookup for near-duplicate phrasings (strict threshold);
+  a near hit must fill the same slots as the cached query: the same
+  target/new text in the same order, the same colour and format words
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from local_parser import COLORS
+
+DEFAULT_CACHE_PATH = Path(os.getenv(
+    'QUERY_CACHE_PATH',
+    str(Path(tempfile.gettempdir()) / 'doc_edit_query_cache.sqlite')
+))
+DEFAULT_MAX_ENTRIES = int(os.getenv('QUERY_CACHE_MAX_ENTRIES', '5000'))
+DEFAULT_SIMILARITY = float(os.getenv('QUERY_CACHE_SIMILARITY', '0.97'))
+EMBEDDING_MODEL = os.getenv('QUERY_CACHE_EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+
+_QUOTES = str.maketrans({'“': '"', '”': '"', '‘': "'", '’': "'"})
+_FORMAT_WORDS = {
+    'bold': re.compile(r'\b(?:bold|embolden)', re.I),
+    'italic': re.compile(r'\bitalic', re.I),
+    'highlight': re.compile(r'\bhighlight', re.I),
+}
+_COLOR_WORDS = {color: re.compile(rf'\b{color}\b', re.I) for color in COLORS}
+
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical form used as the cache key.
+
+    Case is kept: targets like 'Results' vs 'results' are different edits.
+    """
+    return re.sub(r'\s+', ' ', (query or '').translate(_QUOTES)).strip()
+
+
+def query_slots(query: str, result: Dict) -> Optional[Tuple]:
+    """
+    How `query` fills the slots of a parse result: the order in which the
+    result's target and new text appear in it, and the colour and format
+    words it names. None if the result's text is not in the query.
+    """
+    lowered = query.lower()
+    positions = []
+    for field in ('target', 'new_text'):
+        value = result.get(field)
+        if isinstance(value, str) and value and value != 'all':
+            at = lowered.find(value.lower())
+            if at < 0:
+                return None
+            positions.append((at, field))
+    return (tuple(field for _, field in sorted(positions)),
+            tuple(color for color, pattern in _COLOR_WORDS.items() if pattern.search(query)),
+            tuple(action for action, pattern in _FORMAT_WORDS.items() if pattern.search(query)))
+
+
+class QueryCache:
+    """SQLite-backed cache of parsed queries with LRU eviction"""
+
+    def __init__(self, version: str, path: Optional[Path] = None,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 use_embeddings: Optional[bool] = None,
+                 similarity_threshold: float = DEFAULT_SIMILARITY):
+        self.version = version
+        self.path = Path(path or DEFAULT_CACHE_PATH)
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        if use_embeddings is None:
+            use_embeddings = os.getenv('QUERY_CACHE_EMBEDDINGS', '').lower() in ('1', 'true', 'yes')
+        self.use_embeddings = use_embeddings
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._encoder = None
+        self._matrix = None  # (keys, normalized embeddings) for this version, built lazily
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS parsed_queries (
+                key TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                query TEXT NOT NULL,
+                result TEXT NOT NULL,
+                embedding BLOB,
+                accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS parsed_queries_accessed ON parsed_queries(accessed);
+            CREATE INDEX IF NOT EXISTS parsed_queries_version ON parsed_queries(version);
+        """)
+        self._conn.commit()
+
+    def _key(self, normalized: str) -> str:
+        return hashlib.sha256(f"{self.version}\n{normalized}".encode('utf-8')).hexdigest()
+
+    def get(self, query: str) -> Optional[Dict]:
+        """Exact lookup, then (if enabled) near-duplicate lookup"""
+        normalized = normalize_query(query)
+        key = self._key(normalized)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM parsed_queries WHERE key = ?", (key,)
+            ).fetchone()
+            if row:
+                self._conn.execute("UPDATE parsed_queries SET accessed = ? WHERE key = ?",
+                                   (time.time(), key))
+                self._conn.commit()
+                self.hits += 1
+                return json.loads(row[0])
+
+        result = self._similar(normalized) if self.use_embeddings else None
+        if result is not None:
+            self.near_hits += 1
+        else:
+            self.misses += 1
+        return result
+
+    def put(self, query: str, result: Dict):
+        """Store a validated parse result"""
+        normalized = normalize_query(query)
+        embedding = None
+        if self.use_embeddings:
+            vector = self._embed(normalized)
+            if vector is not None:
+                embedding = vector.astype('float32').tobytes()
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO parsed_queries (key, version, query, result, embedding, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self._key(normalized), self.version, normalized,
+                 json.dumps(result, ensure_ascii=False), embedding, time.time())
+            )
+            if self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM parsed_queries WHERE key IN ("
+                    "SELECT key FROM parsed_queries ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            self._conn.commit()
+            self._matrix = None
+
+    def invalidate(self, all_versions: bool = False):
+        """Drop entries from other prompt/model versions (or everything)"""
+        with self._lock:
+            if all_versions:
+                self._conn.execute("DELETE FROM parsed_queries")
+            else:
+                self._conn.execute("DELETE FROM parsed_queries WHERE version != ?", (self.version,))
+            self._conn.commit()
+            self._matrix = None
+
+    def stats(self) -> Dict:
+        """Entry count for this version and hit counters for this process"""
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM parsed_queries WHERE version = ?", (self.version,)
+            ).fetchone()[0]
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            'entries': entries,
+            'hits': self.hits,
+            'near_hits': self.near_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.near_hits) / lookups if lookups else 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Near-duplicate lookup
+    # ------------------------------------------------------------------
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        if self._encoder is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+                self._encoder = SentenceTransformer(EMBEDDING_MODEL)
+            except Exception as e:
+                print(f"  ⚠️  Query cache embeddings disabled: {str(e)[:100]}")
+                self.use_embeddings = False
+                return None
+        vector = np.asarray(self._encoder.encode([text])[0], dtype='float32')
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _similar(self, normalized: str) -> Optional[Dict]:
+        vector = self._embed(normalized)
+        if vector is None:
+            return None
+
+        with self._lock:
+            if self._matrix is None:
+                rows = self._conn.execute(
+                    "SELECT key, embedding FROM parsed_queries "
+                    "WHERE version = ? AND embedding IS NOT NULL", (self.version,)
+                ).fetchall()
+                keys = [row[0] for row in rows]
+                vectors = [np.frombuffer(row[1], dtype='float32') for row in rows]
+                self._matrix = (keys, np.vstack(vectors) if vectors else None)
+            keys, matrix = self._matrix
+
+        if matrix is None or matrix.shape[1] != vector.shape[0]:
+            return None
+
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT query, result FROM parsed_queries WHERE key = ?", (keys[best],)
+            ).fetchone()
+        if not row:
+            return None
+        cached_query, result = row[0], json.loads(row[1])
+
+        # Paraphrase only: the same text in the same roles, otherwise "bold
+        # precision" could get "bold accuracy", "replace B with A" could get
+        # "replace A with B" and "highlight X in blue" could get red
+        slots = query_slots(normalized, result)
+        if slots is None or slots != query_slots(cached_query, result):
+            return None
+        return result
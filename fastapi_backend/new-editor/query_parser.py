@@ -12,184 +12,23 @@ Extracts:
 """
 
 import re
-from typing import Dict, Optional
+from typing import Dict
 import google.generativeai as genai
 import os
 from pathlib import Path
 from dotenv import load_dotenv
 import json
-import time
 
+from doc_edit.llm_client import LLMError, collect_api_keys, get_client
 
-class QueryParser:
-    """Parse natural language queries to extract formatting intent"""
-    
-    def __init__(self):
-        """Initialize with API key rotation"""
-        # Load .env file
-        env_path = Path(__file__).parent.parent.parent / '.env'
-        load_dotenv(env_path)
-        
-        # Collect all API keys
-        self.api_keys = []
-        self.key_names = []
-        
-        # Primary key
-        primary_key = os.getenv('GEMINI_API_KEY')
-        if primary_key and primary_key.strip():
-            self.api_keys.append(primary_key)
-            self.key_names.append('GEMINI_API_KEY')
-        
-        # Backup keys (API_KEY1 to API_KEY39)
-        for i in range(1, 40):
-            key = os.getenv(f'API_KEY{i}')
-            if key and key.strip():
-                self.api_keys.append(key)
-                self.key_names.append(f'API_KEY{i}')
-        
-        # Rotation state
-        self.current_key_index = 0
-        self.total_keys = len(self.api_keys)
-        self.rate_limited_keys = {}  # Track rate-limited keys with timestamps
-        self.key_usage_count = [0] * self.total_keys
-        self.successful_requests = [0] * self.total_keys
-        self.rate_limit_reset_time = 60  # Reset rate limit status after 60 seconds
-        
-        if self.api_keys:
-            # Configure Gemini with first key
-            model_name = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
-            self.model_name = model_name
-            genai.configure(api_key=self.api_keys[0])
-            
-            # Create generation config for longer outputs (reused for all API calls)
-            self.generation_config = genai.types.GenerationConfig(
-                max_output_tokens=4096,  # Much higher limit for complete JSON
-                temperature=0.1,  # Low temperature for consistent structured output
-                top_p=0.8,
-                top_k=40,
-            )
-            
-            print(f"  🤖 Query Parser initialized with {len(self.api_keys)} API keys")
-            print(f"  📊 Estimated capacity: {self.total_keys * 15} queries/minute")
-        else:
-            self.generation_config = None
-            print("  ⚠️  No API keys found - query parsing disabled")
-    
-    def _get_next_key(self) -> Optional[str]:
-        """
-        Get the next available API key in rotation.
-        Skips rate-limited keys automatically.
-        Automatically resets keys that have been rate-limited for more than reset_time seconds.
-        
-        Returns:
-            Next available API key or None if all exhausted
-        """
-        if not self.api_keys:
-            return None
-        
-        # Check and reset keys that have been rate-limited for long enough
-        current_time = time.time()
-        keys_to_reset = []
-        for idx, limited_time in list(self.rate_limited_keys.items()):
-            if current_time - limited_time >= self.rate_limit_reset_time:
-                keys_to_reset.append(idx)
-        
-        if keys_to_reset:
-            for idx in keys_to_reset:
-                del self.rate_limited_keys[idx]
-            print(f"  🔄 Reset {len(keys_to_reset)} rate-limited key(s) after cooldown")
-        
-        # If all keys are rate-limited, reset all
-        if len(self.rate_limited_keys) >= self.total_keys:
-            print(f"  ⚠️  All {self.total_keys} keys rate-limited - resetting all")
-            self.rate_limited_keys.clear()
-            return None
-        
-        # Find next non-rate-limited key
-        attempts = 0
-        while attempts < self.total_keys:
-            current_idx = self.current_key_index
-            key = self.api_keys[current_idx]
-            
-            # Move to next for next call
-            self.current_key_index = (self.current_key_index + 1) % self.total_keys
-            
-            # Skip if rate-limited
-            if current_idx in self.rate_limited_keys:
-                attempts += 1
-                continue
-            
-            # Track usage
-            self.key_usage_count[current_idx] += 1
-            
-            # Reconfigure Gemini with new key (model will be created fresh in parse_query)
-            genai.configure(api_key=key)
-            
-            return key
-        
-        return None
-    
-    def _mark_rate_limited(self, key: str):
-        """Mark a key as rate-limited with timestamp"""
-        try:
-            idx = self.api_keys.index(key)
-            self.rate_limited_keys[idx] = time.time()  # Store timestamp
-            available = self.total_keys - len(self.rate_limited_keys)
-            print(f"  ⚠️  {self.key_names[idx]} rate-limited | {available}/{self.total_keys} keys available (will reset in {self.rate_limit_reset_time}s)")
-        except ValueError:
-            pass
-    
-    def _mark_successful(self, key: str):
-        """Mark a successful request and remove from rate-limited list if present"""
-        try:
-            idx = self.api_keys.index(key)
-            self.successful_requests[idx] += 1
-            # If this key was marked as rate-limited, remove it since it's working now
-            if idx in self.rate_limited_keys:
-                del self.rate_limited_keys[idx]
-        except ValueError:
-            pass
-    
-    def parse_query(self, user_query: str) -> Dict[str, any]:
-        """
-        Parse user's natural language query to extract editing intent.
-        
-        Supports ALL operations:
-        - REPLACE: "replace X with Y", "change X to Y"
-        - REMOVE: "remove X", "delete section X"
-        - ADD: "add X to section Y", "insert X after Y"
-        - FORMAT: "highlight X", "make X bold", "italicize X"
-        
-        Args:
-            user_query: Natural language query from user
-            
-        Returns:
-            Dictionary with:
-            - operation: 'replace', 'remove', 'add', 'format'
-            - action: specific method to call (e.g., 'replace_word', 'bold_sentence', 'remove_section')
-            - target: the text/section to modify
-            - new_text: replacement or new content (for replace/add)
-            - target_type: 'word', 'phrase', 'sentence', 'section', 'paragraph'
-            - format_action: 'highlight', 'bold', 'italic' (for format operation)
-            - color: color for highlighting
-            - section_name: section name (for add/remove section)
-            - position: 'before', 'after', 'replace' (for add operation)
-            - convert_to_latex: bool (for add/replace section content)
-            - confidence: confidence score (0-1)
-        """
-        print(f"\n🔍 Parsing query: '{user_query[:80]}...'")
-        
-        if not self.api_keys or not self.generation_config:
-            print("  ❌ AI model not available")
-            return self._fallback_parse(user_query)
-        
-        # Construct comprehensive prompt for Gemini
-        prompt = f"""Analyze this user query and extract the document editing intent.
+from local_parser import LocalQueryParser
+from query_cache import QueryCache
 
-USER QUERY: "{user_query}"
+# Bump when the parsing prompt changes to invalidate cached results
+PROMPT_VERSION = '1'
 
-Extract the following information and respond ONLY with a valid JSON object:
-{{
+# Schema, rules and examples shared by the single and batch parsing prompts
+PARSE_GUIDE = """{
     "operation": "replace" | "remove" | "add" | "format" | "modify",
     "action": "specific_method_name",
     "target": "text or section to modify",
@@ -201,7 +40,7 @@ Extract the following information and respond ONLY with a valid JSON object:
     "position": "before" | "after" | "replace" (null if not add operation),
     "convert_to_latex": true | false,
     "confidence": 0.0 to 1.0
-}}
+}
 
 OPERATION TYPES:
 
@@ -249,152 +88,195 @@ RULES:
 EXAMPLES:
 
 Query: "replace the word accuracy with precision"
-Response: {{"operation": "replace", "action": "replace_word", "target": "accuracy", "new_text": "precision", "target_type": "word", "format_action": null, "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 1.0}}
+Response: {"operation": "replace", "action": "replace_word", "target": "accuracy", "new_text": "precision", "target_type": "word", "format_action": null, "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 1.0}
 
 Query: "remove section Results"
-Response: {{"operation": "remove", "action": "remove_section", "target": "Results", "new_text": null, "target_type": "section", "format_action": null, "color": null, "section_name": "Results", "position": null, "convert_to_latex": false, "confidence": 0.95}}
+Response: {"operation": "remove", "action": "remove_section", "target": "Results", "new_text": null, "target_type": "section", "format_action": null, "color": null, "section_name": "Results", "position": null, "convert_to_latex": false, "confidence": 0.95}
 
 Query: "remove all tables"
-Response: {{"operation": "remove", "action": "remove_table", "target": "all", "new_text": null, "target_type": "table", "format_action": null, "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 0.95}}
+Response: {"operation": "remove", "action": "remove_table", "target": "all", "new_text": null, "target_type": "table", "format_action": null, "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 0.95}
 
 Query: "delete table"
-Response: {{"operation": "remove", "action": "remove_table", "target": "all", "new_text": null, "target_type": "table", "format_action": null, "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 0.9}}
+Response: {"operation": "remove", "action": "remove_table", "target": "all", "new_text": null, "target_type": "table", "format_action": null, "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 0.9}
 
 Query: "remove tables"
-Response: {{"operation": "remove", "action": "remove_table", "target": "all", "new_text": null, "target_type": "table", "format_action": null, "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 0.9}}
+Response: {"operation": "remove", "action": "remove_table", "target": "all", "new_text": null, "target_type": "table", "format_action": null, "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 0.9}
 
 Query: "remove table with caption Test Results"
-Response: {{"operation": "remove", "action": "remove_table", "target": "Test Results", "new_text": null, "target_type": "table", "format_action": null, "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 0.9}}
+Response: {"operation": "remove", "action": "remove_table", "target": "Test Results", "new_text": null, "target_type": "table", "format_action": null, "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 0.9}
 
 Query: "add this to Methods section: We used cross-validation"
-Response: {{"operation": "add", "action": "add_content_to_section", "target": "Methods", "new_text": "We used cross-validation", "target_type": "section", "format_action": null, "color": null, "section_name": "Methods", "position": "replace", "convert_to_latex": true, "confidence": 0.9}}
+Response: {"operation": "add", "action": "add_content_to_section", "target": "Methods", "new_text": "We used cross-validation", "target_type": "section", "format_action": null, "color": null, "section_name": "Methods", "position": "replace", "convert_to_latex": true, "confidence": 0.9}
 
 Query: "highlight machine learning in red"
-Response: {{"operation": "format", "action": "highlight_phrase", "target": "machine learning", "new_text": null, "target_type": "phrase", "format_action": "highlight", "color": "red", "section_name": null, "position": null, "convert_to_latex": false, "confidence": 1.0}}
+Response: {"operation": "format", "action": "highlight_phrase", "target": "machine learning", "new_text": null, "target_type": "phrase", "format_action": "highlight", "color": "red", "section_name": null, "position": null, "convert_to_latex": false, "confidence": 1.0}
 
 Query: "change deep learning to neural networks in the entire document"
-Response: {{"operation": "replace", "action": "replace_phrase", "target": "deep learning", "new_text": "neural networks", "target_type": "phrase", "format_action": null, "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 1.0}}
+Response: {"operation": "replace", "action": "replace_phrase", "target": "deep learning", "new_text": "neural networks", "target_type": "phrase", "format_action": null, "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 1.0}
 
 Query: "make the word dataset bold"
-Response: {{"operation": "format", "action": "bold_word", "target": "dataset", "new_text": null, "target_type": "word", "format_action": "bold", "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 1.0}}
+Response: {"operation": "format", "action": "bold_word", "target": "dataset", "new_text": null, "target_type": "word", "format_action": "bold", "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 1.0}
 
 Query: "delete this sentence: The model failed to converge"
-Response: {{"operation": "remove", "action": "remove_sentence", "target": "The model failed to converge", "new_text": null, "target_type": "sentence", "format_action": null, "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 0.95}}
+Response: {"operation": "remove", "action": "remove_sentence", "target": "The model failed to converge", "new_text": null, "target_type": "sentence", "format_action": null, "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 0.95}
 
 Query: "replace Introduction section content with: This paper presents a novel approach"
-Response: {{"operation": "replace", "action": "replace_section_content", "target": "Introduction", "new_text": "This paper presents a novel approach", "target_type": "section", "format_action": null, "color": null, "section_name": "Introduction", "position": null, "convert_to_latex": true, "confidence": 0.9}}
+Response: {"operation": "replace", "action": "replace_section_content", "target": "Introduction", "new_text": "This paper presents a novel approach", "target_type": "section", "format_action": null, "color": null, "section_name": "Introduction", "position": null, "convert_to_latex": true, "confidence": 0.9}
 
 Query: "modify the related works section to be more professional and concise, focusing on key limitations"
-Response: {{"operation": "modify", "action": "modify_section_ai", "target": "related works", "new_text": "be more professional and concise, focusing on key limitations", "target_type": "section", "format_action": null, "color": null, "section_name": "related works", "position": null, "convert_to_latex": false, "confidence": 0.9}}
+Response: {"operation": "modify", "action": "modify_section_ai", "target": "related works", "new_text": "be more professional and concise, focusing on key limitations", "target_type": "section", "format_action": null, "color": null, "section_name": "related works", "position": null, "convert_to_latex": false, "confidence": 0.9}
 
 Query: "improve introduction to highlight main contributions"
-Response: {{"operation": "modify", "action": "modify_section_ai", "target": "introduction", "new_text": "highlight main contributions", "target_type": "section", "format_action": null, "color": null, "section_name": "introduction", "position": null, "convert_to_latex": false, "confidence": 0.85}}
+Response: {"operation": "modify", "action": "modify_section_ai", "target": "introduction", "new_text": "highlight main contributions", "target_type": "section", "format_action": null, "color": null, "section_name": "introduction", "position": null, "convert_to_latex": false, "confidence": 0.85}
 
 Query: "italicize this paragraph: Machine learning has transformed healthcare..."
-Response: {{"operation": "format", "action": "italic_paragraph", "target": "Machine learning has transformed healthcare...", "new_text": null, "target_type": "paragraph", "format_action": "italic", "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 0.85}}
+Response: {"operation": "format", "action": "italic_paragraph", "target": "Machine learning has transformed healthcare...", "new_text": null, "target_type": "paragraph", "format_action": "italic", "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 0.85}
 
 Query: "remove the phrase 'not applicable'"
-Response: {{"operation": "remove", "action": "remove_phrase", "target": "not applicable", "new_text": null, "target_type": "phrase", "format_action": null, "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 0.9}}
+Response: {"operation": "remove", "action": "remove_phrase", "target": "not applicable", "new_text": null, "target_type": "phrase", "format_action": null, "color": null, "section_name": null, "position": null, "convert_to_latex": false, "confidence": 0.9}"""
 
-Respond ONLY with the JSON object, no other text."""
 
-        # Try with rotation on rate limit
-        max_retries = min(5, self.total_keys)  # Try up to 5 different keys
+class QueryParser:
+    """Parse natural language queries to extract formatting intent"""
+    
+    def __init__(self):
+        """Initialize with API key rotation"""
+        # Load .env file
+        env_path = Path(__file__).parent.parent.parent / '.env'
+        load_dotenv(env_path)
         
-        for attempt in range(max_retries):
-            try:
-                # Get current key (first attempt uses initial key)
-                if attempt > 0:
-                    current_key = self._get_next_key()
-                    if not current_key:
-                        print(f"  ❌ No more keys available after {attempt} attempts")
-                        return self._fallback_parse(user_query)
-                else:
-                    current_key = self.api_keys[self.current_key_index]
-                
-                # Configure the API with the current key
-                genai.configure(api_key=current_key)
-                model = genai.GenerativeModel(
-                    self.model_name,
-                    generation_config=self.generation_config
-                )
-                
-                response = model.generate_content(prompt)
-                response_text = response.text.strip()
-                
-                # Mark successful
-                self._mark_successful(current_key)
-                
-                # Clean up response - remove markdown code blocks if present
-                response_text = response_text.replace('```json', '').replace('```', '').strip()
-                
-                # Parse JSON
-                result = json.loads(response_text)
-                
-                # Validate result
-                if self._validate_result(result):
-                    print(f"  ✅ Parsed successfully:")
-                    print(f"     Operation: {result['operation']}")
-                    print(f"     Action: {result['action']}")
-                    print(f"     Target: '{result['target']}'")
-                    print(f"     Type: {result['target_type']}")
-                    if result.get('new_text'):
-                        preview = result['new_text'][:50] + '...' if len(result['new_text']) > 50 else result['new_text']
-                        print(f"     New text: '{preview}'")
-                    if result.get('format_action'):
-                        print(f"     Format: {result['format_action']}")
-                    if result.get('color'):
-                        print(f"     Color: {result['color']}")
-                    if result.get('section_name'):
-                        print(f"     Section: {result['section_name']}")
-                    if result.get('position'):
-                        print(f"     Position: {result['position']}")
-                    print(f"     Confidence: {result['confidence']:.0%}")
-                    return result
-                else:
-                    print(f"  ⚠️  Invalid result from AI, using fallback")
-                    print(f"  Debug - Response: {response_text[:300]}")
-                    return self._fallback_parse(user_query)
-                    
-            except json.JSONDecodeError as e:
-                print(f"  ⚠️  JSON parse error: {e}")
-                print(f"  Response: {response_text[:200]}")
+        # Grammar-based fast path; Gemini is only asked below this confidence
+        self.local_parser = LocalQueryParser()
+        self.local_threshold = float(os.getenv('LOCAL_PARSE_THRESHOLD', '0.85'))
+        
+        # Queries sent per Gemini request by parse_batch_queries
+        self.batch_size = int(os.getenv('QUERY_BATCH_SIZE', '20'))
+        
+        # Shared async client handles key rotation, retries and concurrency limits
+        self.model_name = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+        self.api_keys = collect_api_keys()
+        self.client = get_client(self.api_keys, self.model_name)
+        
+        # Validated Gemini results, keyed by normalized query text
+        self.cache = QueryCache(version=f"{PROMPT_VERSION}:{self.model_name}")
+        
+        if self.api_keys:
+            # Create generation config for longer outputs (reused for all API calls)
+            self.generation_config = genai.types.GenerationConfig(
+                max_output_tokens=4096,  # Much higher limit for complete JSON
+                temperature=0.1,  # Low temperature for consistent structured output
+                top_p=0.8,
+                top_k=40,
+            )
+            
+            print(f"  🤖 Query Parser initialized with {len(self.api_keys)} API keys")
+            print(f"  📊 Estimated capacity: {len(self.api_keys) * self.client.scheduler.rpm} queries/minute")
+        else:
+            self.generation_config = None
+            print("  ⚠️  No API keys found - query parsing disabled")
+    
+    def parse_query(self, user_query: str) -> Dict[str, any]:
+        """
+        Parse user's natural language query to extract editing intent.
+        
+        Supports ALL operations:
+        - REPLACE: "replace X with Y", "change X to Y"
+        - REMOVE: "remove X", "delete section X"
+        - ADD: "add X to section Y", "insert X after Y"
+        - FORMAT: "highlight X", "make X bold", "italicize X"
+        
+        Args:
+            user_query: Natural language query from user
+            
+        Returns:
+            Dictionary with:
+            - operation: 'replace', 'remove', 'add', 'format'
+            - action: specific method to call (e.g., 'replace_word', 'bold_sentence', 'remove_section')
+            - target: the text/section to modify
+            - new_text: replacement or new content (for replace/add)
+            - target_type: 'word', 'phrase', 'sentence', 'section', 'paragraph'
+            - format_action: 'highlight', 'bold', 'italic' (for format operation)
+            - color: color for highlighting
+            - section_name: section name (for add/remove section)
+            - position: 'before', 'after', 'replace' (for add operation)
+            - convert_to_latex: bool (for add/replace section content)
+            - confidence: confidence score (0-1)
+        """
+        print(f"\n🔍 Parsing query: '{user_query[:80]}...'")
+        
+        # Simple commands never need the LLM
+        local = self.local_parser.parse(user_query)
+        if local and self._validate_result(local) and local['confidence'] >= self.local_threshold:
+            print(f"  ⚡ Parsed locally: {local['action']} -> '{local['target']}' "
+                  f"(confidence {local['confidence']:.0%})")
+            return local
+        
+        cached = self.cache.get(user_query)
+        if cached and self._validate_result(cached):
+            print(f"  💾 Cached parse: {cached['action']} -> '{cached['target']}'")
+            return cached
+        
+        if not self.api_keys or not self.generation_config:
+            print("  ❌ AI model not available")
+            if local and self._validate_result(local):
+                return local
+            return self._fallback_parse(user_query)
+        
+        prompt = f"""Analyze this user query and extract the document editing intent.
+
+USER QUERY: "{user_query}"
+
+Extract the following information and respond ONLY with a valid JSON object:
+{PARSE_GUIDE}
+
+Respond ONLY with the JSON object, no other text."""
+
+        response_text = ''
+        try:
+            # Rotation on rate limits and jittered retries happen inside the client
+            response_text = self.client.generate_sync(
+                prompt, generation_config=self.generation_config
+            ).strip()
+            
+            # Clean up response - remove markdown code blocks if present
+            response_text = response_text.replace('```json', '').replace('```', '').strip()
+            
+            # Parse JSON
+            result = json.loads(response_text)
+            
+            # Validate result
+            if self._validate_result(result):
+                print(f"  ✅ Parsed successfully:")
+                print(f"     Operation: {result['operation']}")
+                print(f"     Action: {result['action']}")
+                print(f"     Target: '{result['target']}'")
+                print(f"     Type: {result['target_type']}")
+                if result.get('new_text'):
+                    preview = result['new_text'][:50] + '...' if len(result['new_text']) > 50 else result['new_text']
+                    print(f"     New text: '{preview}'")
+                if result.get('format_action'):
+                    print(f"     Format: {result['format_action']}")
+                if result.get('color'):
+                    print(f"     Color: {result['color']}")
+                if result.get('section_name'):
+                    print(f"     Section: {result['section_name']}")
+                if result.get('position'):
+                    print(f"     Position: {result['position']}")
+                print(f"     Confidence: {result['confidence']:.0%}")
+                self.cache.put(user_query, result)
+                return result
+            else:
+                print(f"  ⚠️  Invalid result from AI, using fallback")
+                print(f"  Debug - Response: {response_text[:300]}")
                 return self._fallback_parse(user_query)
-            except Exception as e:
-                error_msg = str(e)
-                error_type = type(e).__name__
                 
-                # Check if it's a REAL rate limit error (not just gRPC warnings)
-                # Look for specific Google API rate limit indicators
-                is_rate_limit = (
-                    ('429' in error_msg and 'resource' in error_msg.lower() and 'exhaust' in error_msg.lower()) or
-                    ('RESOURCE_EXHAUSTED' in error_msg.upper()) or
-                    ('ResourceExhausted' in error_msg) or
-                    ('quota' in error_msg.lower() and 'exceeded' in error_msg.lower()) or
-                    ('rate limit exceeded' in error_msg.lower())
-                )
-                
-                # Ignore ALTS warnings - these are harmless gRPC messages
-                if 'ALTS' in error_msg or 'alts_credentials' in error_msg:
-                    # This is just a gRPC warning, not a real error
-                    print(f"  ⚠️  Unexpected error during parsing: {error_type}: {error_msg[:100]}")
-                    return self._fallback_parse(user_query)
-                
-                if is_rate_limit:
-                    self._mark_rate_limited(current_key)
-                    if attempt < max_retries - 1:
-                        print(f"  🔄 Rotating to next key (attempt {attempt + 2}/{max_retries})")
-                        continue
-                    else:
-                        print(f"  ⚠️  All retry attempts exhausted, using fallback")
-                        return self._fallback_parse(user_query)
-                else:
-                    # Non-rate-limit error
-                    print(f"  ⚠️  Error: {error_type}: {error_msg[:200]}")
-                    return self._fallback_parse(user_query)
-        
-        # If we get here, all retries failed
-        return self._fallback_parse(user_query)
+        except json.JSONDecodeError as e:
+            print(f"  ⚠️  JSON parse error: {e}")
+            print(f"  Response: {response_text[:200]}")
+            return self._fallback_parse(user_query)
+        except LLMError as e:
+            print(f"  ⚠️  AI parsing unavailable ({str(e)[:200]}), using fallback")
+            return self._fallback_parse(user_query)
     
     def _validate_result(self, result: Dict) -> bool:
         """Validate the parsed result"""
@@ -724,22 +606,104 @@ Respond ONLY with the JSON object, no other text."""
     
     def parse_batch_queries(self, queries: list) -> list:
         """
-        Parse multiple queries at once.
+        Parse multiple queries with a single Gemini request.
+        
+        Queries resolved by the local parser or the cache never reach the API.
+        The rest are de-duplicated and sent together (up to batch_size per
+        request); every entry of the returned JSON array is validated on its
+        own, and entries that are missing or invalid are parsed individually.
         
         Args:
             queries: List of user queries
             
         Returns:
-            List of parsed results
+            List of parsed results, in the same order as queries
         """
         print(f"\n📋 Parsing {len(queries)} queries...")
-        results = []
+        results = [None] * len(queries)
+        pending = {}  # query -> positions; repeated queries share one parse
+        
+        for i, query in enumerate(queries):
+            local = self.local_parser.parse(query)
+            if local and self._validate_result(local) and local['confidence'] >= self.local_threshold:
+                results[i] = local
+                continue
+            cached = self.cache.get(query)
+            if cached and self._validate_result(cached):
+                results[i] = cached
+                continue
+            pending.setdefault(query, []).append(i)
+        
+        print(f"  ⚡ {len(queries) - sum(len(p) for p in pending.values())} resolved locally or from cache, "
+              f"{len(pending)} unique queries left for Gemini")
+        
+        unique = list(pending)
+        if unique and self.api_keys and self.generation_config:
+            for start in range(0, len(unique), self.batch_size):
+                chunk = unique[start:start + self.batch_size]
+                for query, result in zip(chunk, self._parse_chunk(chunk)):
+                    if result is None:
+                        continue
+                    self.cache.put(query, result)
+                    for i in pending[query]:
+                        results[i] = dict(result)
         
-        for i, query in enumerate(queries, 1):
-            print(f"\n[{i}/{len(queries)}]")
-            result = self.parse_query(query)
-            results.append(result)
+        # Anything the batch request could not settle takes the single-query path
+        for i, query in enumerate(queries):
+            if results[i] is None:
+                print(f"\n[{i + 1}/{len(queries)}]")
+                results[i] = self.parse_query(query)
+        
+        return results
+    
+    def _parse_chunk(self, queries: list) -> list:
+        """One Gemini request for several queries; None marks entries to re-parse"""
+        numbered = "\n".join(f'{n}. "{query}"' for n, query in enumerate(queries, 1))
+        prompt = f"""Analyze each of these {len(queries)} user queries and extract the document editing intent of each one independently.
+
+USER QUERIES:
+{numbered}
+
+For EVERY query, extract the following information as a JSON object and add "index": the query's number:
+{PARSE_GUIDE}
+
+Respond ONLY with a JSON array of {len(queries)} objects, one per query, in the same order. No other text."""
+        
+        # Room for one full JSON object per query
+        generation_config = genai.types.GenerationConfig(
+            max_output_tokens=4096 + 512 * len(queries),
+            temperature=0.1,
+            top_p=0.8,
+            top_k=40,
+        )
+        
+        results = [None] * len(queries)
+        try:
+            response_text = self.client.generate_sync(prompt, generation_config=generation_config).strip()
+            response_text = response_text.replace('```json', '').replace('```', '').strip()
+            entries = json.loads(response_text)
+        except (json.JSONDecodeError, LLMError) as e:
+            print(f"  ⚠️  Batch parsing failed ({str(e)[:200]}), parsing individually")
+            return results
+        
+        if not isinstance(entries, list):
+            print("  ⚠️  Batch response is not a JSON array, parsing individually")
+            return results
+        
+        for position, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                continue
+            index = entry.pop('index', position + 1)
+            if not isinstance(index, int) or not 1 <= index <= len(queries) or results[index - 1]:
+                continue
+            try:
+                valid = self._validate_result(entry)
+            except TypeError:
+                valid = False
+            if valid:
+                results[index - 1] = entry
         
+        print(f"  ✅ Parsed {sum(1 for r in results if r)}/{len(queries)} queries in one request")
         return results
 
 
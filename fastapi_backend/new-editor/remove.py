@@ -13,6 +13,9 @@ Remove various LaTeX elements using simple string/regex logic:
 import re
 from typing import Tuple
 
+from document_index import find_unmasked, get_index
+from splice import splice_matches
+
 
 class SimpleRemover:
     """Dead simple content removal - pure string logic, no parsers"""
@@ -38,7 +41,7 @@ class SimpleRemover:
         pattern = r'\b' + re.escape(word) + r'\b'
         
         # Find all matches
-        matches = list(re.finditer(pattern, content, re.IGNORECASE))
+        matches = find_unmasked(content, pattern, re.IGNORECASE)
         count = len(matches)
         
         if count == 0:
@@ -47,12 +50,8 @@ class SimpleRemover:
         
         print(f"  📍 Found {count} occurrences")
         
-        # Remove all occurrences (from end to start to preserve positions)
-        modified = content
-        for match in reversed(matches):
-            start, end = match.span()
-            # Remove the word but keep surrounding spaces clean
-            modified = modified[:start] + modified[end:]
+        # Remove all occurrences in a single pass
+        modified = splice_matches(content, matches)
         
         # Clean up multiple spaces
         modified = re.sub(r'  +', ' ', modified)
@@ -77,7 +76,7 @@ class SimpleRemover:
         escaped_phrase = re.escape(phrase)
         
         # Find all matches (case-insensitive)
-        matches = list(re.finditer(escaped_phrase, content, re.IGNORECASE))
+        matches = find_unmasked(content, escaped_phrase, re.IGNORECASE)
         count = len(matches)
         
         if count == 0:
@@ -86,12 +85,8 @@ class SimpleRemover:
         
         print(f"  📍 Found {count} occurrences")
         
-        # Remove all occurrences (from end to start to preserve positions)
-        modified = content
-        for match in reversed(matches):
-            start, end = match.span()
-            # Remove the phrase but keep surrounding spaces clean
-            modified = modified[:start] + modified[end:]
+        # Remove all occurrences in a single pass
+        modified = splice_matches(content, matches)
         
         # Clean up multiple spaces
         modified = re.sub(r'  +', ' ', modified)
@@ -113,9 +108,10 @@ class SimpleRemover:
         print(f"\n🗑️  Removing sentence: '{sentence[:60]}...'")
         
         # Try exact match first
-        if sentence in content:
+        exact = find_unmasked(content, re.escape(sentence))
+        if exact:
             print(f"  ✅ Exact match found")
-            modified = content.replace(sentence, '')
+            modified = splice_matches(content, exact)
             # Clean up extra whitespace/newlines
             modified = re.sub(r'\n\n\n+', '\n\n', modified)
             modified = re.sub(r'  +', ' ', modified)
@@ -123,8 +119,9 @@ class SimpleRemover:
         
         # Try case-insensitive match
         pattern = re.escape(sentence)
-        match = re.search(pattern, content, re.IGNORECASE)
-        if match:
+        matches = find_unmasked(content, pattern, re.IGNORECASE)
+        if matches:
+            match = matches[0]
             print(f"  ✅ Case-insensitive match found")
             modified = content[:match.start()] + content[match.end():]
             modified = re.sub(r'\n\n\n+', '\n\n', modified)
@@ -135,8 +132,9 @@ class SimpleRemover:
         if len(sentence) > 30:
             partial = sentence[:30]
             pattern = re.escape(partial)
-            match = re.search(pattern, content, re.IGNORECASE)
-            if match:
+            matches = find_unmasked(content, pattern, re.IGNORECASE)
+            if matches:
+                match = matches[0]
                 # Find sentence end (. ! ? or newline)
                 sentence_end = re.search(r'[.!?\n]', content[match.start():])
                 if sentence_end:
@@ -163,41 +161,40 @@ class SimpleRemover:
         """
         print(f"\n🗑️  Removing section: '{section_name}'")
         
+        index = get_index(content)
+        
         # First, try to match LaTeX environments (e.g., \begin{abstract}...\end{abstract})
         # Common environments: abstract, acknowledgments, keywords, etc.
         env_name = section_name.lower().strip()
-        env_pattern = r'\\begin\{' + re.escape(env_name) + r'\}.*?\\end\{' + re.escape(env_name) + r'\}'
-        
-        env_match = re.search(env_pattern, content, re.IGNORECASE | re.DOTALL)
+        environment = index.find_environment(env_name)
         
-        if env_match:
+        if environment:
             print(f"  📦 Found as LaTeX environment: \\begin{{{env_name}}}...\\end{{{env_name}}}")
             # Remove the entire environment
-            modified = content[:env_match.start()] + content[env_match.end():]
+            modified = content[:environment.start] + content[environment.end:]
             
             # Clean up extra whitespace
             modified = re.sub(r'\n\n\n+', '\n\n', modified)
             
-            print(f"  ✅ Removed environment ({env_match.end() - env_match.start()} characters)")
+            print(f"  ✅ Removed environment ({environment.end - environment.start} characters)")
             return modified, 1
         
-        # If not an environment, try to match as a regular section
-        # Pattern to match section header + content until next section or end
-        pattern = r'\\(?:sub)*section\*?\{[^}]*' + re.escape(section_name) + r'[^}]*\}.*?(?=\\(?:sub)*section|\Z)'
+        # If not an environment, try to match as a regular section: header,
+        # content and its subsections, up to the next heading of the same or
+        # higher level
+        section = index.find_section(section_name)
         
-        match = re.search(pattern, content, re.IGNORECASE | re.DOTALL)
-        
-        if not match:
+        if not section:
             print(f"  ❌ Section '{section_name}' not found (tried both environment and section)")
             return content, 0
         
         # Remove the entire section
-        modified = content[:match.start()] + content[match.end():]
+        modified = content[:section.start] + content[section.end:]
         
         # Clean up extra whitespace
         modified = re.sub(r'\n\n\n+', '\n\n', modified)
         
-        print(f"  ✅ Removed section ({match.end() - match.start()} characters)")
+        print(f"  ✅ Removed section ({section.end - section.start} characters)")
         return modified, 1
     
     def remove_table(self, content: str, table_identifier: str = None) -> Tuple[str, int]:
@@ -230,9 +227,8 @@ class SimpleRemover:
                 count = len(matches)
                 total_count += count
                 
-                # Remove all matches (from end to start to preserve positions)
-                for match in reversed(matches):
-                    modified = modified[:match.start()] + modified[match.end():]
+                # Remove all matches in a single pass
+                modified = splice_matches(modified, matches)
             
             if total_count == 0:
                 print(f"  ❌ No tables found")
@@ -364,10 +360,8 @@ class SimpleRemover:
             
             print(f"  📍 Found {count} valid inline formulas (skipped {len(matches) - count} non-math)")
             
-            # Remove all valid matches (from end to start)
-            modified = content
-            for match in reversed(valid_matches):
-                modified = modified[:match.start()] + modified[match.end():]
+            # Remove all valid matches in a single pass
+            modified = splice_matches(content, valid_matches)
             
             modified = re.sub(r'  +', ' ', modified)
             print(f"  ✅ Removed {count} inline formulas")
@@ -397,9 +391,8 @@ class SimpleRemover:
                 count = len(matches)
                 total_count += count
                 
-                # Remove all (from end to start to preserve positions)
-                for match in reversed(matches):
-                    modified = modified[:match.start()] + modified[match.end():]
+                # Remove all in a single pass
+                modified = splice_matches(modified, matches)
             
             if total_count == 0:
                 print(f"  ❌ No display equations found")
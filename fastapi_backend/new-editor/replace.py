@@ -5,158 +5,17 @@ Just direct string replacement with smart handling.
 """
 
 import re
-from typing import Tuple, Optional
-import google.generativeai as genai
+from typing import Dict, Tuple, Optional
 import os
 from pathlib import Path
 from dotenv import load_dotenv
 
+from doc_edit.llm_client import LLMError, collect_api_keys, get_client
 
-class APIKeyRotator:
-    """
-    Enhanced API key rotation system for efficient use of all 39 keys.
-    
-    Features:
-    - Automatic detection of all available keys (GEMINI_API_KEY + API_KEY1-39)
-    - Smart rotation that distributes load evenly across all keys
-    - Rate limit tracking per key to avoid hitting the same exhausted key
-    - Automatic skip of recently rate-limited keys
-    - Per-key cooldown period after rate limit
-    """
-    
-    def __init__(self):
-        """Load all API keys from .env file and initialize rotation state"""
-        # Load .env file
-        env_path = Path(__file__).parent.parent.parent / '.env'
-        load_dotenv(env_path)
-        
-        # Collect all API keys
-        self.api_keys = []
-        self.key_names = []  # For debugging/logging
-        
-        # Primary key
-        primary_key = os.getenv('GEMINI_API_KEY')
-        if primary_key and primary_key.strip():
-            self.api_keys.append(primary_key)
-            self.key_names.append('GEMINI_API_KEY')
-        
-        # Backup keys (API_KEY1 to API_KEY39)
-        for i in range(1, 40):
-            key = os.getenv(f'API_KEY{i}')
-            if key and key.strip():  # Only add non-empty keys
-                self.api_keys.append(key)
-                self.key_names.append(f'API_KEY{i}')
-        
-        # Rotation state
-        self.current_index = 0
-        self.total_keys = len(self.api_keys)
-        
-        # Rate limit tracking
-        self.rate_limited_keys = set()  # Indices of rate-limited keys
-        self.key_usage_count = [0] * self.total_keys  # Track usage per key
-        self.successful_requests = [0] * self.total_keys  # Track successful requests
-        
-        if self.api_keys:
-            print(f"  🔑 Loaded {self.total_keys} API keys for rotation")
-            print(f"  📊 Estimated capacity: {self.total_keys * 50} requests/day (50 per key)")
-    
-    def get_next_key(self) -> Optional[str]:
-        """
-        Get the next available API key in rotation.
-        Automatically skips rate-limited keys and distributes load evenly.
-        
-        Returns:
-            Next available API key or None if all keys exhausted
-        """
-        if not self.api_keys:
-            return None
-        
-        # If all keys are rate-limited, reset and try again
-        if len(self.rate_limited_keys) >= self.total_keys:
-            print(f"  ⚠️  All {self.total_keys} keys hit rate limits - resetting cooldown")
-            self.rate_limited_keys.clear()
-            return None
-        
-        # Find next non-rate-limited key
-        attempts = 0
-        while attempts < self.total_keys:
-            key = self.api_keys[self.current_index]
-            key_name = self.key_names[self.current_index]
-            current_idx = self.current_index
-            
-            # Move to next key for next call
-            self.current_index = (self.current_index + 1) % self.total_keys
-            
-            # Skip if rate-limited
-            if current_idx in self.rate_limited_keys:
-                attempts += 1
-                continue
-            
-            # Track usage
-            self.key_usage_count[current_idx] += 1
-            
-            return key
-        
-        # All keys are rate-limited
-        print(f"  ❌ All {self.total_keys} keys are rate-limited")
-        return None
-    
-    def get_current_key(self) -> Optional[str]:
-        """Get current API key without rotating"""
-        if not self.api_keys:
-            return None
-        return self.api_keys[self.current_index]
-    
-    def mark_rate_limited(self, key: str):
-        """
-        Mark a key as rate-limited to avoid using it again.
-        
-        Args:
-            key: The API key that hit rate limit
-        """
-        try:
-            idx = self.api_keys.index(key)
-            self.rate_limited_keys.add(idx)
-            key_name = self.key_names[idx]
-            available = self.total_keys - len(self.rate_limited_keys)
-            print(f"  ⚠️  {key_name} rate-limited | {available}/{self.total_keys} keys still available")
-        except ValueError:
-            pass
-    
-    def mark_successful(self, key: str):
-        """
-        Mark a successful request for a key.
-        
-        Args:
-            key: The API key that completed successfully
-        """
-        try:
-            idx = self.api_keys.index(key)
-            self.successful_requests[idx] += 1
-        except ValueError:
-            pass
-    
-    def get_stats(self) -> dict:
-        """
-        Get rotation statistics for monitoring.
-        
-        Returns:
-            Dictionary with rotation statistics
-        """
-        return {
-            'total_keys': self.total_keys,
-            'available_keys': self.total_keys - len(self.rate_limited_keys),
-            'rate_limited_keys': len(self.rate_limited_keys),
-            'total_usage': sum(self.key_usage_count),
-            'total_successful': sum(self.successful_requests),
-            'key_usage_distribution': dict(zip(self.key_names, self.key_usage_count)),
-            'key_success_rate': dict(zip(self.key_names, self.successful_requests))
-        }
-    
-    def reset_rate_limits(self):
-        """Reset all rate limit flags - useful for new hour/day"""
-        self.rate_limited_keys.clear()
-        print(f"  🔄 Rate limits reset - all {self.total_keys} keys available again")
+from document_index import find_unmasked, get_index
+from llm_context import window_context
+from splice import preserve_case, splice_matches
+from term_matcher import TermMatcher
 
 
 class SimpleReplacer:
@@ -169,22 +28,17 @@ class SimpleReplacer:
         Args:
             use_api_rotation: Whether to use API key rotation (default: True)
         """
-        self.model = None
-        self.api_rotator = None
+        self.client = None
         
         if use_api_rotation:
-            self.api_rotator = APIKeyRotator()
-            if self.api_rotator and self.api_rotator.api_keys:
-                # Get model name from .env or use default
-                env_path = Path(__file__).parent.parent.parent / '.env'
-                load_dotenv(env_path)
+            # Get keys and model name from .env
+            env_path = Path(__file__).parent.parent.parent / '.env'
+            load_dotenv(env_path)
+            api_keys = collect_api_keys()
+            if api_keys:
                 model_name = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash')
-                
-                # Configure with first key
-                first_key = self.api_rotator.get_current_key()
-                genai.configure(api_key=first_key)
-                self.model = genai.GenerativeModel(model_name)
-                print(f"  🤖 Gemini API configured with {len(self.api_rotator.api_keys)} rotating keys")
+                self.client = get_client(api_keys, model_name)
+                print(f"  🤖 Gemini API configured with {len(api_keys)} rotating keys")
             else:
                 print("  ⚠️  No Gemini API keys found - plain text to LaTeX conversion disabled")
     
@@ -207,7 +61,7 @@ class SimpleReplacer:
         pattern = r'\b' + re.escape(old_word) + r'\b'
         
         # Find all matches
-        matches = list(re.finditer(pattern, content, re.IGNORECASE))
+        matches = find_unmasked(content, pattern, re.IGNORECASE)
         count = len(matches)
         
         if count == 0:
@@ -216,16 +70,8 @@ class SimpleReplacer:
         
         print(f"  📍 Found {count} occurrences")
         
-        # Replace from end to start (avoid offset issues)
-        modified = content
-        for match in reversed(matches):
-            start, end = match.span()
-            matched_word = content[start:end]
-            
-            # Preserve case
-            replacement = self._preserve_case(matched_word, new_word)
-            
-            modified = modified[:start] + replacement + modified[end:]
+        # Single pass over all matches, preserving the case of each
+        modified = splice_matches(content, matches, lambda text: self._preserve_case(text, new_word))
         
         print(f"  ✅ Replaced {count} occurrences")
         return modified, count
@@ -249,7 +95,7 @@ class SimpleReplacer:
         pattern = re.escape(old_phrase)
         
         # Find all matches (case-insensitive)
-        matches = list(re.finditer(pattern, content, re.IGNORECASE))
+        matches = find_unmasked(content, pattern, re.IGNORECASE)
         count = len(matches)
         
         if count == 0:
@@ -258,16 +104,45 @@ class SimpleReplacer:
         
         print(f"  📍 Found {count} occurrences")
         
-        # Replace from end to start
-        modified = content
-        for match in reversed(matches):
-            start, end = match.span()
-            matched_phrase = content[start:end]
-            
-            # Preserve case of first word
-            replacement = self._preserve_case(matched_phrase, new_phrase)
+        # Single pass over all matches, preserving the case of each
+        modified = splice_matches(content, matches, lambda text: self._preserve_case(text, new_phrase))
+        
+        print(f"  ✅ Replaced {count} occurrences")
+        return modified, count
+    
+    def replace_terms(self, content: str, replacements: Dict[str, str]) -> Tuple[str, int]:
+        """
+        Replace many words/phrases in a single pass.
+        
+        Same matching as replace_word/replace_phrase (case-insensitive, word
+        boundaries for single words, case of each match preserved), but all
+        old terms are found with one compiled matcher and replaced in one
+        splice. A replacement is never matched again by another term.
+        
+        Args:
+            content: LaTeX document content
+            replacements: {old_term: new_term}
             
-            modified = modified[:start] + replacement + modified[end:]
+        Returns:
+            (modified_content, replacement_count)
+        """
+        print(f"\n🔄 Replacing {len(replacements)} terms")
+        
+        matcher = TermMatcher(replacements)
+        new_terms = {old.strip().lower(): new for old, new in replacements.items()}
+        matches = get_index(content).unmasked(matcher.finditer(content))
+        count = len(matches)
+        
+        if count == 0:
+            print(f"  ❌ No occurrences found")
+            return content, 0
+        
+        print(f"  📍 Found {count} occurrences")
+        
+        modified = splice_matches(
+            content, matches,
+            lambda text: self._preserve_case(text, new_terms.get(text.lower(), text))
+        )
         
         print(f"  ✅ Replaced {count} occurrences")
         return modified, count
@@ -287,24 +162,22 @@ class SimpleReplacer:
         print(f"\n🔄 Replacing sentence: '{old_sentence[:50]}...' → '{new_sentence[:50]}...'")
         
         # Try exact match first
-        if old_sentence in content:
-            modified = content.replace(old_sentence, new_sentence)
-            count = content.count(old_sentence)
+        exact = find_unmasked(content, re.escape(old_sentence))
+        if exact:
+            modified = splice_matches(content, exact, lambda text: new_sentence)
+            count = len(exact)
             print(f"  ✅ Exact match - Replaced {count} occurrence(s)")
             return modified, count
         
         # Try case-insensitive
         pattern = re.escape(old_sentence)
-        matches = list(re.finditer(pattern, content, re.IGNORECASE))
+        matches = find_unmasked(content, pattern, re.IGNORECASE)
         
         if matches:
             count = len(matches)
             print(f"  📍 Found {count} case-insensitive match(es)")
             
-            modified = content
-            for match in reversed(matches):
-                start, end = match.span()
-                modified = modified[:start] + new_sentence + modified[end:]
+            modified = splice_matches(content, matches, lambda text: new_sentence)
             
             print(f"  ✅ Replaced {count} occurrence(s)")
             return modified, count
@@ -315,13 +188,14 @@ class SimpleReplacer:
             # Try matching first 5-7 words
             partial = ' '.join(words[:min(5, len(words))])
             pattern = re.escape(partial)
-            matches = list(re.finditer(pattern, content, re.IGNORECASE))
+            matches = find_unmasked(content, pattern, re.IGNORECASE)
             
             if matches:
                 print(f"  ⚠️  Partial match found with first words: '{partial}'")
                 # Ask user or use AI to find full sentence
-                if self.model:
-                    return self._ai_replace_sentence(content, old_sentence, new_sentence)
+                if self.client:
+                    return self._ai_replace_sentence(content, old_sentence, new_sentence,
+                                                     near=matches[0].start())
         
         print(f"  ❌ No match found for sentence")
         return content, 0
@@ -343,22 +217,18 @@ class SimpleReplacer:
         """
         print(f"\n🔄 Replacing section content: '{section_name}'")
         
-        # Pattern to find section
-        # Matches: \section{Section Name} ... (content until next section)
-        pattern = r'(\\(?:sub)*section\*?\{[^}]*' + re.escape(section_name) + r'[^}]*\})(.*?)(?=\\(?:sub)*section|\Z)'
-        
-        match = re.search(pattern, content, re.IGNORECASE | re.DOTALL)
+        # Section header through the body (up to the next heading)
+        section = get_index(content).find_section(section_name)
         
-        if not match:
+        if not section:
             print(f"  ❌ Section '{section_name}' not found")
             return content, 0
         
         # Replace content but keep section header
-        section_header = match.group(1)
-        old_content = match.group(2)
+        section_header = content[section.start:section.header_end]
         
         # Convert plain text to LaTeX if needed
-        if convert_to_latex and self.model:
+        if convert_to_latex and self.client:
             print(f"  🤖 Converting plain text to LaTeX format...")
             latex_content = self._convert_to_latex(new_content, section_name)
             if latex_content:
@@ -371,7 +241,7 @@ class SimpleReplacer:
         new_section = section_header + '\n' + new_content + '\n\n'
         
         # Replace in document
-        modified = content[:match.start()] + new_section + content[match.end():]
+        modified = content[:section.start] + new_section + content[section.body_end:]
         
         print(f"  ✅ Replaced section content")
         return modified, 1
@@ -406,52 +276,27 @@ class SimpleReplacer:
         Get API key rotation statistics.
         
         Returns:
-            Dictionary with rotation statistics or None if no rotator
+            Per-key request statistics or None if AI is disabled
         """
-        if self.api_rotator:
-            return self.api_rotator.get_stats()
+        if self.client:
+            return self.client.get_stats()
         return None
     
     def reset_rate_limits(self):
-        """Reset all API key rate limit flags"""
-        if self.api_rotator:
-            self.api_rotator.reset_rate_limits()
+        """Reset all API key rate limit cool-downs"""
+        if self.client:
+            self.client.reset_cooldowns()
     
     def _preserve_case(self, original: str, replacement: str) -> str:
-        """
-        Preserve the case of the original text in the replacement.
-        
-        Examples:
-            'CGM' -> 'GLUCOSE MONITOR' becomes 'Glucose Monitor'
-            'cgm' -> 'glucose monitor' becomes 'glucose monitor'
-            'Cgm' -> 'Glucose monitor' becomes 'Glucose monitor'
-        """
-        if not original:
-            return replacement
-        
-        # All caps
-        if original.isupper():
-            # For multi-word replacements with all caps, use Title Case
-            if ' ' in replacement or '-' in original:
-                return replacement.title()
-            return replacement.upper()
-        
-        # First letter capitalized
-        if original[0].isupper():
-            return replacement.capitalize()
-        
-        # All lowercase
-        return replacement.lower()
+        """Preserve the case of the original text in the replacement (see splice.preserve_case)"""
+        return preserve_case(original, replacement)
     
     def _convert_to_latex(self, plain_text: str, section_name: str = "") -> Optional[str]:
         """
-        Convert plain text to properly formatted LaTeX content using AI with enhanced key rotation.
+        Convert plain text to properly formatted LaTeX content using AI.
         
-        Uses all 39 available API keys efficiently:
-        - Automatically rotates through all keys
-        - Skips rate-limited keys
-        - Tracks success/failure per key
-        - Provides detailed progress feedback
+        Key rotation, rate-limit cool-downs and retries are handled by the
+        shared LLM client.
         
         Args:
             plain_text: Plain text content from user
@@ -460,7 +305,7 @@ class SimpleReplacer:
         Returns:
             LaTeX formatted content or None if conversion fails
         """
-        if not self.model or not self.api_rotator:
+        if not self.client:
             return None
         
         prompt = f"""Convert this plain text into properly formatted LaTeX content.
@@ -486,149 +331,75 @@ PLAIN TEXT:
 
 LATEX OUTPUT:"""
 
-        # Try with all available keys
-        max_retries = self.api_rotator.total_keys
-        stats = self.api_rotator.get_stats()
-        print(f"  📊 Starting conversion with {stats['available_keys']}/{stats['total_keys']} keys available")
-        
-        for attempt in range(max_retries):
-            try:
-                # Get next available key
-                current_key = self.api_rotator.get_next_key()
-                
-                if not current_key:
-                    print(f"  ❌ No more keys available after {attempt} attempts")
-                    break
-                
-                # Reconfigure with new key
-                genai.configure(api_key=current_key)
-                
-                if attempt > 0:
-                    stats = self.api_rotator.get_stats()
-                    print(f"  🔄 Attempt {attempt + 1}/{max_retries} | {stats['available_keys']} keys remaining")
-                
-                # Make API call
-                response = self.model.generate_content(prompt)
-                latex_output = response.text.strip()
-                
-                # Mark successful request
-                self.api_rotator.mark_successful(current_key)
-                
-                # Clean up the response - remove code blocks if AI added them
-                latex_output = latex_output.replace('```latex', '').replace('```', '').strip()
-                
-                # Basic validation - check if it looks like LaTeX
-                if '\\' in latex_output or latex_output == plain_text:
-                    stats = self.api_rotator.get_stats()
-                    print(f"  ✅ Conversion successful (Total: {stats['total_successful']} successes)")
-                    return latex_output
-                
-                return None
-                
-            except Exception as e:
-                error_msg = str(e)
-                
-                # Check if it's a rate limit error
-                if 'quota' in error_msg.lower() or 'rate limit' in error_msg.lower() or '429' in error_msg:
-                    # Mark this key as rate-limited
-                    self.api_rotator.mark_rate_limited(current_key)
-                    
-                    if attempt < max_retries - 1:
-                        continue  # Try next key
-                    else:
-                        print(f"  ❌ All {max_retries} API keys exhausted")
-                        return None
-                else:
-                    # Other error - don't retry with different keys
-                    print(f"  ⚠️  AI conversion error: {e}")
-                    return None
+        try:
+            latex_output = self.client.generate_sync(prompt).strip()
+        except LLMError as e:
+            print(f"  ⚠️  AI conversion error: {e}")
+            return None
+        
+        # Clean up the response - remove code blocks if AI added them
+        latex_output = latex_output.replace('```latex', '').replace('```', '').strip()
+        
+        # Basic validation - check if it looks like LaTeX
+        if '\\' in latex_output or latex_output == plain_text:
+            print(f"  ✅ Conversion successful")
+            return latex_output
         
         return None
     
-    def _ai_replace_sentence(self, content: str, old_sentence: str, new_sentence: str) -> Tuple[str, int]:
+    def _ai_replace_sentence(self, content: str, old_sentence: str, new_sentence: str,
+                             near: Optional[int] = None) -> Tuple[str, int]:
         """
         Use AI to find and replace a sentence when exact matching fails.
-        Uses enhanced API key rotation for maximum reliability.
+        
+        Only a window of text around `near` (where its first words were
+        found) is sent, no larger than the 2000 characters sent before.
         
         Args:
             content: LaTeX document content
             old_sentence: Sentence to find
             new_sentence: Replacement sentence
+            near: Approximate position of the sentence (start of document if unknown)
             
         Returns:
             (modified_content, replacement_count)
         """
-        if not self.model or not self.api_rotator:
+        if not self.client:
             print("  ❌ AI model not available for fuzzy matching")
             return content, 0
         
         print("  🤖 Using AI to find sentence...")
         
+        context = window_context(content, near or 0, '_ai_replace_sentence')
+        
         prompt = f"""Find the exact location of this sentence in the text:
 
 TARGET SENTENCE: "{old_sentence}"
 
 TEXT:
-{content[:2000]}...
+{context.target}
 
 Reply with ONLY the exact sentence as it appears in the text, or "NOT FOUND" if you can't find it.
 No explanations."""
 
-        # Try with all available keys
-        max_retries = min(self.api_rotator.total_keys, 10)  # Try up to 10 keys for sentence matching
-        
-        for attempt in range(max_retries):
-            try:
-                # Get next available key
-                current_key = self.api_rotator.get_next_key()
-                
-                if not current_key:
-                    print(f"  ❌ No more keys available after {attempt} attempts")
-                    break
-                
-                # Reconfigure with new key
-                genai.configure(api_key=current_key)
-                
-                if attempt > 0:
-                    stats = self.api_rotator.get_stats()
-                    print(f"  🔄 Retrying with next key ({stats['available_keys']} keys available)")
-                
-                response = self.model.generate_content(prompt)
-                found_sentence = response.text.strip()
-                
-                # Mark successful request
-                self.api_rotator.mark_successful(current_key)
-                
-                if found_sentence == "NOT FOUND" or not found_sentence:
-                    print("  ❌ AI couldn't find the sentence")
-                    return content, 0
-                
-                # Try to replace what AI found
-                if found_sentence in content:
-                    modified = content.replace(found_sentence, new_sentence, 1)
-                    print(f"  ✅ AI found and replaced: '{found_sentence[:50]}...'")
-                    return modified, 1
-                
-                return content, 0
-                
-            except Exception as e:
-                error_msg = str(e)
-                
-                # Check if it's a rate limit error
-                if 'quota' in error_msg.lower() or 'rate limit' in error_msg.lower() or '429' in error_msg:
-                    # Mark this key as rate-limited
-                    self.api_rotator.mark_rate_limited(current_key)
-                    
-                    if attempt < max_retries - 1:
-                        continue  # Try next key
-                    else:
-                        stats = self.api_rotator.get_stats()
-                        print(f"  ❌ Exhausted {attempt + 1} keys ({stats['rate_limited_keys']} rate-limited)")
-                        return content, 0
-                else:
-                    # Other error - don't retry
-                    print(f"  ❌ AI error: {e}")
-                    return content, 0
+        try:
+            found_sentence = self.client.generate_sync(prompt).strip()
+        except LLMError as e:
+            print(f"  ❌ AI error: {e}")
+            return content, 0
+        
+        if found_sentence == "NOT FOUND" or not found_sentence:
+            print("  ❌ AI couldn't find the sentence")
+            return content, 0
+        
+        # Try to replace what AI found, in the searched window first
+        position = content.find(found_sentence, context.start)
+        if position == -1:
+            position = content.find(found_sentence)
+        if position != -1:
+            modified = content[:position] + new_sentence + content[position + len(found_sentence):]
+            print(f"  ✅ AI found and replaced: '{found_sentence[:50]}...'")
+            return modified, 1
         
         return content, 0
 
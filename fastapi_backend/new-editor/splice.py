@@ -0,0 +1,95 @@
+"""
+SPLICE ENGINE
+Single-pass multi-match editing shared by the replace/format/remove engines.
+
+Applying each match with `content[:start] + new + content[end:]` copies the
+whole document once per match (O(n·m)). These helpers collect the kept
+segments and replacements in order and join them once, so the cost is
+linear in the document size regardless of the number of matches.
+diff_hunks recovers such an edit list from two versions of a document.
+"""
+
+from difflib import SequenceMatcher
+from typing import Callable, Iterable, List, Match, Tuple
+
+
+def splice(content: str, edits: Iterable[Tuple[int, int, str]]) -> str:
+    """
+    Apply (start, end, replacement) edits in one pass.
+
+    Edits must be sorted by start and must not overlap, as produced by
+    re.finditer or a filtered list of its matches.
+    """
+    pieces = []
+    position = 0
+    for start, end, replacement in edits:
+        pieces.append(content[position:start])
+        pieces.append(replacement)
+        position = end
+    pieces.append(content[position:])
+    return ''.join(pieces)
+
+
+def splice_matches(content: str, matches: Iterable[Match],
+                   replace: Callable[[str], str] = lambda text: '') -> str:
+    """
+    Replace every match with replace(matched_text) in one pass.
+
+    The default removes the matches.
+    """
+    return splice(content, ((m.start(), m.end(), replace(m.group(0))) for m in matches))
+
+
+def diff_hunks(base: str, modified: str) -> List[Tuple[int, int, str]]:
+    """Line-level change set turning `base` into `modified`"""
+    if base == modified:
+        return []
+    a = base.splitlines(keepends=True)
+    b = modified.splitlines(keepends=True)
+
+    # Trim the common head and tail so the matcher only sees the edited region
+    head = 0
+    while head < len(a) and head < len(b) and a[head] == b[head]:
+        head += 1
+    tail = 0
+    while tail < len(a) - head and tail < len(b) - head and a[-1 - tail] == b[-1 - tail]:
+        tail += 1
+
+    offsets = [0]
+    for line in a:
+        offsets.append(offsets[-1] + len(line))
+
+    middle_a = a[head:len(a) - tail]
+    middle_b = b[head:len(b) - tail]
+    hunks = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, middle_a, middle_b, autojunk=False).get_opcodes():
+        if tag != 'equal':
+            hunks.append((offsets[head + i1], offsets[head + i2], ''.join(middle_b[j1:j2])))
+    return hunks
+
+
+def preserve_case(original: str, replacement: str) -> str:
+    """
+    Preserve the case of the original text in the replacement.
+
+    Examples:
+        'CGM' -> 'GLUCOSE MONITOR' becomes 'Glucose Monitor'
+        'cgm' -> 'glucose monitor' becomes 'glucose monitor'
+        'Cgm' -> 'Glucose monitor' becomes 'Glucose monitor'
+    """
+    if not original:
+        return replacement
+
+    # All caps
+    if original.isupper():
+        # For multi-word replacements with all caps, use Title Case
+        if ' ' in replacement or '-' in original:
+            return replacement.title()
+        return replacement.upper()
+
+    # First letter capitalized
+    if original[0].isupper():
+        return replacement.capitalize()
+
+    # All lowercase
+    return replacement.lower()
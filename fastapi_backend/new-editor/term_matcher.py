@@ -0,0 +1,101 @@
+"""
+MULTI-TERM MATCHER
+Finds many literal terms in one pass over a document.
+
+Running one re.finditer per term costs a full document scan per term. Here
+all terms are merged into a prefix trie and compiled into a single regex
+(e.g. "data", "dataset", "deep" -> d(?:ata(?:set|)|eep)), so each document
+position only follows the characters the terms share: the work per
+position is bounded by the longest term, not by the number of terms.
+
+- Case-insensitive, like the word/phrase engines
+- Single words match as whole words (bold_word), multi-word terms anywhere
+  (bold_phrase). The whole-word guards only apply on a side where the term
+  has a word character, so "C++", "C#" and ".NET" match too
+- Leftmost-longest: at a given position the longest term wins
+"""
+
+import re
+from typing import Dict, Iterable, Iterator, List, Match, Optional
+
+_WORD = re.compile(r'\w')
+
+
+def _trie(terms: Iterable[str]) -> Dict:
+    root: Dict = {}
+    for term in terms:
+        node = root
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = {}  # end of a term
+    return root
+
+
+def _trie_pattern(node: Dict, end: str, last: str = '') -> str:
+    """
+    Regex for a trie node reached by the character `last`; `end` is
+    appended where a term ends on a word character
+    """
+    # Walk single-child chains iteratively so long terms (sentences) do not
+    # recurse once per character
+    prefix = []
+    while len(node) == 1 and '' not in node:
+        (char, node), = node.items()
+        prefix.append(re.escape(char))
+        last = char
+
+    alternatives = [re.escape(char) + _trie_pattern(child, end, char)
+                    for char, child in sorted(node.items()) if char]
+    if '' in node:
+        # Last, so longer terms sharing this prefix are tried first
+        alternatives.append(end if _WORD.match(last) else '')
+
+    if len(alternatives) == 1:
+        return ''.join(prefix) + alternatives[0]
+    return ''.join(prefix) + '(?:' + '|'.join(alternatives) + ')'
+
+
+class TermMatcher:
+    """
+    Compiled matcher for a set of literal terms.
+
+    Usage:
+        matcher = TermMatcher(['CNN', 'deep learning'])
+        for match in matcher.finditer(content):
+            print(matcher.term(match), match.span())
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self.terms: Dict[str, str] = {}  # lowercased -> term as given (first wins)
+        for term in terms:
+            term = (term or '').strip()
+            if term:
+                self.terms.setdefault(term.lower(), term)
+
+        words = [key for key in self.terms if not re.search(r'\s', key)]
+        phrases = [key for key in self.terms if re.search(r'\s', key)]
+        branches = []
+        if phrases:
+            # Phrases first: "data set" should win over the word "data"
+            branches.append(_trie_pattern(_trie(phrases), ''))
+        # Whole words: no word character right before a term that starts
+        # with one, or right after a term that ends with one
+        for guard, group in ((r'(?<!\w)', [key for key in words if _WORD.match(key)]),
+                             ('', [key for key in words if not _WORD.match(key)])):
+            if group:
+                branches.append(guard + _trie_pattern(_trie(group), r'(?!\w)'))
+        self.pattern = re.compile('|'.join(branches) or r'(?!)', re.IGNORECASE)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def finditer(self, content: str) -> Iterator[Match]:
+        """Non-overlapping matches of all terms, in document order"""
+        return self.pattern.finditer(content)
+
+    def findall(self, content: str) -> List[Match]:
+        return list(self.pattern.finditer(content))
+
+    def term(self, match: Match) -> Optional[str]:
+        """The term (as given) that a match belongs to"""
+        return self.terms.get(match.group(0).lower())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test batch edit planning: edits on separate spans share a round, edits
+that overlap keep their order, and merging a round's edits gives the same
+document as running them one after another
+"""
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+from batch_planner import plan_rounds, predict_spans, spans_overlap
+from document_editor import DocumentEditor
+from format import SimpleFormatter
+from local_parser import LocalQueryParser
+from remove import SimpleRemover
+from replace import SimpleReplacer
+
+DOCUMENT = r"""\documentclass{article}
+\begin{document}
+\section{Introduction}
+Machine learning improves accuracy on many tasks.
+\section{Methods}
+We train a neural network and report precision.
+\section{Results}
+The accuracy of the neural network is 95\%.
+\end{document}
+"""
+
+
+class _LocalParser:
+    """Parses batches with the local grammar only (no Gemini)"""
+
+    def parse_batch_queries(self, queries):
+        parser = LocalQueryParser()
+        return [parser.parse(query) for query in queries]
+
+
+def _editor(cls=DocumentEditor):
+    editor = object.__new__(cls)
+    editor.parser = _LocalParser()
+    editor.replacer = SimpleReplacer()
+    editor.formatter = SimpleFormatter()
+    editor.remover = SimpleRemover()
+    editor.max_workers = 4
+    return editor
+
+
+def _parse(queries):
+    return _LocalParser().parse_batch_queries(queries)
+
+
+def test_rounds_follow_span_overlap():
+    assert spans_overlap([(0, 10)], [(5, 15)])
+    assert not spans_overlap([(0, 10)], [(10, 20)])  # adjacent sections are independent
+    assert spans_overlap([(4, 4)], [(4, 4)])  # two insertions at one point are ordered
+
+    queries = ["replace 'precision' with 'recall'",   # the Methods line
+               "bold 'Machine learning'",             # the Introduction line
+               "replace 'accuracy' with 'error'",     # Introduction and Results lines: after 1
+               "bold 'error'",                        # no match yet, whole document: after 2
+               "remove the word 'neural'"]            # after 3, like everything that follows it
+    parsed = _parse(queries)
+    assert predict_spans(DOCUMENT, parsed[3]) == [(0, len(DOCUMENT))]
+    assert plan_rounds(DOCUMENT, parsed) == [[0, 1], [2], [3], [4]]
+    # Without the whole-document edit, 'neural' waits only for the edits on its lines
+    assert plan_rounds(DOCUMENT, parsed[:3] + parsed[4:]) == [[0, 1], [2], [3]]
+    print("✅ Round planning passed")
+
+
+def test_merged_rounds_match_sequential_edits():
+    queries = ["replace 'precision' with 'recall'",
+               "bold 'Machine learning'",
+               "replace 'accuracy' with 'error'",
+               "highlight 'network' in yellow",
+               "remove the word 'neural'"]
+    editor = _editor()
+    merged, results = editor.batch_edit(DOCUMENT, queries)
+    assert all(result['success'] for result in results)
+
+    sequential = DOCUMENT
+    for query, parsed in zip(queries, _parse(queries)):
+        sequential, _ = editor.edit(sequential, query, parsed=parsed)
+    assert merged == sequential
+    assert "recall" in merged and "\\textbf{Machine learning}" in merged and "neural" not in merged
+    print("✅ Round merging passed")
+
+
+def test_edits_wait_for_edits_that_write_their_target():
+    # 'precision' is already on the Methods line; the replacement writes it
+    # on the Introduction and Results lines too
+    queries = ["replace 'accuracy' with 'precision'", "bold 'precision'"]
+    assert plan_rounds(DOCUMENT, _parse(queries)) == [[0], [1]]
+
+    editor = _editor()
+    merged, _ = editor.batch_edit(DOCUMENT, queries)
+    assert merged.count("\\textbf{precision}") == 3
+
+    # Removing text can join its neighbours into a later target
+    text = "one two three\none three\n"
+    remove = {'operation': 'remove', 'action': 'remove_phrase', 'target': 'two '}
+    bold = {'operation': 'format', 'action': 'bold_phrase', 'target': 'one three', 'format_action': 'bold'}
+    assert not spans_overlap(predict_spans(text, remove), predict_spans(text, bold))
+    assert plan_rounds(text, [remove, bold]) == [[0], [1]]
+
+    # AI-written text may contain anything a later edit looks for
+    rewrite = {'operation': 'modify', 'action': 'modify_section_ai', 'target': 'Results',
+               'section_name': 'Results', 'new_text': 'be concise'}
+    parsed = [rewrite] + _parse(["bold 'Machine learning'"])
+    assert predict_spans(DOCUMENT, rewrite) != predict_spans(DOCUMENT, parsed[1])
+    assert plan_rounds(DOCUMENT, parsed) == [[0], [1]]
+    print("✅ Read-after-write planning passed")
+
+
+class _WideEditor(DocumentEditor):
+    """Its first edit also rewrites a line it was not predicted to touch"""
+
+    def edit(self, content, user_query, parsed=None, on_chunk=None):
+        modified, result = super().edit(content, user_query, parsed=parsed, on_chunk=on_chunk)
+        if parsed['target'] == 'Machine':
+            modified = modified.replace("We train", "We fit")
+        return modified, result
+
+
+def test_colliding_edits_are_rerun_in_order():
+    queries = ["replace 'Machine' with 'Statistical'", "replace 'precision' with 'recall'"]
+    assert plan_rounds(DOCUMENT, _parse(queries)) == [[0, 1]]
+
+    editor = _editor(_WideEditor)
+    merged, results = editor.batch_edit(DOCUMENT, queries)
+    assert [result['changes'] for result in results] == [1, 1]
+    assert "Statistical learning" in merged and "We fit a neural network and report recall." in merged
+    print("✅ Colliding edits passed")
+
+
+if __name__ == "__main__":
+    test_rounds_follow_span_overlap()
+    test_merged_rounds_match_sequential_edits()
+    test_edits_wait_for_edits_that_write_their_target()
+    test_colliding_edits_are_rerun_in_order()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test the shared document index: section and mask lookups, and incremental
+updates after an edit matching a full rebuild of the edited document
+"""
+
+import random
+import re
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+from document_index import DocumentIndex, find_unmasked, get_index
+from splice import diff_hunks
+
+DOCUMENT = r"""\documentclass{article}
+\usepackage{amsmath}
+\begin{document}
+\section{Introduction}
+Text with $x+y$ and % comment with x here
+more text \textbf{bold}.
+\subsection{Sub A}
+Content \[ a=b \] end.
+\begin{itemize}
+\item one
+\end{itemize}
+\section{Methods}
+We used \verb|x$| code.
+\begin{equation}
+E=mc^2
+\end{equation}
+\section{Results}
+Done.
+\end{document}
+"""
+
+PIECES = ["foo ", "$z$ ", "% c", "\\section{New}", "\\begin{table}\nx\n\\end{table}", "", "bar",
+          "\\usepackage{xcolor}", "$", "\\end{itemize}"]
+
+
+def _signature(index):
+    return (index.masks,
+            [(e.name, e.start, e.end, e.body_start, e.body_end) for e in index.environments],
+            [(s.title, s.start, s.header_end, s.body_end, s.end, s.parent) for s in index.sections],
+            [(p.name, p.start, p.end) for p in index.packages],
+            index.complete)
+
+
+def test_sections_and_masks():
+    index = DocumentIndex(DOCUMENT)
+    introduction = index.find_section("introduction")
+    assert DOCUMENT[introduction.start:introduction.header_end] == "\\section{Introduction}"
+    assert DOCUMENT[introduction.end:].startswith("\\section{Methods}")  # subtree includes Sub A
+    assert DOCUMENT[introduction.body_end:].startswith("\\subsection{Sub A}")
+    assert index.sections[index.find_section("Sub A").parent] is introduction
+    assert index.has_package("amsmath") and not index.has_package("xcolor")
+    assert index.find_environment("equation") is not None
+
+    # Math, comments and verbatim are masked
+    assert len(re.findall(r'\bx\b', DOCUMENT)) == 3 and find_unmasked(DOCUMENT, r'\bx\b') == []
+    assert [m.group(0) for m in find_unmasked(DOCUMENT, r'\w*ext\b')] == ["Text", "text"]
+    assert index.is_masked(DOCUMENT.index("x+y"))
+    assert index.is_masked(DOCUMENT.index("comment with x"))
+    assert index.is_masked(DOCUMENT.index("x$|"))
+    assert not index.is_masked(DOCUMENT.index("Text with"))
+    print("✅ Sections and masks passed")
+
+
+def test_incremental_updates_match_full_rebuild():
+    random.seed(1)
+    incremental = 0
+    for _ in range(500):
+        lines = DOCUMENT.splitlines(keepends=True)
+        for _ in range(random.randint(1, 3)):
+            i = random.randrange(len(lines))
+            choice = random.random()
+            if choice < 0.4:
+                lines.insert(i, random.choice(PIECES) + "\n")
+            elif choice < 0.7:
+                del lines[i]
+            else:
+                lines[i] = lines[i].replace('e', random.choice(PIECES), 1)
+        edited = ''.join(lines)
+
+        updated = DocumentIndex(DOCUMENT).updated(edited, diff_hunks(DOCUMENT, edited))
+        assert _signature(updated) == _signature(DocumentIndex(edited)), edited
+        incremental += updated.incremental
+    assert 100 < incremental < 500  # most edits update in place, cut structures rebuild
+    print("✅ Incremental updates passed")
+
+
+def test_get_index_derives_from_the_previous_index():
+    previous = get_index(DOCUMENT)
+    assert get_index(DOCUMENT) is previous
+
+    edited = DOCUMENT.replace("Done.", "Done, with $y$ in math.")
+    index = get_index(edited, previous=previous)
+    assert index.incremental and _signature(index) == _signature(DocumentIndex(edited))
+
+    # An edit that cuts an environment tag is rebuilt from scratch
+    broken = DOCUMENT.replace("\\begin{equation}", "\\begin{equ")
+    assert not get_index(broken, previous=previous).incremental
+    print("✅ Derived indexes passed")
+
+
+if __name__ == "__main__":
+    test_sections_and_masks()
+    test_incremental_updates_match_full_rebuild()
+    test_get_index_derives_from_the_previous_index()
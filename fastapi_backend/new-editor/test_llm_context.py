@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test the AI edit context: the target is sent whole, the outline and
+neighbouring text stay within their cap of the previous prompt, and the
+replace window is no larger than the prefix it replaced
+"""
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+from document_index import get_index
+from llm_context import (CHARS_PER_TOKEN, EXTRA_RATIO, REPLACE_WINDOW_CHARS, estimate_tokens,
+                         get_context_stats, section_context, window_context)
+
+PARAGRAPH = "The \\acc{} of the model improves with more training data and better features.\n"
+DOCUMENT = ("\\documentclass{article}\n\\newcommand{\\acc}{accuracy}\n\\newcommand{\\unused}{x}\n"
+            "\\begin{document}\n"
+            + "".join(f"\\section{{Part {i}}}\\label{{sec:{i}}}\n" + PARAGRAPH * 30 for i in range(6))
+            + "\\end{document}\n")
+
+
+def _extra(context):
+    return len(context.outline) + len(context.before) + len(context.after)
+
+
+def test_section_context_is_capped_by_the_previous_prompt():
+    section = get_index(DOCUMENT).find_section("Part 3")
+    body = DOCUMENT[section.header_end:section.body_end]
+    context = section_context(DOCUMENT, section, 'test_section')
+
+    assert context.target == body
+    assert context.baseline_tokens == estimate_tokens(body.strip())
+    assert 0 < _extra(context) <= context.baseline_tokens * EXTRA_RATIO * CHARS_PER_TOKEN
+    assert context.tokens <= context.baseline_tokens * (1 + EXTRA_RATIO) + 1
+    assert "\\newcommand{\\acc}" in context.outline and "\\unused" not in context.outline
+    assert "- Part 3  <-- target" in context.outline
+    assert context.before.endswith(PARAGRAPH + "\\section{Part 3}")
+    assert context.after.startswith("\\section{Part 4}")
+
+    # An explicit cap below the ratio wins; no extra context at all is the old prompt
+    assert _extra(section_context(DOCUMENT, section, 'test_section', extra_tokens=20)) <= 20 * CHARS_PER_TOKEN
+    bare = section_context(DOCUMENT, section, 'test_section', extra_tokens=0)
+    assert _extra(bare) == 0 and bare.tokens == estimate_tokens(body)
+    print("✅ Section context passed")
+
+
+def test_replace_window_is_no_larger_than_before():
+    position = DOCUMENT.index("\\section{Part 4}")
+    context = window_context(DOCUMENT, position, 'test_window')
+    assert len(context.target) <= REPLACE_WINDOW_CHARS
+    assert context.start <= position < context.end and context.target == DOCUMENT[context.start:context.end]
+    assert DOCUMENT[context.start - 1] == "\n" and context.target.endswith("\n")  # whole lines
+    assert context.saved_tokens >= 0
+
+    # A single long line is cut rather than sent whole
+    line = "word " * 2000
+    context = window_context(line, 5000, 'test_window')
+    assert len(context.target) <= REPLACE_WINDOW_CHARS and context.start <= 5000 < context.end
+    print("✅ Replace window passed")
+
+
+def test_stats_report_signed_savings():
+    before = get_context_stats().get('test_stats', {'requests': 0, 'tokens_saved': 0})
+    section = get_index(DOCUMENT).find_section("Part 1")
+    grown = section_context(DOCUMENT, section, 'test_stats')
+    shrunk = window_context(DOCUMENT, 100, 'test_stats', max_chars=400)
+    after = get_context_stats()['test_stats']
+
+    assert grown.saved_tokens < 0 < shrunk.saved_tokens
+    assert after['requests'] - before['requests'] == 2
+    assert after['tokens_saved'] - before['tokens_saved'] == grown.saved_tokens + shrunk.saved_tokens
+    assert get_context_stats()['all']['requests'] >= after['requests']
+    print("✅ Context stats passed")
+
+
+if __name__ == "__main__":
+    test_section_context_is_capped_by_the_previous_prompt()
+    test_replace_window_is_no_larger_than_before()
+    test_stats_report_signed_savings()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test the local query parser: clear commands parse with high confidence,
+ambiguous ones score below the threshold so Gemini parses them
+"""
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+from local_parser import LocalQueryParser
+
+THRESHOLD = 0.85  # LOCAL_PARSE_THRESHOLD default in query_parser.py
+
+parser = LocalQueryParser()
+
+
+def test_clear_commands_parse_locally():
+    cases = {
+        "replace 'accuracy' with 'precision'": ('replace_word', 'accuracy', 'precision'),
+        "replace accuracy with precision": ('replace_word', 'accuracy', 'precision'),
+        "remove the word 'however'": ('remove_word', 'however', None),
+        "make neural network bold": ('bold_phrase', 'neural network', None),
+        "remove all tables": ('remove_table', 'all', None),
+    }
+    for query, (action, target, new_text) in cases.items():
+        result = parser.parse(query)
+        assert result is not None, query
+        assert result['confidence'] >= THRESHOLD, query
+        assert (result['action'], result['target']) == (action, target), query
+        if new_text is not None:
+            assert result['new_text'] == new_text, query
+
+    result = parser.parse("bold 'CNN', 'RNN' and 'LSTM'")
+    assert result['action'] == 'bold_terms' and result['confidence'] >= THRESHOLD
+    assert result['target'] == 'CNN, RNN, LSTM'
+
+    # Quoting makes selector words and structure names literal text again
+    result = parser.parse("remove 'the first sentence'")
+    assert result['target'] == 'the first sentence' and result['confidence'] >= THRESHOLD
+    result = parser.parse("bold 'Abstract'")
+    assert result['target'] == 'Abstract' and result['confidence'] >= THRESHOLD
+    result = parser.parse("replace 'Table 2' with 'Table 3'")
+    assert result['target'] == 'Table 2' and result['confidence'] >= THRESHOLD
+    print("✅ Clear commands passed")
+
+
+def test_ambiguous_commands_defer_to_gemini():
+    for query in (
+        "remove the last sentence",      # selects a sentence, not the text "last sentence"
+        "delete the second paragraph",
+        "bold every heading",
+        "bold CNN, RNN and LSTM",        # three terms or one phrase?
+        "highlight accuracy and precision in yellow",
+        "change color to blue",          # formatting, not a word replacement
+        "change the font to bold",
+        "change the introduction to be more concise",
+        "delete the introduction",       # structure names are not words to search for
+        "remove the abstract",
+        "remove references",
+        "remove bibliography",
+        "delete all figures",
+        "change the title to Deep Nets",
+        "bold the abstract",
+        "replace section 2 with new text",
+        "bold the results table",
+        "make it bold",                  # pronouns and quantifiers need context
+        "replace it with that",
+        "highlight everything",
+    ):
+        result = parser.parse(query)
+        assert result is None or result['confidence'] < THRESHOLD, (query, result)
+    print("✅ Ambiguous commands passed")
+
+
+if __name__ == "__main__":
+    test_clear_commands_parse_locally()
+    test_ambiguous_commands_defer_to_gemini()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test the parsed-query cache: exact hits on normalized text, near-duplicate
+hits that fill the same slots (target, new text, colour), and LRU eviction
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+import numpy as np
+
+from query_cache import QueryCache, normalize_query
+
+RESULT = {'action': 'replace_word', 'target': 'accuracy', 'new_text': 'precision'}
+HIGHLIGHT = {'action': 'highlight_word', 'target': 'accuracy', 'new_text': None,
+             'format_action': 'highlight', 'color': 'red'}
+
+
+class BagOfWords:
+    """Stand-in encoder that only sees the command words, not the edited text"""
+    WORDS = ['replace', 'swap', 'with', 'all', 'highlight', 'in']
+
+    def encode(self, texts):
+        return [np.array([text.lower().split().count(word) for word in self.WORDS], dtype='float32')
+                for text in texts]
+
+
+def _cache(directory, **kwargs):
+    return QueryCache(version="v1", path=Path(directory) / "cache.sqlite", **kwargs)
+
+
+def test_exact_hits_use_normalized_text():
+    assert normalize_query("  replace “accuracy”\n with  'precision' ") == "replace \"accuracy\" with 'precision'"
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = _cache(temp_dir, use_embeddings=False)
+        assert cache.get("replace 'accuracy' with 'precision'") is None
+        cache.put("replace 'accuracy' with 'precision'", RESULT)
+
+        assert cache.get("replace  ‘accuracy’ with 'precision'") == RESULT
+        assert cache.get("replace 'Accuracy' with 'precision'") is None  # case is kept
+
+        # Shared by other workers of the same version; another prompt/model version does not see it
+        assert _cache(temp_dir, use_embeddings=False).get("replace 'accuracy' with 'precision'") == RESULT
+        assert QueryCache(version="v2", path=cache.path, use_embeddings=False).get(
+            "replace 'accuracy' with 'precision'") is None
+
+        stats = cache.stats()
+        assert (stats['entries'], stats['hits'], stats['misses']) == (1, 1, 2)
+    print("✅ Exact hits passed")
+
+
+def test_near_duplicates_must_fill_the_same_slots():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = _cache(temp_dir, use_embeddings=True, similarity_threshold=0.8)
+        cache._encoder = BagOfWords()
+        cache.put("replace accuracy with precision", RESULT)
+
+        assert cache.get("swap accuracy with precision") is None  # below the threshold
+        assert cache.get("replace all accuracy with precision") == RESULT
+        assert cache.get("replace recall with precision") is None  # same words, other target
+        assert cache.get("replace precision with accuracy") is None  # same text, roles swapped
+
+        cache.put("highlight accuracy in red", HIGHLIGHT)
+        assert cache.get("highlight all accuracy in red") == HIGHLIGHT
+        assert cache.get("highlight accuracy in blue") is None  # other colour
+        assert (cache.near_hits, cache.misses) == (2, 4)
+    print("✅ Near-duplicate hits passed")
+
+
+def test_least_recently_used_entries_are_evicted():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = _cache(temp_dir, max_entries=2, use_embeddings=False)
+        cache.put("bold 'a'", {'target': 'a'})
+        time.sleep(0.01)
+        cache.put("bold 'b'", {'target': 'b'})
+        time.sleep(0.01)
+        assert cache.get("bold 'a'") == {'target': 'a'}  # now more recent than b
+        time.sleep(0.01)
+        cache.put("bold 'c'", {'target': 'c'})
+
+        assert cache.get("bold 'b'") is None
+        assert cache.get("bold 'a'") == {'target': 'a'} and cache.get("bold 'c'") == {'target': 'c'}
+        assert cache.stats()['entries'] == 2
+    print("✅ LRU eviction passed")
+
+
+if __name__ == "__main__":
+    test_exact_hits_use_normalized_text()
+    test_near_duplicates_must_fill_the_same_slots()
+    test_least_recently_used_entries_are_evicted()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test the splice engine: one-pass edits equal match-by-match edits, and
+diff_hunks recovers an edit list that rebuilds the modified document
+"""
+
+import random
+import re
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+from splice import diff_hunks, preserve_case, splice, splice_matches
+
+TEXT = "The CGM data. cgm readings vary; a Cgm sensor and CGM-based models.\n" * 3
+
+
+def test_splice_matches_one_at_a_time_edits():
+    pattern = re.compile(r'cgm', re.IGNORECASE)
+
+    # Match-by-match, from the end so earlier offsets stay valid
+    expected = TEXT
+    for match in reversed(list(pattern.finditer(TEXT))):
+        expected = expected[:match.start()] + preserve_case(match.group(0), 'glucose monitor') + expected[match.end():]
+
+    assert splice_matches(TEXT, pattern.finditer(TEXT),
+                          lambda text: preserve_case(text, 'glucose monitor')) == expected
+    assert 'Glucose Monitor data' in expected and 'glucose monitor readings' in expected
+    assert splice_matches(TEXT, pattern.finditer(TEXT)).count('The  data') == 3  # default removes
+    assert splice(TEXT, []) == TEXT
+    assert splice("abc", [(0, 0, "<"), (1, 2, "B"), (3, 3, ">")]) == "<aBc>"
+    print("✅ Splice passed")
+
+
+def test_diff_hunks_rebuild_the_modified_document():
+    lines = [f"line {i}\n" for i in range(40)]
+    base = ''.join(lines)
+    assert diff_hunks(base, base) == []
+
+    random.seed(7)
+    for _ in range(50):
+        modified = list(lines)
+        for _ in range(random.randint(1, 5)):
+            i = random.randrange(len(modified) + 1)
+            choice = random.random()
+            if choice < 0.3 and i < len(modified):
+                del modified[i]
+            elif choice < 0.6:
+                modified.insert(i, f"new {i}\n")
+            elif i < len(modified):
+                modified[i] = modified[i].upper()
+        modified = ''.join(modified)
+
+        hunks = diff_hunks(base, modified)
+        assert splice(base, hunks) == modified
+        assert all(start <= end for start, end, _ in hunks)
+        assert all(a[1] <= b[0] for a, b in zip(hunks, hunks[1:]))  # sorted, not overlapping
+    print("✅ Diff hunks passed")
+
+
+if __name__ == "__main__":
+    test_splice_matches_one_at_a_time_edits()
+    test_diff_hunks_rebuild_the_modified_document()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Test the multi-term matcher against a naive alternation of every term,
+including terms that start or end with punctuation
+"""
+
+import random
+import re
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+from term_matcher import TermMatcher
+
+TERMS = ['data', 'dataset', 'data set', 'deep', 'deep learning', 'CNN', 'C++', 'C#', '.NET',
+         'et al.', 'F1-score', 'R', 'x86']
+
+
+def _naive(terms):
+    """One alternative per term, longest first; whole-word guards on word-character edges"""
+    alternatives = []
+    for term in sorted(terms, key=len, reverse=True):
+        pattern = re.escape(term)
+        if not re.search(r'\s', term):
+            pattern = (r'(?<!\w)' if re.match(r'\w', term) else '') + pattern + \
+                (r'(?!\w)' if re.search(r'\w$', term) else '')
+        alternatives.append(pattern)
+    return re.compile('|'.join(alternatives), re.IGNORECASE)
+
+
+def test_terms_with_punctuation_match():
+    matcher = TermMatcher(TERMS)
+    text = "We port C++ and C# code to .NET, as Smith et al. did; CNNs and x86-64 differ from CNN."
+    found = [(matcher.term(m), m.group(0)) for m in matcher.finditer(text)]
+    assert found == [('C++', 'C++'), ('C#', 'C#'), ('.NET', '.NET'), ('et al.', 'et al.'),
+                     ('x86', 'x86'), ('CNN', 'CNN')]
+    assert [m.group(0) for m in TermMatcher(['data']).finditer("metadata, data-driven, datasets")] == ['data']
+    print("✅ Punctuation terms passed")
+
+
+def test_matches_equal_naive_alternation():
+    tokens = TERMS + ['metadata', 'datasets', 'Deep', 'C', 'NET', 'R2', 'al.', 'learning', 'set']
+    separators = [' ', ', ', '. ', '-', '(', ')', '\n', '']
+    naive = _naive(TERMS)
+    matcher = TermMatcher(TERMS)
+    random.seed(3)
+    for _ in range(300):
+        text = ''.join(random.choice(tokens) + random.choice(separators) for _ in range(30))
+        assert [m.span() for m in matcher.finditer(text)] == [m.span() for m in naive.finditer(text)], text
+    print("✅ Trie matches naive regex")
+
+
+if __name__ == "__main__":
+    test_terms_with_punctuation_match()
+    test_matches_equal_naive_alternation()
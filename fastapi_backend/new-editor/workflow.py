@@ -173,8 +173,7 @@ class LatexEditorWorkflow:
                      tex_file_path: str,
                      prompts: list,
                      output_name: str = None,
-                     compile_pdf: bool = True,
-                     delay: float = 1.5) -> Dict:
+                     compile_pdf: bool = True) -> Dict:
         """
         Process multiple editing operations in sequence.
         
@@ -183,7 +182,6 @@ class LatexEditorWorkflow:
             prompts: List of natural language editing instructions
             output_name: Name for output files
             compile_pdf: Whether to compile to PDF
-            delay: Delay in seconds between operations (default: 1.5s)
             
         Returns:
             Dictionary with results
@@ -193,7 +191,6 @@ class LatexEditorWorkflow:
         print("="*70)
         print(f"Input file: {tex_file_path}")
         print(f"Operations: {len(prompts)}")
-        print(f"Delay: {delay}s between operations")
         print("="*70 + "\n")
         
         try:
@@ -207,9 +204,9 @@ class LatexEditorWorkflow:
             
             print(f"   ✅ Read {len(original_content)} characters\n")
             
-            # Step 2: Apply all modifications with delays
-            print(f"🤖 Step 2: Applying {len(prompts)} modifications with {delay}s delays...")
-            modified_content, results = self.editor.batch_edit(original_content, prompts, delay=delay)
+            # Step 2: Parse all prompts together, then apply them back-to-back
+            print(f"🤖 Step 2: Applying {len(prompts)} modifications...")
+            modified_content, results = self.editor.batch_edit(original_content, prompts)
             
             successful = sum(1 for r in results if r['success'])
             total_changes = sum(r.get('changes', 0) for r in results if r['success'])
@@ -55,4 +55,21 @@ async def debug_metadata():
             "uploads_files": [f.name for f in file_manager.uploads_dir.glob("*")]
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Debug error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Debug error: {str(e)}")
+
+@router.get("/llm-keys")
+async def debug_llm_keys():
+    """Per-key RPM/TPM utilization shared by every worker on this host"""
+    try:
+        from doc_edit.key_scheduler import get_scheduler
+        from doc_edit.llm_client import collect_api_keys
+
+        scheduler = get_scheduler(collect_api_keys())
+        return {
+            "state_path": str(scheduler.path),
+            "rpm_limit": scheduler.rpm,
+            "tpm_limit": scheduler.tpm,
+            "keys": scheduler.utilization()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Debug error: {str(e)}")
@@ -4,8 +4,11 @@ Uses the new editor implementation from 'new editor' folder with AI-powered quer
 """
 
 from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from ..models.schemas import DocumentEditV1Request, DocumentEditV1Response, DocumentEditV1BatchRequest, DocumentEditV1BatchResponse
 from ..utils.file_manager import FileManager
+import asyncio
+import json
 import time
 import os
 import sys
@@ -37,6 +40,50 @@ except Exception as e:
     file_manager = None
 
 
+def _compile_edited_pdf(edited_file_id: str, source_file_id: str) -> Optional[str]:
+    """Compile an edited LaTeX file and store the PDF; None if compilation fails"""
+    try:
+        # Import compiler service for PDF generation
+        from ..services.compiler_service import CompilerService
+        
+        # Get the path to the edited LaTeX file
+        edited_latex_path = file_manager.get_file_path(edited_file_id)
+        
+        if edited_latex_path and os.path.exists(edited_latex_path):
+            # Compile to PDF
+            compiler_service = CompilerService(engine="pdflatex")
+            compile_result = compiler_service.compile_latex(edited_latex_path)
+            
+            if compile_result.get("success") and compile_result.get("pdf_path"):
+                pdf_path = compile_result["pdf_path"]
+                if os.path.exists(pdf_path):
+                    pdf_id = file_manager.save_existing_file(
+                        source_path=pdf_path,
+                        filename=f"{source_file_id}_v1_edited.pdf",
+                        file_type="pdf"
+                    )
+                    print(f"✅ PDF compiled and saved: {pdf_id}")
+                    return pdf_id
+                else:
+                    print(f"⚠️  PDF file not created at {pdf_path}")
+            else:
+                print(f"⚠️  PDF compilation failed: {compile_result}")
+        else:
+            print(f"⚠️  Could not get path to edited LaTeX file")
+                
+    except Exception as e:
+        print(f"⚠️  PDF compilation error: {e}")
+        import traceback
+        traceback.print_exc()
+        # Don't fail the entire request if PDF compilation fails
+    return None
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 @router.post("/edit-doc-v1", response_model=DocumentEditV1Response)
 async def edit_document_v1(
     request: DocumentEditV1Request,
@@ -109,39 +156,7 @@ async def edit_document_v1(
         # Handle PDF compilation if requested
         pdf_id = None
         if request.compile_pdf:
-            try:
-                # Import compiler service for PDF generation
-                from ..services.compiler_service import CompilerService
-                
-                # Get the path to the edited LaTeX file
-                edited_latex_path = file_manager.get_file_path(edited_file_id)
-                
-                if edited_latex_path and os.path.exists(edited_latex_path):
-                    # Compile to PDF
-                    compiler_service = CompilerService(engine="pdflatex")
-                    compile_result = compiler_service.compile_latex(edited_latex_path)
-                    
-                    if compile_result.get("success") and compile_result.get("pdf_path"):
-                        pdf_path = compile_result["pdf_path"]
-                        if os.path.exists(pdf_path):
-                            pdf_id = file_manager.save_existing_file(
-                                source_path=pdf_path,
-                                filename=f"{request.file_id}_v1_edited.pdf",
-                                file_type="pdf"
-                            )
-                            print(f"✅ PDF compiled and saved: {pdf_id}")
-                        else:
-                            print(f"⚠️  PDF file not created at {pdf_path}")
-                    else:
-                        print(f"⚠️  PDF compilation failed: {compile_result}")
-                else:
-                    print(f"⚠️  Could not get path to edited LaTeX file")
-                        
-            except Exception as e:
-                print(f"⚠️  PDF compilation error: {e}")
-                import traceback
-                traceback.print_exc()
-                # Don't fail the entire request if PDF compilation fails
+            pdf_id = _compile_edited_pdf(edited_file_id, request.file_id)
         
         # Calculate processing time
         processing_time = time.time() - start_time
@@ -183,6 +198,117 @@ async def edit_document_v1(
         )
 
 
+@router.post("/edit-doc-v1/stream")
+async def edit_document_v1_stream(
+    request: DocumentEditV1Request,
+    background_tasks: BackgroundTasks
+):
+    """
+    Streaming variant of /edit-doc-v1 (Server-Sent Events).
+    
+    Same request body and editing as /edit-doc-v1, but the response is an
+    event stream, so AI section rewrites show up while Gemini writes them:
+    
+    - start: {"prompt": ...}
+    - delta: {"text": ...} - next piece of the rewritten section (AI
+      section rewrites only; other operations go straight to done)
+    - done: the /edit-doc-v1 response fields plus "content", the final
+      spliced document that was saved under file_id
+    - error: {"detail": ...}
+    """
+    start_time = time.time()
+    
+    if not NEW_EDITOR_AVAILABLE:
+        raise HTTPException(
+            status_code=500,
+            detail="New Editor (V1) is not available. Check server configuration."
+        )
+    
+    # Get uploaded file (missing files fail before the stream starts)
+    file_path = file_manager.get_file_path(request.file_id)
+    if not file_path or not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    with open(file_path, 'r', encoding='utf-8') as f:
+        latex_content = f.read()
+    
+    print(f"🤖 Processing streaming V1 edit request: {request.prompt[:80]}...")
+    
+    loop = asyncio.get_running_loop()
+    deltas: asyncio.Queue = asyncio.Queue()
+    
+    def on_chunk(text: str):
+        # Called on the editor thread
+        loop.call_soon_threadsafe(deltas.put_nowait, text)
+    
+    def run_edit():
+        editor = DocumentEditor()
+        return editor.edit(latex_content, request.prompt, on_chunk=on_chunk)
+    
+    async def events():
+        yield _sse("start", {"prompt": request.prompt})
+        
+        edit = loop.run_in_executor(None, run_edit)
+        edit.add_done_callback(lambda _: deltas.put_nowait(None))
+        while True:
+            text = await deltas.get()
+            if text is None:
+                break
+            yield _sse("delta", {"text": text})
+        
+        try:
+            modified_content, result_info = edit.result()
+            
+            # Same success rules as /edit-doc-v1: zero changes is not an error
+            if not result_info.get('success', False) and result_info.get('error'):
+                yield _sse("error", {"detail": f"Editing failed: {result_info.get('error')}"})
+                return
+            
+            edited_file_id = file_manager.save_file(
+                content=modified_content,
+                filename=f"{request.file_id}_v1_edited.tex",
+                file_type="latex"
+            )
+            
+            pdf_id = None
+            if request.compile_pdf:
+                pdf_id = await loop.run_in_executor(None, _compile_edited_pdf, edited_file_id, request.file_id)
+            
+            processing_time = time.time() - start_time
+            operation = result_info.get('operation', 'unknown')
+            action = result_info.get('action', 'unknown')
+            changes = result_info.get('changes', 0)
+            
+            print(f"✅ V1 streaming edit complete: {operation}/{action} with {changes} changes ({processing_time:.2f}s)")
+            
+            response = DocumentEditV1Response(
+                success=True,
+                file_id=edited_file_id,
+                pdf_id=pdf_id,
+                operation=operation,
+                action=action,
+                changes=changes,
+                processing_time=processing_time,
+                parsed_query=result_info.get('parsed_query', {}),
+                message=f"Document edited successfully. Operation: {operation}/{action}, Changes: {changes}"
+            )
+            yield _sse("done", {**response.model_dump(), "content": modified_content})
+            
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            yield _sse("error", {"detail": f"Error during document editing: {str(e)}"})
+    
+    # Schedule cleanup (runs after the stream ends)
+    background_tasks.add_task(file_manager.cleanup_temp_files)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/batch-edit-v1", response_model=DocumentEditV1BatchResponse)
 async def batch_edit_documents_v1(
     request: DocumentEditV1BatchRequest,
@@ -195,7 +321,6 @@ async def batch_edit_documents_v1(
     - file_id: ID of the LaTeX file to edit
     - queries: List of natural language editing instructions
     - compile_pdf: Whether to compile final result to PDF
-    - delay: Delay in seconds between operations (default: 1.5s for API rate limiting)
     
     Returns:
     - Final edited file ID
@@ -228,7 +353,7 @@ async def batch_edit_documents_v1(
         editor = DocumentEditor()
         
         # Execute batch edits
-        final_content, results = editor.batch_edit(current_content, request.queries, delay=request.delay)
+        final_content, results = editor.batch_edit(current_content, request.queries)
         
         # Save final edited file
         edited_file_id = file_manager.save_file(
@@ -31,6 +31,8 @@ source venv/bin/activate
 # Install dependencies
 echo "📥 Installing dependencies..."
 pip install -r requirements.txt
+# Shared doc_edit package (repo-level src/)
+pip install --no-deps -e ..
 
 # Check if API keys are set
 source .env
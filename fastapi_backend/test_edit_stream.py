@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test the streaming V1 edit endpoint (/edit-doc-v1/stream): events come as
+start, then the rewritten text as deltas, then done (or error)
+"""
+
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+# Setup paths
+backend_dir = Path(__file__).parent.resolve()
+sys.path.insert(0, str(backend_dir.parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from fastapi_backend.routers import doc_editor_v1
+
+DOCUMENT = "\\documentclass{article}\n\\begin{document}\n\\section{Intro}\nOld text.\n\\end{document}\n"
+
+
+class FakeFiles:
+    """Serves one uploaded file and records what is saved"""
+
+    def __init__(self, path):
+        self.path = path
+        self.saved = []
+
+    def get_file_path(self, file_id):
+        return self.path if file_id == "doc" else None
+
+    def save_file(self, content, filename, file_type):
+        self.saved.append(content)
+        return "edited"
+
+    def cleanup_temp_files(self):
+        pass
+
+
+def _editor(pieces=(), result=None, fail=None):
+    """DocumentEditor stand-in: streams `pieces`, then returns `result` or raises `fail`"""
+    class Editor:
+        def edit(self, content, prompt, on_chunk=None):
+            for piece in pieces:
+                on_chunk(piece)
+            if fail:
+                raise fail
+            modified = content.replace("Old text.", "".join(pieces))
+            return modified, result or {'success': True, 'operation': 'modify',
+                                        'action': 'modify_section_ai', 'changes': 1, 'parsed_query': {}}
+    return Editor
+
+
+def _events(body):
+    """(event, data) pairs of an SSE response body"""
+    events = []
+    for message in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in message.split("\n"))
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def _stream(editor, prompt="improve the Intro section", file_id="doc"):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / "doc.tex"
+        path.write_text(DOCUMENT, encoding='utf-8')
+        files = FakeFiles(str(path))
+
+        saved = (getattr(doc_editor_v1, 'DocumentEditor', None), doc_editor_v1.NEW_EDITOR_AVAILABLE,
+                 doc_editor_v1.file_manager)
+        doc_editor_v1.DocumentEditor = editor
+        doc_editor_v1.NEW_EDITOR_AVAILABLE = True
+        doc_editor_v1.file_manager = files
+        try:
+            app = FastAPI()
+            app.include_router(doc_editor_v1.router)
+            response = TestClient(app).post("/edit-doc-v1/stream", json={"file_id": file_id, "prompt": prompt})
+        finally:
+            doc_editor_v1.DocumentEditor, doc_editor_v1.NEW_EDITOR_AVAILABLE, doc_editor_v1.file_manager = saved
+        return response, files
+
+
+def test_stream_sends_start_deltas_done():
+    response, files = _stream(_editor(pieces=["New ", "intro ", "text."]))
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = _events(response.text)
+    assert [name for name, _ in events] == ["start", "delta", "delta", "delta", "done"]
+    assert events[0][1] == {"prompt": "improve the Intro section"}
+    assert "".join(data["text"] for name, data in events if name == "delta") == "New intro text."
+
+    done = events[-1][1]
+    assert done["success"] and done["file_id"] == "edited" and done["changes"] == 1
+    assert "New intro text." in done["content"] and files.saved == [done["content"]]
+    print("✅ Stream events passed")
+
+
+def test_non_streaming_edits_go_straight_to_done():
+    response, _ = _stream(_editor(result={'success': True, 'operation': 'replace', 'action': 'replace_word',
+                                          'changes': 0, 'parsed_query': {}}))
+    assert [name for name, _ in _events(response.text)] == ["start", "done"]
+    print("✅ Non-streaming edit passed")
+
+
+def test_failures_end_with_error():
+    response, files = _stream(_editor(result={'success': False, 'error': 'Failed to parse query'}))
+    events = _events(response.text)
+    assert [name for name, _ in events] == ["start", "error"]
+    assert "Failed to parse query" in events[-1][1]["detail"] and files.saved == []
+
+    response, _ = _stream(_editor(pieces=["partial"], fail=RuntimeError("Gemini quota")))
+    events = _events(response.text)
+    assert [name for name, _ in events] == ["start", "delta", "error"]
+    assert "Gemini quota" in events[-1][1]["detail"]
+
+    # A missing file fails before the stream starts
+    response, _ = _stream(_editor(), file_id="missing")
+    assert response.status_code == 404
+    print("✅ Stream errors passed")
+
+
+if __name__ == "__main__":
+    test_stream_sends_start_deltas_done()
+    test_non_streaming_edits_go_straight_to_done()
+    test_failures_end_with_error()
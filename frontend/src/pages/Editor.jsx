@@ -16,6 +16,7 @@ export default function Editor() {
   const [batchPrompts, setBatchPrompts] = useState([''])
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState(null)
+  const [streamPreview, setStreamPreview] = useState('') // AI rewrite text as it streams in
   const [numPages, setNumPages] = useState(null)
   const [currentPage, setCurrentPage] = useState(1)
   const [scale, setScale] = useState(1.0)
@@ -138,6 +139,7 @@ export default function Editor() {
     
     if (!prompt.trim()) return setError('Please enter an editing prompt')
     setError(null)
+    setStreamPreview('')
     setLoading(true)
     try {
       // First verify the file is still accessible
@@ -173,12 +175,12 @@ export default function Editor() {
         throw new Error(err.message || 'Unable to prepare the document for editing. Please retry the format mapping step.')
       }
 
-      // Step 2: Apply edit prompt
-      const editResp = await api.editDocument({
+      // Step 2: Apply edit prompt (streamed, so AI rewrites show up as they are written)
+      const editResp = await api.editDocumentStream({
         file_id: preparedFileId,
         prompt: prompt.trim(),
         compile_pdf: false
-      })
+      }, (text) => setStreamPreview((preview) => preview + text))
 
       if (!editResp?.file_id) {
         throw new Error(editResp?.message || 'Edit operation did not return an updated file')
@@ -246,8 +248,7 @@ export default function Editor() {
       const batchResp = await api.batchEditDocument({
         file_id: preparedFileId,
         queries: validPrompts,
-        compile_pdf: false,
-        delay: 1.5
+        compile_pdf: false
       })
 
       if (!batchResp?.file_id) {
@@ -539,6 +540,11 @@ export default function Editor() {
                 >
                   {loading ? '⏳ Processing...' : '✅ Apply Edit'}
                 </button>
+                {loading && streamPreview && (
+                  <pre className="w-full border rounded p-2 max-h-60 overflow-auto text-xs font-mono whitespace-pre-wrap bg-slate-50 text-slate-600">
+                    {streamPreview}
+                  </pre>
+                )}
               </>
             ) : (
               <>
@@ -108,6 +108,61 @@ async function editDocument({ file_id, prompt, compile_pdf = false, images_dir_i
   }
 }
 
+// Streaming Document Editing (Server-Sent Events)
+// onDelta receives rewritten text as it is generated; resolves with the
+// final result (same fields as editDocument plus the edited `content`)
+async function editDocumentStream({ file_id, prompt, compile_pdf = false, images_dir_id = null }, onDelta = () => {}) {
+  const response = await fetch(`${BASE_URL}/api/v1/edit/edit-doc-v1/stream`, {
+    method: 'POST',
+    headers: {
+      'Accept': 'text/event-stream',
+      'Content-Type': 'application/json'
+    },
+    body: JSON.stringify({ file_id, prompt, compile_pdf, images_dir_id })
+  })
+
+  if (!response.ok) {
+    const data = await response.json().catch(() => ({}))
+    throw new Error(data.detail || 'Document editing failed. Please try again.')
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let result = null
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    // Events are separated by a blank line
+    let boundary
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const message = buffer.slice(0, boundary)
+      buffer = buffer.slice(boundary + 2)
+
+      const event = message.match(/^event: (.*)$/m)?.[1]
+      const data = message.match(/^data: (.*)$/m)?.[1]
+      if (!event || data === undefined) continue
+
+      const payload = JSON.parse(data)
+      if (event === 'delta') {
+        onDelta(payload.text)
+      } else if (event === 'done') {
+        result = payload
+      } else if (event === 'error') {
+        throw new Error(payload.detail || 'Document editing failed. Please try again.')
+      }
+    }
+  }
+
+  if (!result) {
+    throw new Error('Document editing stream ended unexpectedly. Please try again.')
+  }
+  return result
+}
+
 // LaTeX Compilation
 async function compilePdf({ file_id, engine = 'pdflatex', images_dir_id = null }) {
   try {
@@ -207,13 +262,12 @@ async function convertPdfToLatex({ file_id, mathpix_app_id = null, mathpix_app_k
 }
 
 // Document Batch Editing
-async function batchEditDocument({ file_id, queries, compile_pdf = false, delay = 1.5, images_dir_id = null }) {
+async function batchEditDocument({ file_id, queries, compile_pdf = false, images_dir_id = null }) {
   try {
     const response = await client.post('/api/v1/edit/batch-edit-v1', {
       file_id,
       queries,
       compile_pdf,
-      delay,
       images_dir_id
     }, {
       timeout: 600000 // 10 minutes for batch operations
@@ -247,6 +301,7 @@ export default {
   
   // Document Operations
   editDocument,
+  editDocumentStream,
   batchEditDocument,
   compilePdf,
   fixLatexRag,
@@ -0,0 +1,250 @@
+"""
+Process-wide Gemini API key scheduler.
+
+Every key has two token buckets sized to its published limits: one for
+requests per minute and one for tokens per minute.  Bucket state lives in a
+local SQLite database so all gunicorn workers on a host draw from the same
+budget.  ``acquire`` reserves capacity on the least-loaded key and queues
+(waits) when every key is saturated instead of failing; ``release`` settles
+the actual token usage and records server-side rate limits.
+"""
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RPM = int(os.getenv("GEMINI_RPM", "15"))
+DEFAULT_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+DEFAULT_STATE_PATH = Path(os.getenv(
+    "LLM_KEY_STATE_PATH",
+    str(Path(tempfile.gettempdir()) / "doc_edit_key_scheduler.sqlite")
+))
+RATE_LIMIT_COOLDOWN = float(os.getenv("LLM_RATE_LIMIT_COOLDOWN", "60"))
+MAX_QUEUE_WAIT = float(os.getenv("LLM_MAX_QUEUE_WAIT", "300"))
+
+
+class KeySaturatedError(Exception):
+    """Raised when no key frees up within the queue wait limit"""
+    pass
+
+
+def key_id(api_key: str) -> str:
+    """Stable identifier for a key; the key itself is never stored"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+class KeyScheduler:
+    """
+    Token-bucket scheduler over a set of API keys with SQLite-shared state.
+
+    Buckets refill continuously at rpm/60 requests and tpm/60 tokens per
+    second up to one minute's worth.  Load is the larger of the used
+    fractions of the two buckets; ``acquire`` picks the key with the
+    lowest load, breaking ties by in-flight requests.
+    """
+
+    def __init__(self, api_keys: Sequence[str], rpm: int = DEFAULT_RPM,
+                 tpm: int = DEFAULT_TPM, path: Optional[Path] = None):
+        self.api_keys = [k for k in dict.fromkeys(api_keys) if k]
+        self.rpm = rpm
+        self.tpm = tpm
+        self.path = Path(path or DEFAULT_STATE_PATH)
+        self._ids = {key_id(k): k for k in self.api_keys}
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30,
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS key_buckets (
+                key_id TEXT PRIMARY KEY,
+                requests_left REAL NOT NULL,
+                tokens_left REAL NOT NULL,
+                updated REAL NOT NULL,
+                in_flight INTEGER NOT NULL DEFAULT 0,
+                cooldown_until REAL NOT NULL DEFAULT 0,
+                total_requests INTEGER NOT NULL DEFAULT 0,
+                total_tokens INTEGER NOT NULL DEFAULT 0,
+                rate_limited INTEGER NOT NULL DEFAULT 0,
+                failures INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO key_buckets (key_id, requests_left, tokens_left, updated) "
+            "VALUES (?, ?, ?, ?)",
+            [(kid, float(rpm), float(tpm), now) for kid in self._ids]
+        )
+
+    # ------------------------------------------------------------------
+    # Bucket arithmetic
+    # ------------------------------------------------------------------
+
+    def _refill(self, requests_left: float, tokens_left: float,
+                updated: float, now: float) -> Tuple[float, float]:
+        elapsed = max(0.0, now - updated)
+        return (min(float(self.rpm), requests_left + elapsed * self.rpm / 60.0),
+                min(float(self.tpm), tokens_left + elapsed * self.tpm / 60.0))
+
+    def _wait_for(self, requests_left: float, tokens_left: float,
+                  cooldown_until: float, tokens: int, now: float) -> float:
+        """Seconds until this key can serve a request of `tokens` tokens"""
+        wait = max(0.0, cooldown_until - now)
+        if requests_left < 1:
+            wait = max(wait, (1 - requests_left) * 60.0 / self.rpm)
+        if tokens_left < tokens:
+            wait = max(wait, (tokens - tokens_left) * 60.0 / self.tpm)
+        return wait
+
+    def _rows(self) -> List[tuple]:
+        marks = ",".join("?" * len(self._ids))
+        return self._conn.execute(
+            f"SELECT key_id, requests_left, tokens_left, updated, in_flight, cooldown_until "
+            f"FROM key_buckets WHERE key_id IN ({marks})", list(self._ids)
+        ).fetchall()
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    def try_acquire(self, tokens: int = 1, exclude: Sequence[str] = ()) -> Tuple[Optional[str], float]:
+        """
+        Reserve one request and `tokens` tokens on the least-loaded key.
+
+        Returns:
+            (api_key, 0.0) on success, or (None, seconds_to_wait) when saturated
+        """
+        if not self._ids:
+            return None, 0.0
+        tokens = min(max(1, int(tokens)), self.tpm)
+        excluded = {key_id(k) for k in exclude}
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                best, best_rank, min_wait = None, None, None
+                for kid, req_left, tok_left, updated, in_flight, cooldown in self._rows():
+                    req_left, tok_left = self._refill(req_left, tok_left, updated, now)
+                    wait = self._wait_for(req_left, tok_left, cooldown, tokens, now)
+                    if wait > 0 or kid in excluded:
+                        min_wait = wait if min_wait is None else min(min_wait, wait)
+                        continue
+                    load = max(1 - req_left / self.rpm, 1 - tok_left / self.tpm)
+                    rank = (load, in_flight)
+                    if best_rank is None or rank < best_rank:
+                        best, best_rank = (kid, req_left, tok_left), rank
+
+                if best is None:
+                    self._conn.execute("COMMIT")
+                    return None, min_wait or 0.0
+
+                kid, req_left, tok_left = best
+                self._conn.execute(
+                    "UPDATE key_buckets SET requests_left = ?, tokens_left = ?, updated = ?, "
+                    "in_flight = in_flight + 1, total_requests = total_requests + 1 "
+                    "WHERE key_id = ?",
+                    (req_left - 1, tok_left - tokens, now, kid)
+                )
+                self._conn.execute("COMMIT")
+                return self._ids[kid], 0.0
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    async def acquire(self, tokens: int = 1, exclude: Sequence[str] = (),
+                      max_wait: float = MAX_QUEUE_WAIT) -> str:
+        """Reserve capacity, waiting in the queue while every key is saturated"""
+        deadline = time.monotonic() + max_wait
+        while True:
+            api_key, wait = self.try_acquire(tokens, exclude)
+            if api_key:
+                return api_key
+            if wait == 0.0 and exclude:
+                exclude = ()  # Only excluded keys are free; use them rather than stall
+                continue
+            if time.monotonic() + wait > deadline:
+                raise KeySaturatedError(f"All {len(self.api_keys)} API keys saturated for {max_wait:.0f}s")
+            await asyncio.sleep(min(max(wait, 0.05), 5.0))
+
+    def release(self, api_key: str, tokens_used: Optional[int] = None,
+                tokens_reserved: int = 1, rate_limited: bool = False,
+                failed: bool = False, cooldown: float = RATE_LIMIT_COOLDOWN):
+        """Settle a finished request: charge actual tokens, record 429s and failures"""
+        kid = key_id(api_key)
+        adjust = 0 if tokens_used is None else tokens_reserved - tokens_used
+        with self._lock:
+            if rate_limited:
+                # The server disagrees with our budget: drain the key and cool it down
+                self._conn.execute(
+                    "UPDATE key_buckets SET in_flight = MAX(0, in_flight - 1), requests_left = 0, "
+                    "cooldown_until = ?, rate_limited = rate_limited + 1, failures = failures + 1 "
+                    "WHERE key_id = ?",
+                    (time.time() + cooldown, kid)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE key_buckets SET in_flight = MAX(0, in_flight - 1), "
+                    "tokens_left = MIN(?, tokens_left + ?), total_tokens = total_tokens + ?, "
+                    "failures = failures + ? WHERE key_id = ?",
+                    (float(self.tpm), adjust, tokens_used or tokens_reserved, int(failed), kid)
+                )
+
+    def reset_cooldowns(self):
+        """Clear rate-limit cool-downs on every key of this scheduler"""
+        marks = ",".join("?" * len(self._ids))
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE key_buckets SET cooldown_until = 0 WHERE key_id IN ({marks})", list(self._ids)
+            )
+
+    def utilization(self) -> Dict[str, Dict[str, float]]:
+        """Per-key RPM/TPM utilization and counters, keyed by masked key"""
+        marks = ",".join("?" * len(self._ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key_id, requests_left, tokens_left, updated, in_flight, cooldown_until, "
+                f"total_requests, total_tokens, rate_limited, failures "
+                f"FROM key_buckets WHERE key_id IN ({marks})", list(self._ids)
+            ).fetchall()
+
+        now = time.time()
+        report = {}
+        for kid, req_left, tok_left, updated, in_flight, cooldown, requests, tokens, limited, failures in rows:
+            req_left, tok_left = self._refill(req_left, tok_left, updated, now)
+            report[f"...{self._ids[kid][-6:]}"] = {
+                "rpm_utilization": round(1 - req_left / self.rpm, 3),
+                "tpm_utilization": round(1 - tok_left / self.tpm, 3),
+                "in_flight": in_flight,
+                "cooling_for": round(max(0.0, cooldown - now), 1),
+                "requests": requests,
+                "tokens": tokens,
+                "rate_limited": limited,
+                "failures": failures,
+            }
+        return report
+
+
+_schedulers: Dict[Tuple[str, ...], KeyScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(api_keys: Sequence[str]) -> KeyScheduler:
+    """Shared scheduler for a key set (one SQLite connection per process)"""
+    keys = tuple(k for k in dict.fromkeys(api_keys) if k)
+    with _schedulers_lock:
+        scheduler = _schedulers.get(keys)
+        if scheduler is None:
+            scheduler = KeyScheduler(keys)
+            _schedulers[keys] = scheduler
+        return scheduler
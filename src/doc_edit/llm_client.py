@@ -0,0 +1,426 @@
+"""
+Shared async Gemini client used by every LLM caller.
+
+All requests run on one background event loop.  Each API key gets its own
+underlying client (so the process-global ``genai.configure`` is never touched)
+and its own semaphore bounding in-flight requests.  Keys are handed out by the
+process-wide ``KeyScheduler`` (token buckets shared across workers), which
+queues requests while every key is saturated.  Calls have a timeout and are
+retried with jittered exponential backoff on 429/5xx.  Both async and blocking
+entry points are provided so synchronous editors and async services share the
+same limits.
+"""
+
+import asyncio
+import dataclasses
+import os
+import queue
+import random
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+import logging
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from google.api_core import exceptions as google_exceptions
+
+from .key_scheduler import KeySaturatedError, KeyScheduler, get_scheduler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+MAX_CONCURRENCY_PER_KEY = int(os.getenv("LLM_MAX_CONCURRENCY_PER_KEY", "4"))
+REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+OUTPUT_TOKEN_RESERVE = 1024  # Reserved per request until actual usage is known
+
+RETRYABLE_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.DeadlineExceeded,
+    asyncio.TimeoutError,
+)
+
+
+class LLMError(Exception):
+    """Raised when a request fails on every key and retry"""
+    pass
+
+
+def collect_api_keys() -> List[str]:
+    """Gemini keys from GEMINI_API_KEY / GOOGLE_API_KEY and API_KEY1..API_KEY39"""
+    names = ["GEMINI_API_KEY", "GOOGLE_API_KEY"] + [f"API_KEY{i}" for i in range(1, 40)]
+    keys = []
+    for name in names:
+        key = os.getenv(name)
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+
+def is_rate_limit(error: BaseException) -> bool:
+    """True for 429 / quota errors"""
+    if isinstance(error, (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted)):
+        return True
+    text = str(error).lower()
+    return "429" in text or "quota" in text or "resource_exhausted" in text or "rate limit" in text
+
+
+def is_retryable(error: BaseException) -> bool:
+    """True for rate limits, timeouts and 5xx responses"""
+    return isinstance(error, RETRYABLE_ERRORS) or is_rate_limit(error)
+
+
+def estimate_tokens(prompt: Any, generation_config=None) -> int:
+    """Tokens to reserve for a request: ~4 characters per prompt token plus the output budget"""
+    max_output = None
+    if isinstance(generation_config, dict):
+        max_output = generation_config.get("max_output_tokens")
+    elif generation_config is not None:
+        max_output = getattr(generation_config, "max_output_tokens", None)
+    return len(str(prompt)) // 4 + (max_output or OUTPUT_TOKEN_RESERVE)
+
+
+def _usage(response) -> Optional[int]:
+    """Total tokens reported by the API, if any"""
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) or None
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_MAX) -> float:
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2**attempt))"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class _LoopThread:
+    """Single daemon thread running the event loop that owns every request"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="llm-client", daemon=True)
+        self.thread.start()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+
+class _KeyState:
+    """Per-key semaphore and client (only touched on the client loop)"""
+
+    def __init__(self, api_key: str, max_concurrency: int):
+        self.api_key = api_key
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self._service = None
+
+    @property
+    def service(self):
+        """Async generative service bound to this key only"""
+        if self._service is None:
+            self._service = glm.GenerativeServiceAsyncClient(
+                client_options={"api_key": self.api_key}
+            )
+        return self._service
+
+    def model(self, model_name: str, generation_config=None, system_instruction=None):
+        return _KeyModel(self.service, model_name, generation_config, system_instruction)
+
+
+def _content(value, role: Optional[str] = None) -> glm.Content:
+    """A Content message from text, a list of text parts, or an existing Content"""
+    if isinstance(value, glm.Content):
+        return value
+    parts = value if isinstance(value, (list, tuple)) else [value]
+    return glm.Content(role=role, parts=[glm.Part(text=str(part)) for part in parts])
+
+
+def _generation_config(config) -> Optional[glm.GenerationConfig]:
+    """GenerationConfig from a dict or ``genai.types.GenerationConfig``"""
+    if config is None or isinstance(config, glm.GenerationConfig):
+        return config
+    if dataclasses.is_dataclass(config):
+        config = dataclasses.asdict(config)
+    return glm.GenerationConfig(**{k: v for k, v in dict(config).items() if v is not None})
+
+
+class _KeyModel:
+    """
+    ``generate_content_async`` over one key's service.
+
+    ``genai.GenerativeModel`` has no public way to use a client other than the
+    globally configured one, so requests are built from the public
+    ``generativelanguage`` types and sent through the key's own service;
+    responses are wrapped in ``genai.types.AsyncGenerateContentResponse`` so
+    callers see the same ``.text`` / ``usage_metadata`` / async iteration.
+    """
+
+    def __init__(self, service, model_name: str, generation_config=None, system_instruction=None):
+        self.service = service
+        self.model_name = model_name if "/" in model_name else f"models/{model_name}"
+        self.generation_config = _generation_config(generation_config)
+        self.system_instruction = _content(system_instruction) if system_instruction else None
+
+    def request(self, prompt) -> glm.GenerateContentRequest:
+        return glm.GenerateContentRequest(model=self.model_name, contents=[_content(prompt, role="user")],
+                                          generation_config=self.generation_config,
+                                          system_instruction=self.system_instruction)
+
+    async def generate_content_async(self, prompt, stream: bool = False, request_options=None):
+        request = self.request(prompt)
+        if stream:
+            iterator = await self.service.stream_generate_content(request, **(request_options or {}))
+            return await genai.types.AsyncGenerateContentResponse.from_aiterator(iterator)
+        response = await self.service.generate_content(request, **(request_options or {}))
+        return genai.types.AsyncGenerateContentResponse.from_response(response)
+
+
+_runner: Optional[_LoopThread] = None
+_runner_lock = threading.Lock()
+_clients_lock = threading.Lock()
+_key_states: Dict[str, _KeyState] = {}
+_clients: Dict[Tuple[str, ...], "AsyncLLMClient"] = {}
+
+
+def _get_runner() -> _LoopThread:
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = _LoopThread()
+        return _runner
+
+
+class AsyncLLMClient:
+    """
+    Concurrency-limited Gemini client over a pool of API keys.
+
+    Key states (semaphores, underlying clients) are process-wide, so two
+    clients sharing a key also share its concurrency limit; rate budgets are
+    shared further, across processes, by the key scheduler.
+    """
+
+    def __init__(self, api_keys: Optional[Sequence[str]] = None,
+                 model_name: Optional[str] = None,
+                 max_concurrency_per_key: int = MAX_CONCURRENCY_PER_KEY,
+                 timeout: float = REQUEST_TIMEOUT,
+                 max_retries: int = MAX_RETRIES,
+                 scheduler: Optional[KeyScheduler] = None):
+        keys = collect_api_keys() if api_keys is None else api_keys
+        self.api_keys = [k for k in dict.fromkeys(keys) if k]
+        self.model_name = model_name or DEFAULT_MODEL
+        self.max_concurrency_per_key = max_concurrency_per_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.scheduler = scheduler or get_scheduler(self.api_keys)
+        self._runner = _get_runner()
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_keys)
+
+    # ------------------------------------------------------------------
+    # Core request loop (runs on the client loop)
+    # ------------------------------------------------------------------
+
+    def _state(self, api_key: str) -> _KeyState:
+        state = _key_states.get(api_key)
+        if state is None:
+            state = _KeyState(api_key, self.max_concurrency_per_key)
+            _key_states[api_key] = state
+        return state
+
+    async def _with_retries(self, call, reserved: int, max_retries: int, retry_after_output: bool = True):
+        """
+        Run `call(model_factory)` on scheduled keys until it succeeds.
+
+        Rate-limited keys are drained in the scheduler and the request is
+        rescheduled immediately (it queues if no key is free); other
+        retryable errors back off with jitter.  `call` returns
+        (result, tokens_used, produced_output).
+        """
+        if not self.api_keys:
+            raise LLMError("No Gemini API keys configured")
+
+        last_error: Optional[BaseException] = None
+        limited: List[str] = []
+        for attempt in range(max_retries + 1):
+            try:
+                api_key = await self.scheduler.acquire(reserved, exclude=limited)
+            except KeySaturatedError as e:
+                raise LLMError(str(e)) from e
+
+            state = self._state(api_key)
+            used, rate_limited, failed, produced = None, False, False, False
+            try:
+                async with state.semaphore:
+                    result, used, produced = await call(state)
+                return result
+            except Exception as e:
+                last_error, failed = e, True
+                produced = produced or getattr(e, "produced_output", False)
+                rate_limited = is_rate_limit(e)
+                if not is_retryable(e) or (produced and not retry_after_output):
+                    raise LLMError(str(e)) from e
+            finally:
+                self.scheduler.release(api_key, used, reserved,
+                                       rate_limited=rate_limited, failed=failed)
+
+            if attempt == max_retries:
+                break
+            if rate_limited:
+                logger.warning("LLM key rate limited; rescheduling on another key")
+                limited.append(api_key)
+                continue
+            delay = backoff_delay(attempt)
+            logger.warning(f"LLM request failed (attempt {attempt + 1}/{max_retries + 1}): "
+                           f"{type(last_error).__name__}; retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        raise LLMError(f"LLM request failed after {max_retries + 1} attempts: "
+                       f"{type(last_error).__name__}: {last_error}") from last_error
+
+    async def _generate(self, prompt: Any, model_name: str, generation_config,
+                        system_instruction, timeout: float, max_retries: int) -> str:
+        async def call(state: _KeyState):
+            model = state.model(model_name, generation_config, system_instruction)
+            response = await asyncio.wait_for(
+                model.generate_content_async(prompt, request_options={"timeout": timeout}),
+                timeout,
+            )
+            return response.text, _usage(response), True
+
+        return await self._with_retries(call, estimate_tokens(prompt, generation_config), max_retries)
+
+    async def _stream(self, prompt: Any, model_name: str, generation_config,
+                      system_instruction, timeout: float, max_retries: int, emit) -> None:
+        """Stream chunks into `emit`; retries only before the first chunk arrives"""
+        async def call(state: _KeyState):
+            model = state.model(model_name, generation_config, system_instruction)
+            response = await asyncio.wait_for(
+                model.generate_content_async(prompt, stream=True,
+                                             request_options={"timeout": timeout}),
+                timeout,
+            )
+            started = False
+            try:
+                async for chunk in response:
+                    text = getattr(chunk, "text", "")
+                    if text:
+                        started = True
+                        await emit(text)
+            except Exception as e:
+                e.produced_output = started
+                raise
+            return None, _usage(response), started
+
+        await self._with_retries(call, estimate_tokens(prompt, generation_config), max_retries,
+                                 retry_after_output=False)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def _request(self, prompt: Any, model: Optional[str], generation_config,
+                 system_instruction, timeout: Optional[float], max_retries: Optional[int]):
+        """Positional arguments shared by `_generate` and `_stream`"""
+        return (prompt, model or self.model_name, generation_config, system_instruction,
+                timeout or self.timeout, self.max_retries if max_retries is None else max_retries)
+
+    async def generate(self, prompt: Any, model: Optional[str] = None,
+                       generation_config=None, system_instruction=None,
+                       timeout: Optional[float] = None,
+                       max_retries: Optional[int] = None) -> str:
+        """Generate text; awaitable from any event loop"""
+        args = self._request(prompt, model, generation_config, system_instruction, timeout, max_retries)
+        return await asyncio.wrap_future(self._runner.submit(self._generate(*args)))
+
+    def generate_sync(self, prompt: Any, model: Optional[str] = None,
+                      generation_config=None, system_instruction=None,
+                      timeout: Optional[float] = None,
+                      max_retries: Optional[int] = None) -> str:
+        """Blocking variant of `generate` for synchronous callers"""
+        args = self._request(prompt, model, generation_config, system_instruction, timeout, max_retries)
+        return self._runner.submit(self._generate(*args)).result()
+
+    def generate_many(self, prompts: Sequence[Any], model: Optional[str] = None,
+                      generation_config=None, system_instruction=None,
+                      timeout: Optional[float] = None,
+                      max_retries: Optional[int] = None) -> List[Any]:
+        """Run independent prompts concurrently; failed entries hold the exception"""
+        async def run_all():
+            return await asyncio.gather(*[
+                self._generate(*self._request(p, model, generation_config, system_instruction,
+                                              timeout, max_retries))
+                for p in prompts
+            ], return_exceptions=True)
+        return self._runner.submit(run_all()).result()
+
+    async def stream(self, prompt: Any, model: Optional[str] = None,
+                     generation_config=None, system_instruction=None,
+                     timeout: Optional[float] = None,
+                     max_retries: Optional[int] = None) -> AsyncIterator[str]:
+        """Yield text chunks as they arrive; usable from any event loop"""
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        async def emit(text):
+            loop.call_soon_threadsafe(chunks.put_nowait, text)
+
+        args = self._request(prompt, model, generation_config, system_instruction, timeout, max_retries)
+        future = self._runner.submit(self._stream(*args, emit))
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(chunks.put_nowait, done))
+
+        while True:
+            item = await chunks.get()
+            if item is done:
+                break
+            yield item
+        future.result()  # re-raise stream errors
+
+    def stream_sync(self, prompt: Any, model: Optional[str] = None,
+                    generation_config=None, system_instruction=None,
+                    timeout: Optional[float] = None,
+                    max_retries: Optional[int] = None) -> Iterator[str]:
+        """Blocking iterator over streamed text chunks"""
+        chunks: queue.Queue = queue.Queue()
+        done = object()
+
+        async def emit(text):
+            chunks.put(text)
+
+        args = self._request(prompt, model, generation_config, system_instruction, timeout, max_retries)
+        future = self._runner.submit(self._stream(*args, emit))
+        future.add_done_callback(lambda _: chunks.put(done))
+
+        while True:
+            item = chunks.get()
+            if item is done:
+                break
+            yield item
+        future.result()
+
+    def reset_cooldowns(self):
+        """Make every rate-limited key of this client available again"""
+        self.scheduler.reset_cooldowns()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-key RPM/TPM utilization and counters (keys masked)"""
+        return self.scheduler.utilization()
+
+
+def get_client(api_keys: Optional[Sequence[str]] = None,
+               model_name: Optional[str] = None) -> AsyncLLMClient:
+    """Shared client for a key set (defaults to every key in the environment)"""
+    keys = tuple(collect_api_keys() if api_keys is None else [k for k in api_keys if k])
+    cache_key = keys + (model_name or DEFAULT_MODEL,)
+    with _clients_lock:
+        client = _clients.get(cache_key)
+        if client is None:
+            client = AsyncLLMClient(keys, model_name=model_name)
+            _clients[cache_key] = client
+        return client